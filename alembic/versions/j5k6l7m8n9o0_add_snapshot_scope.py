@@ -0,0 +1,29 @@
+"""add scope column to calculation_snapshots
+
+Revision ID: j5k6l7m8n9o0
+Revises: i4j5k6l7m8n9
+Create Date: 2026-03-02
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'j5k6l7m8n9o0'
+down_revision: Union[str, None] = 'i4j5k6l7m8n9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('calculation_snapshots', sa.Column(
+        'scope', postgresql.JSONB(astext_type=sa.Text()), nullable=True,
+        comment='Calculation scope {row_ids, period_ids}; NULL = whole grid'
+    ))
+
+
+def downgrade() -> None:
+    op.drop_column('calculation_snapshots', 'scope')
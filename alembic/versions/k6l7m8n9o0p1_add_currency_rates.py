@@ -0,0 +1,45 @@
+"""add budget_currency_rates table
+
+Revision ID: k6l7m8n9o0p1
+Revises: j5k6l7m8n9o0
+Create Date: 2026-03-05
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'k6l7m8n9o0p1'
+down_revision: Union[str, None] = 'j5k6l7m8n9o0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'budget_currency_rates',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('currency_code', sa.String(length=10), nullable=False, comment='Para Birimi Kodu'),
+        sa.Column('period_id', sa.Integer(), nullable=False),
+        sa.Column('version_id', sa.Integer(), nullable=True, comment='Bos ise tum versiyonlar icin gecerli'),
+        sa.Column('rate', sa.Numeric(precision=20, scale=8), nullable=False, comment='1 birimin baz para birimi karsiligi'),
+        sa.Column('created_date', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_date', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.ForeignKeyConstraint(['period_id'], ['budget_periods.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['version_id'], ['budget_versions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('currency_code', 'period_id', 'version_id', name='uq_currency_rate'),
+    )
+    op.create_index('ix_budget_currency_rates_currency_code', 'budget_currency_rates', ['currency_code'])
+    op.create_index(
+        'uq_currency_rate_global', 'budget_currency_rates', ['currency_code', 'period_id'],
+        unique=True, postgresql_where=sa.text('version_id IS NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_currency_rate_global', table_name='budget_currency_rates')
+    op.drop_index('ix_budget_currency_rates_currency_code', table_name='budget_currency_rates')
+    op.drop_table('budget_currency_rates')
@@ -0,0 +1,107 @@
+"""partition budget_entry_cells by budget_definition_id
+
+Revision ID: l7m8n9o0p1q2
+Revises: k6l7m8n9o0p1
+Create Date: 2026-03-06
+
+budget_entry_cells tablosu budget_definition_id ile LIST partition'li
+tabloya donusturulur. Her tanim icin budget_entry_cells_d<id> partition'i
+olusturulur; partition'i olmayan tanimlarin hucreleri
+budget_entry_cells_default'a duser. Mevcut hucreler tasinir.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'l7m8n9o0p1q2'
+down_revision: Union[str, None] = 'k6l7m8n9o0p1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CELL_COLUMNS = (
+    "row_id, period_id, measure_code, value, cell_type, source_rule_id, source_param_id, "
+    "is_manual_override, created_date, updated_date"
+)
+
+
+def _rename_old_table() -> None:
+    op.rename_table('budget_entry_cells', 'budget_entry_cells_old')
+    op.execute("ALTER TABLE budget_entry_cells_old RENAME CONSTRAINT budget_entry_cells_pkey TO budget_entry_cells_old_pkey")
+    op.execute("ALTER TABLE budget_entry_cells_old RENAME CONSTRAINT uq_cell_row_period_measure TO uq_cell_row_period_measure_old")
+    op.execute("ALTER INDEX ix_cell_row_period RENAME TO ix_cell_row_period_old")
+    op.execute("ALTER SEQUENCE budget_entry_cells_id_seq OWNED BY NONE")
+
+
+def _cell_columns() -> list:
+    return [
+        sa.Column('id', sa.Integer(), nullable=False,
+                  server_default=sa.text("nextval('budget_entry_cells_id_seq'::regclass)")),
+        sa.Column('row_id', sa.Integer(), nullable=False),
+        sa.Column('period_id', sa.Integer(), nullable=False),
+        sa.Column('measure_code', sa.String(length=50), nullable=False),
+        sa.Column('value', sa.Numeric(precision=20, scale=4), nullable=True),
+        sa.Column('cell_type', postgresql.ENUM('input', 'calculated', 'parameter_calculated', name='budgetcelltype', create_type=False), nullable=False, server_default='input'),
+        sa.Column('source_rule_id', sa.Integer(), nullable=True),
+        sa.Column('source_param_id', sa.Integer(), nullable=True),
+        sa.Column('is_manual_override', sa.Boolean(), server_default='false'),
+        sa.Column('created_date', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column('updated_date', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['row_id'], ['budget_entry_rows.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['period_id'], ['budget_periods.id']),
+        sa.ForeignKeyConstraint(['source_rule_id'], ['rule_set_items.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['source_param_id'], ['budget_parameters.id'], ondelete='SET NULL'),
+    ]
+
+
+def upgrade() -> None:
+    _rename_old_table()
+
+    op.create_table('budget_entry_cells',
+        sa.Column('budget_definition_id', sa.Integer(), nullable=False, comment='Butce tanimi (partition anahtari)'),
+        *_cell_columns(),
+        sa.ForeignKeyConstraint(['budget_definition_id'], ['budget_definitions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id', 'budget_definition_id'),
+        sa.UniqueConstraint('budget_definition_id', 'row_id', 'period_id', 'measure_code', name='uq_cell_row_period_measure'),
+        postgresql_partition_by='LIST (budget_definition_id)',
+    )
+    op.execute("ALTER SEQUENCE budget_entry_cells_id_seq OWNED BY budget_entry_cells.id")
+    op.create_index('ix_cell_row_period', 'budget_entry_cells', ['row_id', 'period_id'])
+
+    op.execute("CREATE TABLE budget_entry_cells_default PARTITION OF budget_entry_cells DEFAULT")
+    bind = op.get_bind()
+    for (definition_id,) in bind.execute(sa.text("SELECT id FROM budget_definitions ORDER BY id")).all():
+        op.execute(
+            f"CREATE TABLE budget_entry_cells_d{int(definition_id)} "
+            f"PARTITION OF budget_entry_cells FOR VALUES IN ({int(definition_id)})"
+        )
+
+    op.execute(f"""
+        INSERT INTO budget_entry_cells (id, budget_definition_id, {CELL_COLUMNS})
+        SELECT c.id, r.budget_definition_id, {', '.join('c.' + col.strip() for col in CELL_COLUMNS.split(','))}
+        FROM budget_entry_cells_old c
+        JOIN budget_entry_rows r ON r.id = c.row_id
+    """)
+    op.drop_table('budget_entry_cells_old')
+
+
+def downgrade() -> None:
+    _rename_old_table()
+
+    op.create_table('budget_entry_cells',
+        *_cell_columns(),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('row_id', 'period_id', 'measure_code', name='uq_cell_row_period_measure'),
+    )
+    op.execute("ALTER SEQUENCE budget_entry_cells_id_seq OWNED BY budget_entry_cells.id")
+    op.create_index('ix_cell_row_period', 'budget_entry_cells', ['row_id', 'period_id'])
+
+    op.execute(f"""
+        INSERT INTO budget_entry_cells (id, {CELL_COLUMNS})
+        SELECT id, {CELL_COLUMNS}
+        FROM budget_entry_cells_old
+    """)
+    # Partition'lar ana tabloyla birlikte silinir
+    op.drop_table('budget_entry_cells_old')
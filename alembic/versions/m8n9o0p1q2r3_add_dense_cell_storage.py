@@ -0,0 +1,74 @@
+"""add dense cell storage mode (budget_entry_series)
+
+Revision ID: m8n9o0p1q2r3
+Revises: l7m8n9o0p1q2
+Create Date: 2026-03-07
+
+budget_definitions.storage_mode (cell / dense) eklenir. dense modundaki
+tanimlarin hucreleri budget_entry_series tablosunda satir x olcu basina
+tek bir float8[] dizisi ve donem basina bir baytlik bayrak dizisi olarak
+tutulur. Mevcut tanimlar cell modunda kalir.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'm8n9o0p1q2r3'
+down_revision: Union[str, None] = 'l7m8n9o0p1q2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+budgetstoragemode = postgresql.ENUM('cell', 'dense', name='budgetstoragemode', create_type=False)
+
+
+def upgrade() -> None:
+    budgetstoragemode.create(op.get_bind(), checkfirst=True)
+
+    op.add_column('budget_definitions', sa.Column(
+        'storage_mode', budgetstoragemode, nullable=False, server_default='cell',
+        comment='Hucre depolama modu (cell / dense)'
+    ))
+
+    op.create_table('budget_entry_series',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('budget_definition_id', sa.Integer(), nullable=False),
+        sa.Column('row_id', sa.Integer(), nullable=False),
+        sa.Column('measure_code', sa.String(length=50), nullable=False, comment='Olcu kodu'),
+        sa.Column('start_month', sa.Integer(), nullable=False, comment='Ilk elemanin ay indeksi (yil*12+ay-1)'),
+        sa.Column('values', postgresql.ARRAY(sa.Float()), nullable=False, comment='Donem degerleri'),
+        sa.Column('flags', sa.LargeBinary(), nullable=False, comment='Donem basina hucre tipi / override bayragi'),
+        sa.Column('updated_date', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['budget_definition_id'], ['budget_definitions.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['row_id'], ['budget_entry_rows.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('row_id', 'measure_code', name='uq_series_row_measure'),
+    )
+    op.create_index(op.f('ix_budget_entry_series_budget_definition_id'), 'budget_entry_series',
+                    ['budget_definition_id'], unique=False)
+
+
+def downgrade() -> None:
+    # dense tanimlarin serileri hucrelere geri acilir
+    op.execute("""
+        INSERT INTO budget_entry_cells (
+            budget_definition_id, row_id, period_id, measure_code, value, cell_type,
+            is_manual_override, created_date, updated_date
+        )
+        SELECT s.budget_definition_id, s.row_id, p.id, s.measure_code, e.value::numeric(20, 4),
+               (CASE get_byte(s.flags, e.ord::int - 1) & 3
+                    WHEN 1 THEN 'calculated' WHEN 2 THEN 'parameter_calculated' ELSE 'input'
+                END)::budgetcelltype,
+               get_byte(s.flags, e.ord::int - 1) & 4 <> 0,
+               now(), now()
+        FROM budget_entry_series s
+        CROSS JOIN LATERAL unnest(s.values) WITH ORDINALITY AS e(value, ord)
+        JOIN budget_periods p ON p.year * 12 + p.month - 1 = s.start_month + e.ord::int - 1
+        WHERE get_byte(s.flags, e.ord::int - 1) & 8 <> 0
+    """)
+    op.drop_index(op.f('ix_budget_entry_series_budget_definition_id'), table_name='budget_entry_series')
+    op.drop_table('budget_entry_series')
+    op.drop_column('budget_definitions', 'storage_mode')
+    budgetstoragemode.drop(op.get_bind(), checkfirst=True)
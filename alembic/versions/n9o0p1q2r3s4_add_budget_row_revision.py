@@ -0,0 +1,30 @@
+"""add budget_entry_rows.revision for optimistic save checks
+
+Revision ID: n9o0p1q2r3s4
+Revises: m8n9o0p1q2r3
+Create Date: 2026-03-08
+
+Satirin hucreleri her degistiginde artan revizyon. Kaydetmede istemcinin
+gonderdigi revizyonla karsilastirilir.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'n9o0p1q2r3s4'
+down_revision: Union[str, None] = 'm8n9o0p1q2r3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('budget_entry_rows', sa.Column(
+        'revision', sa.Integer(), nullable=False, server_default='0',
+        comment='Hucreleri her degistiginde artan revizyon (iyimser kilit)'
+    ))
+
+
+def downgrade() -> None:
+    op.drop_column('budget_entry_rows', 'revision')
@@ -0,0 +1,63 @@
+"""add background deletion jobs and soft-delete markers
+
+Revision ID: o0p1q2r3s4t5
+Revises: n9o0p1q2r3s4
+Create Date: 2026-03-09
+
+budget_definitions ve budget_versions tablolarina deleted_at eklenir;
+silme istekleri kaydi hemen isaretler, veriyi budget_deletion_jobs
+kaydiyla izlenen arka plan isi parca parca siler.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'o0p1q2r3s4t5'
+down_revision: Union[str, None] = 'n9o0p1q2r3s4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+deletiontargettype = postgresql.ENUM('definition', 'version', 'snapshots', name='deletiontargettype', create_type=False)
+deletionjobstatus = postgresql.ENUM('pending', 'running', 'completed', 'failed', name='deletionjobstatus', create_type=False)
+
+
+def upgrade() -> None:
+    deletiontargettype.create(op.get_bind(), checkfirst=True)
+    deletionjobstatus.create(op.get_bind(), checkfirst=True)
+
+    op.add_column('budget_definitions', sa.Column(
+        'deleted_at', sa.DateTime(), nullable=True,
+        comment='Silinmek uzere isaretlendigi zaman (arka planda silinir)'
+    ))
+    op.add_column('budget_versions', sa.Column(
+        'deleted_at', sa.DateTime(), nullable=True,
+        comment='Silinmek üzere işaretlendiği zaman (arka planda silinir)'
+    ))
+
+    op.create_table('budget_deletion_jobs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('target_type', deletiontargettype, nullable=False, comment='definition / version / snapshots'),
+        sa.Column('target_id', sa.Integer(), nullable=False, comment='Silinen tanim veya versiyon id'),
+        sa.Column('target_code', sa.String(length=50), nullable=True, comment='Silinen kaydin kodu (bilgi amacli)'),
+        sa.Column('status', deletionjobstatus, nullable=False),
+        sa.Column('current_step', sa.String(length=100), nullable=True, comment='Calisan adim'),
+        sa.Column('total_items', sa.Integer(), nullable=True, comment='Silinecek kayit sayisi (tahmini)'),
+        sa.Column('deleted_items', sa.Integer(), nullable=False, server_default='0', comment='Silinen kayit sayisi'),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('requested_by', sa.String(length=100), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('created_date', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('budget_deletion_jobs')
+    op.drop_column('budget_versions', 'deleted_at')
+    op.drop_column('budget_definitions', 'deleted_at')
+    deletionjobstatus.drop(op.get_bind(), checkfirst=True)
+    deletiontargettype.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,92 @@
+"""move calculation snapshot cells from JSONB into calculation_snapshot_cells
+
+Revision ID: p1q2r3s4t5u6
+Revises: o0p1q2r3s4t5
+Create Date: 2026-03-10
+
+Snapshot hucreleri calculation_snapshots.snapshot_data JSONB dokumani
+yerine (snapshot, satir, donem, olcu) anahtarli calculation_snapshot_cells
+tablosunda tutulur; geri alma ve snapshot aninda okuma indeks uzerinden
+yapilir. Mevcut snapshot'lar tasinir, silinmis satirlarin hucreleri atlanir.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'p1q2r3s4t5u6'
+down_revision: Union[str, None] = 'o0p1q2r3s4t5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('calculation_snapshot_cells',
+        sa.Column('snapshot_id', sa.Integer(), nullable=False),
+        sa.Column('row_id', sa.Integer(), nullable=False),
+        sa.Column('period_id', sa.Integer(), nullable=False),
+        sa.Column('measure_code', sa.String(length=50), nullable=False, comment='Olcu kodu'),
+        sa.Column('value', sa.Numeric(precision=20, scale=4), nullable=True, comment='Hucre degeri'),
+        sa.Column('cell_type', postgresql.ENUM('input', 'calculated', 'parameter_calculated', name='budgetcelltype', create_type=False), nullable=False, comment='Hucre tipi'),
+        sa.Column('is_manual_override', sa.Boolean(), nullable=False),
+        sa.Column('source_rule_id', sa.Integer(), nullable=True, comment='Kaynak kural'),
+        sa.Column('source_param_id', sa.Integer(), nullable=True, comment='Kaynak parametre'),
+        sa.ForeignKeyConstraint(['snapshot_id'], ['calculation_snapshots.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['row_id'], ['budget_entry_rows.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('snapshot_id', 'row_id', 'period_id', 'measure_code'),
+    )
+    op.add_column('calculation_snapshots', sa.Column(
+        'cell_count', sa.Integer(), nullable=False, server_default='0', comment='Snapshot hucre sayisi'
+    ))
+
+    op.execute("""
+        INSERT INTO calculation_snapshot_cells (
+            snapshot_id, row_id, period_id, measure_code, value, cell_type,
+            is_manual_override, source_rule_id, source_param_id
+        )
+        SELECT DISTINCT ON (s.id, c.row_id, c.period_id, c.measure_code)
+               s.id, c.row_id, c.period_id, c.measure_code, c.value::numeric(20, 4),
+               coalesce(c.cell_type, 'input')::budgetcelltype, coalesce(c.is_manual_override, false),
+               c.source_rule_id, c.source_param_id
+        FROM calculation_snapshots s
+        CROSS JOIN LATERAL jsonb_to_recordset(s.snapshot_data) AS c(
+            row_id integer, period_id integer, measure_code varchar, value text, cell_type text,
+            is_manual_override boolean, source_rule_id integer, source_param_id integer
+        )
+        JOIN budget_entry_rows r ON r.id = c.row_id
+        ORDER BY s.id, c.row_id, c.period_id, c.measure_code
+    """)
+    op.execute("""
+        UPDATE calculation_snapshots s
+        SET cell_count = (SELECT count(*) FROM calculation_snapshot_cells c WHERE c.snapshot_id = s.id)
+    """)
+    op.drop_column('calculation_snapshots', 'snapshot_data')
+
+
+def downgrade() -> None:
+    op.add_column('calculation_snapshots', sa.Column(
+        'snapshot_data', postgresql.JSONB(astext_type=sa.Text()), nullable=False,
+        server_default='[]', comment='Pre-calculation cell values'
+    ))
+    op.execute("""
+        UPDATE calculation_snapshots s
+        SET snapshot_data = coalesce((
+            SELECT jsonb_agg(jsonb_build_object(
+                'row_id', c.row_id,
+                'period_id', c.period_id,
+                'measure_code', c.measure_code,
+                'value', c.value::text,
+                'cell_type', c.cell_type::text,
+                'is_manual_override', c.is_manual_override,
+                'source_rule_id', c.source_rule_id,
+                'source_param_id', c.source_param_id
+            ))
+            FROM calculation_snapshot_cells c
+            WHERE c.snapshot_id = s.id
+        ), '[]'::jsonb)
+    """)
+    op.alter_column('calculation_snapshots', 'snapshot_data', server_default=None)
+    op.drop_column('calculation_snapshots', 'cell_count')
+    op.drop_table('calculation_snapshot_cells')
@@ -0,0 +1,57 @@
+"""add budget_cell_history (append-only, monthly partitions)
+
+Revision ID: q2r3s4t5u6v7
+Revises: p1q2r3s4t5u6
+Create Date: 2026-03-11
+
+Hucre degisiklik gecmisi: kaydetme, hesaplama, geri alma, ice aktarma,
+dagitim ve eslestirme degistirdikleri hucrelerin eski / yeni degerini
+yazar. Tablo changed_at ile RANGE partition'lidir; aylik partition'lar
+(budget_cell_history_yYYYYmMM) ilk yazimda uygulama tarafindan acilir.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'q2r3s4t5u6v7'
+down_revision: Union[str, None] = 'p1q2r3s4t5u6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+cellchangesource = postgresql.ENUM(
+    'save', 'calculate', 'undo', 'file_import', 'mapping', 'allocation',
+    name='cellchangesource', create_type=False
+)
+
+
+def upgrade() -> None:
+    cellchangesource.create(op.get_bind(), checkfirst=True)
+
+    op.create_table('budget_cell_history',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('changed_at', sa.DateTime(), server_default=sa.func.now(), nullable=False, comment='Degisiklik zamani (partition anahtari)'),
+        sa.Column('budget_definition_id', sa.Integer(), nullable=False),
+        sa.Column('row_id', sa.Integer(), nullable=False),
+        sa.Column('period_id', sa.Integer(), nullable=False),
+        sa.Column('measure_code', sa.String(length=50), nullable=False, comment='Olcu kodu'),
+        sa.Column('old_value', sa.Numeric(precision=20, scale=4), nullable=True, comment='Onceki deger (NULL = hucre yoktu)'),
+        sa.Column('new_value', sa.Numeric(precision=20, scale=4), nullable=True, comment='Yeni deger (NULL = hucre silindi)'),
+        sa.Column('source', cellchangesource, nullable=False, comment='Degisikligi yapan islem'),
+        sa.Column('reference_id', sa.Integer(), nullable=True, comment='Iliskili kayit (snapshot, eslestirme vb.)'),
+        sa.Column('changed_by', sa.String(length=100), nullable=True, comment='Kullanici adi'),
+        sa.PrimaryKeyConstraint('id', 'changed_at'),
+        postgresql_partition_by='RANGE (changed_at)',
+    )
+    op.create_index('ix_cell_history_row', 'budget_cell_history', ['row_id', 'id'])
+    op.create_index('ix_cell_history_cell', 'budget_cell_history', ['row_id', 'period_id', 'measure_code', 'id'])
+
+
+def downgrade() -> None:
+    # Aylik partition'lar ana tabloyla birlikte silinir
+    op.drop_index('ix_cell_history_cell', table_name='budget_cell_history')
+    op.drop_index('ix_cell_history_row', table_name='budget_cell_history')
+    op.drop_table('budget_cell_history')
+    cellchangesource.drop(op.get_bind(), checkfirst=True)
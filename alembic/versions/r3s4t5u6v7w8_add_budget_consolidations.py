@@ -0,0 +1,108 @@
+"""add budget consolidations and consolidated cell cache
+
+Revision ID: r3s4t5u6v7w8
+Revises: q2r3s4t5u6v7
+Create Date: 2026-03-12
+
+Konsolidasyon tanimlari birden fazla butce tanimini ortak olcu setine ve
+ortak boyut alt kumesine indirger. Sonuc kaynak basina
+budget_consolidation_cells tablosunda tutulur; kaynaklar islenmis son
+hucre gecmisi id'sini (history_watermark) saklar ve artimli yenilenir.
+Watermark sorgulari icin budget_cell_history'ye (tanim, id) indeksi eklenir.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'r3s4t5u6v7w8'
+down_revision: Union[str, None] = 'q2r3s4t5u6v7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('budget_consolidations',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('version_id', sa.Integer(), nullable=False, comment='Butce Versiyonu'),
+        sa.Column('code', sa.String(length=50), nullable=False, comment='Konsolidasyon Kodu'),
+        sa.Column('name', sa.String(length=200), nullable=False, comment='Konsolidasyon Adi'),
+        sa.Column('description', sa.String(length=500), nullable=True, comment='Aciklama'),
+        sa.Column('dimension_entity_ids', postgresql.JSONB(astext_type=sa.Text()), nullable=False, comment="Ortak boyut entity id'leri"),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('created_by', sa.String(length=100), nullable=True, comment='Olusturan kullanici'),
+        sa.Column('created_date', sa.DateTime(), nullable=False),
+        sa.Column('updated_date', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['version_id'], ['budget_versions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_budget_consolidations_code'), 'budget_consolidations', ['code'], unique=True)
+
+    op.create_table('budget_consolidation_measures',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('consolidation_id', sa.Integer(), nullable=False),
+        sa.Column('code', sa.String(length=50), nullable=False, comment='Olcu Kodu'),
+        sa.Column('name', sa.String(length=200), nullable=False, comment='Olcu Adi'),
+        sa.Column('data_type', postgresql.ENUM('decimal', 'integer', 'currency', 'percentage', name='measuredatatype', create_type=False), nullable=False, comment='Veri tipi'),
+        sa.Column('sort_order', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['consolidation_id'], ['budget_consolidations.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('consolidation_id', 'code', name='uq_consolidation_measure'),
+    )
+
+    op.create_table('budget_consolidation_sources',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('consolidation_id', sa.Integer(), nullable=False),
+        sa.Column('budget_definition_id', sa.Integer(), nullable=False),
+        sa.Column('history_watermark', sa.BigInteger(), nullable=False, comment="Islenmis son hucre gecmisi id'si"),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=True, comment='Son yenileme (NULL = hic hesaplanmadi)'),
+        sa.Column('sort_order', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['consolidation_id'], ['budget_consolidations.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['budget_definition_id'], ['budget_definitions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('consolidation_id', 'budget_definition_id', name='uq_consolidation_source'),
+    )
+    op.create_index(op.f('ix_budget_consolidation_sources_budget_definition_id'),
+                    'budget_consolidation_sources', ['budget_definition_id'], unique=False)
+
+    op.create_table('budget_consolidation_measure_maps',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('source_id', sa.Integer(), nullable=False),
+        sa.Column('source_measure_code', sa.String(length=50), nullable=False, comment='Kaynak tanim olcu kodu'),
+        sa.Column('target_measure_code', sa.String(length=50), nullable=False, comment='Ortak olcu kodu'),
+        sa.Column('factor', sa.Numeric(precision=20, scale=6), nullable=False, comment='Carpan'),
+        sa.ForeignKeyConstraint(['source_id'], ['budget_consolidation_sources.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source_id', 'source_measure_code', 'target_measure_code', name='uq_consolidation_measure_map'),
+    )
+
+    op.create_table('budget_consolidation_cells',
+        sa.Column('source_id', sa.Integer(), nullable=False),
+        sa.Column('dimension_values', postgresql.JSONB(astext_type=sa.Text()), nullable=False, comment='Ortak boyut degerleri {entity_id: master_data_id}'),
+        sa.Column('currency_code', sa.String(length=10), nullable=False, comment='Satir para birimi'),
+        sa.Column('period_id', sa.Integer(), nullable=False),
+        sa.Column('measure_code', sa.String(length=50), nullable=False, comment='Ortak olcu kodu'),
+        sa.Column('consolidation_id', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Numeric(precision=20, scale=4), nullable=False),
+        sa.ForeignKeyConstraint(['source_id'], ['budget_consolidation_sources.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['consolidation_id'], ['budget_consolidations.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('source_id', 'dimension_values', 'currency_code', 'period_id', 'measure_code'),
+    )
+    op.create_index('ix_consolidation_cells_consolidation', 'budget_consolidation_cells',
+                    ['consolidation_id', 'period_id'])
+
+    op.create_index('ix_cell_history_definition', 'budget_cell_history', ['budget_definition_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_cell_history_definition', table_name='budget_cell_history')
+    op.drop_index('ix_consolidation_cells_consolidation', table_name='budget_consolidation_cells')
+    op.drop_table('budget_consolidation_cells')
+    op.drop_table('budget_consolidation_measure_maps')
+    op.drop_index(op.f('ix_budget_consolidation_sources_budget_definition_id'), table_name='budget_consolidation_sources')
+    op.drop_table('budget_consolidation_sources')
+    op.drop_table('budget_consolidation_measures')
+    op.drop_index(op.f('ix_budget_consolidations_code'), table_name='budget_consolidations')
+    op.drop_table('budget_consolidations')
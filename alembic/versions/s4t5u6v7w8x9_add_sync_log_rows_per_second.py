@@ -0,0 +1,27 @@
+"""add rows_per_second to data_sync_logs
+
+Revision ID: s4t5u6v7w8x9
+Revises: r3s4t5u6v7w8
+Create Date: 2026-03-13
+
+Staging yukleme COPY ile yapilir; yukleme hizi (satir / sn) sync
+sirasinda ve sonunda sync log'a yazilir.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 's4t5u6v7w8x9'
+down_revision: Union[str, None] = 'r3s4t5u6v7w8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('data_sync_logs', sa.Column('rows_per_second', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('data_sync_logs', 'rows_per_second')
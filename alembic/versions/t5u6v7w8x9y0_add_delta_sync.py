@@ -0,0 +1,40 @@
+"""add delta sync mode and watermarks
+
+Revision ID: t5u6v7w8x9y0
+Revises: s4t5u6v7w8x9
+Create Date: 2026-03-14
+
+Sorgular delta modunda senkronize edilebilir: watermark kolonunun son
+basarili sync'teki degerinden itibaren kayitlar cekilir ve staging'e
+anahtar kolonlarla upsert edilir. Watermark her sync log'unda saklanir.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 't5u6v7w8x9y0'
+down_revision: Union[str, None] = 's4t5u6v7w8x9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+syncmode = postgresql.ENUM('full', 'delta', name='syncmode', create_type=False)
+
+
+def upgrade() -> None:
+    syncmode.create(op.get_bind(), checkfirst=True)
+
+    op.add_column('data_connection_queries', sa.Column('sync_mode', syncmode, nullable=False, server_default='full'))
+    op.add_column('data_connection_queries', sa.Column('watermark_column', sa.String(length=200), nullable=True))
+    op.add_column('data_sync_logs', sa.Column('sync_mode', syncmode, nullable=True))
+    op.add_column('data_sync_logs', sa.Column('watermark_value', sa.String(length=100), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('data_sync_logs', 'watermark_value')
+    op.drop_column('data_sync_logs', 'sync_mode')
+    op.drop_column('data_connection_queries', 'watermark_column')
+    op.drop_column('data_connection_queries', 'sync_mode')
+    syncmode.drop(op.get_bind(), checkfirst=True)
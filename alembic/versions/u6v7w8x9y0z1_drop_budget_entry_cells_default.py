@@ -0,0 +1,52 @@
+"""drop budget_entry_cells default partition
+
+Revision ID: u6v7w8x9y0z1
+Revises: t5u6v7w8x9y0
+Create Date: 2026-03-15
+
+Hucre partition'lari artik ATTACH PARTITION ile eklenip DETACH PARTITION
+... CONCURRENTLY ile cikarilir; default partition varken ATTACH default
+partition'da ACCESS EXCLUSIVE kilit alir ve CONCURRENTLY kullanilamaz.
+Partition'i olmayan tanimlar icin partition acilir, default partition'daki
+hucreler tasinir ve default partition kaldirilir.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'u6v7w8x9y0z1'
+down_revision: Union[str, None] = 't5u6v7w8x9y0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CELL_COLUMNS = (
+    "id, budget_definition_id, row_id, period_id, measure_code, value, cell_type, source_rule_id, "
+    "source_param_id, is_manual_override, created_date, updated_date"
+)
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE budget_entry_cells DETACH PARTITION budget_entry_cells_default")
+
+    bind = op.get_bind()
+    missing = bind.execute(sa.text(
+        "SELECT id FROM budget_definitions "
+        "WHERE to_regclass('budget_entry_cells_d' || id) IS NULL ORDER BY id"
+    )).all()
+    for (definition_id,) in missing:
+        op.execute(
+            f"CREATE TABLE budget_entry_cells_d{int(definition_id)} "
+            f"PARTITION OF budget_entry_cells FOR VALUES IN ({int(definition_id)})"
+        )
+
+    op.execute(
+        f"INSERT INTO budget_entry_cells ({CELL_COLUMNS}) "
+        f"SELECT {CELL_COLUMNS} FROM budget_entry_cells_default"
+    )
+    op.execute("DROP TABLE budget_entry_cells_default")
+
+
+def downgrade() -> None:
+    op.execute("CREATE TABLE budget_entry_cells_default PARTITION OF budget_entry_cells DEFAULT")
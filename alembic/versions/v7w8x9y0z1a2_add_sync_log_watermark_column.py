@@ -0,0 +1,33 @@
+"""add watermark_column to data_sync_logs
+
+Revision ID: v7w8x9y0z1a2
+Revises: u6v7w8x9y0z1
+Create Date: 2026-03-16
+
+Delta sync yalnizca ayni kolondan alinmis watermark'i kullanir; sorgunun
+watermark kolonu degistiyse sonraki sync tam yapilir. Mevcut log'lar
+sorgunun bugunku watermark kolonuyla doldurulur.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'v7w8x9y0z1a2'
+down_revision: Union[str, None] = 'u6v7w8x9y0z1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('data_sync_logs', sa.Column('watermark_column', sa.String(length=200), nullable=True))
+    op.execute(
+        "UPDATE data_sync_logs l SET watermark_column = q.watermark_column "
+        "FROM data_connection_queries q "
+        "WHERE q.id = l.query_id AND l.watermark_value IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('data_sync_logs', 'watermark_column')
@@ -2,36 +2,63 @@
 Budget Entries API - Butce Girisleri Endpoint'leri
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi.responses import StreamingResponse, FileResponse
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_
+from sqlalchemy import and_, func
 from typing import Optional, List
 import itertools
-import json
 
 from app.db.session import get_db
+from app.dependencies import get_optional_user
 from app.models.budget_entry import (
     BudgetType, BudgetTypeMeasure, BudgetDefinition, BudgetDefinitionDimension,
     BudgetEntryRow, BudgetEntryCell, BudgetCellType, BudgetMeasureType,
-    RuleSet, RuleSetItem, RuleType, CalculationSnapshot
+    BudgetStorageMode, RuleSet, RuleSetItem, RuleType, CalculationSnapshot,
+    BudgetDeletionJob, DeletionJobStatus, CellChangeSource, BudgetConsolidation
 )
-from app.models.system_data import BudgetVersion, BudgetPeriod, BudgetParameter, ParameterVersion, BudgetCurrency
+from app.models.system_data import BudgetVersion, BudgetPeriod, BudgetParameter, BudgetCurrency
 from app.models.dynamic.meta_entity import MetaEntity
 from app.models.dynamic.master_data import MasterData
-from app.models.dynamic.master_data_value import MasterDataValue
-from app.models.dynamic.meta_attribute import MetaAttribute
 from app.schemas.budget_entry import (
     BudgetTypeResponse, BudgetTypeListResponse,
     BudgetDefinitionCreate, BudgetDefinitionUpdate, BudgetDefinitionResponse,
-    BudgetDefinitionListResponse, DimensionInfo,
+    BudgetDefinitionListResponse, DimensionInfo, StorageModeRequest, StorageModeResponse,
     BudgetGridResponse, BudgetGridRow, CellData, PeriodInfo, BudgetTypeMeasureResponse,
-    BudgetBulkSaveRequest, BudgetBulkSaveResponse,
+    BudgetAggregateResponse, BudgetAggregateGroup,
+    BudgetBulkSaveRequest, BudgetBulkSaveResponse, CellConflict,
+    DefinitionLockStatus,
     BudgetRowCurrencyBulkUpdate, BudgetRowCurrencyBulkResponse,
     GenerateRowsResponse,
     RuleSetCreate, RuleSetUpdate, RuleSetResponse, RuleSetListResponse,
     RuleSetItemResponse,
-    CalculateRequest, CalculateResponse,
-    UndoResponse
+    CalculateRequest, CalculateResponse, CalculateScope, CalculateDimensionFilter,
+    UndoResponse, CalculationSnapshotResponse, CalculationSnapshotListResponse,
+    SensitivityRequest, SensitivityResponse,
+    AllocationRequest, AllocationResponse,
+    GridImportResponse,
+    DeletionJobResponse,
+    CellHistoryEntry, CellHistoryListResponse,
+    BudgetConsolidationCreate, BudgetConsolidationUpdate, BudgetConsolidationResponse,
+    BudgetConsolidationListResponse, ConsolidationRefreshResponse, ConsolidationAggregateResponse
+)
+from app.schemas.user import UserResponse
+from app.services.budget_grid_engine import BudgetGridEngine
+from app.services.currency_conversion_service import CurrencyConverter
+from app.services.grid_export_service import GridExportService, EXPORT_FORMATS
+from app.services.budget_import_service import BudgetImportService, IMPORT_LAYOUTS
+from app.services.budget_cell_store import BudgetCellStore
+from app.services.budget_cell_storage import BudgetCellStorage
+from app.services.budget_lock_service import BudgetLockService, SAVE_CONFLICT_MODES
+from app.services.budget_deletion_service import BudgetDeletionService
+from app.services.budget_consolidation_service import BudgetConsolidationService
+from app.services.budget_snapshot_service import BudgetSnapshotService
+from app.services.cell_history_service import CellHistoryBuffer, CellHistoryService
+from app.services.budget_allocation_service import (
+    BudgetAllocationService, ALLOCATION_DRIVERS, MAX_ALLOCATION_DECIMALS
+)
+from app.services.rule_set_compiler import (
+    RuleSetCompiler, ExecutionPlan, CompiledRuleItem, CompiledFormula, AttributeRef, compile_formula
 )
 from decimal import Decimal
 
@@ -74,6 +101,7 @@ def _build_definition_response(definition: BudgetDefinition, db: Session) -> dic
         "budget_type_name": definition.budget_type.name if definition.budget_type else None,
         "dimensions": dims,
         "status": definition.status.value if definition.status else "draft",
+        "storage_mode": definition.storage_mode.value if definition.storage_mode else "cell",
         "is_active": definition.is_active,
         "row_count": row_count,
         "created_by": definition.created_by,
@@ -82,6 +110,15 @@ def _build_definition_response(definition: BudgetDefinition, db: Session) -> dic
     }
 
 
+def _acquire_definition_lock(db: Session, def_id: int, shared: bool = False) -> None:
+    """Take the definition's advisory lock for this transaction or fail fast with 409."""
+    if not BudgetLockService.try_lock(db, def_id, shared=shared):
+        raise HTTPException(
+            status_code=409,
+            detail="Tanim uzerinde devam eden bir hesaplama/islem var, daha sonra tekrar deneyin",
+        )
+
+
 def _get_periods_for_version(db: Session, version: BudgetVersion) -> list:
     """Get all periods between version's start and end period."""
     if not version.start_period_id or not version.end_period_id:
@@ -209,6 +246,7 @@ def list_definitions(
         joinedload(BudgetDefinition.budget_type),
         joinedload(BudgetDefinition.dimensions),
     )
+    query = query.filter(BudgetDefinition.deleted_at.is_(None))
     if version_id:
         query = query.filter(BudgetDefinition.version_id == version_id)
     if budget_type_id:
@@ -228,7 +266,7 @@ def get_definition(def_id: int, db: Session = Depends(get_db)):
         joinedload(BudgetDefinition.dimensions),
     ).filter(BudgetDefinition.id == def_id).first()
 
-    if not definition:
+    if not definition or definition.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
 
     return _build_definition_response(definition, db)
@@ -288,6 +326,12 @@ def create_definition(data: BudgetDefinitionCreate, db: Session = Depends(get_db
     # Auto-generate rows
     _generate_rows_for_definition(db, definition)
 
+    # Hucre partition'i: ATTACH kilitleri commit'e kadar tutulur
+    try:
+        BudgetCellStore.ensure_partition(db, definition.id)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
     db.commit()
     db.refresh(definition)
 
@@ -309,7 +353,7 @@ def update_definition(def_id: int, data: BudgetDefinitionUpdate, db: Session = D
         joinedload(BudgetDefinition.dimensions),
     ).filter(BudgetDefinition.id == def_id).first()
 
-    if not definition:
+    if not definition or definition.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
 
     if data.name is not None:
@@ -325,33 +369,154 @@ def update_definition(def_id: int, data: BudgetDefinitionUpdate, db: Session = D
     return _build_definition_response(definition, db)
 
 
-@router.delete("/definitions/{def_id}", status_code=204)
-def delete_definition(def_id: int, db: Session = Depends(get_db)):
+@router.delete("/definitions/{def_id}", response_model=DeletionJobResponse, status_code=202)
+def delete_definition(def_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """
+    Tanimi silinmek uzere isaretler; satir, hucre ve snapshot'lar arka planda
+    parca parca silinir. Ilerleme /deletion-jobs/{job_id} ile izlenir.
+    """
     definition = db.query(BudgetDefinition).filter(BudgetDefinition.id == def_id).first()
-    if not definition:
+    if not definition or definition.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
 
     if definition.status and definition.status.value == "locked":
         raise HTTPException(status_code=400, detail="Kilitli tanim silinemez")
 
-    db.delete(definition)
+    job = BudgetDeletionService.request_definition_deletion(db, definition)
+    db.commit()
+
+    background_tasks.add_task(BudgetDeletionService.run_job, job.id)
+    return BudgetDeletionService.job_status(job)
+
+
+@router.get("/deletion-jobs/{job_id}", response_model=DeletionJobResponse)
+def get_deletion_job(job_id: int, db: Session = Depends(get_db)):
+    """Arka plan silme isinin durumu ve ilerlemesi."""
+    job = db.query(BudgetDeletionJob).filter(BudgetDeletionJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Silme isi bulunamadi")
+    return BudgetDeletionService.job_status(job)
+
+
+@router.post("/deletion-jobs/{job_id}/retry", response_model=DeletionJobResponse, status_code=202)
+def retry_deletion_job(job_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """Hata ile yarida kalan silme isini kaldigi yerden yeniden baslatir."""
+    job = db.query(BudgetDeletionJob).filter(BudgetDeletionJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Silme isi bulunamadi")
+
+    if job.status != DeletionJobStatus.failed:
+        raise HTTPException(status_code=400, detail="Yalnizca hatali silme isleri yeniden baslatilabilir")
+
+    # Silinmis kayit sayisi korunur; toplam, is basladiginda silinmis + kalan olarak yeniden hesaplanir
+    job.status = DeletionJobStatus.pending
+    db.commit()
+
+    background_tasks.add_task(BudgetDeletionService.run_job, job.id)
+    return BudgetDeletionService.job_status(job)
+
+
+@router.put("/definitions/{def_id}/storage-mode", response_model=StorageModeResponse)
+def change_storage_mode(def_id: int, data: StorageModeRequest, db: Session = Depends(get_db)):
+    """
+    Tanimin hucre depolama modunu degistirir ve mevcut hucreleri tasir.
+    cell: hucre basina bir satir; dense: satir x olcu basina bir deger dizisi.
+    """
+    definition = db.query(BudgetDefinition).filter(BudgetDefinition.id == def_id).first()
+    if not definition or definition.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
+
+    if definition.status and definition.status.value == "locked":
+        raise HTTPException(status_code=400, detail="Kilitli tanim uzerinde degisiklik yapilamaz")
+
+    try:
+        mode = BudgetStorageMode(data.storage_mode)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Gecersiz depolama modu: {data.storage_mode} (cell, dense)")
+
+    _acquire_definition_lock(db, def_id)
+
+    previous_mode = (definition.storage_mode or BudgetStorageMode.cell).value
+    try:
+        converted = BudgetCellStorage.convert(db, definition, mode)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
     db.commit()
 
+    return StorageModeResponse(
+        definition_id=def_id,
+        previous_mode=previous_mode,
+        storage_mode=mode.value,
+        converted_records=converted,
+    )
+
+
+@router.get("/definitions/{def_id}/lock", response_model=DefinitionLockStatus)
+def get_definition_lock_status(def_id: int, db: Session = Depends(get_db)):
+    """Tanim kilidinin durumu: hesaplama / geri alma (exclusive) veya kaydetme (shared)."""
+    definition = db.query(BudgetDefinition).filter(BudgetDefinition.id == def_id).first()
+    if not definition or definition.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
+
+    return DefinitionLockStatus(**BudgetLockService.lock_status(db, def_id))
+
+
+def _username(current_user: Optional[UserResponse]) -> Optional[str]:
+    return getattr(current_user, "username", None)
+
+
+def _get_snapshot(db: Session, def_id: int, snapshot_id: int) -> CalculationSnapshot:
+    snapshot = BudgetSnapshotService.get(db, def_id, snapshot_id)
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Snapshot bulunamadi")
+    return snapshot
+
+
+def _require_cell_storage(definition: BudgetDefinition) -> None:
+    """Hucre tablosunu dogrudan kullanan islemler dense modda calismaz."""
+    if BudgetCellStorage.is_dense(definition):
+        raise HTTPException(
+            status_code=400,
+            detail="Bu islem dense depolama modundaki tanimlarda desteklenmiyor, once cell moduna donusturun",
+        )
+
 
 # ============ Grid Data ============
 
+def _conversion_errors(missing_rates: set, periods: list) -> list:
+    """Format missing (currency, period) rate pairs as messages."""
+    period_codes = {p.id: p.code for p in periods}
+    return [
+        f"Kur bulunamadi: {code} {period_codes.get(period_id, period_id)}"
+        for code, period_id in sorted(missing_rates, key=lambda x: (x[0], period_codes.get(x[1], "")))
+    ]
+
+
 @router.get("/grid/{def_id}", response_model=BudgetGridResponse)
-def get_grid(def_id: int, db: Session = Depends(get_db)):
-    """Full grid data for a budget definition."""
+def get_grid(
+    def_id: int,
+    currency: Optional[str] = None,
+    snapshot_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Full grid data for a budget definition.
+    With currency, monetary measures are converted from each row's currency.
+    With snapshot_id, cells are read as of that calculation snapshot
+    (read-only; what undo would restore).
+    """
     definition = db.query(BudgetDefinition).options(
         joinedload(BudgetDefinition.version),
         joinedload(BudgetDefinition.budget_type).joinedload(BudgetType.measures),
         joinedload(BudgetDefinition.dimensions),
     ).filter(BudgetDefinition.id == def_id).first()
 
-    if not definition:
+    if not definition or definition.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
 
+    snapshot = _get_snapshot(db, def_id, snapshot_id) if snapshot_id is not None else None
+
     # Get periods for version
     periods = _get_periods_for_version(db, definition.version)
     period_infos = [
@@ -386,14 +551,15 @@ def get_grid(def_id: int, db: Session = Depends(get_db)):
             measures=measure_responses,
             rows=[],
             total_rows=0,
+            as_of_snapshot_id=snapshot_id,
         )
 
     row_ids = [r.id for r in rows]
 
-    # Get all cells in one query
-    cells = db.query(BudgetEntryCell).filter(
-        BudgetEntryCell.row_id.in_(row_ids)
-    ).all()
+    # Get all cells in one query (cell or dense storage)
+    cells = BudgetCellStorage.for_definition(db, definition).load(row_ids)
+    if snapshot is not None:
+        cells = BudgetSnapshotService.overlay(db, snapshot, cells, row_ids)
 
     # Build cell lookup: {row_id: {period_id: {measure_code: cell}}}
     cell_lookup = {}
@@ -418,9 +584,33 @@ def get_grid(def_id: int, db: Session = Depends(get_db)):
         for md in master_records:
             md_lookup[md.id] = {"id": md.id, "code": md.code, "name": md.name}
 
+    # Optional reporting currency: one factor per (row, period) for monetary measures
+    factor_matrix = None
+    monetary_codes = set()
+    conversion_errors = []
+    if currency:
+        currency = currency.upper().strip()
+        monetary_codes = CurrencyConverter.monetary_measure_codes(measures)
+        rate_table = CurrencyConverter.get_rate_table(db, definition.version_id)
+        row_codes = [r.currency_code for r in rows]
+        period_ids = [p.id for p in periods]
+        factor_matrix = CurrencyConverter.factor_matrix(rate_table, row_codes, period_ids, currency)
+        if monetary_codes:
+            conversion_errors = _conversion_errors(
+                CurrencyConverter.missing_rates(
+                    rate_table,
+                    factor_matrix,
+                    [code for code in row_codes for _ in period_ids],
+                    period_ids * len(row_codes),
+                    currency,
+                ),
+                periods,
+            )
+        factor_matrix = factor_matrix.tolist()
+
     # Build grid rows
     grid_rows = []
-    for row in rows:
+    for row_idx, row in enumerate(rows):
         # Resolve dimension values to display info
         dim_display = {}
         for entity_id_str, md_id in row.dimension_values.items():
@@ -429,13 +619,17 @@ def get_grid(def_id: int, db: Session = Depends(get_db)):
 
         # Build cells dict
         row_cells = {}
-        for period in periods:
+        for period_idx, period in enumerate(periods):
             period_cells = {}
             for measure in measures:
                 cell = cell_lookup.get(row.id, {}).get(period.id, {}).get(measure.code)
                 if cell:
+                    value = float(cell.value) if cell.value is not None else None
+                    if value is not None and factor_matrix is not None and measure.code in monetary_codes:
+                        factor = factor_matrix[row_idx][period_idx]
+                        value = value * factor if factor == factor else None  # NaN = kur yok
                     period_cells[measure.code] = CellData(
-                        value=float(cell.value) if cell.value is not None else None,
+                        value=value,
                         cell_type=cell.cell_type.value if cell.cell_type else "input"
                     )
                 else:
@@ -446,6 +640,7 @@ def get_grid(def_id: int, db: Session = Depends(get_db)):
             row_id=row.id,
             dimension_values=dim_display,
             currency_code=row.currency_code,
+            revision=row.revision or 0,
             cells=row_cells,
         ))
 
@@ -457,22 +652,217 @@ def get_grid(def_id: int, db: Session = Depends(get_db)):
         measures=measure_responses,
         rows=grid_rows,
         total_rows=len(grid_rows),
+        currency_code=currency or None,
+        conversion_errors=conversion_errors,
+        as_of_snapshot_id=snapshot_id,
+    )
+
+
+@router.get("/grid/{def_id}/aggregate", response_model=BudgetAggregateResponse)
+def aggregate_grid(
+    def_id: int,
+    currency: Optional[str] = None,
+    group_by_entity_id: Optional[int] = None,
+    snapshot_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Period x measure totals of a definition, optionally grouped by one dimension
+    and converted into a reporting currency. With snapshot_id, totals are
+    computed as of that calculation snapshot.
+    """
+    definition = db.query(BudgetDefinition).options(
+        joinedload(BudgetDefinition.version),
+        joinedload(BudgetDefinition.budget_type).joinedload(BudgetType.measures),
+    ).filter(BudgetDefinition.id == def_id).first()
+
+    if not definition or definition.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
+
+    _require_cell_storage(definition)
+    snapshot = _get_snapshot(db, def_id, snapshot_id) if snapshot_id is not None else None
+
+    periods = _get_periods_for_version(db, definition.version)
+    period_infos = [
+        PeriodInfo(id=p.id, code=p.code, name=p.name, year=p.year, month=p.month, quarter=p.quarter)
+        for p in periods
+    ]
+    measure_codes = [m.code for m in definition.budget_type.measures if m.is_active]
+    currency = currency.upper().strip() if currency else None
+
+    result = BudgetGridEngine.aggregate(
+        db, definition, [p.id for p in periods], measure_codes, group_by_entity_id, currency, snapshot
+    )
+    values = result["values"]
+
+    md_lookup = {}
+    md_ids = [int(k) for k in result["group_keys"] if k is not None and str(k).isdigit()]
+    if md_ids:
+        for md in db.query(MasterData).filter(MasterData.id.in_(md_ids)).all():
+            md_lookup[str(md.id)] = md
+
+    groups = []
+    for g, key in enumerate(result["group_keys"]):
+        md = md_lookup.get(key)
+        groups.append(BudgetAggregateGroup(
+            key=key,
+            code=md.code if md else None,
+            name=md.name if md else None,
+            totals={
+                str(period.id): {code: float(values[g, p, m]) for m, code in enumerate(measure_codes)}
+                for p, period in enumerate(periods)
+            },
+            measure_totals={code: float(values[g, :, m].sum()) for m, code in enumerate(measure_codes)},
+        ))
+
+    return BudgetAggregateResponse(
+        definition_id=def_id,
+        currency_code=currency,
+        group_by_entity_id=group_by_entity_id,
+        periods=period_infos,
+        measures=measure_codes,
+        groups=groups,
+        grand_totals={code: float(values[:, :, m].sum()) for m, code in enumerate(measure_codes)},
+        conversion_errors=_conversion_errors(result["missing_rates"], periods),
+        as_of_snapshot_id=snapshot_id,
+    )
+
+
+@router.get("/grid/{def_id}/export")
+def export_grid(
+    def_id: int,
+    format: str = "csv",
+    currency: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Grid'i CSV veya XLSX olarak akis halinde disa aktarir
+    (satir x donem basina bir satir, olculer kolon olarak).
+    """
+    definition = db.query(BudgetDefinition).options(
+        joinedload(BudgetDefinition.version),
+        joinedload(BudgetDefinition.budget_type).joinedload(BudgetType.measures),
+    ).filter(BudgetDefinition.id == def_id).first()
+
+    if not definition or definition.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
+
+    _require_cell_storage(definition)
+
+    export_format = (format or "csv").lower()
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Gecersiz format: {format} (csv, xlsx)")
+
+    periods = _get_periods_for_version(db, definition.version)
+    currency = currency.upper().strip() if currency else None
+    context = GridExportService.prepare(db, definition, periods, currency)
+
+    if export_format == "xlsx":
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        media_type = "text/csv; charset=utf-8"
+
+    return StreamingResponse(
+        GridExportService.stream(context, export_format),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename={definition.code}_grid.{export_format}"
+        }
     )
 
 
+@router.post("/grid/{def_id}/import", response_model=GridImportResponse)
+def import_grid(
+    def_id: int,
+    file: UploadFile = File(...),
+    layout: str = Form("auto"),
+    measure_code: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: Optional[UserResponse] = Depends(get_optional_user),
+):
+    """
+    CSV / XLSX / Parquet dosyasini grid'e toplu aktarir.
+    long: boyut kolonlari + PERIOD + olcu kolonlari (export formati);
+    wide: boyut kolonlari + donem kolonlari (MEASURE kolonu veya measure_code).
+    Eksik satirlar olusturulur, hatali satirlar red dosyasina yazilir.
+    """
+    definition = db.query(BudgetDefinition).options(
+        joinedload(BudgetDefinition.version),
+        joinedload(BudgetDefinition.budget_type).joinedload(BudgetType.measures),
+    ).filter(BudgetDefinition.id == def_id).first()
+
+    if not definition or definition.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
+
+    _require_cell_storage(definition)
+
+    if definition.status and definition.status.value == "locked":
+        raise HTTPException(status_code=400, detail="Kilitli tanim uzerinde degisiklik yapilamaz")
+
+    if layout not in IMPORT_LAYOUTS:
+        raise HTTPException(status_code=400, detail=f"Gecersiz duzen: {layout} (auto, long, wide)")
+
+    periods = _get_periods_for_version(db, definition.version)
+    if not periods:
+        raise HTTPException(status_code=400, detail="Versiyona ait donem bulunamadi")
+
+    _acquire_definition_lock(db, def_id)
+
+    history = CellHistoryBuffer(db, def_id, CellChangeSource.file_import, changed_by=_username(current_user))
+    try:
+        result = BudgetImportService.import_file(
+            db, definition, periods, file.file, file.filename or "upload.csv",
+            layout=layout, measure_code=measure_code, history=history,
+        )
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    BudgetLockService.bump_revisions(db, def_id)
+    if result.pop("rows_changed"):
+        # Yeni / aktiflesen satir ve para birimi hucre gecmisine dusmez; konsolidasyonlar tam yenilenir
+        BudgetConsolidationService.invalidate_definition(db, def_id)
+    db.commit()
+    return GridImportResponse(**result)
+
+
+@router.get("/grid/{def_id}/import/rejects/{reject_id}")
+def download_import_rejects(def_id: int, reject_id: str):
+    """Ice aktarmada reddedilen satirlari (hata nedeniyle) CSV olarak indirir."""
+    path = BudgetImportService.reject_file_path(def_id, reject_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Red dosyasi bulunamadi")
+    return FileResponse(path, media_type="text/csv; charset=utf-8", filename=f"import_rejects_{def_id}.csv")
+
+
 @router.post("/grid/{def_id}/save", response_model=BudgetBulkSaveResponse)
-def save_grid(def_id: int, data: BudgetBulkSaveRequest, db: Session = Depends(get_db)):
-    """Bulk save cells for a budget definition."""
+def save_grid(
+    def_id: int,
+    data: BudgetBulkSaveRequest,
+    db: Session = Depends(get_db),
+    current_user: Optional[UserResponse] = Depends(get_optional_user),
+):
+    """
+    Bulk save cells for a budget definition.
+    Cells sent with the row revision they were edited at are rejected as
+    conflicts when the row changed meanwhile (unless on_conflict=overwrite).
+    """
     definition = db.query(BudgetDefinition).options(
         joinedload(BudgetDefinition.budget_type).joinedload(BudgetType.measures),
     ).filter(BudgetDefinition.id == def_id).first()
 
-    if not definition:
+    if not definition or definition.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
 
     if definition.status and definition.status.value == "locked":
         raise HTTPException(status_code=400, detail="Kilitli tanim uzerinde degisiklik yapilamaz")
 
+    if data.on_conflict not in SAVE_CONFLICT_MODES:
+        raise HTTPException(status_code=400, detail=f"Gecersiz on_conflict: {data.on_conflict} (reject, overwrite)")
+
+    # Saves share the definition lock; only calculation / undo excludes them
+    _acquire_definition_lock(db, def_id, shared=True)
+
     # Build input measure codes set
     input_measures = {
         m.code for m in definition.budget_type.measures
@@ -481,6 +871,22 @@ def save_grid(def_id: int, data: BudgetBulkSaveRequest, db: Session = Depends(ge
 
     saved = 0
     errors = []
+    conflicts = []
+    saved_row_ids = set()
+    history = CellHistoryBuffer(db, def_id, CellChangeSource.save, changed_by=_username(current_user))
+
+    # Lock the touched rows and read their current revisions
+    row_revisions = BudgetLockService.lock_rows(db, def_id, [c.row_id for c in data.cells])
+
+    # Load the touched cells once (cell or dense storage)
+    storage = BudgetCellStorage.for_definition(db, definition)
+    existing_cells = {
+        (c.row_id, c.period_id, c.measure_code): c
+        for c in storage.load(
+            list({c.row_id for c in data.cells}),
+            {c.period_id for c in data.cells},
+        )
+    }
 
     for cell_update in data.cells:
         # Only allow saving input measures
@@ -488,19 +894,43 @@ def save_grid(def_id: int, data: BudgetBulkSaveRequest, db: Session = Depends(ge
             errors.append(f"'{cell_update.measure_code}' hesaplanan olcu, deger girilmez")
             continue
 
-        # Upsert cell
-        existing_cell = db.query(BudgetEntryCell).filter(
-            BudgetEntryCell.row_id == cell_update.row_id,
-            BudgetEntryCell.period_id == cell_update.period_id,
-            BudgetEntryCell.measure_code == cell_update.measure_code,
-        ).first()
+        current_revision = row_revisions.get(cell_update.row_id)
+        if current_revision is None:
+            errors.append(f"Satir bulunamadi: {cell_update.row_id}")
+            continue
 
+        key = (cell_update.row_id, cell_update.period_id, cell_update.measure_code)
+        existing_cell = existing_cells.get(key)
+
+        # Stale write: the row changed after the client read it
+        if (
+            cell_update.revision is not None
+            and cell_update.revision != current_revision
+            and data.on_conflict == "reject"
+        ):
+            conflicts.append(CellConflict(
+                row_id=cell_update.row_id,
+                period_id=cell_update.period_id,
+                measure_code=cell_update.measure_code,
+                revision=cell_update.revision,
+                current_revision=current_revision,
+                current_value=float(existing_cell.value)
+                if existing_cell and existing_cell.value is not None else None,
+            ))
+            continue
+
+        # Upsert cell
+        history.record(
+            cell_update.row_id, cell_update.period_id, cell_update.measure_code,
+            existing_cell.value if existing_cell else None, cell_update.value,
+        )
         if existing_cell:
             existing_cell.value = cell_update.value
             existing_cell.cell_type = BudgetCellType.input
             existing_cell.is_manual_override = True
         else:
             new_cell = BudgetEntryCell(
+                budget_definition_id=def_id,
                 row_id=cell_update.row_id,
                 period_id=cell_update.period_id,
                 measure_code=cell_update.measure_code,
@@ -508,19 +938,29 @@ def save_grid(def_id: int, data: BudgetBulkSaveRequest, db: Session = Depends(ge
                 cell_type=BudgetCellType.input,
                 is_manual_override=True,
             )
-            db.add(new_cell)
+            storage.add(new_cell)
+            existing_cells[key] = new_cell
+        saved_row_ids.add(cell_update.row_id)
         saved += 1
 
+    storage.flush()
+    history.flush()
+    revisions = BudgetLockService.bump_revisions(db, def_id, list(saved_row_ids), returning=True)
     db.commit()
 
-    return BudgetBulkSaveResponse(saved_count=saved, errors=errors)
+    return BudgetBulkSaveResponse(
+        saved_count=saved,
+        errors=errors,
+        conflicts=conflicts,
+        revisions={str(row_id): revision for row_id, revision in revisions.items()},
+    )
 
 
 @router.put("/grid/{def_id}/rows/currency", response_model=BudgetRowCurrencyBulkResponse)
 def update_row_currencies(def_id: int, data: BudgetRowCurrencyBulkUpdate, db: Session = Depends(get_db)):
     """Update currency_code for budget grid rows."""
     definition = db.query(BudgetDefinition).filter(BudgetDefinition.id == def_id).first()
-    if not definition:
+    if not definition or definition.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
 
     if definition.status and definition.status.value == "locked":
@@ -555,6 +995,9 @@ def update_row_currencies(def_id: int, data: BudgetRowCurrencyBulkUpdate, db: Se
             row.currency_code = None
         updated += 1
 
+    if updated:
+        # Para birimi degisikligi hucre gecmisine dusmez; konsolidasyonlar tam yenilenir
+        BudgetConsolidationService.invalidate_definition(db, def_id)
     db.commit()
     return BudgetRowCurrencyBulkResponse(updated_count=updated, errors=errors)
 
@@ -566,7 +1009,7 @@ def generate_rows(def_id: int, db: Session = Depends(get_db)):
         joinedload(BudgetDefinition.dimensions),
     ).filter(BudgetDefinition.id == def_id).first()
 
-    if not definition:
+    if not definition or definition.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
 
     result = _generate_rows_for_definition(db, definition)
@@ -703,6 +1146,7 @@ def create_rule_set(data: RuleSetCreate, db: Session = Depends(get_db)):
 
     db.commit()
     db.refresh(rs)
+    RuleSetCompiler.invalidate_rule_set(rs.id)
 
     rs = db.query(RuleSet).options(joinedload(RuleSet.items)).filter(RuleSet.id == rs.id).first()
     return _build_rule_set_response(rs, db)
@@ -750,8 +1194,12 @@ def update_rule_set(rs_id: int, data: RuleSetUpdate, db: Session = Depends(get_d
             )
             db.add(item)
 
+    # Plan cache revizyonu: kalem degisikligi de updated_date'i ilerletir
+    rs.updated_date = func.now()
+
     db.commit()
     db.refresh(rs)
+    RuleSetCompiler.invalidate_rule_set(rs.id)
 
     rs = db.query(RuleSet).options(joinedload(RuleSet.items)).filter(RuleSet.id == rs.id).first()
     return _build_rule_set_response(rs, db)
@@ -764,195 +1212,219 @@ def delete_rule_set(rs_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Kural seti bulunamadi")
     db.delete(rs)
     db.commit()
+    RuleSetCompiler.invalidate_rule_set(rs_id)
 
 
 # ============ Calculate ============
 
-def _check_condition(row: BudgetEntryRow, item: RuleSetItem, db: Session) -> bool:
-    """Check if a rule set item's condition matches the given row."""
-    if not item.condition_entity_id or not item.condition_attribute_code:
-        return True  # No condition = matches all rows
-
-    entity_id_str = str(item.condition_entity_id)
-    md_id = row.dimension_values.get(entity_id_str)
-    if md_id is None:
-        return False  # Row doesn't have this dimension
-
-    attr_code_upper = item.condition_attribute_code.upper()
-
-    # Handle built-in fields CODE and NAME (direct MasterData columns)
-    if attr_code_upper in ("CODE", "NAME"):
-        md = db.query(MasterData).filter(MasterData.id == md_id).first()
-        if not md:
-            return False
-        actual_value = md.code if attr_code_upper == "CODE" else md.name
-    else:
-        # Resolve attribute_code to attribute_id via MetaAttribute
-        attr = db.query(MetaAttribute).filter(
-            MetaAttribute.entity_id == item.condition_entity_id,
-            MetaAttribute.code == item.condition_attribute_code
-        ).first()
-        if not attr:
-            return False
-
-        # Get the master data value for the specified attribute
-        md_value = db.query(MasterDataValue).filter(
-            MasterDataValue.master_data_id == md_id,
-            MasterDataValue.attribute_id == attr.id
-        ).first()
+def _load_attribute_lookups(db: Session, rows: list, plan: ExecutionPlan) -> dict:
+    """Plandaki kosul ve para birimi attribute'larini tum satirlar icin toplu cozer."""
+    lookups = {}
+    for ref in plan.attribute_refs:
+        key = str(ref.entity_id)
+        md_ids = {row.dimension_values.get(key) for row in rows}
+        lookups[ref] = RuleSetCompiler.resolve_attribute(db, ref, md_ids)
+    return lookups
 
-        if md_value is None:
-            return False
 
-        actual_value = md_value.value or ""
+def _get_row_attribute_value(row: BudgetEntryRow, ref: AttributeRef | None, lookups: dict) -> str | None:
+    """Resolve a master data attribute value for a row from preloaded lookups."""
+    if ref is None:
+        return None
+    md_id = row.dimension_values.get(str(ref.entity_id))
+    if md_id is None:
+        return None
+    return lookups.get(ref, {}).get(md_id)
 
-    condition_value = item.condition_value or ""
-    operator = item.condition_operator or "eq"
 
-    if operator == "eq":
-        return actual_value == condition_value
-    elif operator == "ne":
-        return actual_value != condition_value
-    elif operator == "in":
-        try:
-            allowed = json.loads(condition_value) if condition_value.startswith("[") else [v.strip() for v in condition_value.split(",")]
-            return actual_value in allowed
-        except (json.JSONDecodeError, AttributeError):
-            return False
-    return False
+def _check_condition(row: BudgetEntryRow, item: CompiledRuleItem, lookups: dict) -> bool:
+    """Check if a rule set item's condition matches the given row."""
+    if item.condition is None:
+        return True  # No condition = matches all rows
+    actual_value = _get_row_attribute_value(row, item.condition.attribute, lookups)
+    if actual_value is None:
+        return False
+    return item.condition.matches(actual_value)
 
 
-def _get_row_attribute_value(row: BudgetEntryRow, entity_id: int | None, attribute_code: str | None, db: Session) -> str | None:
-    """Resolve a master data attribute value for a row."""
-    if not entity_id or not attribute_code:
+def _evaluate_formula(formula: CompiledFormula | None, measure_values: dict) -> float | None:
+    """Evaluate a compiled formula like 'FIYAT * MIKTAR'."""
+    if formula is None:
         return None
-    md_id = row.dimension_values.get(str(entity_id))
-    if md_id is None:
+    result = formula.evaluate(measure_values)
+    if result is None:
         return None
-
-    attr_code_upper = attribute_code.upper()
-    if attr_code_upper in ("CODE", "NAME"):
-        md = db.query(MasterData).filter(MasterData.id == md_id).first()
-        if not md:
-            return None
-        return md.code if attr_code_upper == "CODE" else md.name
-
-    attr = db.query(MetaAttribute).filter(
-        MetaAttribute.entity_id == entity_id,
-        MetaAttribute.code == attribute_code
-    ).first()
-    if not attr:
+    try:
+        return float(result)
+    except (TypeError, ValueError):
         return None
 
-    md_value = db.query(MasterDataValue).filter(
-        MasterDataValue.master_data_id == md_id,
-        MasterDataValue.attribute_id == attr.id
-    ).first()
-    if md_value is None:
-        return None
-    return md_value.value
 
+def _match_dimension_filter(db: Session, dim_filter: CalculateDimensionFilter) -> list:
+    """Return master data ids of the entity matching a scope dimension filter."""
+    if dim_filter.codes is not None:
+        return [
+            md_id for (md_id,) in db.query(MasterData.id).filter(
+                MasterData.entity_id == dim_filter.entity_id,
+                MasterData.code.in_(dim_filter.codes)
+            ).all()
+        ]
 
-def _check_period(period_id: int, item: RuleSetItem) -> bool:
-    """Check if a period is in the rule item's applicable periods."""
-    if not item.apply_to_period_ids:
-        return True  # null = all periods
-    return period_id in item.apply_to_period_ids
+    if not dim_filter.attribute_code:
+        raise HTTPException(status_code=400, detail="Boyut filtresi icin kod listesi veya attribute kosulu gerekli")
 
+    condition = RuleSetCompiler.compile_condition(
+        db, dim_filter.entity_id, dim_filter.attribute_code, dim_filter.operator, dim_filter.value
+    )
+    if not condition.attribute.resolvable:
+        raise HTTPException(status_code=400, detail=f"Attribute bulunamadi: {dim_filter.attribute_code}")
 
-def _evaluate_formula(formula: str, measure_values: dict) -> float | None:
-    """Safely evaluate a formula like 'FIYAT * MIKTAR'."""
-    if not formula:
-        return None
-    try:
-        # Replace measure codes with values
-        expr = formula
-        for code, val in measure_values.items():
-            expr = expr.replace(code, str(val if val is not None else 0))
-        # Safe eval with only math operations
-        allowed_chars = set("0123456789.+-*/(). ")
-        if not all(c in allowed_chars for c in expr):
-            return None
-        result = eval(expr)
-        return float(result)
-    except Exception:
-        return None
+    md_ids = [
+        md_id for (md_id,) in db.query(MasterData.id).filter(MasterData.entity_id == dim_filter.entity_id).all()
+    ]
+    values = RuleSetCompiler.resolve_attribute(db, condition.attribute, md_ids)
+    return [md_id for md_id, value in values.items() if condition.matches(value)]
+
+
+def _scope_rows(db: Session, def_id: int, scope: CalculateScope | None) -> list:
+    """Load active rows of a definition, restricted to the scope's row ids and dimension filters."""
+    query = db.query(BudgetEntryRow).filter(
+        BudgetEntryRow.budget_definition_id == def_id,
+        BudgetEntryRow.is_active == True
+    )
+    if scope is None:
+        return query.all()
+
+    if scope.row_ids is not None:
+        query = query.filter(BudgetEntryRow.id.in_(scope.row_ids))
+    for dim_filter in scope.dimension_filters:
+        md_ids = _match_dimension_filter(db, dim_filter)
+        query = query.filter(
+            BudgetEntryRow.dimension_values[str(dim_filter.entity_id)].astext.in_([str(i) for i in md_ids])
+        )
+    return query.all()
+
+
+def _scope_period_window(periods: list, scope: CalculateScope | None) -> tuple:
+    """Return (start_idx, end_idx) of the scope's period range within the version periods."""
+    start_idx, end_idx = 0, len(periods) - 1
+    if scope is None:
+        return start_idx, end_idx
+
+    index = {p.id: idx for idx, p in enumerate(periods)}
+    if scope.period_start_id is not None:
+        if scope.period_start_id not in index:
+            raise HTTPException(status_code=400, detail="Baslangic donemi versiyon araliginda degil")
+        start_idx = index[scope.period_start_id]
+    if scope.period_end_id is not None:
+        if scope.period_end_id not in index:
+            raise HTTPException(status_code=400, detail="Bitis donemi versiyon araliginda degil")
+        end_idx = index[scope.period_end_id]
+    if start_idx > end_idx:
+        raise HTTPException(status_code=400, detail="Donem araligi gecersiz")
+    return start_idx, end_idx
+
+
+def _first_applicable_period_idx(periods: list, item: CompiledRuleItem) -> int | None:
+    """Index of the first version period a period-filtered rule item applies to."""
+    for pidx, p in enumerate(periods):
+        if p.id in item.period_ids:
+            return pidx
+    return None
+
+
+def _scope_base_period_ids(periods: list, start_idx: int, items: list) -> set:
+    """
+    Periods outside the window that calculations inside it read from (read-only):
+    the period before the window (cascading parameters) and rule base periods.
+    """
+    period_ids = set()
+    if start_idx > 0:
+        period_ids.add(periods[start_idx - 1].id)
+    for item in items:
+        if not item.period_ids or item.rule_type not in (RuleType.parameter_multiplier, RuleType.formula):
+            continue
+        first_applicable_idx = _first_applicable_period_idx(periods, item)
+        if first_applicable_idx is not None and first_applicable_idx > 0:
+            period_ids.add(periods[first_applicable_idx - 1].id)
+    return period_ids
 
 
 @router.post("/grid/{def_id}/calculate", response_model=CalculateResponse)
-def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(get_db)):
-    """Apply rule sets and calculate formulas for all cells."""
+def calculate_grid(
+    def_id: int,
+    data: CalculateRequest,
+    db: Session = Depends(get_db),
+    current_user: Optional[UserResponse] = Depends(get_optional_user),
+):
+    """
+    Apply rule sets and calculate formulas for all cells.
+    With a scope, only the selected rows and period window are snapshotted,
+    reset and recalculated; cells outside it are read as-is.
+    """
     definition = db.query(BudgetDefinition).options(
         joinedload(BudgetDefinition.version),
         joinedload(BudgetDefinition.budget_type).joinedload(BudgetType.measures),
     ).filter(BudgetDefinition.id == def_id).first()
 
-    if not definition:
+    if not definition or definition.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
 
     if definition.status and definition.status.value == "locked":
         raise HTTPException(status_code=400, detail="Kilitli tanim hesaplanamaz")
 
+    # One calculation per definition; concurrent saves get 409 instead of waiting
+    _acquire_definition_lock(db, def_id)
+
     # Load periods chronologically
     periods = _get_periods_for_version(db, definition.version)
     if not periods:
         raise HTTPException(status_code=400, detail="Versiyona ait donem bulunamadi")
 
-    # Load all rows
-    rows = db.query(BudgetEntryRow).filter(
-        BudgetEntryRow.budget_definition_id == def_id,
-        BudgetEntryRow.is_active == True
-    ).all()
+    # Resolve scope (rows + period window); no scope = whole grid
+    scope = data.scope
+    start_idx, end_idx = _scope_period_window(periods, scope)
+    calc_periods = periods[start_idx:end_idx + 1]
+    calc_period_ids = [p.id for p in calc_periods]
+
+    rows = _scope_rows(db, def_id, scope)
 
     if not rows:
         return CalculateResponse()
 
     row_ids = [r.id for r in rows]
 
-    # Load all existing cells
-    all_cells = db.query(BudgetEntryCell).filter(
-        BudgetEntryCell.row_id.in_(row_ids)
-    ).all()
+    # Load compiled plan (items ordered, conditions resolved, formulas parsed)
+    plan = RuleSetCompiler.get_plan(db, data.rule_set_ids or [], definition.version_id)
+    rule_set_items = list(plan.items)
 
-    # ── Snapshot: save current state for undo ──
-    snapshot_data = []
-    for cell in all_cells:
-        snapshot_data.append({
-            "id": cell.id,
-            "row_id": cell.row_id,
-            "period_id": cell.period_id,
-            "measure_code": cell.measure_code,
-            "value": str(cell.value) if cell.value is not None else None,
-            "cell_type": cell.cell_type.value if cell.cell_type else "input",
-            "is_manual_override": cell.is_manual_override or False,
-            "source_rule_id": cell.source_rule_id,
-            "source_param_id": cell.source_param_id,
-        })
+    # Load existing cells of the scope (cell or dense storage)
+    storage = BudgetCellStorage.for_definition(db, definition)
+    all_cells = storage.load(row_ids, calc_period_ids if scope is not None else None)
+    before_values = {(c.row_id, c.period_id, c.measure_code): c.value for c in all_cells}
 
-    snapshot = CalculationSnapshot(
-        budget_definition_id=def_id,
-        snapshot_data=snapshot_data,
+    # ── Snapshot: save current state for undo ──
+    snapshot = BudgetSnapshotService.capture(
+        db, def_id, all_cells,
         rule_set_ids=data.rule_set_ids or [],
+        scope={"row_ids": row_ids, "period_ids": calc_period_ids} if scope is not None else None,
     )
-    db.add(snapshot)
-    db.flush()
     snapshot_id = snapshot.id
 
     # ── Reset Phase: delete all non-input cells (idempotency) ──
-    non_input_ids = [
-        c.id for c in all_cells
-        if c.cell_type != BudgetCellType.input
-    ]
-    if non_input_ids:
-        db.query(BudgetEntryCell).filter(
-            BudgetEntryCell.id.in_(non_input_ids)
-        ).delete(synchronize_session='fetch')
-        db.flush()
+    non_input_cells = [c for c in all_cells if c.cell_type != BudgetCellType.input]
+    if non_input_cells:
+        storage.remove(non_input_cells)
+        storage.flush()
 
-    # Reload cells (only input cells remain)
-    all_cells = db.query(BudgetEntryCell).filter(
-        BudgetEntryCell.row_id.in_(row_ids)
-    ).all()
+    # Only input cells remain
+    all_cells = [c for c in all_cells if c.cell_type == BudgetCellType.input]
+
+    # Scoped run: base periods outside the window are read but never written
+    if scope is not None:
+        base_period_ids = _scope_base_period_ids(periods, start_idx, rule_set_items) - set(calc_period_ids)
+        if base_period_ids:
+            all_cells += storage.load(row_ids, base_period_ids)
 
     # Build mutable cell lookup: {row_id: {period_id: {measure_code: cell}}}
     cell_lookup = {}
@@ -964,17 +1436,8 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
     input_measure_codes = {code for code, m in measures.items() if m.measure_type == BudgetMeasureType.input}
     calculated_measure_codes = {code for code, m in measures.items() if m.measure_type == BudgetMeasureType.calculated}
 
-    # Load selected rule sets
-    rule_set_items = []
-    for rs_id in data.rule_set_ids:
-        rs = db.query(RuleSet).options(joinedload(RuleSet.items)).filter(
-            RuleSet.id == rs_id, RuleSet.is_active == True
-        ).first()
-        if rs:
-            rule_set_items.extend([item for item in rs.items if item.is_active])
-
-    # Sort by priority then sort_order
-    rule_set_items.sort(key=lambda x: (x.priority or 0, x.sort_order or 0))
+    attribute_lookups = _load_attribute_lookups(db, rows, plan)
+    measure_formulas = {code: compile_formula(m.formula) for code, m in measures.items()}
 
     calculated_cells = 0
     formula_cells = 0
@@ -986,17 +1449,16 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
         c.code for c in db.query(BudgetCurrency).filter(BudgetCurrency.is_active == True).all()
     }
     currency_items = [item for item in rule_set_items if item.rule_type == RuleType.currency_assign]
+    currency_changed = False
     if currency_items:
         for item in currency_items:
             for row in rows:
-                if not _check_condition(row, item, db):
+                if not _check_condition(row, item, attribute_lookups):
                     continue
 
                 code = None
-                if item.currency_source_entity_id and item.currency_source_attribute_code:
-                    value = _get_row_attribute_value(
-                        row, item.currency_source_entity_id, item.currency_source_attribute_code, db
-                    )
+                if item.currency_source is not None:
+                    value = _get_row_attribute_value(row, item.currency_source, attribute_lookups)
                     if value:
                         code = str(value).upper().strip()
 
@@ -1010,7 +1472,9 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
                     errors.add(f"Para birimi aktif degil veya bulunamadi: {code}")
                     continue
 
-                row.currency_code = code
+                if row.currency_code != code:
+                    row.currency_code = code
+                    currency_changed = True
 
     # Phase 1: Apply rule set items (fixed_value, parameter_multiplier)
     for item in rule_set_items:
@@ -1023,31 +1487,20 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
         if item.rule_type == RuleType.parameter_multiplier:
             if not item.parameter_id:
                 continue
-            pv = db.query(ParameterVersion).filter(
-                ParameterVersion.parameter_id == item.parameter_id,
-                ParameterVersion.version_id == definition.version_id
-            ).first()
-            if not pv or not pv.value:
-                continue
-            try:
-                param_value = float(pv.value)
-            except (ValueError, TypeError):
+            param_value = plan.parameter_values.get(item.parameter_id)
+            if param_value is None:
                 continue
-            operation = item.parameter_operation or "multiply"
+            operation = item.parameter_operation
 
         for row in rows:
-            if not _check_condition(row, item, db):
+            if not _check_condition(row, item, attribute_lookups):
                 continue
 
             # For parameter_multiplier: compute base value per row
             # Base = value in the period just before the first applicable period
             base_value_for_row = None  # None means cascading (no period filter)
-            if item.rule_type == RuleType.parameter_multiplier and item.apply_to_period_ids:
-                first_applicable_idx = None
-                for pidx, p in enumerate(periods):
-                    if p.id in item.apply_to_period_ids:
-                        first_applicable_idx = pidx
-                        break
+            if item.rule_type == RuleType.parameter_multiplier and item.period_ids:
+                first_applicable_idx = _first_applicable_period_idx(periods, item)
                 if first_applicable_idx is not None and first_applicable_idx > 0:
                     base_period = periods[first_applicable_idx - 1]
                     base_cell = cell_lookup.get(row.id, {}).get(base_period.id, {}).get(item.target_measure_code)
@@ -1055,8 +1508,8 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
                 else:
                     base_value_for_row = 0.0
 
-            for period_idx, period in enumerate(periods):
-                if not _check_period(period.id, item):
+            for period_idx, period in enumerate(calc_periods, start=start_idx):
+                if not item.applies_to_period(period.id):
                     continue
 
                 # Check manual override
@@ -1102,6 +1555,7 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
                             existing.source_param_id = item.parameter_id
                     else:
                         new_cell = BudgetEntryCell(
+                            budget_definition_id=def_id,
                             row_id=row.id,
                             period_id=period.id,
                             measure_code=item.target_measure_code,
@@ -1110,8 +1564,7 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
                             source_rule_id=item.id,
                             source_param_id=item.parameter_id,
                         )
-                        db.add(new_cell)
-                        db.flush()
+                        storage.add(new_cell)
                         cell_lookup.setdefault(row.id, {}).setdefault(period.id, {})[item.target_measure_code] = new_cell
                     calculated_cells += 1
 
@@ -1124,7 +1577,7 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
                 continue
 
             for row in rows:
-                for period in periods:
+                for period in calc_periods:
                     existing = cell_lookup.get(row.id, {}).get(period.id, {}).get(measure_code)
                     if existing and existing.is_manual_override:
                         skipped_manual += 1
@@ -1135,21 +1588,21 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
                         cell = cell_lookup.get(row.id, {}).get(period.id, {}).get(m_code)
                         measure_values[m_code] = float(cell.value) if cell and cell.value is not None else 0
 
-                    result = _evaluate_formula(measure.formula, measure_values)
+                    result = _evaluate_formula(measure_formulas[measure_code], measure_values)
                     if result is not None:
                         if existing:
                             existing.value = Decimal(str(result))
                             existing.cell_type = BudgetCellType.calculated
                         else:
                             new_cell = BudgetEntryCell(
+                                budget_definition_id=def_id,
                                 row_id=row.id,
                                 period_id=period.id,
                                 measure_code=measure_code,
                                 value=Decimal(str(result)),
                                 cell_type=BudgetCellType.calculated,
                             )
-                            db.add(new_cell)
-                            db.flush()
+                            storage.add(new_cell)
                             cell_lookup.setdefault(row.id, {}).setdefault(period.id, {})[measure_code] = new_cell
                         formula_cells += 1
 
@@ -1164,20 +1617,16 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
     for item in formula_items:
         # Pre-compute base period for this item (if period filter is active)
         base_period_id = None
-        if item.apply_to_period_ids:
-            first_applicable_idx = None
-            for pidx, p in enumerate(periods):
-                if p.id in item.apply_to_period_ids:
-                    first_applicable_idx = pidx
-                    break
+        if item.period_ids:
+            first_applicable_idx = _first_applicable_period_idx(periods, item)
             if first_applicable_idx is not None and first_applicable_idx > 0:
                 base_period_id = periods[first_applicable_idx - 1].id
 
         for row in rows:
-            if not _check_condition(row, item, db):
+            if not _check_condition(row, item, attribute_lookups):
                 continue
-            for period in periods:
-                if not _check_period(period.id, item):
+            for period in calc_periods:
+                if not item.applies_to_period(period.id):
                     continue
                 existing = cell_lookup.get(row.id, {}).get(period.id, {}).get(item.target_measure_code)
                 if existing and existing.is_manual_override:
@@ -1199,6 +1648,7 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
                         existing.source_rule_id = item.id
                     else:
                         new_cell = BudgetEntryCell(
+                            budget_definition_id=def_id,
                             row_id=row.id,
                             period_id=period.id,
                             measure_code=item.target_measure_code,
@@ -1206,8 +1656,7 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
                             cell_type=BudgetCellType.calculated,
                             source_rule_id=item.id,
                         )
-                        db.add(new_cell)
-                        db.flush()
+                        storage.add(new_cell)
                         cell_lookup.setdefault(row.id, {}).setdefault(period.id, {})[item.target_measure_code] = new_cell
                     formula_cells += 1
 
@@ -1215,6 +1664,24 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
     if formula_items:
         _run_formula_measures()
 
+    storage.flush()
+
+    # Cell history: recalculated slice before vs after (base periods excluded)
+    calc_period_set = set(calc_period_ids)
+    history = CellHistoryBuffer(
+        db, def_id, CellChangeSource.calculate, changed_by=_username(current_user), reference_id=snapshot_id
+    )
+    history.record_diff(before_values, {
+        (row_id, period_id, measure_code): cell.value
+        for row_id, period_cells in cell_lookup.items()
+        for period_id, measure_cells in period_cells.items() if period_id in calc_period_set
+        for measure_code, cell in measure_cells.items()
+    })
+    history.flush()
+    BudgetLockService.bump_revisions(db, def_id, row_ids)
+    if currency_changed:
+        # Para birimi degisikligi hucre gecmisine dusmez; konsolidasyonlar tam yenilenir
+        BudgetConsolidationService.invalidate_definition(db, def_id)
     db.commit()
 
     return CalculateResponse(
@@ -1222,6 +1689,8 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
         formula_cells=formula_cells,
         skipped_manual=skipped_manual,
         snapshot_id=snapshot_id,
+        row_count=len(rows),
+        period_count=len(calc_periods),
         errors=sorted(errors),
     )
 
@@ -1229,48 +1698,602 @@ def calculate_grid(def_id: int, data: CalculateRequest, db: Session = Depends(ge
 # ============ Undo Calculation ============
 
 @router.post("/grid/{def_id}/undo/{snapshot_id}", response_model=UndoResponse)
-def undo_calculation(def_id: int, snapshot_id: int, db: Session = Depends(get_db)):
+def undo_calculation(
+    def_id: int,
+    snapshot_id: int,
+    db: Session = Depends(get_db),
+    current_user: Optional[UserResponse] = Depends(get_optional_user),
+):
     """Restore cells to pre-calculation state from a snapshot."""
-    snapshot = db.query(CalculationSnapshot).filter(
-        CalculationSnapshot.id == snapshot_id,
-        CalculationSnapshot.budget_definition_id == def_id,
-    ).first()
+    snapshot = _get_snapshot(db, def_id, snapshot_id)
 
-    if not snapshot:
-        raise HTTPException(status_code=404, detail="Snapshot bulunamadi")
+    _acquire_definition_lock(db, def_id)
 
-    # Get all current rows for this definition
-    rows = db.query(BudgetEntryRow).filter(
-        BudgetEntryRow.budget_definition_id == def_id,
-        BudgetEntryRow.is_active == True
-    ).all()
-    row_ids = [r.id for r in rows]
-
-    # Delete all current cells
-    if row_ids:
-        db.query(BudgetEntryCell).filter(
-            BudgetEntryCell.row_id.in_(row_ids)
-        ).delete(synchronize_session='fetch')
-        db.flush()
+    definition = db.query(BudgetDefinition).filter(BudgetDefinition.id == def_id).first()
+    storage = BudgetCellStorage.for_definition(db, definition)
+
+    # Scoped snapshot: only the calculated slice is replaced
+    if snapshot.scope:
+        row_ids = snapshot.scope.get("row_ids") or []
+        period_ids = snapshot.scope.get("period_ids") or []
+        current_cells = storage.load(row_ids, period_ids) if row_ids and period_ids else []
+        if row_ids and period_ids:
+            storage.remove_slice(row_ids, period_ids)
+    else:
+        # Get all current rows for this definition
+        rows = db.query(BudgetEntryRow).filter(
+            BudgetEntryRow.budget_definition_id == def_id,
+            BudgetEntryRow.is_active == True
+        ).all()
+        row_ids = [r.id for r in rows]
+        current_cells = storage.load(row_ids)
+
+        # Delete all current cells
+        storage.remove_slice(row_ids)
+    storage.flush()
 
     # Restore cells from snapshot
     restored = 0
-    for cell_data in snapshot.snapshot_data:
-        cell = BudgetEntryCell(
-            row_id=cell_data["row_id"],
-            period_id=cell_data["period_id"],
-            measure_code=cell_data["measure_code"],
-            value=Decimal(cell_data["value"]) if cell_data["value"] is not None else None,
-            cell_type=BudgetCellType(cell_data["cell_type"]),
-            is_manual_override=cell_data.get("is_manual_override", False),
-            source_rule_id=cell_data.get("source_rule_id"),
-            source_param_id=cell_data.get("source_param_id"),
-        )
-        db.add(cell)
+    restored_values = {}
+    for cell in BudgetSnapshotService.load_cells(db, snapshot):
+        storage.add(cell)
+        restored_values[(cell.row_id, cell.period_id, cell.measure_code)] = cell.value
         restored += 1
+    storage.flush()
+
+    history = CellHistoryBuffer(
+        db, def_id, CellChangeSource.undo, changed_by=_username(current_user), reference_id=snapshot_id
+    )
+    history.record_diff(
+        {(c.row_id, c.period_id, c.measure_code): c.value for c in current_cells}, restored_values
+    )
+    history.flush()
+    BudgetLockService.bump_revisions(db, def_id, row_ids)
 
     # Delete the used snapshot
     db.delete(snapshot)
     db.commit()
 
     return UndoResponse(restored_cells=restored, snapshot_id=snapshot_id)
+
+
+@router.get("/grid/{def_id}/snapshots", response_model=CalculationSnapshotListResponse)
+def list_snapshots(def_id: int, db: Session = Depends(get_db)):
+    """Tanimin hesaplama snapshot'lari (geri alma ve snapshot aninda okuma icin)."""
+    definition = db.query(BudgetDefinition).filter(BudgetDefinition.id == def_id).first()
+    if not definition or definition.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
+
+    snapshots = db.query(CalculationSnapshot).filter(
+        CalculationSnapshot.budget_definition_id == def_id
+    ).order_by(CalculationSnapshot.id.desc()).all()
+
+    items = []
+    for snapshot in snapshots:
+        scope = BudgetSnapshotService.scope_slice(snapshot)
+        items.append(CalculationSnapshotResponse(
+            id=snapshot.id,
+            budget_definition_id=def_id,
+            rule_set_ids=snapshot.rule_set_ids or [],
+            scope_row_count=len(scope[0]) if scope is not None else None,
+            scope_period_ids=scope[1] if scope is not None else None,
+            cell_count=snapshot.cell_count or 0,
+            created_date=snapshot.created_date,
+        ))
+    return CalculationSnapshotListResponse(items=items, total=len(items))
+
+
+# ============ Cell History ============
+
+@router.get("/grid/{def_id}/history", response_model=CellHistoryListResponse)
+def get_cell_history(
+    def_id: int,
+    row_id: int,
+    period_id: Optional[int] = None,
+    measure_code: Optional[str] = None,
+    source: Optional[str] = None,
+    before_id: Optional[int] = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+):
+    """
+    Satirin (period_id ve measure_code ile tek hucrenin) degisiklik gecmisi,
+    yeniden eskiye. Sonraki sayfa: before_id=next_before_id.
+    """
+    definition = db.query(BudgetDefinition).filter(BudgetDefinition.id == def_id).first()
+    if not definition or definition.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
+
+    source_filter = None
+    if source:
+        try:
+            source_filter = CellChangeSource(source)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Gecersiz kaynak: {source}")
+
+    page = CellHistoryService.query(
+        db, def_id, row_id,
+        period_id=period_id, measure_code=measure_code, source=source_filter,
+        before_id=before_id, limit=limit,
+    )
+    return CellHistoryListResponse(
+        items=[
+            CellHistoryEntry(
+                id=h.id,
+                changed_at=h.changed_at,
+                row_id=h.row_id,
+                period_id=h.period_id,
+                measure_code=h.measure_code,
+                old_value=float(h.old_value) if h.old_value is not None else None,
+                new_value=float(h.new_value) if h.new_value is not None else None,
+                source=h.source.value,
+                reference_id=h.reference_id,
+                changed_by=h.changed_by,
+            )
+            for h in page["items"]
+        ],
+        next_before_id=page["next_before_id"],
+    )
+
+
+@router.delete("/grid/{def_id}/snapshots", response_model=DeletionJobResponse, status_code=202)
+def delete_snapshots(def_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """Tanimin tum hesaplama snapshot'larini arka planda parca parca siler."""
+    definition = db.query(BudgetDefinition).filter(BudgetDefinition.id == def_id).first()
+    if not definition or definition.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
+
+    job = BudgetDeletionService.request_snapshot_deletion(db, definition)
+    db.commit()
+
+    background_tasks.add_task(BudgetDeletionService.run_job, job.id)
+    return BudgetDeletionService.job_status(job)
+
+
+# ============ Sensitivity ============
+
+@router.post("/grid/{def_id}/sensitivity", response_model=SensitivityResponse)
+def analyze_sensitivity(def_id: int, data: SensitivityRequest, db: Session = Depends(get_db)):
+    """
+    Bir parametrenin farkli degerleri icin grid toplamlarini hesaplar (veritabanina yazmaz).
+    Tum degerler senaryo ekseninde tek hesaplama geciste degerlendirilir.
+    """
+    definition = db.query(BudgetDefinition).options(
+        joinedload(BudgetDefinition.version),
+        joinedload(BudgetDefinition.budget_type).joinedload(BudgetType.measures),
+    ).filter(BudgetDefinition.id == def_id).first()
+
+    if not definition or definition.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
+
+    _require_cell_storage(definition)
+
+    periods = _get_periods_for_version(db, definition.version)
+    if not periods:
+        raise HTTPException(status_code=400, detail="Versiyona ait donem bulunamadi")
+
+    try:
+        sweep = BudgetGridEngine.sweep_values(data.values, data.range_start, data.range_end, data.step)
+        result = BudgetGridEngine.run_sensitivity(
+            db, definition, periods, data.parameter_id, sweep, data.rule_set_ids or []
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return SensitivityResponse(**result)
+
+
+# ============ Allocation ============
+
+@router.post("/grid/{def_id}/allocate", response_model=AllocationResponse)
+def allocate_grid(
+    def_id: int,
+    data: AllocationRequest,
+    db: Session = Depends(get_db),
+    current_user: Optional[UserResponse] = Depends(get_optional_user),
+):
+    """
+    Hedef toplami secilen surucuye gore kapsamdaki hucrelere dagitir
+    (esit, olcu, onceki versiyon veya mevsimsellik).
+    """
+    definition = db.query(BudgetDefinition).options(
+        joinedload(BudgetDefinition.version),
+        joinedload(BudgetDefinition.budget_type).joinedload(BudgetType.measures),
+    ).filter(BudgetDefinition.id == def_id).first()
+
+    if not definition or definition.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Butce tanimi bulunamadi")
+
+    _require_cell_storage(definition)
+
+    if definition.status and definition.status.value == "locked":
+        raise HTTPException(status_code=400, detail="Kilitli tanim uzerinde degisiklik yapilamaz")
+
+    measures = {m.code: m for m in definition.budget_type.measures if m.is_active}
+    measure = measures.get(data.measure_code)
+    if not measure:
+        raise HTTPException(status_code=400, detail=f"Olcu bulunamadi: {data.measure_code}")
+    if measure.measure_type != BudgetMeasureType.input:
+        raise HTTPException(status_code=400, detail=f"'{data.measure_code}' hesaplanan olcu, dagitim yapilamaz")
+
+    if data.driver not in ALLOCATION_DRIVERS:
+        raise HTTPException(status_code=400, detail=f"Gecersiz surucu: {data.driver}")
+
+    periods = _get_periods_for_version(db, definition.version)
+    if not periods:
+        raise HTTPException(status_code=400, detail="Versiyona ait donem bulunamadi")
+
+    start_idx, end_idx = _scope_period_window(periods, data.scope)
+    target_periods = periods[start_idx:end_idx + 1]
+
+    rows = _scope_rows(db, def_id, data.scope)
+    if not rows:
+        raise HTTPException(status_code=400, detail="Kapsamda satir bulunamadi")
+
+    decimals = data.decimals
+    if decimals is None:
+        decimals = min(measure.decimal_places if measure.decimal_places is not None else 2, MAX_ALLOCATION_DECIMALS)
+
+    # Surucu agirliklari [satir, donem]
+    if data.driver == "equal":
+        weights = BudgetAllocationService.equal_weights(len(rows), len(target_periods))
+
+    elif data.driver == "measure":
+        if not data.driver_measure_code or data.driver_measure_code not in measures:
+            raise HTTPException(status_code=400, detail="Surucu olcu bulunamadi")
+        weights = BudgetAllocationService.measure_weights(
+            db, [r.id for r in rows], [p.id for p in target_periods], data.driver_measure_code
+        )
+
+    elif data.driver == "version":
+        if not data.driver_version_id and not data.driver_definition_id:
+            raise HTTPException(status_code=400, detail="Surucu versiyon veya tanim secilmeli")
+        source_query = db.query(BudgetDefinition).options(joinedload(BudgetDefinition.version))
+        if data.driver_definition_id:
+            source = source_query.filter(BudgetDefinition.id == data.driver_definition_id).first()
+        else:
+            source = source_query.filter(
+                BudgetDefinition.version_id == data.driver_version_id,
+                BudgetDefinition.budget_type_id == definition.budget_type_id,
+            ).order_by(BudgetDefinition.id).first()
+        if not source:
+            raise HTTPException(status_code=404, detail="Surucu versiyonda butce tanimi bulunamadi")
+        _require_cell_storage(source)
+
+        # Donemler versiyon icindeki siraya gore eslesir (or. 2025-03 <-> 2026-03)
+        source_periods = _get_periods_for_version(db, source.version)
+        source_period_ids = [
+            source_periods[idx].id if idx < len(source_periods) else None
+            for idx in range(start_idx, end_idx + 1)
+        ]
+        weights = BudgetAllocationService.version_weights(
+            db, [r.dimension_values or {} for r in rows], source.id, source_period_ids,
+            data.driver_measure_code or data.measure_code,
+        )
+
+    else:
+        if not data.seasonality:
+            raise HTTPException(status_code=400, detail="Mevsimsellik profili girilmeli")
+        try:
+            weights = BudgetAllocationService.seasonality_weights(data.seasonality, target_periods, len(rows))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    _acquire_definition_lock(db, def_id)
+
+    history = CellHistoryBuffer(db, def_id, CellChangeSource.allocation, changed_by=_username(current_user))
+    try:
+        result = BudgetAllocationService.allocate(
+            db, rows, target_periods, data.measure_code, data.total, weights, decimals, data.driver, history
+        )
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    BudgetLockService.bump_revisions(db, def_id, [r.id for r in rows])
+    db.commit()
+
+    return AllocationResponse(**result)
+
+
+# ============ Consolidations ============
+
+def _build_consolidation_response(consolidation: BudgetConsolidation, db: Session) -> dict:
+    entities = {
+        e.id: e for e in db.query(MetaEntity).filter(
+            MetaEntity.id.in_(consolidation.dimension_entity_ids or [])
+        ).all()
+    }
+    dims = []
+    for i, entity_id in enumerate(consolidation.dimension_entity_ids or []):
+        entity = entities.get(entity_id)
+        dims.append({
+            "id": entity_id,
+            "entity_id": entity_id,
+            "entity_code": entity.code if entity else "",
+            "entity_name": entity.default_name if entity else "",
+            "sort_order": i,
+        })
+
+    sources = []
+    for source in consolidation.sources:
+        definition = source.budget_definition
+        sources.append({
+            "id": source.id,
+            "budget_definition_id": source.budget_definition_id,
+            "definition_code": definition.code if definition else None,
+            "definition_name": definition.name if definition else None,
+            "measure_maps": [
+                {
+                    "source_measure_code": m.source_measure_code,
+                    "target_measure_code": m.target_measure_code,
+                    "factor": float(m.factor),
+                }
+                for m in source.measure_maps
+            ],
+            "history_watermark": source.history_watermark or 0,
+            "refreshed_at": source.refreshed_at,
+        })
+
+    return {
+        "id": consolidation.id,
+        "code": consolidation.code,
+        "name": consolidation.name,
+        "description": consolidation.description,
+        "version_id": consolidation.version_id,
+        "version_code": consolidation.version.code if consolidation.version else None,
+        "dimensions": dims,
+        "measures": [
+            {"code": m.code, "name": m.name, "data_type": m.data_type.value, "sort_order": m.sort_order or 0}
+            for m in consolidation.measures
+        ],
+        "sources": sources,
+        "is_active": consolidation.is_active,
+        "created_by": consolidation.created_by,
+        "created_date": consolidation.created_date,
+        "updated_date": consolidation.updated_date,
+    }
+
+
+def _get_consolidation(db: Session, consolidation_id: int) -> BudgetConsolidation:
+    consolidation = db.query(BudgetConsolidation).options(
+        joinedload(BudgetConsolidation.version),
+        joinedload(BudgetConsolidation.measures),
+    ).filter(BudgetConsolidation.id == consolidation_id).first()
+    if not consolidation or (consolidation.version and consolidation.version.deleted_at is not None):
+        raise HTTPException(status_code=404, detail="Konsolidasyon bulunamadi")
+    return consolidation
+
+
+@router.get("/consolidations", response_model=BudgetConsolidationListResponse)
+def list_consolidations(version_id: Optional[int] = None, db: Session = Depends(get_db)):
+    query = db.query(BudgetConsolidation).options(
+        joinedload(BudgetConsolidation.version),
+        joinedload(BudgetConsolidation.measures),
+    ).join(BudgetVersion, BudgetVersion.id == BudgetConsolidation.version_id).filter(
+        BudgetVersion.deleted_at.is_(None)
+    )
+    if version_id:
+        query = query.filter(BudgetConsolidation.version_id == version_id)
+
+    items = [_build_consolidation_response(c, db) for c in query.order_by(BudgetConsolidation.id.desc()).all()]
+    return {"items": items, "total": len(items)}
+
+
+@router.get("/consolidations/{consolidation_id}", response_model=BudgetConsolidationResponse)
+def get_consolidation(consolidation_id: int, db: Session = Depends(get_db)):
+    return _build_consolidation_response(_get_consolidation(db, consolidation_id), db)
+
+
+@router.post("/consolidations", response_model=BudgetConsolidationResponse, status_code=201)
+def create_consolidation(
+    data: BudgetConsolidationCreate,
+    db: Session = Depends(get_db),
+    current_user: Optional[UserResponse] = Depends(get_optional_user),
+):
+    """
+    Konsolidasyon tanimi: kaynak tanimlarin olculeri ortak olculere,
+    satirlari ortak boyutlara indirgenir. Onbellek ilk okumada hesaplanir.
+    """
+    code = data.code.upper()
+    if db.query(BudgetConsolidation).filter(BudgetConsolidation.code == code).first():
+        raise HTTPException(status_code=400, detail=f"Konsolidasyon kodu zaten var: {code}")
+
+    measures = [m.model_dump() for m in data.measures]
+    sources = [s.model_dump() for s in data.sources]
+    try:
+        definitions = BudgetConsolidationService.validate(
+            db, data.version_id, data.dimension_entity_ids, measures, sources
+        )
+        consolidation = BudgetConsolidation(
+            version_id=data.version_id,
+            code=code,
+            name=data.name,
+            description=data.description,
+            dimension_entity_ids=list(data.dimension_entity_ids),
+            created_by=_username(current_user),
+        )
+        db.add(consolidation)
+        BudgetConsolidationService.apply_structure(db, consolidation, measures, sources, definitions)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    db.commit()
+    return _build_consolidation_response(_get_consolidation(db, consolidation.id), db)
+
+
+@router.put("/consolidations/{consolidation_id}", response_model=BudgetConsolidationResponse)
+def update_consolidation(consolidation_id: int, data: BudgetConsolidationUpdate, db: Session = Depends(get_db)):
+    """Ad / aciklama gunceller; boyut, olcu veya kaynak verilirse yapi ve onbellek yeniden kurulur."""
+    consolidation = _get_consolidation(db, consolidation_id)
+
+    if data.name is not None:
+        consolidation.name = data.name
+    if data.description is not None:
+        consolidation.description = data.description
+    if data.is_active is not None:
+        consolidation.is_active = data.is_active
+
+    if data.dimension_entity_ids is not None or data.measures is not None or data.sources is not None:
+        dimension_entity_ids = (
+            list(data.dimension_entity_ids) if data.dimension_entity_ids is not None
+            else list(consolidation.dimension_entity_ids or [])
+        )
+        measures = (
+            [m.model_dump() for m in data.measures] if data.measures is not None
+            else [
+                {"code": m.code, "name": m.name, "data_type": m.data_type.value, "sort_order": m.sort_order or 0}
+                for m in consolidation.measures
+            ]
+        )
+        sources = (
+            [s.model_dump() for s in data.sources] if data.sources is not None
+            else [
+                {
+                    "budget_definition_id": s.budget_definition_id,
+                    "measure_maps": [
+                        {
+                            "source_measure_code": m.source_measure_code,
+                            "target_measure_code": m.target_measure_code,
+                            "factor": float(m.factor),
+                        }
+                        for m in s.measure_maps
+                    ],
+                }
+                for s in consolidation.sources
+            ]
+        )
+        try:
+            definitions = BudgetConsolidationService.validate(
+                db, consolidation.version_id, dimension_entity_ids, measures, sources
+            )
+            consolidation.dimension_entity_ids = dimension_entity_ids
+            BudgetConsolidationService.apply_structure(db, consolidation, measures, sources, definitions)
+        except ValueError as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+
+    db.commit()
+    db.expire_all()
+    return _build_consolidation_response(_get_consolidation(db, consolidation_id), db)
+
+
+@router.delete("/consolidations/{consolidation_id}", status_code=204)
+def delete_consolidation(consolidation_id: int, db: Session = Depends(get_db)):
+    consolidation = _get_consolidation(db, consolidation_id)
+    # Kaynaklar, eslemeler ve onbellek FK cascade ile silinir
+    db.query(BudgetConsolidation).filter(BudgetConsolidation.id == consolidation.id).delete(synchronize_session=False)
+    db.commit()
+
+
+@router.post("/consolidations/{consolidation_id}/refresh", response_model=ConsolidationRefreshResponse)
+def refresh_consolidation(consolidation_id: int, full: bool = False, db: Session = Depends(get_db)):
+    """
+    Onbellegi yeniler: her kaynakta yalnizca son yenilemeden sonra degisen
+    satirlar yeniden hesaplanir (full=true ile bastan). Kaynak tanimda
+    devam eden islem varsa bitmesi beklenir.
+    """
+    consolidation = _get_consolidation(db, consolidation_id)
+    results = BudgetConsolidationService.refresh(db, consolidation, full=full, wait=True)
+    return ConsolidationRefreshResponse(consolidation_id=consolidation_id, sources=results)
+
+
+@router.get("/consolidations/{consolidation_id}/aggregate", response_model=ConsolidationAggregateResponse)
+def aggregate_consolidation(
+    consolidation_id: int,
+    currency: Optional[str] = None,
+    group_by_entity_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Konsolidasyon toplamlari (donem x ortak olcu), istege bagli bir ortak
+    boyuta gore gruplanmis ve raporlama para birimine donusturulmus.
+    Okumadan once degisen kaynaklar artimli yenilenir.
+    """
+    consolidation = _get_consolidation(db, consolidation_id)
+    if group_by_entity_id is not None and group_by_entity_id not in (consolidation.dimension_entity_ids or []):
+        raise HTTPException(status_code=400, detail="Gruplama boyutu konsolidasyonun ortak boyutlarindan olmali")
+
+    refresh = BudgetConsolidationService.refresh(db, consolidation, wait=False)
+    consolidation = _get_consolidation(db, consolidation_id)
+
+    periods = _get_periods_for_version(db, consolidation.version)
+    period_infos = [
+        PeriodInfo(id=p.id, code=p.code, name=p.name, year=p.year, month=p.month, quarter=p.quarter)
+        for p in periods
+    ]
+    measure_codes = [m.code for m in consolidation.measures]
+    currency = currency.upper().strip() if currency else None
+
+    result = BudgetConsolidationService.aggregate(
+        db, consolidation, [p.id for p in periods], measure_codes, group_by_entity_id, currency
+    )
+    values = result["values"]
+
+    md_lookup = {}
+    md_ids = [int(k) for k in result["group_keys"] if k is not None and str(k).isdigit()]
+    if md_ids:
+        for md in db.query(MasterData).filter(MasterData.id.in_(md_ids)).all():
+            md_lookup[str(md.id)] = md
+
+    groups = []
+    for g, key in enumerate(result["group_keys"]):
+        md = md_lookup.get(key)
+        groups.append(BudgetAggregateGroup(
+            key=key,
+            code=md.code if md else None,
+            name=md.name if md else None,
+            totals={
+                str(period.id): {code: float(values[g, p, m]) for m, code in enumerate(measure_codes)}
+                for p, period in enumerate(periods)
+            },
+            measure_totals={code: float(values[g, :, m].sum()) for m, code in enumerate(measure_codes)},
+        ))
+
+    return ConsolidationAggregateResponse(
+        consolidation_id=consolidation_id,
+        currency_code=currency,
+        group_by_entity_id=group_by_entity_id,
+        periods=period_infos,
+        measures=measure_codes,
+        groups=groups,
+        grand_totals={code: float(values[:, :, m].sum()) for m, code in enumerate(measure_codes)},
+        conversion_errors=_conversion_errors(result["missing_rates"], periods),
+        stale_definition_ids=[r["definition_id"] for r in refresh if r["status"] == "busy"],
+    )
+
+
+@router.get("/consolidations/{consolidation_id}/export")
+def export_consolidation(
+    consolidation_id: int,
+    format: str = "csv",
+    currency: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Konsolidasyonu grid export formatinda (ortak boyutlar + donem + ortak olculer) aktarir."""
+    consolidation = _get_consolidation(db, consolidation_id)
+
+    export_format = (format or "csv").lower()
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Gecersiz format: {format} (csv, xlsx)")
+
+    BudgetConsolidationService.refresh(db, consolidation, wait=False)
+    consolidation = _get_consolidation(db, consolidation_id)
+
+    periods = _get_periods_for_version(db, consolidation.version)
+    currency = currency.upper().strip() if currency else None
+    context = GridExportService.prepare_consolidation(db, consolidation, periods, currency)
+
+    if export_format == "xlsx":
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        media_type = "text/csv; charset=utf-8"
+
+    return StreamingResponse(
+        GridExportService.stream(context, export_format),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename={consolidation.code}_consolidation.{export_format}"
+        }
+    )
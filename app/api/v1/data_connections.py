@@ -5,10 +5,13 @@ Dis kaynak sistemlerden (SAP OData, HANA DB, Excel/CSV/TXT, Parquet)
 veri cekip PostgreSQL staging tablolarina yazmak icin API endpointleri.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+import hashlib
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 from app.db.session import get_db
 from app.dependencies import get_current_user
@@ -38,9 +41,13 @@ from app.schemas.data_connection import (
 from app.services.connection_manager import ConnectionManager
 from app.services.data_sync_service import DataSyncService
 from app.services.data_mapping_service import DataMappingService
+from app.services.upload_cache import UploadCache
 
 router = APIRouter(prefix="/data-connections", tags=["Data Connections - Veri Baglantilari"])
 
+# Yuklenen dosyalar yukleme deposuna bu buyuklukte parcalarla yazilir
+UPLOAD_SPOOL_CHUNK = 1 << 20
+
 
 # =============================================
 # CONNECTION CRUD
@@ -223,6 +230,7 @@ async def test_connection_saved(
         raise HTTPException(status_code=404, detail="Baglanti bulunamadi.")
 
     config = {
+        "connection_id": conn.id,
         "host": conn.host,
         "port": conn.port,
         "database_name": conn.database_name,
@@ -313,6 +321,8 @@ async def create_query(
         odata_filter=data.odata_filter,
         odata_top=data.odata_top,
         file_parse_config=data.file_parse_config,
+        sync_mode=data.sync_mode,
+        watermark_column=data.watermark_column,
         staging_table_name=staging_name,
     )
     db.add(q)
@@ -426,11 +436,15 @@ async def detect_columns(
 async def detect_columns_from_file(
     connection_id: int,
     query_id: int,
-    file: UploadFile = File(...),
+    file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Yuklenen dosyadan kolon tiplerini tespit et."""
+    """
+    Yuklenen dosyadan kolon tiplerini tespit et. Dosya yerine daha once
+    donen upload_id gonderilebilir; ayni dosyanin tespiti depodan gelir.
+    """
     conn = db.query(DataConnection).filter(DataConnection.id == connection_id).first()
     if not conn:
         raise HTTPException(status_code=404, detail="Baglanti bulunamadi.")
@@ -442,11 +456,16 @@ async def detect_columns_from_file(
     if not q:
         raise HTTPException(status_code=404, detail="Sorgu bulunamadi.")
 
-    file_bytes = await file.read()
-    file_name = file.filename or "upload.csv"
+    upload = await _resolve_upload(file, upload_id)
 
     try:
-        result = DataSyncService.detect_columns(conn, q, file_bytes=file_bytes, file_name=file_name)
+        result = DataSyncService.detect_columns(
+            conn, q, file_path=upload["file_path"], file_name=upload["file_name"],
+            cache_dir=upload["cache_dir"]
+        )
+        # Tespit edilen CSV lehcesi (file_parse_config.detected) saklanir
+        db.commit()
+        result.upload_id = upload["upload_id"]
         return result
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Dosya kolon tespiti hatasi: {str(e)}")
@@ -552,11 +571,12 @@ async def trigger_sync(
 async def trigger_sync_from_file(
     connection_id: int,
     query_id: int,
-    file: UploadFile = File(...),
+    file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Dosyadan veri senkronizasyonu baslat."""
+    """Dosyadan (ya da daha once yuklenmis dosyanin upload_id'si ile) veri senkronizasyonu baslat."""
     conn = db.query(DataConnection).filter(DataConnection.id == connection_id).first()
     if not conn:
         raise HTTPException(status_code=404, detail="Baglanti bulunamadi.")
@@ -573,13 +593,13 @@ async def trigger_sync_from_file(
     if not q.columns:
         raise HTTPException(status_code=400, detail="Kolon tanimlari bos. Once kolon tespiti yapin.")
 
-    file_bytes = await file.read()
-    file_name = file.filename or "upload.csv"
+    upload = await _resolve_upload(file, upload_id)
     triggered_by = getattr(current_user, 'username', 'system')
 
     sync_log = DataSyncService.execute_sync(
         db, conn, q, triggered_by=triggered_by,
-        file_bytes=file_bytes, file_name=file_name
+        file_path=upload["file_path"], file_name=upload["file_name"],
+        cache_dir=upload["cache_dir"]
     )
 
     status_val = sync_log.status.value if hasattr(sync_log.status, 'value') else str(sync_log.status)
@@ -587,7 +607,8 @@ async def trigger_sync_from_file(
     return SyncTriggerResponse(
         sync_log_id=sync_log.id,
         status=status_val,
-        message=f"Sync {'basarili' if status_val == 'success' else 'basarisiz'}: {sync_log.inserted_rows or 0} satir.{error_detail}"
+        message=f"Sync {'basarili' if status_val == 'success' else 'basarisiz'}: {sync_log.inserted_rows or 0} satir.{error_detail}",
+        upload_id=upload["upload_id"]
     )
 
 
@@ -918,3 +939,42 @@ def _connection_to_response(db: Session, conn: DataConnection) -> DataConnection
         created_date=conn.created_date,
         updated_date=conn.updated_date,
     )
+
+
+async def _resolve_upload(file: Optional[UploadFile], upload_id: Optional[str]) -> dict:
+    """
+    Dosya geldiyse yukleme deposuna alir, gelmediyse upload_id kaydini
+    bulur. Donen kayit: {upload_id, file_name, file_path, cache_dir}.
+    """
+    if file is not None:
+        file_name = file.filename or "upload.csv"
+        spool_path, digest = await _spool_upload(file)
+        return UploadCache.put(spool_path, digest, file_name)
+
+    if not upload_id:
+        raise HTTPException(status_code=400, detail="Dosya ya da upload_id gerekli.")
+    upload = UploadCache.get(upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Yukleme bulunamadi, dosyayi tekrar yukleyin.")
+    return upload
+
+
+async def _spool_upload(file: UploadFile) -> Tuple[str, str]:
+    """
+    Yuklenen dosyayi UPLOAD_SPOOL_CHUNK'lik parcalarla yukleme deposundaki
+    gecici dosyaya yazarken SHA-256 ozetini hesaplar; dosya bellege
+    tamamen alinmaz. (gecici dosya yolu, ozet) dondurur.
+    """
+    file_name = file.filename or ""
+    suffix = f".{file_name.rsplit('.', 1)[-1].lower()}" if "." in file_name else ""
+    digest = hashlib.sha256()
+    tmp = UploadCache.spool_file(suffix)
+    try:
+        with tmp:
+            while chunk := await file.read(UPLOAD_SPOOL_CHUNK):
+                digest.update(chunk)
+                tmp.write(chunk)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+    return tmp.name, digest.hexdigest()
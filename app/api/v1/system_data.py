@@ -2,16 +2,23 @@
 System Data API - Sistem Verileri (Versiyon, Dönem, Parametre)
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 import logging
 
 from app.db.session import get_db
 from app.dependencies import get_current_user
 from app.models.user import User
-from app.models.system_data import BudgetVersion, BudgetPeriod, BudgetParameter, ParameterVersion, BudgetCurrency
+from app.models.system_data import BudgetVersion, BudgetPeriod, BudgetParameter, ParameterVersion, BudgetCurrency, BudgetCurrencyRate
+from app.services.rule_set_compiler import RuleSetCompiler
+from app.services.currency_conversion_service import CurrencyConverter
+from app.services.version_copy_service import VersionCopyService
+from app.services.budget_deletion_service import BudgetDeletionService
+from app.schemas.budget_entry import DeletionJobResponse
+from app.config import settings
 from app.schemas.system_data import (
     BudgetPeriodCreate,
     BudgetPeriodResponse,
@@ -29,6 +36,8 @@ from app.schemas.system_data import (
     BudgetCurrencyUpdate,
     BudgetCurrencyResponse,
     BudgetCurrencyListResponse,
+    BudgetCurrencyRateBulkUpsert,
+    BudgetCurrencyRateListResponse,
     VersionValueResponse,
     SystemDataSummary,
 )
@@ -280,7 +289,7 @@ async def list_versions(
 ):
     """Versiyon listesi"""
     try:
-        query = db.query(BudgetVersion)
+        query = db.query(BudgetVersion).filter(BudgetVersion.deleted_at.is_(None))
 
         if is_active is not None:
             query = query.filter(BudgetVersion.is_active == is_active)
@@ -309,7 +318,7 @@ async def get_version(
 ):
     """Versiyon detayı"""
     version = db.query(BudgetVersion).filter(BudgetVersion.id == version_id).first()
-    if not version:
+    if not version or version.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Versiyon bulunamadı")
 
     # Enrich with period info
@@ -375,7 +384,7 @@ async def update_version(
 ):
     """Versiyon güncelle"""
     version = db.query(BudgetVersion).filter(BudgetVersion.id == version_id).first()
-    if not version:
+    if not version or version.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Versiyon bulunamadı")
 
     if version.is_locked and not data.is_locked:
@@ -418,9 +427,9 @@ async def copy_version(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Versiyonu kopyala"""
+    """Versiyonu kopyala (istenirse parametreler ve bütçe verisiyle, dönem kaydırarak)"""
     source = db.query(BudgetVersion).filter(BudgetVersion.id == version_id).first()
-    if not source:
+    if not source or source.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Kaynak versiyon bulunamadı")
 
     # Check unique code
@@ -428,35 +437,44 @@ async def copy_version(
     if existing:
         raise HTTPException(status_code=400, detail=f"'{data.new_code}' kodu zaten mevcut")
 
+    try:
+        start_period_id = VersionCopyService.shift_period(db, source.start_period_id, data.period_offset)
+        end_period_id = VersionCopyService.shift_period(db, source.end_period_id, data.period_offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     new_version = BudgetVersion(
         code=data.new_code.upper(),
         name=data.new_name,
         description=data.description or source.description,
-        start_period_id=source.start_period_id,
-        end_period_id=source.end_period_id,
+        start_period_id=start_period_id,
+        end_period_id=end_period_id,
         is_active=True,
         is_locked=False,
         copied_from_id=source.id
     )
 
     db.add(new_version)
-    db.commit()
-    db.refresh(new_version)
+    db.flush()
 
-    # Copy parameters if requested
-    if data.copy_parameters:
-        source_pvs = db.query(ParameterVersion).filter(
-            ParameterVersion.version_id == version_id
-        ).all()
-        for pv in source_pvs:
-            new_pv = ParameterVersion(
-                parameter_id=pv.parameter_id,
-                version_id=new_version.id,
-                value=pv.value,
+    try:
+        # Copy parameters if requested
+        if data.copy_parameters:
+            count = VersionCopyService.copy_parameters(db, source.id, new_version.id)
+            logger.info(f"Copied {count} parameter values from {source.code} to {new_version.code}")
+
+        # Deep copy: definitions, dimensions, rows and cells (set based)
+        if data.copy_budget_data:
+            VersionCopyService.copy_budget_data(
+                db, source, new_version, data.period_offset, created_by=current_user.username
             )
-            db.add(new_pv)
-        db.commit()
-        logger.info(f"Copied {len(source_pvs)} parameter values from {source.code} to {new_version.code}")
+    except (ValueError, IntegrityError) as e:
+        db.rollback()
+        detail = str(e) if isinstance(e, ValueError) else "Kopyalanan tanım kodları mevcut kayıtlarla çakışıyor"
+        raise HTTPException(status_code=400, detail=detail)
+
+    db.commit()
+    db.refresh(new_version)
 
     logger.info(f"Version {source.code} copied to {new_version.code}")
 
@@ -469,23 +487,30 @@ async def copy_version(
     return new_version
 
 
-@router.delete("/versions/{version_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/versions/{version_id}", response_model=DeletionJobResponse, status_code=status.HTTP_202_ACCEPTED)
 async def delete_version(
     version_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Versiyon sil"""
+    """
+    Versiyonu ve bütçe tanımlarını silinmek üzere işaretler; veriler arka planda
+    parça parça silinir. İlerleme /budget-entries/deletion-jobs/{job_id} ile izlenir.
+    """
     version = db.query(BudgetVersion).filter(BudgetVersion.id == version_id).first()
-    if not version:
+    if not version or version.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Versiyon bulunamadı")
 
     if version.is_locked:
         raise HTTPException(status_code=400, detail="Kilitli versiyon silinemez")
 
-    db.delete(version)
+    job = BudgetDeletionService.request_version_deletion(db, version, requested_by=current_user.username)
     db.commit()
-    return None
+    RuleSetCompiler.invalidate_version(version_id)
+
+    background_tasks.add_task(BudgetDeletionService.run_job, job.id)
+    return BudgetDeletionService.job_status(job)
 
 
 # ============ Budget Parameter Endpoints ============
@@ -580,6 +605,7 @@ async def create_parameter(
 
     db.commit()
     db.refresh(parameter)
+    RuleSetCompiler.invalidate_parameters([parameter.id])
 
     return _build_parameter_response(parameter, db)
 
@@ -638,8 +664,12 @@ async def update_parameter(
             )
             db.add(pv)
 
+        # Kural seti plan cache'i parametre revizyonunu updated_date'ten okur
+        parameter.updated_date = func.now()
+
     db.commit()
     db.refresh(parameter)
+    RuleSetCompiler.invalidate_parameters([parameter_id])
 
     return _build_parameter_response(parameter, db)
 
@@ -657,6 +687,7 @@ async def delete_parameter(
 
     db.delete(parameter)
     db.commit()
+    RuleSetCompiler.invalidate_parameters([parameter_id])
     return None
 
 
@@ -761,3 +792,113 @@ async def delete_currency(
     db.delete(currency)
     db.commit()
     return None
+
+
+# ============ Currency Rate Endpoints ============
+
+@router.get("/currency-rates", response_model=BudgetCurrencyRateListResponse)
+async def list_currency_rates(
+    version_id: Optional[int] = None,
+    currency_code: Optional[str] = None,
+    period_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Doviz kuru listesi (version_id verilirse genel + versiyona ozel kurlar)"""
+    query = db.query(BudgetCurrencyRate)
+    if version_id is not None:
+        query = query.filter(
+            (BudgetCurrencyRate.version_id == version_id) | (BudgetCurrencyRate.version_id.is_(None))
+        )
+    if currency_code:
+        query = query.filter(BudgetCurrencyRate.currency_code == currency_code.upper())
+    if period_id is not None:
+        query = query.filter(BudgetCurrencyRate.period_id == period_id)
+    total = query.count()
+    items = query.order_by(
+        BudgetCurrencyRate.currency_code, BudgetCurrencyRate.period_id, BudgetCurrencyRate.version_id
+    ).all()
+    return BudgetCurrencyRateListResponse(
+        items=items, total=total, base_currency_code=settings.BASE_CURRENCY_CODE
+    )
+
+
+@router.put("/currency-rates", response_model=BudgetCurrencyRateListResponse)
+async def upsert_currency_rates(
+    data: BudgetCurrencyRateBulkUpsert,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Doviz kurlarini toplu ekle/guncelle (para birimi + donem + versiyon bazinda)"""
+    if not data.rates:
+        return BudgetCurrencyRateListResponse(items=[], total=0, base_currency_code=settings.BASE_CURRENCY_CODE)
+
+    period_ids = {r.period_id for r in data.rates}
+    found_periods = {
+        pid for (pid,) in db.query(BudgetPeriod.id).filter(BudgetPeriod.id.in_(period_ids)).all()
+    }
+    if period_ids - found_periods:
+        raise HTTPException(status_code=400, detail=f"Donem bulunamadi: {sorted(period_ids - found_periods)}")
+
+    version_ids = {r.version_id for r in data.rates if r.version_id is not None}
+    if version_ids:
+        found_versions = {
+            vid for (vid,) in db.query(BudgetVersion.id).filter(BudgetVersion.id.in_(version_ids)).all()
+        }
+        if version_ids - found_versions:
+            raise HTTPException(status_code=400, detail=f"Versiyon bulunamadi: {sorted(version_ids - found_versions)}")
+
+    codes = {r.currency_code.upper() for r in data.rates}
+    existing = {
+        (rate.currency_code, rate.period_id, rate.version_id): rate
+        for rate in db.query(BudgetCurrencyRate).filter(
+            BudgetCurrencyRate.currency_code.in_(codes),
+            BudgetCurrencyRate.period_id.in_(period_ids),
+        ).all()
+    }
+
+    saved = []
+    for item in data.rates:
+        key = (item.currency_code.upper(), item.period_id, item.version_id)
+        rate = existing.get(key)
+        if rate:
+            rate.rate = item.rate
+            rate.updated_date = func.now()
+        else:
+            rate = BudgetCurrencyRate(
+                currency_code=key[0],
+                period_id=item.period_id,
+                version_id=item.version_id,
+                rate=item.rate,
+            )
+            db.add(rate)
+            existing[key] = rate
+        saved.append(rate)
+
+    db.commit()
+    # Genel kur (version_id bos) degistiyse tum versiyonlarin cache'i silinir
+    for version_id in {r.version_id for r in data.rates}:
+        CurrencyConverter.invalidate(version_id)
+    for rate in saved:
+        db.refresh(rate)
+    return BudgetCurrencyRateListResponse(
+        items=saved, total=len(saved), base_currency_code=settings.BASE_CURRENCY_CODE
+    )
+
+
+@router.delete("/currency-rates/{rate_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_currency_rate(
+    rate_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Doviz kuru sil"""
+    rate = db.query(BudgetCurrencyRate).filter(BudgetCurrencyRate.id == rate_id).first()
+    if not rate:
+        raise HTTPException(status_code=404, detail="Doviz kuru bulunamadi")
+
+    version_id = rate.version_id
+    db.delete(rate)
+    db.commit()
+    CurrencyConverter.invalidate(version_id)
+    return None
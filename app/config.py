@@ -2,6 +2,9 @@
 Application Configuration
 """
 
+import os
+import tempfile
+
 from pydantic_settings import BaseSettings
 from pydantic import Field
 from typing import List
@@ -57,6 +60,44 @@ class Settings(BaseSettings):
         description="Token geçerlilik süresi (saat)"
     )
     
+    # ============ BUDGET SETTINGS ============
+    BASE_CURRENCY_CODE: str = Field(
+        default="TL",
+        description="Doviz kurlarinin ifade edildigi baz para birimi"
+    )
+    
+    # ============ FILE UPLOAD SETTINGS ============
+    UPLOAD_CACHE_DIR: str = Field(
+        default=os.path.join(tempfile.gettempdir(), "pbs_upload_cache"),
+        description="Yuklenen dosyalarin icerik adresli deposu"
+    )
+    UPLOAD_CACHE_MAX_BYTES: int = Field(
+        default=2 * 1024 ** 3,
+        description="Depo boyut siniri; asilinca en uzun suredir kullanilmayan yuklemeler silinir"
+    )
+    UPLOAD_CACHE_EVICT_GRACE: int = Field(
+        default=3600,
+        description="Bu kadar sn icinde kullanilan yuklemeler silinmez; bu kadar sn yazilmayan yarim yuklemeler silinir"
+    )
+
+    # ============ HANA SETTINGS ============
+    HANA_POOL_MAX_SIZE: int = Field(
+        default=4,
+        description="DataConnection basina acik tutulabilecek en fazla HANA baglantisi"
+    )
+    HANA_POOL_IDLE_TIMEOUT: int = Field(
+        default=300,
+        description="Bu kadar sn kullanilmayan havuz baglantisi kapatilir"
+    )
+    HANA_POOL_HEALTH_INTERVAL: int = Field(
+        default=60,
+        description="Havuz baglantisi bu kadar sn'den eskiyse verilmeden once SELECT 1 FROM DUMMY ile denenir"
+    )
+    HANA_POOL_ACQUIRE_TIMEOUT: int = Field(
+        default=60,
+        description="Havuz doluyken bos baglanti icin en fazla bekleme (sn)"
+    )
+
     class Config:
         env_file = ".env"
         case_sensitive = True
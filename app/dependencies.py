@@ -65,3 +65,20 @@ async def get_current_admin_user(
         )
     
     return current_user
+
+async def get_optional_user(
+    authorization: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+) -> Optional[UserResponse]:
+    """
+    Token varsa mevcut kullanıcıyı al, yoksa None (kimlik zorunlu olmayan uçlar için)
+    """
+    if not authorization:
+        return None
+    try:
+        scheme, token = authorization.split()
+    except ValueError:
+        return None
+    if scheme.lower() != "bearer":
+        return None
+    return AuthService.get_current_user(db, token)
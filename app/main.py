@@ -283,6 +283,10 @@ async def shutdown_event():
     except Exception:
         pass
 
+    # Havuzdaki HANA baglantilarini kapat
+    from app.services.hana_pool import HanaPool
+    HanaPool.close_all()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,8 +1,10 @@
 from .audit_log import AuditLog
-from .system_data import BudgetVersion, BudgetPeriod, BudgetParameter, ParameterVersion, BudgetCurrency
+from .system_data import BudgetVersion, BudgetPeriod, BudgetParameter, ParameterVersion, BudgetCurrency, BudgetCurrencyRate
 from .budget_entry import (
     BudgetType, BudgetTypeMeasure, BudgetDefinition, BudgetDefinitionDimension,
-    BudgetEntryRow, BudgetEntryCell, RuleSet, RuleSetItem
+    BudgetEntryRow, BudgetEntryCell, BudgetEntrySeries, RuleSet, RuleSetItem,
+    BudgetDeletionJob, BudgetCellHistory, BudgetConsolidation, BudgetConsolidationMeasure,
+    BudgetConsolidationSource, BudgetConsolidationMeasureMap, BudgetConsolidationCell
 )
 from .data_connection import (
     DataConnection, DataConnectionQuery, DataConnectionColumn,
@@ -21,14 +23,23 @@ __all__ = [
 	"BudgetParameter",
 	"ParameterVersion",
 	"BudgetCurrency",
+	"BudgetCurrencyRate",
 	"BudgetType",
 	"BudgetTypeMeasure",
 	"BudgetDefinition",
 	"BudgetDefinitionDimension",
 	"BudgetEntryRow",
 	"BudgetEntryCell",
+	"BudgetEntrySeries",
 	"RuleSet",
 	"RuleSetItem",
+	"BudgetDeletionJob",
+	"BudgetCellHistory",
+	"BudgetConsolidation",
+	"BudgetConsolidationMeasure",
+	"BudgetConsolidationSource",
+	"BudgetConsolidationMeasureMap",
+	"BudgetConsolidationCell",
 	"DataConnection",
 	"DataConnectionQuery",
 	"DataConnectionColumn",
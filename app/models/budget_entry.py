@@ -4,10 +4,10 @@ Butce tipi, tanim, satir, hucre, kural seti modelleri
 """
 
 from sqlalchemy import (
-    Column, String, Integer, Boolean, DateTime, ForeignKey,
-    Enum, UniqueConstraint, Index, Numeric, Text, func
+    Column, String, Integer, BigInteger, Boolean, DateTime, ForeignKey,
+    Enum, UniqueConstraint, Index, Numeric, Text, Float, LargeBinary, func
 )
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
 from sqlalchemy.orm import relationship
 import uuid
 import enum
@@ -41,6 +41,33 @@ class BudgetCellType(str, enum.Enum):
     parameter_calculated = "parameter_calculated"
 
 
+class BudgetStorageMode(str, enum.Enum):
+    cell = "cell"    # budget_entry_cells: hucre basina bir satir
+    dense = "dense"  # budget_entry_series: satir x olcu basina bir dizi
+
+
+class DeletionTargetType(str, enum.Enum):
+    definition = "definition"
+    version = "version"
+    snapshots = "snapshots"  # bir tanimin tum hesaplama snapshot'lari
+
+
+class DeletionJobStatus(str, enum.Enum):
+    pending = "pending"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+
+class CellChangeSource(str, enum.Enum):
+    save = "save"
+    calculate = "calculate"
+    undo = "undo"
+    file_import = "file_import"
+    mapping = "mapping"
+    allocation = "allocation"
+
+
 class RuleType(str, enum.Enum):
     fixed_value = "fixed_value"
     parameter_multiplier = "parameter_multiplier"
@@ -134,6 +161,12 @@ class BudgetDefinition(Base):
         Enum(BudgetDefinitionStatus, name="budgetdefinitionstatus", create_type=False),
         nullable=False, default=BudgetDefinitionStatus.draft, comment="Durum"
     )
+    storage_mode = Column(
+        Enum(BudgetStorageMode, name="budgetstoragemode", create_type=False),
+        nullable=False, default=BudgetStorageMode.cell, server_default="cell",
+        comment="Hucre depolama modu (cell / dense)"
+    )
+    deleted_at = Column(DateTime, nullable=True, comment="Silinmek uzere isaretlendigi zaman (arka planda silinir)")
     is_active = Column(Boolean, default=True, nullable=False)
     created_by = Column(String(100), nullable=True, comment="Olusturan kullanici")
     sort_order = Column(Integer, default=0)
@@ -146,7 +179,7 @@ class BudgetDefinition(Base):
     dimensions = relationship("BudgetDefinitionDimension", back_populates="budget_definition",
                               cascade="all, delete-orphan", order_by="BudgetDefinitionDimension.sort_order")
     rows = relationship("BudgetEntryRow", back_populates="budget_definition",
-                        cascade="all, delete-orphan")
+                        cascade="all, delete-orphan", passive_deletes=True)
 
     def __repr__(self):
         return f"<BudgetDefinition(id={self.id}, code={self.code})>"
@@ -184,6 +217,7 @@ class BudgetEntryRow(Base):
     Butce Giris Satiri modeli
     - Grid'deki bir satir = bir anaveri kombinasyonu
     - dimension_values: {"entity_id_1": master_data_id_1, "entity_id_2": master_data_id_2}
+    - revision: hucreleri degistiren her islemde artar, kaydetmede catisma kontrolu icin
     """
     __tablename__ = "budget_entry_rows"
 
@@ -193,6 +227,8 @@ class BudgetEntryRow(Base):
                                   nullable=False, index=True)
     dimension_values = Column(JSONB, nullable=False, comment="Boyut degerleri JSON: {entity_id: master_data_id}")
     currency_code = Column(String(10), nullable=True, default="TL", comment="Para birimi")
+    revision = Column(Integer, nullable=False, default=0, server_default="0",
+                      comment="Hucreleri her degistiginde artan revizyon (iyimser kilit)")
     is_active = Column(Boolean, default=True, nullable=False)
     sort_order = Column(Integer, default=0)
     created_date = Column(DateTime, default=func.now(), nullable=False)
@@ -200,7 +236,8 @@ class BudgetEntryRow(Base):
 
     # Relationships
     budget_definition = relationship("BudgetDefinition", back_populates="rows")
-    cells = relationship("BudgetEntryCell", back_populates="row", cascade="all, delete-orphan")
+    cells = relationship("BudgetEntryCell", back_populates="row", cascade="all, delete-orphan",
+                         passive_deletes=True)
 
     def __repr__(self):
         return f"<BudgetEntryRow(id={self.id}, dims={self.dimension_values})>"
@@ -212,14 +249,21 @@ class BudgetEntryCell(Base):
     - Bir satir + bir donem + bir olcu = bir hucre degeri
     - value: Numeric(20,4) gercek sayisal deger
     - cell_type: input / calculated / parameter_calculated
+    - budget_definition_id: bolumleme (LIST partition) anahtari; her tanimin
+      hucreleri ayri bir partition'da (budget_entry_cells_d<id>) tutulur;
+      default partition yoktur, partition tanimla birlikte olusturulur
     """
     __tablename__ = "budget_entry_cells"
     __table_args__ = (
-        UniqueConstraint('row_id', 'period_id', 'measure_code', name='uq_cell_row_period_measure'),
+        UniqueConstraint('budget_definition_id', 'row_id', 'period_id', 'measure_code',
+                         name='uq_cell_row_period_measure'),
         Index('ix_cell_row_period', 'row_id', 'period_id'),
+        {"postgresql_partition_by": "LIST (budget_definition_id)"},
     )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
+    budget_definition_id = Column(Integer, ForeignKey("budget_definitions.id", ondelete="CASCADE"),
+                                  primary_key=True, comment="Butce tanimi (partition anahtari)")
     row_id = Column(Integer, ForeignKey("budget_entry_rows.id", ondelete="CASCADE"), nullable=False)
     period_id = Column(Integer, ForeignKey("budget_periods.id"), nullable=False)
     measure_code = Column(String(50), nullable=False, comment="Olcu kodu (FIYAT, MIKTAR, TUTAR)")
@@ -246,6 +290,33 @@ class BudgetEntryCell(Base):
         return f"<BudgetEntryCell(id={self.id}, measure={self.measure_code}, value={self.value})>"
 
 
+class BudgetEntrySeries(Base):
+    """
+    Yogun (dense) depolama modunda satir x olcu serisi
+    - values: donem degerleri, start_month'tan itibaren ayda bir eleman (NULL = deger yok)
+    - start_month: ilk elemanin ay indeksi (yil * 12 + ay - 1)
+    - flags: donem basina bir bayt; bit 0-1 hucre tipi (0 input, 1 calculated,
+      2 parameter_calculated), bit 2 manuel override, bit 3 hucre var
+    """
+    __tablename__ = "budget_entry_series"
+    __table_args__ = (
+        UniqueConstraint('row_id', 'measure_code', name='uq_series_row_measure'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    budget_definition_id = Column(Integer, ForeignKey("budget_definitions.id", ondelete="CASCADE"),
+                                  nullable=False, index=True)
+    row_id = Column(Integer, ForeignKey("budget_entry_rows.id", ondelete="CASCADE"), nullable=False)
+    measure_code = Column(String(50), nullable=False, comment="Olcu kodu")
+    start_month = Column(Integer, nullable=False, comment="Ilk elemanin ay indeksi (yil*12+ay-1)")
+    values = Column(ARRAY(Float), nullable=False, comment="Donem degerleri")
+    flags = Column(LargeBinary, nullable=False, comment="Donem basina hucre tipi / override bayragi")
+    updated_date = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<BudgetEntrySeries(row_id={self.row_id}, measure={self.measure_code}, start={self.start_month})>"
+
+
 class RuleSet(Base):
     """
     Kural Seti modeli
@@ -331,16 +402,250 @@ class RuleSetItem(Base):
 
 
 class CalculationSnapshot(Base):
-    """Hesaplama oncesi snapshot - Geri alma (undo) icin"""
+    """
+    Hesaplama oncesi snapshot - Geri alma (undo) ve "snapshot aninda" okuma icin
+    - Hucre degerleri calculation_snapshot_cells tablosunda tutulur
+    - scope: hesaplanan dilim {row_ids, period_ids}; NULL = tum grid
+    """
     __tablename__ = "calculation_snapshots"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     budget_definition_id = Column(Integer, ForeignKey("budget_definitions.id", ondelete="CASCADE"), nullable=False, index=True)
-    snapshot_data = Column(JSONB, nullable=False, comment="Pre-calculation cell values")
     rule_set_ids = Column(JSONB, nullable=True, comment="Applied rule set IDs")
+    scope = Column(JSONB, nullable=True, comment="Calculation scope {row_ids, period_ids}; NULL = whole grid")
+    cell_count = Column(Integer, nullable=False, default=0, comment="Snapshot hucre sayisi")
     created_date = Column(DateTime, default=func.now(), nullable=False)
 
     definition = relationship("BudgetDefinition")
 
     def __repr__(self):
         return f"<CalculationSnapshot(id={self.id}, def_id={self.budget_definition_id})>"
+
+
+class CalculationSnapshotCell(Base):
+    """
+    Snapshot hucresi - hesaplama oncesi hucre degeri
+    - (snapshot, satir, donem, olcu) birincil anahtari ile snapshot'in
+      belirli satirlari JSONB cozumlemeden indeks uzerinden okunur
+    """
+    __tablename__ = "calculation_snapshot_cells"
+
+    snapshot_id = Column(Integer, ForeignKey("calculation_snapshots.id", ondelete="CASCADE"), primary_key=True)
+    row_id = Column(Integer, ForeignKey("budget_entry_rows.id", ondelete="CASCADE"), primary_key=True)
+    period_id = Column(Integer, primary_key=True)
+    measure_code = Column(String(50), primary_key=True, comment="Olcu kodu")
+    value = Column(Numeric(20, 4), nullable=True, comment="Hucre degeri")
+    cell_type = Column(
+        Enum(BudgetCellType, name="budgetcelltype", create_type=False),
+        nullable=False, default=BudgetCellType.input, comment="Hucre tipi"
+    )
+    is_manual_override = Column(Boolean, nullable=False, default=False)
+    source_rule_id = Column(Integer, nullable=True, comment="Kaynak kural")
+    source_param_id = Column(Integer, nullable=True, comment="Kaynak parametre")
+
+    def __repr__(self):
+        return f"<CalculationSnapshotCell(snapshot={self.snapshot_id}, row={self.row_id}, period={self.period_id}, measure={self.measure_code})>"
+
+
+class BudgetCellHistory(Base):
+    """
+    Hucre degisiklik gecmisi (yalnizca ekleme yapilir)
+    - Kaydetme, hesaplama, geri alma, ice aktarma, dagitim ve eslestirme
+      degistirdikleri hucrelerin eski / yeni degerini yazar
+    - changed_at ile aylik RANGE partition'lidir (budget_cell_history_yYYYYmMM);
+      eski aylar partition drop ile temizlenir
+    - Tanim / satir silinse de gecmis korunur (yabanci anahtar yok)
+    """
+    __tablename__ = "budget_cell_history"
+    __table_args__ = (
+        Index('ix_cell_history_row', 'row_id', 'id'),
+        Index('ix_cell_history_cell', 'row_id', 'period_id', 'measure_code', 'id'),
+        Index('ix_cell_history_definition', 'budget_definition_id', 'id'),
+        {"postgresql_partition_by": "RANGE (changed_at)"},
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    changed_at = Column(DateTime, primary_key=True, default=func.now(), comment="Degisiklik zamani (partition anahtari)")
+    budget_definition_id = Column(Integer, nullable=False)
+    row_id = Column(Integer, nullable=False)
+    period_id = Column(Integer, nullable=False)
+    measure_code = Column(String(50), nullable=False, comment="Olcu kodu")
+    old_value = Column(Numeric(20, 4), nullable=True, comment="Onceki deger (NULL = hucre yoktu)")
+    new_value = Column(Numeric(20, 4), nullable=True, comment="Yeni deger (NULL = hucre silindi)")
+    source = Column(
+        Enum(CellChangeSource, name="cellchangesource", create_type=False),
+        nullable=False, comment="Degisikligi yapan islem"
+    )
+    reference_id = Column(Integer, nullable=True, comment="Iliskili kayit (snapshot, eslestirme vb.)")
+    changed_by = Column(String(100), nullable=True, comment="Kullanici adi")
+
+    def __repr__(self):
+        return f"<BudgetCellHistory(id={self.id}, row={self.row_id}, period={self.period_id}, measure={self.measure_code})>"
+
+
+class BudgetDeletionJob(Base):
+    """
+    Arka plan silme isi
+    - Tanim / versiyon / snapshot silme istegi hedefi hemen isaretler,
+      veri parca parca (veya partition drop ile) ayri transaction'larda silinir
+    - deleted_items / total_items ilerlemeyi gosterir
+    """
+    __tablename__ = "budget_deletion_jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    target_type = Column(
+        Enum(DeletionTargetType, name="deletiontargettype", create_type=False),
+        nullable=False, comment="definition / version / snapshots"
+    )
+    target_id = Column(Integer, nullable=False, comment="Silinen tanim veya versiyon id")
+    target_code = Column(String(50), nullable=True, comment="Silinen kaydin kodu (bilgi amacli)")
+    status = Column(
+        Enum(DeletionJobStatus, name="deletionjobstatus", create_type=False),
+        nullable=False, default=DeletionJobStatus.pending
+    )
+    current_step = Column(String(100), nullable=True, comment="Calisan adim")
+    total_items = Column(Integer, nullable=True, comment="Silinecek kayit sayisi (tahmini)")
+    deleted_items = Column(Integer, nullable=False, default=0, comment="Silinen kayit sayisi")
+    error_message = Column(Text, nullable=True)
+    requested_by = Column(String(100), nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    created_date = Column(DateTime, default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<BudgetDeletionJob(id={self.id}, {self.target_type}={self.target_id}, status={self.status})>"
+
+
+class BudgetConsolidation(Base):
+    """
+    Konsolidasyon tanimi
+    - Ayni versiyondaki birden fazla butce taniminin olculerini ortak bir
+      olcu setine, satirlarini ortak bir boyut alt kumesine indirger
+    - Sonuc budget_consolidation_cells tablosunda onbelleklenir
+    """
+    __tablename__ = "budget_consolidations"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    version_id = Column(Integer, ForeignKey("budget_versions.id", ondelete="CASCADE"), nullable=False, comment="Butce Versiyonu")
+    code = Column(String(50), unique=True, nullable=False, index=True, comment="Konsolidasyon Kodu")
+    name = Column(String(200), nullable=False, comment="Konsolidasyon Adi")
+    description = Column(String(500), comment="Aciklama")
+    dimension_entity_ids = Column(JSONB, nullable=False, default=list, comment="Ortak boyut entity id'leri")
+    is_active = Column(Boolean, default=True, nullable=False)
+    created_by = Column(String(100), nullable=True, comment="Olusturan kullanici")
+    created_date = Column(DateTime, default=func.now(), nullable=False)
+    updated_date = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
+
+    # Relationships
+    version = relationship("BudgetVersion")
+    measures = relationship("BudgetConsolidationMeasure", back_populates="consolidation",
+                            cascade="all, delete-orphan", order_by="BudgetConsolidationMeasure.sort_order")
+    sources = relationship("BudgetConsolidationSource", back_populates="consolidation",
+                           cascade="all, delete-orphan", passive_deletes=True,
+                           order_by="BudgetConsolidationSource.sort_order")
+
+    def __repr__(self):
+        return f"<BudgetConsolidation(id={self.id}, code={self.code})>"
+
+
+class BudgetConsolidationMeasure(Base):
+    """
+    Konsolidasyonun ortak olcusu
+    - data_type currency ise raporlama para birimine donusturulur
+    """
+    __tablename__ = "budget_consolidation_measures"
+    __table_args__ = (
+        UniqueConstraint('consolidation_id', 'code', name='uq_consolidation_measure'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    consolidation_id = Column(Integer, ForeignKey("budget_consolidations.id", ondelete="CASCADE"), nullable=False)
+    code = Column(String(50), nullable=False, comment="Olcu Kodu")
+    name = Column(String(200), nullable=False, comment="Olcu Adi")
+    data_type = Column(
+        Enum(MeasureDataType, name="measuredatatype", create_type=False),
+        nullable=False, default=MeasureDataType.decimal, comment="Veri tipi"
+    )
+    sort_order = Column(Integer, default=0)
+
+    # Relationships
+    consolidation = relationship("BudgetConsolidation", back_populates="measures")
+
+    def __repr__(self):
+        return f"<BudgetConsolidationMeasure(consolidation={self.consolidation_id}, code={self.code})>"
+
+
+class BudgetConsolidationSource(Base):
+    """
+    Konsolidasyona giren butce tanimi
+    - history_watermark: onbellege islenmis son budget_cell_history id'si;
+      yenilemede yalnizca bu id'den sonra degisen satirlar yeniden hesaplanir
+    """
+    __tablename__ = "budget_consolidation_sources"
+    __table_args__ = (
+        UniqueConstraint('consolidation_id', 'budget_definition_id', name='uq_consolidation_source'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    consolidation_id = Column(Integer, ForeignKey("budget_consolidations.id", ondelete="CASCADE"), nullable=False)
+    budget_definition_id = Column(Integer, ForeignKey("budget_definitions.id", ondelete="CASCADE"), nullable=False, index=True)
+    history_watermark = Column(BigInteger, nullable=False, default=0, comment="Islenmis son hucre gecmisi id'si")
+    refreshed_at = Column(DateTime, nullable=True, comment="Son yenileme (NULL = hic hesaplanmadi)")
+    sort_order = Column(Integer, default=0)
+
+    # Relationships
+    consolidation = relationship("BudgetConsolidation", back_populates="sources")
+    budget_definition = relationship("BudgetDefinition")
+    measure_maps = relationship("BudgetConsolidationMeasureMap", back_populates="source",
+                                cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f"<BudgetConsolidationSource(consolidation={self.consolidation_id}, def={self.budget_definition_id})>"
+
+
+class BudgetConsolidationMeasureMap(Base):
+    """
+    Kaynak olcu -> ortak olcu eslemesi
+    - Ortak olcu = SUM(kaynak olcu * factor); ornek: gider tanimi TUTAR -> NET_TUTAR, factor -1
+    - Birden fazla kaynak olcu ayni ortak olcuye eslenebilir
+    """
+    __tablename__ = "budget_consolidation_measure_maps"
+    __table_args__ = (
+        UniqueConstraint('source_id', 'source_measure_code', 'target_measure_code', name='uq_consolidation_measure_map'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source_id = Column(Integer, ForeignKey("budget_consolidation_sources.id", ondelete="CASCADE"), nullable=False)
+    source_measure_code = Column(String(50), nullable=False, comment="Kaynak tanim olcu kodu")
+    target_measure_code = Column(String(50), nullable=False, comment="Ortak olcu kodu")
+    factor = Column(Numeric(20, 6), nullable=False, default=1, comment="Carpan")
+
+    # Relationships
+    source = relationship("BudgetConsolidationSource", back_populates="measure_maps")
+
+    def __repr__(self):
+        return f"<BudgetConsolidationMeasureMap({self.source_measure_code} -> {self.target_measure_code})>"
+
+
+class BudgetConsolidationCell(Base):
+    """
+    Konsolidasyon onbellegi
+    - Kaynak basina (ortak boyut degerleri, para birimi, donem, ortak olcu) toplami
+    - Kaynak bazinda tutuldugu icin bir tanimin degisikligi yalnizca kendi
+      katkisini yeniden hesaplatir; okumalar kaynaklar uzerinden toplar
+    """
+    __tablename__ = "budget_consolidation_cells"
+    __table_args__ = (
+        Index('ix_consolidation_cells_consolidation', 'consolidation_id', 'period_id'),
+    )
+
+    source_id = Column(Integer, ForeignKey("budget_consolidation_sources.id", ondelete="CASCADE"), primary_key=True)
+    dimension_values = Column(JSONB, primary_key=True, comment="Ortak boyut degerleri {entity_id: master_data_id}")
+    currency_code = Column(String(10), primary_key=True, comment="Satir para birimi")
+    period_id = Column(Integer, primary_key=True)
+    measure_code = Column(String(50), primary_key=True, comment="Ortak olcu kodu")
+    consolidation_id = Column(Integer, ForeignKey("budget_consolidations.id", ondelete="CASCADE"), nullable=False)
+    value = Column(Numeric(20, 4), nullable=False)
+
+    def __repr__(self):
+        return f"<BudgetConsolidationCell(source={self.source_id}, period={self.period_id}, measure={self.measure_code})>"
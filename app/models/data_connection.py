@@ -8,7 +8,7 @@ veri cekip PostgreSQL staging tablolarina yazmak icin kullanilir.
 import enum
 import uuid
 from sqlalchemy import (
-    Column, Integer, String, Boolean, Text, DateTime, Enum, ForeignKey,
+    Column, Integer, String, Boolean, Text, DateTime, Float, Enum, ForeignKey,
     UniqueConstraint, Index
 )
 from sqlalchemy.dialects.postgresql import JSONB
@@ -32,6 +32,11 @@ class SyncStatus(str, enum.Enum):
     failed = "failed"
 
 
+class SyncMode(str, enum.Enum):
+    full = "full"     # TRUNCATE + tam yukleme
+    delta = "delta"   # watermark'tan sonraki kayitlar, anahtar kolonlarla upsert
+
+
 class ColumnDataType(str, enum.Enum):
     string = "string"
     integer = "integer"
@@ -140,6 +145,15 @@ class DataConnectionQuery(BaseModel):
     # Dosya parse ayarlari
     file_parse_config = Column(JSONB, nullable=True)
 
+    # Senkronizasyon modu; delta icin watermark kolonu (source_name) ve
+    # is_primary_key kolonlari gerekir
+    sync_mode = Column(
+        Enum(SyncMode, name="syncmode", create_type=False),
+        nullable=False,
+        default=SyncMode.full
+    )
+    watermark_column = Column(String(200), nullable=True)
+
     # Staging tablo bilgileri
     staging_table_name = Column(String(100), nullable=True)
     staging_table_created = Column(Boolean, default=False, nullable=False)
@@ -242,6 +256,10 @@ class DataSyncLog(BaseModel):
     completed_at = Column(DateTime, nullable=True)
     total_rows = Column(Integer, nullable=True)
     inserted_rows = Column(Integer, nullable=True)
+    rows_per_second = Column(Float, nullable=True)
+    sync_mode = Column(Enum(SyncMode, name="syncmode", create_type=False), nullable=True)
+    watermark_value = Column(String(100), nullable=True)  # Basarili sync sonrasi en buyuk watermark
+    watermark_column = Column(String(200), nullable=True)  # watermark_value'nun kolonu (source_name)
     error_message = Column(Text, nullable=True)
     triggered_by = Column(String(100), nullable=True)
 
@@ -2,7 +2,7 @@
 System Data Models - Sistem Verileri (Versiyon, Dönem, Parametre)
 """
 
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, Enum, UniqueConstraint, func
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, Enum, UniqueConstraint, Index, Numeric, func, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
@@ -36,6 +36,7 @@ class BudgetVersion(Base):
     is_active = Column(Boolean, default=True, nullable=False)
     is_locked = Column(Boolean, default=False, nullable=False, comment="Kilitli (değişiklik yapılamaz)")
     copied_from_id = Column(Integer, ForeignKey("budget_versions.id"), nullable=True, comment="Kopyalandığı versiyon")
+    deleted_at = Column(DateTime, nullable=True, comment="Silinmek üzere işaretlendiği zaman (arka planda silinir)")
     sort_order = Column(Integer, default=0)
     created_date = Column(DateTime, default=func.now(), nullable=False)
     updated_date = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
@@ -141,6 +142,36 @@ class BudgetCurrency(Base):
         return f"<BudgetCurrency(id={self.id}, code={self.code}, name={self.name})>"
 
 
+class BudgetCurrencyRate(Base):
+    """
+    Doviz Kuru modeli
+    - Para birimi + donem bazinda baz para birimi karsiligi (1 birim = rate baz para birimi)
+    - version_id bos ise tum versiyonlar icin gecerli, dolu ise o versiyona ozel (oncelikli)
+    """
+    __tablename__ = "budget_currency_rates"
+    __table_args__ = (
+        UniqueConstraint('currency_code', 'period_id', 'version_id', name='uq_currency_rate'),
+        Index('uq_currency_rate_global', 'currency_code', 'period_id', unique=True,
+              postgresql_where=text("version_id IS NULL")),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    currency_code = Column(String(10), nullable=False, index=True, comment="Para Birimi Kodu")
+    period_id = Column(Integer, ForeignKey("budget_periods.id", ondelete="CASCADE"), nullable=False)
+    version_id = Column(Integer, ForeignKey("budget_versions.id", ondelete="CASCADE"), nullable=True,
+                        comment="Bos ise tum versiyonlar icin gecerli")
+    rate = Column(Numeric(20, 8), nullable=False, comment="1 birimin baz para birimi karsiligi")
+    created_date = Column(DateTime, default=func.now(), nullable=False)
+    updated_date = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
+
+    # Relationships
+    period = relationship("BudgetPeriod")
+    version = relationship("BudgetVersion")
+
+    def __repr__(self):
+        return f"<BudgetCurrencyRate({self.currency_code}, period={self.period_id}, version={self.version_id}, rate={self.rate})>"
+
+
 class ParameterVersion(Base):
     """
     Parametre-Versiyon ara tablosu
@@ -83,6 +83,7 @@ class BudgetDefinitionResponse(BaseModel):
     budget_type_name: Optional[str] = None
     dimensions: List[DimensionInfo] = []
     status: str = "draft"
+    storage_mode: str = "cell"
     is_active: bool = True
     row_count: int = 0
     created_by: Optional[str] = None
@@ -97,6 +98,17 @@ class BudgetDefinitionListResponse(BaseModel):
     total: int
 
 
+class StorageModeRequest(BaseModel):
+    storage_mode: str  # cell / dense
+
+
+class StorageModeResponse(BaseModel):
+    definition_id: int
+    previous_mode: str
+    storage_mode: str
+    converted_records: int = 0
+
+
 # ============ Budget Grid ============
 
 class PeriodInfo(BaseModel):
@@ -117,6 +129,7 @@ class BudgetGridRow(BaseModel):
     row_id: int
     dimension_values: Dict[str, Any]  # {entity_id: {id, code, name}}
     currency_code: Optional[str] = "TL"
+    revision: int = 0  # kaydetmede iyimser kontrol icin geri gonderilir
     cells: Dict[str, Dict[str, CellData]]  # {period_id: {measure_code: CellData}}
 
 
@@ -126,6 +139,29 @@ class BudgetGridResponse(BaseModel):
     measures: List[BudgetTypeMeasureResponse]
     rows: List[BudgetGridRow]
     total_rows: int = 0
+    currency_code: Optional[str] = None  # raporlama para birimi (donusum yapildiysa)
+    conversion_errors: List[str] = []
+    as_of_snapshot_id: Optional[int] = None  # snapshot aninda okunduysa (salt okunur)
+
+
+class BudgetAggregateGroup(BaseModel):
+    key: Optional[str] = None  # gruplama anaverisinin id'si (gruplama yoksa None)
+    code: Optional[str] = None
+    name: Optional[str] = None
+    totals: Dict[str, Dict[str, float]]  # {period_id: {measure_code: toplam}}
+    measure_totals: Dict[str, float]  # {measure_code: tum donemler toplami}
+
+
+class BudgetAggregateResponse(BaseModel):
+    definition_id: int
+    currency_code: Optional[str] = None
+    group_by_entity_id: Optional[int] = None
+    periods: List[PeriodInfo]
+    measures: List[str]
+    groups: List[BudgetAggregateGroup] = []
+    grand_totals: Dict[str, float] = {}
+    conversion_errors: List[str] = []
+    as_of_snapshot_id: Optional[int] = None
 
 
 class BudgetCellUpdate(BaseModel):
@@ -133,15 +169,43 @@ class BudgetCellUpdate(BaseModel):
     period_id: int
     measure_code: str
     value: Optional[float] = None
+    revision: Optional[int] = None  # duzenlenen satirin grid'den okunan revizyonu
 
 
 class BudgetBulkSaveRequest(BaseModel):
     cells: List[BudgetCellUpdate]
+    on_conflict: str = "reject"  # reject: eski revizyonlu hucreler yazilmaz; overwrite: yine de yazilir
+
+
+class CellConflict(BaseModel):
+    row_id: int
+    period_id: int
+    measure_code: str
+    revision: Optional[int] = None  # istemcinin gonderdigi revizyon
+    current_revision: int
+    current_value: Optional[float] = None
 
 
 class BudgetBulkSaveResponse(BaseModel):
     saved_count: int = 0
     errors: List[str] = []
+    conflicts: List[CellConflict] = []
+    revisions: Dict[str, int] = {}  # {row_id: yeni revizyon}
+
+
+class DefinitionLockHolder(BaseModel):
+    pid: int
+    mode: str  # exclusive (hesaplama / geri alma) / shared (kaydetme)
+    granted: bool = True
+    transaction_start: Optional[datetime] = None
+    application_name: Optional[str] = None
+
+
+class DefinitionLockStatus(BaseModel):
+    definition_id: int
+    locked: bool = False
+    exclusive: bool = False
+    holders: List[DefinitionLockHolder] = []
 
 
 class BudgetRowCurrencyUpdate(BaseModel):
@@ -249,8 +313,24 @@ class RuleSetListResponse(BaseModel):
     total: int
 
 
+class CalculateDimensionFilter(BaseModel):
+    entity_id: int
+    codes: Optional[List[str]] = None  # anaveri kodlari (entity_id icin)
+    attribute_code: Optional[str] = None  # veya attribute kosulu
+    operator: str = "eq"  # eq, ne, in
+    value: Optional[str] = None
+
+
+class CalculateScope(BaseModel):
+    dimension_filters: List[CalculateDimensionFilter] = []
+    row_ids: Optional[List[int]] = None
+    period_start_id: Optional[int] = None
+    period_end_id: Optional[int] = None
+
+
 class CalculateRequest(BaseModel):
     rule_set_ids: Optional[List[int]] = []
+    scope: Optional[CalculateScope] = None  # verilmezse tum grid hesaplanir
 
 
 class CalculateResponse(BaseModel):
@@ -258,9 +338,229 @@ class CalculateResponse(BaseModel):
     formula_cells: int = 0
     skipped_manual: int = 0
     snapshot_id: Optional[int] = None
+    row_count: int = 0
+    period_count: int = 0
     errors: List[str] = []
 
 
 class UndoResponse(BaseModel):
     restored_cells: int = 0
     snapshot_id: int = 0
+
+
+class CalculationSnapshotResponse(BaseModel):
+    id: int
+    budget_definition_id: int
+    rule_set_ids: List[int] = []
+    scope_row_count: Optional[int] = None  # None = tum grid
+    scope_period_ids: Optional[List[int]] = None
+    cell_count: int = 0
+    created_date: datetime
+
+
+class CalculationSnapshotListResponse(BaseModel):
+    items: List[CalculationSnapshotResponse]
+    total: int
+
+
+# ============ Cell History ============
+
+class CellHistoryEntry(BaseModel):
+    id: int
+    changed_at: datetime
+    row_id: int
+    period_id: int
+    measure_code: str
+    old_value: Optional[float] = None  # None = hucre yoktu
+    new_value: Optional[float] = None  # None = hucre silindi
+    source: str  # save / calculate / undo / file_import / mapping / allocation
+    reference_id: Optional[int] = None  # snapshot_id (calculate / undo) veya mapping id
+    changed_by: Optional[str] = None
+
+
+class CellHistoryListResponse(BaseModel):
+    items: List[CellHistoryEntry]
+    next_before_id: Optional[int] = None  # sonraki sayfa icin before_id; None = son sayfa
+
+
+# ============ Sensitivity ============
+
+class SensitivityRequest(BaseModel):
+    parameter_id: int
+    rule_set_ids: List[int] = []
+    values: Optional[List[float]] = None  # verilmezse range_start/range_end/step kullanilir
+    range_start: Optional[float] = None
+    range_end: Optional[float] = None
+    step: Optional[float] = None
+
+
+class SensitivityPoint(BaseModel):
+    parameter_value: float
+    totals: Dict[str, float]  # {measure_code: toplam}
+    deltas: Dict[str, float]  # {measure_code: toplam - baz toplam}
+    delta_percents: Dict[str, Optional[float]]
+
+
+class SensitivityResponse(BaseModel):
+    definition_id: int
+    parameter_id: int
+    parameter_code: str
+    base_value: Optional[float] = None
+    measures: List[str] = []
+    base_totals: Dict[str, float] = {}
+    points: List[SensitivityPoint] = []
+    row_count: int = 0
+    period_count: int = 0
+
+
+# ============ Allocation ============
+
+class AllocationRequest(BaseModel):
+    measure_code: str  # dagitilacak input olcu
+    total: float  # hedef toplam (kapsamdaki tum hucreler icin)
+    scope: Optional[CalculateScope] = None  # boyut grubu x donem araligi
+    driver: str = "equal"  # equal, measure, version, seasonality
+    driver_measure_code: Optional[str] = None  # measure: oran olcusu; version: varsayilan measure_code
+    driver_version_id: Optional[int] = None  # version: onceki versiyon
+    driver_definition_id: Optional[int] = None  # version: verilmezse ayni butce tipindeki tanim
+    seasonality: Optional[List[float]] = None  # donem basina veya 12 aylik agirliklar
+    decimals: Optional[int] = None  # verilmezse olcunun ondalik basamagi
+
+
+class AllocationResponse(BaseModel):
+    measure_code: str
+    driver: str
+    total: float
+    allocated_total: float
+    decimals: int
+    cell_count: int = 0
+    row_count: int = 0
+    period_count: int = 0
+
+
+# ============ Import ============
+
+class GridImportResponse(BaseModel):
+    layout: str  # long, wide
+    processed_rows: int = 0  # dosyadaki kaynak satir sayisi
+    created_rows: int = 0  # yeni olusturulan butce satirlari
+    upserted_cells: int = 0
+    rejected_rows: int = 0
+    reject_file_id: Optional[str] = None  # /grid/{def_id}/import/rejects/{id} ile indirilir
+    ignored_columns: List[str] = []
+    errors: List[str] = []  # ilk hatalar
+
+
+# ============ Deletion Jobs ============
+
+class DeletionJobResponse(BaseModel):
+    id: int
+    target_type: str
+    target_id: int
+    target_code: Optional[str] = None
+    status: str
+    current_step: Optional[str] = None
+    total_items: Optional[int] = None
+    deleted_items: int = 0
+    progress: Optional[float] = None  # 0-100
+    error_message: Optional[str] = None
+    requested_by: Optional[str] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    created_date: Optional[datetime] = None
+
+
+# ============ Consolidation ============
+
+class ConsolidationMeasureItem(BaseModel):
+    code: str
+    name: Optional[str] = None
+    data_type: str = "decimal"  # currency olculer raporlama para birimine donusturulur
+    sort_order: int = 0
+
+
+class ConsolidationMeasureMapItem(BaseModel):
+    source_measure_code: str
+    target_measure_code: str
+    factor: float = 1.0  # ortak olcu = SUM(kaynak olcu * factor)
+
+
+class ConsolidationSourceItem(BaseModel):
+    budget_definition_id: int
+    measure_maps: List[ConsolidationMeasureMapItem] = []  # bos ise ayni kodlu olculer eslenir
+
+
+class BudgetConsolidationCreate(BaseModel):
+    version_id: int
+    code: str
+    name: str
+    description: Optional[str] = None
+    dimension_entity_ids: List[int] = []  # ortak boyutlar (tum kaynaklarda bulunmali)
+    measures: List[ConsolidationMeasureItem]
+    sources: List[ConsolidationSourceItem]
+
+
+class BudgetConsolidationUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    is_active: Optional[bool] = None
+    # Asagidakilerden biri verilirse yapi yeniden yazilir ve onbellek silinir
+    dimension_entity_ids: Optional[List[int]] = None
+    measures: Optional[List[ConsolidationMeasureItem]] = None
+    sources: Optional[List[ConsolidationSourceItem]] = None
+
+
+class ConsolidationSourceResponse(BaseModel):
+    id: int
+    budget_definition_id: int
+    definition_code: Optional[str] = None
+    definition_name: Optional[str] = None
+    measure_maps: List[ConsolidationMeasureMapItem] = []
+    history_watermark: int = 0
+    refreshed_at: Optional[datetime] = None
+
+
+class BudgetConsolidationResponse(BaseModel):
+    id: int
+    code: str
+    name: str
+    description: Optional[str] = None
+    version_id: int
+    version_code: Optional[str] = None
+    dimensions: List[DimensionInfo] = []
+    measures: List[ConsolidationMeasureItem] = []
+    sources: List[ConsolidationSourceResponse] = []
+    is_active: bool = True
+    created_by: Optional[str] = None
+    created_date: Optional[datetime] = None
+    updated_date: Optional[datetime] = None
+
+
+class BudgetConsolidationListResponse(BaseModel):
+    items: List[BudgetConsolidationResponse]
+    total: int
+
+
+class ConsolidationSourceRefresh(BaseModel):
+    definition_id: int
+    definition_code: Optional[str] = None
+    status: str  # full, incremental, current, busy, deleted
+    changed_rows: int = 0
+    cells_written: int = 0
+
+
+class ConsolidationRefreshResponse(BaseModel):
+    consolidation_id: int
+    sources: List[ConsolidationSourceRefresh] = []
+
+
+class ConsolidationAggregateResponse(BaseModel):
+    consolidation_id: int
+    currency_code: Optional[str] = None
+    group_by_entity_id: Optional[int] = None
+    periods: List[PeriodInfo]
+    measures: List[str]
+    groups: List[BudgetAggregateGroup] = []
+    grand_totals: Dict[str, float] = {}
+    conversion_errors: List[str] = []
+    stale_definition_ids: List[int] = []  # kilitli oldugu icin yenilenemeyen kaynaklar
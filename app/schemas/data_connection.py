@@ -86,6 +86,8 @@ class DataConnectionQueryCreate(BaseModel):
     odata_filter: Optional[str] = Field(None, max_length=1000)
     odata_top: Optional[int] = None
     file_parse_config: Optional[dict] = None
+    sync_mode: str = Field("full", pattern="^(full|delta)$", description="full, delta")
+    watermark_column: Optional[str] = Field(None, max_length=200, description="Delta icin watermark kolonu (source_name)")
 
 
 class DataConnectionQueryUpdate(BaseModel):
@@ -98,6 +100,8 @@ class DataConnectionQueryUpdate(BaseModel):
     odata_filter: Optional[str] = Field(None, max_length=1000)
     odata_top: Optional[int] = None
     file_parse_config: Optional[dict] = None
+    sync_mode: Optional[str] = Field(None, pattern="^(full|delta)$", description="full, delta")
+    watermark_column: Optional[str] = Field(None, max_length=200)
     is_active: Optional[bool] = None
 
 
@@ -130,6 +134,8 @@ class DataConnectionQueryResponse(BaseModel):
     odata_filter: Optional[str] = None
     odata_top: Optional[int] = None
     file_parse_config: Optional[dict] = None
+    sync_mode: str = "full"
+    watermark_column: Optional[str] = None
     staging_table_name: Optional[str] = None
     staging_table_created: bool
     columns: List[DataConnectionColumnResponse] = []
@@ -186,6 +192,10 @@ class DataSyncLogResponse(BaseModel):
     completed_at: Optional[datetime] = None
     total_rows: Optional[int] = None
     inserted_rows: Optional[int] = None
+    rows_per_second: Optional[float] = None
+    sync_mode: Optional[str] = None
+    watermark_value: Optional[str] = None
+    watermark_column: Optional[str] = None
     error_message: Optional[str] = None
     triggered_by: Optional[str] = None
     created_date: datetime
@@ -227,12 +237,18 @@ class DetectedColumn(BaseModel):
     sample_values: List[str] = []
     is_nullable: bool = True
     max_length: Optional[int] = None
+    null_ratio: Optional[float] = None  # Ornekte bos deger orani (0-1)
+    distinct_count: Optional[int] = None  # Farkli deger sayisi (ornek taramanin tamami degilse tahmin)
+    min_value: Optional[str] = None
+    max_value: Optional[str] = None
 
 
 class ColumnDetectionResponse(BaseModel):
     columns: List[DetectedColumn]
     sample_row_count: int
+    scanned_row_count: Optional[int] = None  # Ornegin secildigi okunan satir sayisi
     source_info: Optional[dict] = None
+    upload_id: Optional[str] = None  # Dosya tespitinde: sonraki isteklerde dosya yerine gonderilebilir
 
 
 # ============ Sync Trigger Schemas ============
@@ -241,6 +257,7 @@ class SyncTriggerResponse(BaseModel):
     sync_log_id: int
     status: str
     message: str
+    upload_id: Optional[str] = None
 
 
 # ============ Data Preview Schemas ============
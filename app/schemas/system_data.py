@@ -71,6 +71,8 @@ class BudgetVersionCopy(BaseModel):
     new_name: str = Field(..., min_length=1, max_length=200, description="Yeni versiyon adı")
     description: Optional[str] = Field(None, max_length=500)
     copy_parameters: bool = Field(False, description="Kaynak versiyondaki parametre değerlerini kopyala")
+    copy_budget_data: bool = Field(False, description="Bütçe tanımları, satırları ve hücreleriyle derin kopya")
+    period_offset: int = Field(0, ge=-120, le=120, description="Dönemleri ay olarak kaydır (ör: 12 = bir yıl ileri)")
 
 
 class BudgetVersionResponse(BaseModel):
@@ -192,6 +194,38 @@ class BudgetCurrencyListResponse(BaseModel):
     total: int
 
 
+# ============ Currency Rate Schemas ============
+
+class BudgetCurrencyRateItem(BaseModel):
+    currency_code: str = Field(..., min_length=1, max_length=10, description="Para birimi kodu")
+    period_id: int
+    version_id: Optional[int] = Field(None, description="Bos ise tum versiyonlar icin gecerli")
+    rate: float = Field(..., gt=0, description="1 birimin baz para birimi karsiligi")
+
+
+class BudgetCurrencyRateBulkUpsert(BaseModel):
+    rates: List[BudgetCurrencyRateItem]
+
+
+class BudgetCurrencyRateResponse(BaseModel):
+    id: int
+    currency_code: str
+    period_id: int
+    version_id: Optional[int] = None
+    rate: float
+    created_date: datetime
+    updated_date: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class BudgetCurrencyRateListResponse(BaseModel):
+    items: List[BudgetCurrencyRateResponse]
+    total: int
+    base_currency_code: str
+
+
 # ============ System Data Summary ============
 
 class SystemDataSummary(BaseModel):
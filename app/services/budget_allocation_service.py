@@ -0,0 +1,229 @@
+"""
+Budget Allocation Service - Tepeden asagi butce dagitim motoru
+
+Bir hedef toplami (boyut grubu x donem araligi) bir surucuye gore alttaki
+hucrelere dagitir: esit, baska bir olcuye oranli, onceki bir versiyona
+oranli veya mevsimsellik profili. Dagitim numpy ile yapilir, yuvarlama
+farki en buyuk kalan yontemiyle dagitilir ve sonuc tek bir toplu upsert
+ile yazilir.
+"""
+
+import logging
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.budget_entry import BudgetEntryRow, BudgetEntryCell
+from app.services.budget_cell_store import BudgetCellStore
+from app.services.cell_history_service import CellHistoryBuffer
+
+logger = logging.getLogger(__name__)
+
+ALLOCATION_DRIVERS = ("equal", "measure", "version", "seasonality")
+
+# budget_entry_cells.value Numeric(20, 4)
+MAX_ALLOCATION_DECIMALS = 4
+
+
+def _dimension_key(dimension_values: dict) -> tuple:
+    """Versiyonlar arasi satir eslestirme anahtari: {entity_id: md_id} -> sirali tuple."""
+    return tuple(sorted((str(k), str(v)) for k, v in (dimension_values or {}).items()))
+
+
+class BudgetAllocationService:
+    """Hedef toplamlari grid hucrelerine dagitan servis."""
+
+    # ============ Drivers ============
+
+    @staticmethod
+    def equal_weights(row_count: int, period_count: int) -> np.ndarray:
+        """Esit dagitim agirliklari [R, P]."""
+        return np.ones((row_count, period_count), dtype=np.float64)
+
+    @staticmethod
+    def measure_weights(
+        db: Session,
+        row_ids: List[int],
+        period_ids: List[int],
+        measure_code: str,
+    ) -> np.ndarray:
+        """Ayni satir ve donemlerdeki bir olcunun degerleri [R, P] (olmayan hucre = 0)."""
+        weights = np.zeros((len(row_ids), len(period_ids)), dtype=np.float64)
+        row_pos = {rid: i for i, rid in enumerate(row_ids)}
+        period_pos = {pid: i for i, pid in enumerate(period_ids)}
+
+        cells = db.query(BudgetEntryCell.row_id, BudgetEntryCell.period_id, BudgetEntryCell.value).filter(
+            BudgetEntryCell.row_id.in_(row_ids),
+            BudgetEntryCell.period_id.in_(period_ids),
+            BudgetEntryCell.measure_code == measure_code,
+        ).all()
+        for row_id, period_id, value in cells:
+            if value is not None:
+                weights[row_pos[row_id], period_pos[period_id]] = float(value)
+        return weights
+
+    @staticmethod
+    def version_weights(
+        db: Session,
+        dimension_values: List[dict],
+        source_definition_id: int,
+        source_period_ids: List[Optional[int]],
+        measure_code: str,
+    ) -> np.ndarray:
+        """
+        Onceki versiyondaki tanimin degerleri [R, P].
+        Satirlar boyut degerleriyle, donemler versiyon icindeki sirayla eslesir
+        (source_period_ids[i] hedef penceredeki i. donemin karsiligidir).
+        """
+        weights = np.zeros((len(dimension_values), len(source_period_ids)), dtype=np.float64)
+        period_pos = {pid: i for i, pid in enumerate(source_period_ids) if pid is not None}
+        if not period_pos:
+            return weights
+
+        source_rows = db.query(BudgetEntryRow.id, BudgetEntryRow.dimension_values).filter(
+            BudgetEntryRow.budget_definition_id == source_definition_id,
+            BudgetEntryRow.is_active == True
+        ).all()
+        target_pos = {}
+        for i, dims in enumerate(dimension_values):
+            target_pos.setdefault(_dimension_key(dims), []).append(i)
+        row_map = {
+            source_id: target_pos[_dimension_key(dims)]
+            for source_id, dims in source_rows
+            if _dimension_key(dims) in target_pos
+        }
+        if not row_map:
+            return weights
+
+        cells = db.query(BudgetEntryCell.row_id, BudgetEntryCell.period_id, BudgetEntryCell.value).filter(
+            BudgetEntryCell.budget_definition_id == source_definition_id,
+            BudgetEntryCell.row_id.in_(list(row_map)),
+            BudgetEntryCell.period_id.in_(list(period_pos)),
+            BudgetEntryCell.measure_code == measure_code,
+        ).all()
+        for row_id, period_id, value in cells:
+            if value is None:
+                continue
+            for r in row_map[row_id]:
+                weights[r, period_pos[period_id]] = float(value)
+        return weights
+
+    @staticmethod
+    def seasonality_weights(profile: Sequence[float], periods: list, row_count: int) -> np.ndarray:
+        """
+        Mevsimsellik profili [R, P]: profil ya pencere donem sayisi kadar
+        ya da 12 aylik (donemin ayina gore) olmalidir. Satirlar arasi esittir.
+        """
+        if len(profile) == len(periods):
+            period_weights = np.asarray(profile, dtype=np.float64)
+        elif len(profile) == 12:
+            period_weights = np.array([profile[p.month - 1] for p in periods], dtype=np.float64)
+        else:
+            raise ValueError(
+                f"Mevsimsellik profili {len(periods)} donem veya 12 ay icin deger icermeli"
+            )
+        return np.broadcast_to(period_weights[None, :], (row_count, len(periods))).copy()
+
+    # ============ Distribution ============
+
+    @staticmethod
+    def distribute(total: float, weights: np.ndarray, decimals: int) -> np.ndarray:
+        """
+        Toplami agirliklara oranli dagitir ve decimals basamaga yuvarlar.
+        Yuvarlama farki en buyuk kalan yontemiyle dagitilir; sonucun toplami
+        yuvarlanmis hedef toplamina birebir esittir.
+        """
+        if decimals < 0 or decimals > MAX_ALLOCATION_DECIMALS:
+            raise ValueError(f"Ondalik basamak 0 ile {MAX_ALLOCATION_DECIMALS} arasinda olmali")
+        if weights.size == 0:
+            raise ValueError("Dagitilacak hucre bulunamadi")
+        if np.any(weights < 0) or not np.all(np.isfinite(weights)):
+            raise ValueError("Surucu degerleri negatif veya gecersiz olamaz")
+        weight_sum = weights.sum()
+        if weight_sum <= 0:
+            raise ValueError("Surucu toplami sifir, dagitim yapilamaz")
+
+        scale = 10 ** decimals
+        units = int(round(abs(total) * scale))
+        raw = weights.ravel() / weight_sum * units
+        allocated = np.floor(raw)
+        residual = units - int(allocated.sum())
+
+        # Kalan birimler en buyuk kesirli kisma sahip hucrelere (agirligi sifir olanlar haric)
+        fraction = np.where(weights.ravel() > 0, raw - allocated, -1.0)
+        if residual > 0:
+            order = np.argsort(-fraction, kind="stable")
+            allocated[order[:residual]] += 1
+        elif residual < 0:
+            order = np.argsort(np.where(allocated > 0, fraction, np.inf), kind="stable")
+            allocated[order[:-residual]] -= 1
+
+        sign = -1.0 if total < 0 else 1.0
+        return (sign * allocated / scale).reshape(weights.shape)
+
+    # ============ Write ============
+
+    @staticmethod
+    def upsert_cells(
+        db: Session,
+        row_ids: List[int],
+        period_ids: List[int],
+        measure_code: str,
+        values: np.ndarray,
+        decimals: int,
+        history: Optional[CellHistoryBuffer] = None,
+    ) -> int:
+        """Dagitilan degerleri manuel input hucreleri olarak toplu upsert ile yazar."""
+        records = (
+            {
+                "row_id": row_id,
+                "period_id": period_id,
+                "measure_code": measure_code,
+                "value": Decimal(f"{values[r, p]:.{decimals}f}"),
+            }
+            for r, row_id in enumerate(row_ids)
+            for p, period_id in enumerate(period_ids)
+        )
+        return BudgetCellStore.bulk_upsert(db, records, manual_override=True, history=history)
+
+    # ============ Allocation ============
+
+    @staticmethod
+    def allocate(
+        db: Session,
+        rows: list,
+        periods: list,
+        measure_code: str,
+        total: float,
+        weights: np.ndarray,
+        decimals: int,
+        driver: str,
+        history: Optional[CellHistoryBuffer] = None,
+    ) -> Dict:
+        """Toplami dagitir ve yazar (commit cagirana aittir)."""
+        row_ids = [r.id for r in rows]
+        period_ids = [p.id for p in periods]
+
+        values = BudgetAllocationService.distribute(total, weights, decimals)
+        cell_count = BudgetAllocationService.upsert_cells(
+            db, row_ids, period_ids, measure_code, values, decimals, history
+        )
+        allocated_total = round(float(values.sum()), decimals)
+
+        logger.info(
+            f"Dagitim: olcu={measure_code}, surucu={driver}, toplam={total}, "
+            f"{len(row_ids)} satir x {len(period_ids)} donem"
+        )
+
+        return {
+            "measure_code": measure_code,
+            "driver": driver,
+            "total": total,
+            "allocated_total": allocated_total,
+            "decimals": decimals,
+            "cell_count": cell_count,
+            "row_count": len(row_ids),
+            "period_count": len(period_ids),
+        }
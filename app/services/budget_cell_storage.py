@@ -0,0 +1,419 @@
+"""
+Budget Cell Storage - Hucre depolama modlari icin okuma/yazma adaptorleri
+
+cell modu (varsayilan): her hucre budget_entry_cells'te bir satirdir.
+
+dense modu: bir satirin bir olcusune ait tum donem degerleri
+budget_entry_series'te tek bir float8[] dizisinde tutulur; hucre tipi ve
+manuel override bilgisi donem basina bir baytlik bayrak dizisindedir.
+Hucre basina ~80 baytlik satir + indeks kaydi yerine eleman basina 9 bayt
+yazildigi icin tablo boyutu ve okunan/yazilan veri onlarca kat kuculur.
+
+Grid, kaydet, hesapla ve geri al endpoint'leri hucrelere bu adaptorler
+uzerinden erisir: load() hucre nesneleri dondurur (dense modda session'a
+bagli olmayan hafif nesneler), add() / remove() / remove_slice() eklenen
+ve silinen hucreleri bildirir, flush() degisiklikleri yazar. Mevcut
+hucrelerde yapilan deger/tip degisiklikleri de flush() ile yazilir.
+
+Modlar arasi gecis BudgetCellStorage.convert ile tek SQL ifadesiyle
+yapilir. dense modda degerler float8 (~15 anlamli basamak, 4 ondalik)
+tutulur, hucrelerin kaynak kural/parametre bilgisi saklanmaz.
+"""
+
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.budget_entry import (
+    BudgetDefinition, BudgetEntryCell, BudgetEntrySeries, BudgetCellType, BudgetStorageMode,
+)
+from app.models.system_data import BudgetPeriod
+from app.services.budget_cell_store import BudgetCellStore
+
+logger = logging.getLogger(__name__)
+
+# Bayrak bitleri (donem basina bir bayt)
+FLAG_TYPE_MASK = 0x03
+FLAG_MANUAL_OVERRIDE = 0x04
+FLAG_PRESENT = 0x08
+
+_TYPE_CODES = {
+    BudgetCellType.input: 0,
+    BudgetCellType.calculated: 1,
+    BudgetCellType.parameter_calculated: 2,
+}
+_CODE_TYPES = {code: cell_type for cell_type, code in _TYPE_CODES.items()}
+
+# dense modda degerler cell modundaki Numeric(20, 4) ile ayni hassasiyete yuvarlanir
+VALUE_SCALE = 4
+_VALUE_QUANTUM = Decimal(1).scaleb(-VALUE_SCALE)
+
+_SERIES_STAGING_TABLE = "tmp_budget_series_upsert"
+
+_CREATE_SERIES_STAGING_SQL = text(f"""
+    CREATE TEMP TABLE IF NOT EXISTS {_SERIES_STAGING_TABLE} (
+        row_id integer NOT NULL,
+        measure_code varchar(50) NOT NULL,
+        start_month integer NOT NULL,
+        values float8[] NOT NULL,
+        flags bytea NOT NULL
+    ) ON COMMIT DELETE ROWS
+""")
+
+_UPSERT_SERIES_SQL = text(f"""
+    INSERT INTO budget_entry_series (
+        budget_definition_id, row_id, measure_code, start_month, values, flags, updated_date
+    )
+    SELECT :definition_id, s.row_id, s.measure_code, s.start_month, s.values, s.flags, now()
+    FROM {_SERIES_STAGING_TABLE} s
+    ON CONFLICT ON CONSTRAINT uq_series_row_measure DO UPDATE SET
+        start_month = EXCLUDED.start_month,
+        values = EXCLUDED.values,
+        flags = EXCLUDED.flags,
+        updated_date = now()
+""")
+
+_DELETE_SERIES_SQL = text("""
+    DELETE FROM budget_entry_series s
+    USING unnest(CAST(:row_ids AS integer[]), CAST(:measure_codes AS varchar[])) AS d(row_id, measure_code)
+    WHERE s.budget_definition_id = :definition_id
+      AND s.row_id = d.row_id
+      AND s.measure_code = d.measure_code
+""")
+
+_CELLS_TO_SERIES_SQL = text(f"""
+    WITH cm AS MATERIALIZED (
+        SELECT c.row_id, c.measure_code, p.year * 12 + p.month - 1 AS m,
+               round(c.value, {VALUE_SCALE})::float8 AS value,
+               (CASE c.cell_type WHEN 'calculated' THEN 1 WHEN 'parameter_calculated' THEN 2 ELSE 0 END)
+               | (CASE WHEN c.is_manual_override THEN {FLAG_MANUAL_OVERRIDE} ELSE 0 END)
+               | {FLAG_PRESENT} AS flag
+        FROM budget_entry_cells c
+        JOIN budget_periods p ON p.id = c.period_id
+        WHERE c.budget_definition_id = :definition_id
+    ),
+    bounds AS (
+        SELECT row_id, measure_code, min(m) AS lo, max(m) AS hi
+        FROM cm
+        GROUP BY row_id, measure_code
+    )
+    INSERT INTO budget_entry_series (
+        budget_definition_id, row_id, measure_code, start_month, values, flags, updated_date
+    )
+    SELECT :definition_id, b.row_id, b.measure_code, b.lo,
+           array_agg(c.value ORDER BY g.m),
+           string_agg(set_byte('\\x00'::bytea, 0, coalesce(c.flag, 0)), ''::bytea ORDER BY g.m),
+           now()
+    FROM bounds b
+    CROSS JOIN LATERAL generate_series(b.lo, b.hi) AS g(m)
+    LEFT JOIN cm c ON c.row_id = b.row_id AND c.measure_code = b.measure_code AND c.m = g.m
+    GROUP BY b.row_id, b.measure_code, b.lo
+""")
+
+_SERIES_TO_CELLS_SQL = text(f"""
+    INSERT INTO budget_entry_cells (
+        budget_definition_id, row_id, period_id, measure_code, value, cell_type,
+        is_manual_override, created_date, updated_date
+    )
+    SELECT s.budget_definition_id, s.row_id, p.id, s.measure_code, e.value::numeric(20, 4),
+           (CASE get_byte(s.flags, e.ord::int - 1) & {FLAG_TYPE_MASK}
+                WHEN 1 THEN 'calculated' WHEN 2 THEN 'parameter_calculated' ELSE 'input'
+            END)::budgetcelltype,
+           get_byte(s.flags, e.ord::int - 1) & {FLAG_MANUAL_OVERRIDE} <> 0,
+           now(), now()
+    FROM budget_entry_series s
+    CROSS JOIN LATERAL unnest(s.values) WITH ORDINALITY AS e(value, ord)
+    JOIN budget_periods p ON p.year * 12 + p.month - 1 = s.start_month + e.ord::int - 1
+    WHERE s.budget_definition_id = :definition_id
+      AND get_byte(s.flags, e.ord::int - 1) & {FLAG_PRESENT} <> 0
+""")
+
+
+def _month_index(year: int, month: int) -> int:
+    return year * 12 + month - 1
+
+
+def _to_float(value) -> Optional[float]:
+    """Numeric(20, 4) ile ayni yuvarlama (ROUND_HALF_UP)."""
+    if value is None:
+        return None
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return float(value.quantize(_VALUE_QUANTUM, rounding=ROUND_HALF_UP))
+
+
+class DenseCell:
+    """dense modda load() ile donen hafif hucre nesnesi (BudgetEntryCell ile ayni alanlar)."""
+    __slots__ = (
+        "id", "budget_definition_id", "row_id", "period_id", "measure_code", "value",
+        "cell_type", "is_manual_override", "source_rule_id", "source_param_id",
+    )
+
+    def __init__(self, budget_definition_id, row_id, period_id, measure_code, value,
+                 cell_type, is_manual_override):
+        self.id = None
+        self.budget_definition_id = budget_definition_id
+        self.row_id = row_id
+        self.period_id = period_id
+        self.measure_code = measure_code
+        self.value = value
+        self.cell_type = cell_type
+        self.is_manual_override = is_manual_override
+        self.source_rule_id = None
+        self.source_param_id = None
+
+
+class RowCellStorage:
+    """cell modu: hucreler budget_entry_cells'te ORM nesneleri olarak okunur/yazilir."""
+
+    mode = BudgetStorageMode.cell
+
+    def __init__(self, db: Session, definition_id: int):
+        self.db = db
+        self.definition_id = definition_id
+
+    def _query(self, row_ids: List[int], period_ids: Optional[Iterable[int]] = None):
+        query = self.db.query(BudgetEntryCell).filter(
+            BudgetEntryCell.budget_definition_id == self.definition_id,
+            BudgetEntryCell.row_id.in_(row_ids),
+        )
+        if period_ids is not None:
+            query = query.filter(BudgetEntryCell.period_id.in_(list(period_ids)))
+        return query
+
+    def load(self, row_ids: List[int], period_ids: Optional[Iterable[int]] = None) -> list:
+        if not row_ids:
+            return []
+        return self._query(row_ids, period_ids).all()
+
+    def add(self, cell) -> None:
+        self.db.add(cell)
+
+    def remove(self, cells: Iterable) -> None:
+        ids = [c.id for c in cells if c.id is not None]
+        if ids:
+            self.db.query(BudgetEntryCell).filter(
+                BudgetEntryCell.budget_definition_id == self.definition_id,
+                BudgetEntryCell.id.in_(ids),
+            ).delete(synchronize_session='fetch')
+
+    def remove_slice(self, row_ids: List[int], period_ids: Optional[Iterable[int]] = None) -> None:
+        if row_ids:
+            self._query(row_ids, period_ids).delete(synchronize_session='fetch')
+
+    def flush(self) -> None:
+        self.db.flush()
+
+
+class DenseCellStorage:
+    """
+    dense modu: satirlarin serileri bir kez okunur, hucreler bellekte
+    degistirilir ve flush() ile degisen seriler COPY + tek upsert ile yazilir.
+    """
+
+    mode = BudgetStorageMode.dense
+
+    def __init__(self, db: Session, definition_id: int):
+        self.db = db
+        self.definition_id = definition_id
+        # row_id -> {measure_code: {month: (value, flags)}}
+        self._series: Dict[int, Dict[str, Dict[int, Tuple[Optional[float], int]]]] = {}
+        # (row_id, period_id, measure_code) -> hucre
+        self._cells: Dict[Tuple[int, int, str], object] = {}
+        self._dirty = set()
+        self._period_months: Optional[Dict[int, int]] = None
+        self._month_periods: Optional[Dict[int, int]] = None
+
+    # ---- donem <-> ay indeksi ----
+
+    def _ensure_period_maps(self) -> None:
+        if self._period_months is not None:
+            return
+        rows = self.db.query(BudgetPeriod.id, BudgetPeriod.year, BudgetPeriod.month).all()
+        self._period_months = {pid: _month_index(year, month) for pid, year, month in rows}
+        self._month_periods = {m: pid for pid, m in self._period_months.items()}
+
+    def _months(self, period_ids: Optional[Iterable[int]]) -> Optional[set]:
+        if period_ids is None:
+            return None
+        return {self._period_months[pid] for pid in period_ids if pid in self._period_months}
+
+    def _load_rows(self, row_ids: List[int]) -> None:
+        self._ensure_period_maps()
+        missing = [rid for rid in row_ids if rid not in self._series]
+        if not missing:
+            return
+        for rid in missing:
+            self._series[rid] = {}
+        series = self.db.query(
+            BudgetEntrySeries.row_id, BudgetEntrySeries.measure_code, BudgetEntrySeries.start_month,
+            BudgetEntrySeries.values, BudgetEntrySeries.flags,
+        ).filter(
+            BudgetEntrySeries.budget_definition_id == self.definition_id,
+            BudgetEntrySeries.row_id.in_(missing),
+        ).all()
+        for row_id, measure_code, start_month, values, flags in series:
+            self._series[row_id][measure_code] = {
+                start_month + i: (value, flags[i])
+                for i, value in enumerate(values)
+                if flags[i] & FLAG_PRESENT
+            }
+
+    # ---- okuma / yazma ----
+
+    def load(self, row_ids: List[int], period_ids: Optional[Iterable[int]] = None) -> list:
+        if not row_ids:
+            return []
+        self._load_rows(row_ids)
+        months = self._months(period_ids)
+        month_periods = self._month_periods
+        cells = []
+        for row_id in row_ids:
+            for measure_code, elements in self._series[row_id].items():
+                for month, (value, flags) in elements.items():
+                    if months is not None and month not in months:
+                        continue
+                    period_id = month_periods.get(month)
+                    if period_id is None:
+                        continue
+                    key = (row_id, period_id, measure_code)
+                    cell = self._cells.get(key)
+                    if cell is None:
+                        cell = DenseCell(
+                            self.definition_id, row_id, period_id, measure_code,
+                            Decimal(repr(value)) if value is not None else None,
+                            _CODE_TYPES[flags & FLAG_TYPE_MASK],
+                            bool(flags & FLAG_MANUAL_OVERRIDE),
+                        )
+                        self._cells[key] = cell
+                    cells.append(cell)
+        return cells
+
+    def add(self, cell) -> None:
+        self._load_rows([cell.row_id])
+        self._cells[(cell.row_id, cell.period_id, cell.measure_code)] = cell
+
+    def remove(self, cells: Iterable) -> None:
+        self._ensure_period_maps()
+        for cell in cells:
+            key = (cell.row_id, cell.period_id, cell.measure_code)
+            self._cells.pop(key, None)
+            elements = self._series.get(cell.row_id, {}).get(cell.measure_code)
+            month = self._period_months.get(cell.period_id)
+            if elements is not None and elements.pop(month, None) is not None:
+                self._dirty.add((cell.row_id, cell.measure_code))
+
+    def remove_slice(self, row_ids: List[int], period_ids: Optional[Iterable[int]] = None) -> None:
+        self._load_rows(row_ids)
+        months = self._months(period_ids)
+        for row_id in row_ids:
+            for measure_code, elements in self._series[row_id].items():
+                doomed = [m for m in elements if months is None or m in months]
+                for month in doomed:
+                    del elements[month]
+                    self._cells.pop((row_id, self._month_periods.get(month), measure_code), None)
+                if doomed:
+                    self._dirty.add((row_id, measure_code))
+
+    def flush(self) -> None:
+        # Bellekteki hucreleri serilere yansit
+        for (row_id, period_id, measure_code), cell in self._cells.items():
+            month = self._period_months.get(period_id)
+            if month is None:
+                continue
+            value = _to_float(cell.value)
+            flags = FLAG_PRESENT | _TYPE_CODES[BudgetCellType(cell.cell_type or BudgetCellType.input)]
+            if cell.is_manual_override:
+                flags |= FLAG_MANUAL_OVERRIDE
+            elements = self._series[row_id].setdefault(measure_code, {})
+            if elements.get(month) != (value, flags):
+                elements[month] = (value, flags)
+                self._dirty.add((row_id, measure_code))
+
+        if not self._dirty:
+            return
+
+        upserts = []
+        deletes = []
+        for row_id, measure_code in self._dirty:
+            elements = self._series[row_id].get(measure_code)
+            if not elements:
+                deletes.append((row_id, measure_code))
+                continue
+            start = min(elements)
+            length = max(elements) - start + 1
+            values = [None] * length
+            flags = bytearray(length)
+            for month, (value, flag) in elements.items():
+                values[month - start] = value
+                flags[month - start] = flag
+            upserts.append((row_id, measure_code, start, values, bytes(flags)))
+
+        if upserts:
+            self.db.execute(_CREATE_SERIES_STAGING_SQL)
+            cursor = self.db.connection().connection.driver_connection.cursor()
+            try:
+                with cursor.copy(
+                    f"COPY {_SERIES_STAGING_TABLE} (row_id, measure_code, start_month, values, flags) FROM STDIN"
+                ) as copy:
+                    for record in upserts:
+                        copy.write_row(record)
+            finally:
+                cursor.close()
+            self.db.execute(_UPSERT_SERIES_SQL, {"definition_id": self.definition_id})
+            self.db.execute(text(f"TRUNCATE {_SERIES_STAGING_TABLE}"))
+
+        if deletes:
+            self.db.execute(_DELETE_SERIES_SQL, {
+                "definition_id": self.definition_id,
+                "row_ids": [row_id for row_id, _ in deletes],
+                "measure_codes": [code for _, code in deletes],
+            })
+
+        self._dirty.clear()
+
+
+class BudgetCellStorage:
+    """Tanimin depolama moduna gore adaptor secimi ve modlar arasi donusum."""
+
+    @staticmethod
+    def is_dense(definition: BudgetDefinition) -> bool:
+        return definition.storage_mode == BudgetStorageMode.dense
+
+    @staticmethod
+    def for_definition(db: Session, definition: BudgetDefinition):
+        if BudgetCellStorage.is_dense(definition):
+            return DenseCellStorage(db, definition.id)
+        return RowCellStorage(db, definition.id)
+
+    @staticmethod
+    def convert(db: Session, definition: BudgetDefinition, mode: BudgetStorageMode) -> int:
+        """
+        Tanimin hucrelerini hedef depolama moduna tasir (commit ve tanimin
+        ozel kilidi cagirana aittir). Donen deger: hedefte olusan kayit
+        sayisi (seri veya hucre).
+        """
+        mode = BudgetStorageMode(mode)
+        current = definition.storage_mode or BudgetStorageMode.cell
+        if mode == current:
+            return 0
+
+        params = {"definition_id": definition.id}
+        if mode == BudgetStorageMode.dense:
+            written = db.execute(_CELLS_TO_SERIES_SQL, params).rowcount
+            partition = BudgetCellStore.partition_name(definition.id)
+            if db.execute(text("SELECT to_regclass(:name)"), {"name": partition}).scalar():
+                db.execute(text(f"TRUNCATE {partition}"))
+            else:
+                db.execute(text("DELETE FROM budget_entry_cells WHERE budget_definition_id = :definition_id"), params)
+        else:
+            BudgetCellStore.ensure_partition(db, definition.id)
+            written = db.execute(_SERIES_TO_CELLS_SQL, params).rowcount
+            db.execute(text("DELETE FROM budget_entry_series WHERE budget_definition_id = :definition_id"), params)
+
+        definition.storage_mode = mode
+        logger.info(f"Tanim {definition.code} depolama modu {current.value} -> {mode.value}: {written} kayit")
+        return written
@@ -0,0 +1,269 @@
+"""
+Budget Cell Store - Butce hucrelerinin toplu yazimi
+
+Dagitim, ice aktarma gibi cok sayida hucre yazan islemler icin hucreler
+COPY ile gecici bir tabloya aktarilir ve tek bir
+INSERT ... SELECT ... ON CONFLICT (tanim, satir, donem, olcu) DO UPDATE
+ifadesiyle budget_entry_cells tablosuna yazilir. Satir basina ayri
+INSERT gonderilmedigi icin milyonlarca hucre dakikanin altinda yazilir.
+
+budget_entry_cells, budget_definition_id ile LIST bolumlenmistir; her
+tanim icin ayri bir partition (budget_entry_cells_d<id>) acilir ve tanim
+silinirken hucreleri partition drop ile tek adimda kaldirilir.
+
+Partition'lar ana tabloda ACCESS EXCLUSIVE kilit alan CREATE TABLE ...
+PARTITION OF ile degil, bagimsiz tablo olusturulup ATTACH PARTITION ile
+eklenir ve DETACH PARTITION ... CONCURRENTLY ile cikarilir (ana tabloda
+SHARE UPDATE EXCLUSIVE; okuma / yazmalari engellemez). Default partition
+bu yuzden yoktur: varligi ATTACH'ta ACCESS EXCLUSIVE kilit gerektirir ve
+CONCURRENTLY'yi engeller. Kilit isteyen partition DDL'i
+PARTITION_LOCK_TIMEOUT'tan fazla beklemez: bekleyen DDL'in arkasinda grid
+islemleri kuyruga girmesin diye kilit alinamazsa tekrar denenir.
+"""
+
+import logging
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.models.budget_entry import BudgetCellType
+from app.services.cell_history_service import CellHistoryBuffer
+
+logger = logging.getLogger(__name__)
+
+# Tek INSERT ... SELECT ile yazilan en fazla kayit sayisi
+CELL_UPSERT_BATCH_SIZE = 200000
+
+_STAGING_TABLE = "tmp_budget_cell_upsert"
+
+# Partition ekleme / cikarma kilit bekleme siniri ve deneme sayisi
+PARTITION_LOCK_TIMEOUT = "2s"
+PARTITION_LOCK_ATTEMPTS = 5
+
+_CREATE_STAGING_SQL = text(f"""
+    CREATE TEMP TABLE IF NOT EXISTS {_STAGING_TABLE} (
+        row_id integer NOT NULL,
+        period_id integer NOT NULL,
+        measure_code varchar(50) NOT NULL,
+        value numeric(20, 4),
+        cell_type varchar(30) NOT NULL
+    ) ON COMMIT DELETE ROWS
+""")
+
+_UPSERT_SQL = f"""
+    INSERT INTO budget_entry_cells (
+        budget_definition_id, row_id, period_id, measure_code, value, cell_type,
+        source_rule_id, source_param_id, is_manual_override, created_date, updated_date
+    )
+    SELECT r.budget_definition_id, s.row_id, s.period_id, s.measure_code, s.value, s.cell_type::budgetcelltype,
+           NULL, NULL, :manual_override, now(), now()
+    FROM {_STAGING_TABLE} s
+    JOIN budget_entry_rows r ON r.id = s.row_id
+    ON CONFLICT ON CONSTRAINT uq_cell_row_period_measure DO UPDATE SET
+        value = EXCLUDED.value,
+        cell_type = EXCLUDED.cell_type,
+        source_rule_id = NULL,
+        source_param_id = NULL,
+        {{override}}updated_date = now()
+"""
+
+
+class BudgetCellStore:
+    """Hucreleri toplu upsert eden yardimci sinif."""
+
+    @staticmethod
+    def bulk_upsert(
+        db: Session,
+        records: Iterable[Dict],
+        manual_override: Optional[bool] = None,
+        batch_size: int = CELL_UPSERT_BATCH_SIZE,
+        history: Optional[CellHistoryBuffer] = None,
+    ) -> int:
+        """
+        records: {row_id, period_id, measure_code, value[, cell_type]} sozlukleri.
+        Ayni (row_id, period_id, measure_code) bir parti icinde tekrar etmemelidir.
+        manual_override None ise mevcut hucrelerin override bayragi korunur
+        (yeni hucreler override edilmemis olarak eklenir).
+        Hucreler kaynak kural/parametre bilgisi olmadan yazilir.
+        history verilirse her partide degisen hucreler upsert'ten once
+        gecmise yazilir.
+        """
+        upsert_sql = text(_UPSERT_SQL.format(
+            override="is_manual_override = EXCLUDED.is_manual_override,\n        "
+            if manual_override is not None else ""
+        ))
+        params = {"manual_override": bool(manual_override)}
+        default_type = BudgetCellType.input.value
+
+        db.execute(_CREATE_STAGING_SQL)
+        cursor = db.connection().connection.driver_connection.cursor()
+
+        written = 0
+        pending = 0
+        iterator = iter(records)
+        exhausted = False
+        try:
+            while not exhausted:
+                with cursor.copy(
+                    f"COPY {_STAGING_TABLE} (row_id, period_id, measure_code, value, cell_type) FROM STDIN"
+                ) as copy:
+                    for record in iterator:
+                        cell_type = record.get("cell_type", default_type)
+                        copy.write_row((
+                            record["row_id"],
+                            record["period_id"],
+                            record["measure_code"],
+                            record["value"],
+                            getattr(cell_type, "value", cell_type),
+                        ))
+                        pending += 1
+                        if pending >= batch_size:
+                            break
+                    else:
+                        exhausted = True
+
+                if pending:
+                    if history is not None:
+                        history.record_staged(_STAGING_TABLE)
+                    db.execute(upsert_sql, params)
+                    db.execute(text(f"TRUNCATE {_STAGING_TABLE}"))
+                    written += pending
+                    pending = 0
+        finally:
+            cursor.close()
+        return written
+
+    # ============ Partitions ============
+
+    @staticmethod
+    def partition_name(definition_id: int) -> str:
+        return f"budget_entry_cells_d{int(definition_id)}"
+
+    @staticmethod
+    def ensure_partition(db: Session, definition_id: int) -> None:
+        """
+        Tanim icin hucre partition'ini olusturur (varsa dokunmaz). Default
+        partition olmadigi icin tanimin hucreleri yazilmadan once
+        cagrilmalidir. ATTACH kilitleri transaction sonuna kadar tutuldugu
+        icin commit'ten hemen once cagrilmasi onerilir.
+        """
+        definition_id = int(definition_id)
+        name = BudgetCellStore.partition_name(definition_id)
+        if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+            return
+        BudgetCellStore.create_partition_table(db, definition_id)
+        BudgetCellStore.attach_partition(db, definition_id)
+
+    @staticmethod
+    def create_partition_table(db: Session, definition_id: int) -> str:
+        """
+        Tanimin partition'i olacak bagimsiz tabloyu olusturur (ana tabloya
+        kilit almaz). Partition siniriyla ayni CHECK kisiti ATTACH'in tabloyu
+        taramasini onler; attach_partition sonrasi kaldirilir.
+        """
+        definition_id = int(definition_id)
+        name = BudgetCellStore.partition_name(definition_id)
+        db.execute(text(f"CREATE TABLE {name} (LIKE budget_entry_cells INCLUDING DEFAULTS)"))
+        db.execute(text(
+            f"ALTER TABLE {name} ADD CONSTRAINT {name}_bound CHECK (budget_definition_id = {definition_id})"
+        ))
+        return name
+
+    @staticmethod
+    def index_partition_table(db: Session, definition_id: int) -> None:
+        """
+        Toplu yuklenmis bagimsiz tabloda ana tablonun PK / unique kisitlari ve
+        indeksini olusturur. Indeksler yuklemeden sonra tek seferde kurulur;
+        ATTACH esdeger kisitlari yeniden kurmadan partition indeksi olarak
+        baglar.
+        """
+        name = BudgetCellStore.partition_name(definition_id)
+        db.execute(text(f"ALTER TABLE {name} ADD CONSTRAINT {name}_pkey PRIMARY KEY (id, budget_definition_id)"))
+        db.execute(text(
+            f"ALTER TABLE {name} ADD CONSTRAINT {name}_uq UNIQUE (budget_definition_id, row_id, period_id, measure_code)"
+        ))
+        db.execute(text(f"CREATE INDEX {name}_row_period ON {name} (row_id, period_id)"))
+
+    @staticmethod
+    def attach_partition(db: Session, definition_id: int) -> None:
+        """create_partition_table ile olusturulan tabloyu ana tabloya ekler."""
+        definition_id = int(definition_id)
+        name = BudgetCellStore.partition_name(definition_id)
+        BudgetCellStore._partition_ddl(
+            db, f"ALTER TABLE budget_entry_cells ATTACH PARTITION {name} FOR VALUES IN ({definition_id})"
+        )
+        db.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {name}_bound"))
+
+    @staticmethod
+    def drop_partition(db: Session, definition_id: int) -> None:
+        """
+        Tanimin hucre partition'ini (tum hucreleriyle) kaldirir. Partition
+        DETACH ... CONCURRENTLY ile ayrilir (ana tabloda yalnizca SHARE
+        UPDATE EXCLUSIVE), ayrilan tablo ana tabloya dokunmadan silinir.
+        DROP, FK'larin hedef tablolarinda (satirlar, donemler ...) ACCESS
+        EXCLUSIVE aldigi icin her iki adim da kilit siniri altinda denenir.
+        CONCURRENTLY transaction icinde calismadigi ve acik transaction'larin
+        bitmesini bekledigi icin ayri bir autocommit baglantisi kullanilir:
+        db'de acik transaction olmamalidir (cagirmadan once commit edilir).
+        Yarida kalmis bir ayirma FINALIZE ile tamamlanir.
+        """
+        name = BudgetCellStore.partition_name(definition_id)
+        with db.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if not conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+                return
+
+            def detach() -> None:
+                pending = conn.execute(
+                    text("SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = to_regclass(:name)"),
+                    {"name": name},
+                ).scalar()
+                if pending is not None:
+                    mode = "FINALIZE" if pending else "CONCURRENTLY"
+                    run(f"ALTER TABLE budget_entry_cells DETACH PARTITION {name} {mode}")
+
+            def run(sql: str) -> None:
+                try:
+                    conn.execute(text(sql))
+                except OperationalError:
+                    conn.rollback()
+                    raise
+
+            conn.execute(text("SELECT set_config('lock_timeout', :value, false)"), {"value": PARTITION_LOCK_TIMEOUT})
+            try:
+                BudgetCellStore._retry_locked(detach, f"DETACH PARTITION {name}")
+                BudgetCellStore._retry_locked(lambda: run(f"DROP TABLE {name}"), f"DROP TABLE {name}")
+            finally:
+                conn.execute(text("RESET lock_timeout"))
+
+    @staticmethod
+    def _partition_ddl(db: Session, sql: str) -> None:
+        """
+        Ana tabloda kilit isteyen DDL: PARTITION_LOCK_TIMEOUT ile, her deneme
+        savepoint icinde. Transaction'in onceki lock_timeout'u geri yuklenir.
+        """
+        def run() -> None:
+            with db.begin_nested():
+                db.execute(text(sql))
+
+        previous = db.execute(text("SELECT current_setting('lock_timeout')")).scalar()
+        db.execute(text("SELECT set_config('lock_timeout', :value, true)"), {"value": PARTITION_LOCK_TIMEOUT})
+        try:
+            BudgetCellStore._retry_locked(run, sql)
+        finally:
+            db.execute(text("SELECT set_config('lock_timeout', :value, true)"), {"value": previous})
+
+    @staticmethod
+    def _retry_locked(run: Callable[[], None], description: str) -> None:
+        """Kilit zaman asiminda run'i en fazla PARTITION_LOCK_ATTEMPTS kez dener."""
+        for attempt in range(1, PARTITION_LOCK_ATTEMPTS + 1):
+            try:
+                run()
+                return
+            except OperationalError as e:
+                if attempt == PARTITION_LOCK_ATTEMPTS:
+                    raise ValueError("Hucre tablosu mesgul, partition islemi yapilamadi; daha sonra tekrar deneyin") from e
+                logger.warning(f"Partition kilidi alinamadi ({attempt}/{PARTITION_LOCK_ATTEMPTS}): {description}")
+                time.sleep(attempt)
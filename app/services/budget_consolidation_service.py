@@ -0,0 +1,405 @@
+"""
+Budget Consolidation Service - Tanimlar arasi konsolidasyon
+
+Bir konsolidasyon ayni versiyondaki birden fazla butce tanimini ortak bir
+olcu setine (kaynak olcu * carpan) ve ortak bir boyut alt kumesine indirger.
+Sonuc budget_consolidation_cells tablosunda kaynak basina (ortak boyut
+degerleri, para birimi, donem, olcu) toplamlari olarak onbelleklenir; her
+kaynagin katkisi tek bir INSERT ... SELECT ... GROUP BY ile veritabaninda
+hesaplanir, satirlar uygulamaya tasinmaz.
+
+Yenileme artimlidir: her kaynak islenmis son budget_cell_history id'sini
+(history_watermark) tutar. Sonraki yenilemede yalnizca bu id'den sonra
+hucresi degisen satirlarin ortak boyut anahtarlari silinip yeniden
+hesaplanir; degisen satir orani yuksekse kaynak bastan hesaplanir. Satir
+para birimi gibi hucre gecmisine dusmeyen degisiklikler kaynagi gecersiz
+kilar (refreshed_at = NULL) ve bir sonraki yenileme tam yapilir.
+
+Yenileme sirasinda kaynak tanimin exclusive kilidi alinir; boylece devam
+eden kaydetme / hesaplama commit edilmeden watermark ilerlemez. Watermark
+gecmis id'sine dayandigi icin hucre / gecmis yazan her islem (API,
+eslestirmeler) tanim kilidini tutarak yazar; kilitsiz bir yazici daha
+kucuk bir id'yi yenilemeden sonra commit edip atlatabilirdi. Okumalar
+kilidi beklemez (try_lock), kilitli kaynak eski haliyle okunur ve yanitta
+belirtilir.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, literal, text
+from sqlalchemy.orm import Session
+
+from app.models.budget_entry import (
+    BudgetConsolidation, BudgetConsolidationCell, BudgetConsolidationMeasure,
+    BudgetConsolidationMeasureMap, BudgetConsolidationSource, BudgetDefinition,
+    BudgetDefinitionDimension, BudgetEntryRow, MeasureDataType,
+)
+from app.models.system_data import BudgetVersion
+from app.services.budget_cell_storage import BudgetCellStorage
+from app.services.budget_grid_engine import BudgetGridEngine
+from app.services.budget_lock_service import BudgetLockService
+from app.services.currency_conversion_service import CurrencyConverter
+
+logger = logging.getLogger(__name__)
+
+# Degisen satirlar tanimin bu oranini asarsa kaynak bastan hesaplanir
+FULL_REFRESH_RATIO = 0.25
+
+# Satirin ortak boyut alt kumesine indirgenmis hali
+_PROJECTED_ROWS_SQL = """
+    projected AS (
+        SELECT r.id, r.is_active, coalesce(r.currency_code, '') AS currency_code,
+               coalesce((
+                   SELECT jsonb_object_agg(d.key, d.value)
+                   FROM jsonb_each(r.dimension_values) d
+                   WHERE d.key = ANY(:entity_keys)
+               ), '{}'::jsonb) AS dims
+        FROM budget_entry_rows r
+        WHERE r.budget_definition_id = :definition_id
+    )
+"""
+
+# Son watermark'tan sonra hucresi degisen satirlarin ortak boyut anahtarlari
+_TOUCHED_KEYS_SQL = """
+    touched AS (
+        SELECT DISTINCT pr.dims
+        FROM projected pr
+        WHERE pr.id IN (
+            SELECT h.row_id FROM budget_cell_history h
+            WHERE h.budget_definition_id = :definition_id
+              AND h.id > :from_id AND h.id <= :to_id
+        )
+    )
+"""
+
+_TOUCHED_ROWS_FILTER = "IN (SELECT pr.id FROM projected pr JOIN touched t ON t.dims = pr.dims)"
+
+# Depolama moduna gore (row_id, period_id, measure_code, value) kaynagi
+_CELL_SOURCE_SQL = {
+    "cell": """
+        SELECT c.row_id, c.period_id, c.measure_code, c.value
+        FROM budget_entry_cells c
+        WHERE c.budget_definition_id = :definition_id AND c.value IS NOT NULL
+          {row_filter}
+    """,
+    "dense": """
+        SELECT s.row_id, p.id AS period_id, s.measure_code, e.value::numeric(20, 4) AS value
+        FROM budget_entry_series s
+        CROSS JOIN LATERAL unnest(s.values) WITH ORDINALITY AS e(value, ord)
+        JOIN budget_periods p ON p.year * 12 + p.month - 1 = s.start_month + e.ord::int - 1
+        WHERE s.budget_definition_id = :definition_id
+          AND get_byte(s.flags, e.ord::int - 1) & 8 <> 0
+          AND e.value IS NOT NULL
+          {row_filter}
+    """,
+}
+
+_INSERT_SQL = """
+    WITH {ctes},
+    src AS ({cell_source})
+    INSERT INTO budget_consolidation_cells (
+        source_id, dimension_values, currency_code, period_id, measure_code, consolidation_id, value
+    )
+    SELECT :source_id, pr.dims, pr.currency_code, src.period_id, m.target_measure_code,
+           :consolidation_id, sum(src.value * m.factor)
+    FROM src
+    JOIN projected pr ON pr.id = src.row_id AND pr.is_active
+    JOIN budget_consolidation_measure_maps m
+      ON m.source_id = :source_id AND m.source_measure_code = src.measure_code
+    {key_filter}
+    GROUP BY pr.dims, pr.currency_code, src.period_id, m.target_measure_code
+"""
+
+_DELETE_TOUCHED_SQL = f"""
+    WITH {_PROJECTED_ROWS_SQL}, {_TOUCHED_KEYS_SQL}
+    DELETE FROM budget_consolidation_cells c
+    USING touched t
+    WHERE c.source_id = :source_id AND c.dimension_values = t.dims
+"""
+
+_CHANGED_ROWS_SQL = """
+    SELECT count(DISTINCT h.row_id) FROM budget_cell_history h
+    WHERE h.budget_definition_id = :definition_id AND h.id > :from_id AND h.id <= :to_id
+"""
+
+_HISTORY_HEAD_SQL = "SELECT coalesce(max(id), 0) FROM budget_cell_history WHERE budget_definition_id = :definition_id"
+
+
+class BudgetConsolidationService:
+    """Konsolidasyon tanimlari, onbellek yenileme ve okuma."""
+
+    # ============ Definition ============
+
+    @staticmethod
+    def validate(
+        db: Session,
+        version_id: int,
+        dimension_entity_ids: List[int],
+        measures: List[Dict],
+        sources: List[Dict],
+    ) -> Dict[int, BudgetDefinition]:
+        """
+        Kaynak tanimlarin ayni versiyonda oldugunu, ortak boyutlari
+        icerdigini ve olcu eslemelerinin gecerli oldugunu kontrol eder.
+        """
+        version = db.query(BudgetVersion).filter(BudgetVersion.id == version_id).first()
+        if not version or version.deleted_at is not None:
+            raise ValueError("Versiyon bulunamadi")
+        if not measures:
+            raise ValueError("En az bir ortak olcu tanimlanmali")
+        if not sources:
+            raise ValueError("En az bir kaynak tanim secilmeli")
+
+        measure_codes = [m["code"] for m in measures]
+        if len(set(measure_codes)) != len(measure_codes):
+            raise ValueError("Ortak olcu kodlari tekrarlanamaz")
+        for m in measures:
+            if m.get("data_type") and m["data_type"] not in MeasureDataType.__members__:
+                raise ValueError(f"Gecersiz veri tipi: {m['data_type']}")
+
+        definition_ids = [s["budget_definition_id"] for s in sources]
+        if len(set(definition_ids)) != len(definition_ids):
+            raise ValueError("Ayni tanim birden fazla kaynak olarak eklenemez")
+
+        definitions = {
+            d.id: d for d in db.query(BudgetDefinition).filter(BudgetDefinition.id.in_(definition_ids)).all()
+        }
+        for source in sources:
+            definition = definitions.get(source["budget_definition_id"])
+            if not definition or definition.deleted_at is not None:
+                raise ValueError(f"Butce tanimi bulunamadi: {source['budget_definition_id']}")
+            if definition.version_id != version_id:
+                raise ValueError(f"{definition.code} tanimi konsolidasyon versiyonunda degil")
+
+            entity_ids = {
+                entity_id for (entity_id,) in db.query(BudgetDefinitionDimension.entity_id).filter(
+                    BudgetDefinitionDimension.budget_definition_id == definition.id
+                ).all()
+            }
+            missing = [e for e in dimension_entity_ids if e not in entity_ids]
+            if missing:
+                raise ValueError(f"{definition.code} tanimi ortak boyutlari icermiyor: {missing}")
+
+            source_codes = {m.code for m in definition.budget_type.measures if m.is_active}
+            for measure_map in source.get("measure_maps") or []:
+                if measure_map["source_measure_code"] not in source_codes:
+                    raise ValueError(f"{definition.code} tanimda olcu yok: {measure_map['source_measure_code']}")
+                if measure_map["target_measure_code"] not in measure_codes:
+                    raise ValueError(f"Ortak olcu bulunamadi: {measure_map['target_measure_code']}")
+
+        return definitions
+
+    @staticmethod
+    def apply_structure(
+        db: Session,
+        consolidation: BudgetConsolidation,
+        measures: List[Dict],
+        sources: List[Dict],
+        definitions: Dict[int, BudgetDefinition],
+    ) -> None:
+        """
+        Olculeri ve kaynaklari (eslemeleriyle) yeniden yazar; onbellek
+        kaynaklarla birlikte (FK cascade) silinir (commit cagirana aittir).
+        """
+        if consolidation.id is not None:
+            for model in (BudgetConsolidationMeasure, BudgetConsolidationSource):
+                db.query(model).filter(model.consolidation_id == consolidation.id).delete(synchronize_session=False)
+            db.expire(consolidation, ["measures", "sources"])
+            db.flush()
+
+        consolidation.measures = [
+            BudgetConsolidationMeasure(
+                code=m["code"],
+                name=m.get("name") or m["code"],
+                data_type=MeasureDataType(m.get("data_type") or "decimal"),
+                sort_order=m.get("sort_order", i),
+            )
+            for i, m in enumerate(measures)
+        ]
+        measure_codes = {m["code"] for m in measures}
+        for i, source in enumerate(sources):
+            definition = definitions[source["budget_definition_id"]]
+            maps = source.get("measure_maps")
+            if not maps:
+                # Esleme verilmezse ayni kodlu olculer 1:1 eslenir
+                maps = [
+                    {"source_measure_code": m.code, "target_measure_code": m.code}
+                    for m in definition.budget_type.measures if m.is_active and m.code in measure_codes
+                ]
+            if not maps:
+                raise ValueError(f"{definition.code} tanimi icin olcu eslemesi yok")
+
+            consolidation.sources.append(BudgetConsolidationSource(
+                budget_definition_id=definition.id,
+                sort_order=i,
+                measure_maps=[
+                    BudgetConsolidationMeasureMap(
+                        source_measure_code=m["source_measure_code"],
+                        target_measure_code=m["target_measure_code"],
+                        factor=m.get("factor", 1),
+                    )
+                    for m in maps
+                ],
+            ))
+        db.flush()
+
+    @staticmethod
+    def invalidate_definition(db: Session, definition_id: int) -> None:
+        """
+        Hucre gecmisine dusmeyen degisikliklerden (satir para birimi vb.) sonra
+        tanimi kaynak olarak kullanan konsolidasyonlari tam yenilemeye isaretler.
+        """
+        db.query(BudgetConsolidationSource).filter(
+            BudgetConsolidationSource.budget_definition_id == definition_id
+        ).update({BudgetConsolidationSource.refreshed_at: None}, synchronize_session=False)
+
+    # ============ Refresh ============
+
+    @staticmethod
+    def refresh(db: Session, consolidation: BudgetConsolidation, full: bool = False, wait: bool = True) -> List[Dict]:
+        """
+        Tum kaynaklari yeniler; her kaynak ayri transaction'da commit edilir.
+        wait=False ise kilidi baska islemde olan kaynak atlanir (status=busy).
+        """
+        entity_keys = [str(e) for e in consolidation.dimension_entity_ids or []]
+        results = []
+        for source_id in [s.id for s in consolidation.sources]:
+            results.append(BudgetConsolidationService._refresh_source(
+                db, consolidation.id, source_id, entity_keys, full, wait
+            ))
+        return results
+
+    @staticmethod
+    def _refresh_source(
+        db: Session,
+        consolidation_id: int,
+        source_id: int,
+        entity_keys: List[str],
+        full: bool,
+        wait: bool,
+    ) -> Dict:
+        source = db.query(BudgetConsolidationSource).filter(BudgetConsolidationSource.id == source_id).first()
+        definition = source.budget_definition
+        result = {
+            "definition_id": definition.id,
+            "definition_code": definition.code,
+            "status": "current",
+            "changed_rows": 0,
+            "cells_written": 0,
+        }
+
+        if definition.deleted_at is not None:
+            # Silinmek uzere isaretli tanimin katkisi hemen cikarilir
+            db.execute(text("DELETE FROM budget_consolidation_cells WHERE source_id = :source_id"),
+                       {"source_id": source.id})
+            db.commit()
+            result["status"] = "deleted"
+            return result
+
+        if wait:
+            BudgetLockService.lock(db, definition.id)
+        elif not BudgetLockService.try_lock(db, definition.id):
+            db.rollback()
+            result["status"] = "busy"
+            return result
+
+        # Ayni kaynagi yenileyen diger oturumlar sirayla calisir
+        source = db.query(BudgetConsolidationSource).filter(
+            BudgetConsolidationSource.id == source_id
+        ).with_for_update().populate_existing().one()
+
+        head = db.execute(text(_HISTORY_HEAD_SQL), {"definition_id": definition.id}).scalar()
+        params = {
+            "definition_id": definition.id,
+            "source_id": source.id,
+            "consolidation_id": consolidation_id,
+            "entity_keys": entity_keys,
+            "from_id": source.history_watermark or 0,
+            "to_id": head,
+        }
+        storage = "dense" if BudgetCellStorage.is_dense(definition) else "cell"
+
+        incremental = not full and source.refreshed_at is not None
+        if incremental:
+            if head <= params["from_id"]:
+                db.commit()
+                return result
+            changed = db.execute(text(_CHANGED_ROWS_SQL), params).scalar() or 0
+            total = db.query(func.count(BudgetEntryRow.id)).filter(
+                BudgetEntryRow.budget_definition_id == definition.id
+            ).scalar() or 0
+            result["changed_rows"] = changed
+            incremental = changed <= total * FULL_REFRESH_RATIO
+
+        if incremental:
+            db.execute(text(_DELETE_TOUCHED_SQL), params)
+            sql = _INSERT_SQL.format(
+                ctes=f"{_PROJECTED_ROWS_SQL}, {_TOUCHED_KEYS_SQL}",
+                cell_source=_CELL_SOURCE_SQL[storage].format(
+                    row_filter=f"AND {'c' if storage == 'cell' else 's'}.row_id {_TOUCHED_ROWS_FILTER}"
+                ),
+                key_filter="WHERE pr.dims IN (SELECT dims FROM touched)",
+            )
+            result["status"] = "incremental"
+        else:
+            db.execute(text("DELETE FROM budget_consolidation_cells WHERE source_id = :source_id"), params)
+            sql = _INSERT_SQL.format(
+                ctes=_PROJECTED_ROWS_SQL,
+                cell_source=_CELL_SOURCE_SQL[storage].format(row_filter=""),
+                key_filter="",
+            )
+            result["status"] = "full"
+
+        result["cells_written"] = db.execute(text(sql), params).rowcount or 0
+        source.history_watermark = head
+        source.refreshed_at = datetime.utcnow()
+        db.commit()
+
+        logger.info(
+            f"Konsolidasyon {consolidation_id} kaynak {definition.code}: {result['status']}, "
+            f"{result['changed_rows']} satir degisti, {result['cells_written']} hucre yazildi"
+        )
+        return result
+
+    # ============ Read ============
+
+    @staticmethod
+    def aggregate(
+        db: Session,
+        consolidation: BudgetConsolidation,
+        period_ids: List[int],
+        measure_codes: List[str],
+        group_by_entity_id: Optional[int] = None,
+        currency_code: Optional[str] = None,
+    ) -> dict:
+        """
+        Onbellekteki kaynak katkilarini [G, P, M] olarak toplar;
+        donusum grid toplamlari ile ayni yoldan yapilir.
+        """
+        cells = BudgetConsolidationCell
+        group_key = (
+            cells.dimension_values[str(group_by_entity_id)].astext
+            if group_by_entity_id is not None else literal(None)
+        )
+        records = db.query(
+            cells.currency_code,
+            group_key.label("group_key"),
+            cells.period_id,
+            cells.measure_code,
+            func.sum(cells.value),
+        ).filter(
+            cells.consolidation_id == consolidation.id,
+            cells.period_id.in_(period_ids),
+            cells.measure_code.in_(measure_codes),
+        ).group_by(
+            cells.currency_code, "group_key", cells.period_id, cells.measure_code,
+        ).all()
+
+        monetary_codes = set()
+        if currency_code:
+            monetary_codes = CurrencyConverter.monetary_measure_codes(consolidation.measures)
+        return BudgetGridEngine.aggregate_records(
+            db, records, period_ids, measure_codes, monetary_codes, consolidation.version_id, currency_code
+        )
@@ -0,0 +1,286 @@
+"""
+Budget Deletion Service - Tanim, versiyon ve snapshot'larin arka planda silinmesi
+
+Silme istegi hedefi hemen isaretler (deleted_at) ve bir BudgetDeletionJob
+olusturur; isaretli kayitlar API'de bulunamadi olarak gorunur. Veri,
+istekten bagimsiz bir session'da parca parca (DELETE_CHUNK_SIZE) silinir
+ve her parca ayri transaction'da commit edilir. Boylece ORM cascade ile
+tum cocuklarin bellege yuklenmesi ve tek dev transaction olmaz. Tanimin
+hucre partition'i varsa hucreler DROP TABLE ile tek adimda kaldirilir.
+
+Adimlar tekrar calistirilabilir; yarida kalan (failed) bir is yeniden
+baslatildiginda kalan kayitlardan devam eder.
+"""
+
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db.session import get_session_local
+from app.models.budget_entry import (
+    BudgetDefinition, BudgetDeletionJob, DeletionJobStatus, DeletionTargetType,
+)
+from app.models.system_data import BudgetVersion
+from app.services.budget_cell_store import BudgetCellStore
+from app.services.budget_lock_service import BudgetLockService
+
+logger = logging.getLogger(__name__)
+
+# Tek transaction'da silinen en fazla kayit sayisi
+DELETE_CHUNK_SIZE = 20000
+
+_CHUNK_DELETE_SQL = {
+    "snapshot_cells": """
+        DELETE FROM calculation_snapshot_cells
+        WHERE ctid = ANY(ARRAY(
+            SELECT sc.ctid FROM calculation_snapshot_cells sc
+            JOIN calculation_snapshots s ON s.id = sc.snapshot_id
+            WHERE s.budget_definition_id = :definition_id
+            LIMIT :limit
+        ))
+    """,
+    "snapshots": """
+        DELETE FROM calculation_snapshots
+        WHERE id IN (SELECT id FROM calculation_snapshots WHERE budget_definition_id = :definition_id LIMIT :limit)
+    """,
+    "cells": """
+        DELETE FROM budget_entry_cells
+        WHERE budget_definition_id = :definition_id
+          AND id IN (SELECT id FROM budget_entry_cells WHERE budget_definition_id = :definition_id LIMIT :limit)
+    """,
+    "series": """
+        DELETE FROM budget_entry_series
+        WHERE id IN (SELECT id FROM budget_entry_series WHERE budget_definition_id = :definition_id LIMIT :limit)
+    """,
+    "rows": """
+        DELETE FROM budget_entry_rows
+        WHERE id IN (SELECT id FROM budget_entry_rows WHERE budget_definition_id = :definition_id LIMIT :limit)
+    """,
+}
+
+_COUNT_SQL = {
+    "snapshot_cells": """
+        SELECT coalesce(sum(cell_count), 0) FROM calculation_snapshots WHERE budget_definition_id = :definition_id
+    """,
+    "snapshots": "SELECT count(*) FROM calculation_snapshots WHERE budget_definition_id = :definition_id",
+    "cells": "SELECT count(*) FROM budget_entry_cells WHERE budget_definition_id = :definition_id",
+    "series": "SELECT count(*) FROM budget_entry_series WHERE budget_definition_id = :definition_id",
+    "rows": "SELECT count(*) FROM budget_entry_rows WHERE budget_definition_id = :definition_id",
+}
+
+
+class BudgetDeletionService:
+    """Silme isteklerini isaretleyen ve arka planda parca parca silen servis."""
+
+    # ============ Requests ============
+
+    @staticmethod
+    def request_definition_deletion(
+        db: Session, definition: BudgetDefinition, requested_by: Optional[str] = None
+    ) -> BudgetDeletionJob:
+        """Tanimi silinmek uzere isaretler ve is kaydi olusturur (commit cagirana aittir)."""
+        definition.deleted_at = datetime.utcnow()
+        job = BudgetDeletionJob(
+            target_type=DeletionTargetType.definition,
+            target_id=definition.id,
+            target_code=definition.code,
+            status=DeletionJobStatus.pending,
+            requested_by=requested_by,
+        )
+        db.add(job)
+        db.flush()
+        return job
+
+    @staticmethod
+    def request_version_deletion(
+        db: Session, version: BudgetVersion, requested_by: Optional[str] = None
+    ) -> BudgetDeletionJob:
+        """Versiyonu ve tanimlarini silinmek uzere isaretler (commit cagirana aittir)."""
+        now = datetime.utcnow()
+        version.deleted_at = now
+        db.query(BudgetDefinition).filter(
+            BudgetDefinition.version_id == version.id,
+            BudgetDefinition.deleted_at.is_(None),
+        ).update({BudgetDefinition.deleted_at: now}, synchronize_session=False)
+        job = BudgetDeletionJob(
+            target_type=DeletionTargetType.version,
+            target_id=version.id,
+            target_code=version.code,
+            status=DeletionJobStatus.pending,
+            requested_by=requested_by,
+        )
+        db.add(job)
+        db.flush()
+        return job
+
+    @staticmethod
+    def request_snapshot_deletion(
+        db: Session, definition: BudgetDefinition, requested_by: Optional[str] = None
+    ) -> BudgetDeletionJob:
+        """Tanimin tum hesaplama snapshot'lari icin is kaydi olusturur."""
+        job = BudgetDeletionJob(
+            target_type=DeletionTargetType.snapshots,
+            target_id=definition.id,
+            target_code=definition.code,
+            status=DeletionJobStatus.pending,
+            requested_by=requested_by,
+        )
+        db.add(job)
+        db.flush()
+        return job
+
+    @staticmethod
+    def job_status(job: BudgetDeletionJob) -> dict:
+        progress = None
+        if job.total_items:
+            progress = round(min(100.0, 100.0 * (job.deleted_items or 0) / job.total_items), 1)
+        elif job.status == DeletionJobStatus.completed:
+            progress = 100.0
+        return {
+            "id": job.id,
+            "target_type": job.target_type.value,
+            "target_id": job.target_id,
+            "target_code": job.target_code,
+            "status": job.status.value,
+            "current_step": job.current_step,
+            "total_items": job.total_items,
+            "deleted_items": job.deleted_items or 0,
+            "progress": progress,
+            "error_message": job.error_message,
+            "requested_by": job.requested_by,
+            "started_at": job.started_at,
+            "completed_at": job.completed_at,
+            "created_date": job.created_date,
+        }
+
+    # ============ Worker ============
+
+    @staticmethod
+    def run_job(job_id: int) -> None:
+        """
+        Arka plan gorevi: kendi session'ini acar, hedefi parca parca siler
+        ve ilerlemeyi is kaydina yazar.
+        """
+        db = get_session_local()()
+        try:
+            job = db.query(BudgetDeletionJob).filter(BudgetDeletionJob.id == job_id).first()
+            if not job or job.status == DeletionJobStatus.completed:
+                return
+
+            job.status = DeletionJobStatus.running
+            job.started_at = datetime.utcnow()
+            job.error_message = None
+            db.commit()
+
+            if job.target_type == DeletionTargetType.version:
+                BudgetDeletionService._delete_version(db, job)
+            elif job.target_type == DeletionTargetType.definition:
+                BudgetDeletionService._delete_definition(db, job, job.target_id)
+            else:
+                job.total_items = (
+                    (job.deleted_items or 0)
+                    + BudgetDeletionService._count(db, "snapshot_cells", job.target_id)
+                    + BudgetDeletionService._count(db, "snapshots", job.target_id)
+                )
+                BudgetDeletionService._delete_snapshots(db, job, job.target_id)
+
+            job.status = DeletionJobStatus.completed
+            job.current_step = None
+            job.completed_at = datetime.utcnow()
+            db.commit()
+            logger.info(f"Silme isi tamamlandi: {job.target_type.value} {job.target_id}, {job.deleted_items} kayit")
+
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Silme isi hatasi: job_id={job_id}, hata={e}")
+            job = db.query(BudgetDeletionJob).filter(BudgetDeletionJob.id == job_id).first()
+            if job:
+                job.status = DeletionJobStatus.failed
+                job.error_message = str(e)[:2000]
+                job.completed_at = datetime.utcnow()
+                db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _count(db: Session, kind: str, definition_id: int) -> int:
+        return db.execute(text(_COUNT_SQL[kind]), {"definition_id": definition_id}).scalar() or 0
+
+    @staticmethod
+    def _delete_chunks(db: Session, job: BudgetDeletionJob, kind: str, definition_id: int) -> None:
+        """Kayitlari DELETE_CHUNK_SIZE'lik parcalarla, her parcayi ayri commit ederek siler."""
+        job.current_step = f"{kind} ({definition_id})"
+        db.commit()
+        sql = text(_CHUNK_DELETE_SQL[kind])
+        while True:
+            deleted = db.execute(sql, {"definition_id": definition_id, "limit": DELETE_CHUNK_SIZE}).rowcount
+            job.deleted_items = (job.deleted_items or 0) + deleted
+            db.commit()
+            if deleted < DELETE_CHUNK_SIZE:
+                break
+
+    @staticmethod
+    def _delete_snapshots(db: Session, job: BudgetDeletionJob, definition_id: int) -> None:
+        # Snapshot hucreleri once parca parca silinir; snapshot silerken cascade kucuk kalir
+        BudgetDeletionService._delete_chunks(db, job, "snapshot_cells", definition_id)
+        BudgetDeletionService._delete_chunks(db, job, "snapshots", definition_id)
+
+    @staticmethod
+    def _definition_total(db: Session, definition_id: int) -> int:
+        return sum(BudgetDeletionService._count(db, kind, definition_id) for kind in _COUNT_SQL)
+
+    @staticmethod
+    def _delete_definition(db: Session, job: BudgetDeletionJob, definition_id: int, count: bool = True) -> None:
+        if count:
+            job.total_items = (job.deleted_items or 0) + BudgetDeletionService._definition_total(db, definition_id)
+            db.commit()
+
+        # Devam eden hesaplama / kaydetme bitene kadar bekle
+        BudgetLockService.lock(db, definition_id)
+        db.commit()
+
+        BudgetDeletionService._delete_snapshots(db, job, definition_id)
+
+        partition = BudgetCellStore.partition_name(definition_id)
+        if db.execute(text("SELECT to_regclass(:name)"), {"name": partition}).scalar():
+            job.current_step = f"cells ({definition_id})"
+            cells = BudgetDeletionService._count(db, "cells", definition_id)
+            # drop_partition ayri baglantida CONCURRENTLY ayirir; acik transaction birakilmaz
+            db.commit()
+            BudgetCellStore.drop_partition(db, definition_id)
+            job.deleted_items = (job.deleted_items or 0) + cells
+            db.commit()
+        else:
+            BudgetDeletionService._delete_chunks(db, job, "cells", definition_id)
+
+        BudgetDeletionService._delete_chunks(db, job, "series", definition_id)
+        BudgetDeletionService._delete_chunks(db, job, "rows", definition_id)
+
+        # Boyutlar FK cascade ile silinir
+        db.execute(text("DELETE FROM budget_definitions WHERE id = :id"), {"id": definition_id})
+        db.commit()
+
+    @staticmethod
+    def _delete_version(db: Session, job: BudgetDeletionJob) -> None:
+        version_id = job.target_id
+        definition_ids = [
+            definition_id for (definition_id,) in db.execute(
+                text("SELECT id FROM budget_definitions WHERE version_id = :v ORDER BY id"), {"v": version_id}
+            ).all()
+        ]
+        job.total_items = (job.deleted_items or 0) + sum(
+            BudgetDeletionService._definition_total(db, d) for d in definition_ids
+        )
+        db.commit()
+
+        for definition_id in definition_ids:
+            BudgetDeletionService._delete_definition(db, job, definition_id, count=False)
+
+        # Parametre degerleri ve kurlar FK cascade ile silinir
+        job.current_step = "version"
+        db.execute(text("UPDATE budget_versions SET copied_from_id = NULL WHERE copied_from_id = :v"), {"v": version_id})
+        db.execute(text("DELETE FROM budget_versions WHERE id = :v"), {"v": version_id})
+        db.commit()
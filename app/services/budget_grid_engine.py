@@ -0,0 +1,511 @@
+"""
+Budget Grid Engine - Vektorel butce grid hesaplama motoru
+
+Butce grid'ini (senaryo x satir x donem x olcu) numpy dizilerine yukler ve
+kural seti kalemlerini tum satirlara ayni anda uygular. Senaryo ekseni
+sayesinde ayni hesaplama N farkli parametre degeri icin tek geciste yapilir.
+"""
+
+import logging
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func, literal
+from sqlalchemy.orm import Session
+
+from app.models.budget_entry import (
+    BudgetDefinition, BudgetEntryRow, BudgetEntryCell, BudgetCellType,
+    BudgetMeasureType, CalculationSnapshot, RuleType
+)
+from app.models.system_data import BudgetParameter
+from app.services.budget_snapshot_service import BudgetSnapshotService
+from app.services.currency_conversion_service import CurrencyConverter
+from app.services.rule_set_compiler import (
+    RuleSetCompiler, CompiledRuleItem, CompiledFormula, compile_formula
+)
+
+logger = logging.getLogger(__name__)
+
+# Bir sweep'te izin verilen en fazla senaryo sayisi (bellek korumasi)
+MAX_SWEEP_POINTS = 101
+
+
+class GridArrays:
+    """
+    Grid'in dizi temsili.
+    - values: float64 [S, R, P, M] (olmayan hucre = 0)
+    - manual: bool [R, P, M] (kullanici override'i, tum senaryolarda ortak)
+    """
+
+    def __init__(
+        self,
+        row_ids: List[int],
+        dimension_values: List[dict],
+        period_ids: List[int],
+        measure_codes: List[str],
+        values: np.ndarray,
+        manual: np.ndarray,
+    ):
+        self.row_ids = row_ids
+        self.dimension_values = dimension_values
+        self.period_ids = period_ids
+        self.measure_codes = measure_codes
+        self.measure_index = {code: i for i, code in enumerate(measure_codes)}
+        self.values = values
+        self.manual = manual
+
+    @property
+    def scenario_count(self) -> int:
+        return self.values.shape[0]
+
+
+class BudgetGridEngine:
+    """Grid hesaplamalarini dizi uzerinde yapan motor."""
+
+    # ============ Loading ============
+
+    @staticmethod
+    def load_arrays(
+        db: Session,
+        definition_id: int,
+        period_ids: List[int],
+        measure_codes: List[str],
+        scenario_count: int = 1,
+    ) -> GridArrays:
+        """
+        Aktif satirlari ve input hucreleri tek sorguda okur.
+        Hesaplanan hucreler hesaplama basinda silindigi icin yuklenmez.
+        """
+        rows = db.query(BudgetEntryRow.id, BudgetEntryRow.dimension_values).filter(
+            BudgetEntryRow.budget_definition_id == definition_id,
+            BudgetEntryRow.is_active == True
+        ).order_by(BudgetEntryRow.sort_order, BudgetEntryRow.id).all()
+
+        row_ids = [r.id for r in rows]
+        dimension_values = [r.dimension_values or {} for r in rows]
+
+        shape = (len(row_ids), len(period_ids), len(measure_codes))
+        values = np.zeros((scenario_count,) + shape, dtype=np.float64)
+        manual = np.zeros(shape, dtype=bool)
+
+        if not row_ids or not period_ids or not measure_codes:
+            return GridArrays(row_ids, dimension_values, period_ids, measure_codes, values, manual)
+
+        row_pos = {rid: i for i, rid in enumerate(row_ids)}
+        period_pos = {pid: i for i, pid in enumerate(period_ids)}
+        measure_pos = {code: i for i, code in enumerate(measure_codes)}
+
+        cells = db.query(
+            BudgetEntryCell.row_id, BudgetEntryCell.period_id, BudgetEntryCell.measure_code,
+            BudgetEntryCell.value, BudgetEntryCell.is_manual_override
+        ).join(BudgetEntryRow, BudgetEntryRow.id == BudgetEntryCell.row_id).filter(
+            BudgetEntryCell.budget_definition_id == definition_id,
+            BudgetEntryRow.budget_definition_id == definition_id,
+            BudgetEntryRow.is_active == True,
+            BudgetEntryCell.cell_type == BudgetCellType.input,
+        ).all()
+
+        ri, pi, mi, vals, flags = [], [], [], [], []
+        for row_id, period_id, measure_code, value, is_manual in cells:
+            p = period_pos.get(period_id)
+            m = measure_pos.get(measure_code)
+            if p is None or m is None:
+                continue
+            ri.append(row_pos[row_id])
+            pi.append(p)
+            mi.append(m)
+            vals.append(float(value) if value is not None else 0.0)
+            flags.append(bool(is_manual))
+
+        if ri:
+            ri_arr, pi_arr, mi_arr = np.array(ri), np.array(pi), np.array(mi)
+            values[:, ri_arr, pi_arr, mi_arr] = np.array(vals, dtype=np.float64)
+            manual[ri_arr, pi_arr, mi_arr] = np.array(flags, dtype=bool)
+
+        return GridArrays(row_ids, dimension_values, period_ids, measure_codes, values, manual)
+
+    # ============ Conditions ============
+
+    @staticmethod
+    def row_mask(db: Session, arrays: GridArrays, item: CompiledRuleItem) -> np.ndarray:
+        """Kalemin boyut kosuluna uyan satirlar icin bool maske [R]."""
+        if item.condition is None:
+            return np.ones(len(arrays.row_ids), dtype=bool)
+
+        key = str(item.condition.attribute.entity_id)
+        row_md_ids = [dims.get(key) for dims in arrays.dimension_values]
+        lookup = RuleSetCompiler.resolve_attribute(db, item.condition.attribute, row_md_ids)
+
+        matches = {md_id: item.condition.matches(actual) for md_id, actual in lookup.items()}
+        return np.array([matches.get(md_id, False) for md_id in row_md_ids], dtype=bool)
+
+    @staticmethod
+    def period_window(arrays: GridArrays, period_ids: Optional[frozenset]):
+        """
+        Donem maskesi [P] ve baz donem index'i.
+        Baz donem, ilk uygulanan donemden bir onceki donemdir (yoksa None).
+        """
+        if not period_ids:
+            return np.ones(len(arrays.period_ids), dtype=bool), None
+        mask = np.array([pid in period_ids for pid in arrays.period_ids], dtype=bool)
+        applicable = np.flatnonzero(mask)
+        base_idx = int(applicable[0]) - 1 if applicable.size and applicable[0] > 0 else None
+        return mask, base_idx
+
+    # ============ Formulas ============
+
+    @staticmethod
+    def evaluate_formula(formula: Optional[CompiledFormula], arrays: GridArrays, period_idx: Optional[int] = None):
+        """
+        Derlenmis formulu tum grid icin hesaplar [S, R, P]; gecersiz sonuclar NaN olur.
+        period_idx verilirse olcu degerleri o donemden okunur (baz donem).
+        """
+        if formula is None:
+            return None
+        values = arrays.values
+        if period_idx is not None:
+            namespace = {code: values[:, :, period_idx, i][:, :, None] for code, i in arrays.measure_index.items()}
+        else:
+            namespace = {code: values[:, :, :, i] for code, i in arrays.measure_index.items()}
+        with np.errstate(all="ignore"):
+            result = formula.evaluate(namespace)
+            if result is None:
+                return None
+            result = np.broadcast_to(np.asarray(result, dtype=np.float64), values.shape[:3])
+        return np.where(np.isfinite(result), result, np.nan)
+
+    # ============ Rule Application ============
+
+    @staticmethod
+    def apply_value_item(
+        arrays: GridArrays,
+        item: CompiledRuleItem,
+        rows: np.ndarray,
+        periods: np.ndarray,
+        base_idx: Optional[int],
+        param_values: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        fixed_value ve parameter_multiplier kalemlerini uygular.
+        param_values: senaryo basina parametre degeri [S] (NaN = parametre yok, kalem atlanir).
+        """
+        t = arrays.measure_index.get(item.target_measure_code)
+        if t is None:
+            return
+        values = arrays.values
+        writable = rows[:, None] & periods[None, :] & ~arrays.manual[:, :, t]  # [R, P]
+
+        if item.rule_type == RuleType.fixed_value:
+            if item.fixed_value is None:
+                return
+            values[:, :, :, t] = np.where(writable[None], float(item.fixed_value), values[:, :, :, t])
+            return
+
+        if param_values is None:
+            return
+        operation = item.parameter_operation
+        if operation not in ("multiply", "add", "replace"):
+            return
+        active = ~np.isnan(param_values)  # [S]
+        pv = np.nan_to_num(param_values)[:, None]  # [S, 1]
+
+        def _apply(base):
+            if operation == "multiply":
+                return base * (1 + pv / 100)
+            if operation == "add":
+                return base + pv
+            return np.broadcast_to(pv, base.shape)
+
+        if item.period_ids:
+            # Donem filtresi: tum uygulanan donemler icin sabit baz
+            base = values[:, :, base_idx, t] if base_idx is not None else np.zeros(values.shape[:2])
+            new_values = _apply(base)  # [S, R]
+            mask = active[:, None, None] & writable[None]
+            values[:, :, :, t] = np.where(mask, new_values[:, :, None], values[:, :, :, t])
+            return
+
+        # Filtre yok: onceki donemden zincirleme
+        for p in range(values.shape[2]):
+            base = values[:, :, p - 1, t] if p > 0 else np.zeros(values.shape[:2])
+            mask = active[:, None] & writable[None, :, p]
+            values[:, :, p, t] = np.where(mask, _apply(base), values[:, :, p, t])
+
+    @staticmethod
+    def apply_formula_item(
+        arrays: GridArrays,
+        item: CompiledRuleItem,
+        rows: np.ndarray,
+        periods: np.ndarray,
+        base_idx: Optional[int],
+    ) -> None:
+        """formula tipi kalemi uygular (donem filtresi varsa baz donem degerleriyle)."""
+        t = arrays.measure_index.get(item.target_measure_code)
+        if t is None:
+            return
+        result = BudgetGridEngine.evaluate_formula(item.formula, arrays, base_idx)
+        if result is None:
+            return
+
+        values = arrays.values
+        writable = rows[:, None] & periods[None, :] & ~arrays.manual[:, :, t]
+        mask = writable[None] & ~np.isnan(result)
+        values[:, :, :, t] = np.where(mask, result, values[:, :, :, t])
+
+    @staticmethod
+    def run_formula_measures(arrays: GridArrays, formulas: Dict[str, str]) -> None:
+        """Hesaplanan olculeri (ornek: TUTAR = FIYAT * MIKTAR) tum grid icin hesaplar."""
+        values = arrays.values
+        for measure_code, formula in formulas.items():
+            t = arrays.measure_index.get(measure_code)
+            if t is None:
+                continue
+            result = BudgetGridEngine.evaluate_formula(compile_formula(formula), arrays)
+            if result is None:
+                continue
+            mask = ~arrays.manual[None, :, :, t] & ~np.isnan(result)
+            values[:, :, :, t] = np.where(mask, result, values[:, :, :, t])
+
+    @staticmethod
+    def run_rules(
+        db: Session,
+        arrays: GridArrays,
+        items: Sequence[CompiledRuleItem],
+        formulas: Dict[str, str],
+        param_values: Dict[int, np.ndarray],
+    ) -> None:
+        """
+        calculate_grid ile ayni fazlari dizi uzerinde calistirir:
+        1) fixed_value / parameter_multiplier, 2) olcu formulleri,
+        3) formula kalemleri, 4) olcu formulleri (formula kalemi varsa).
+        Para birimi atamasi toplamlari etkilemedigi icin atlanir.
+        """
+        masks = {}
+
+        def _masks(item):
+            if item.id not in masks:
+                rows = BudgetGridEngine.row_mask(db, arrays, item)
+                periods, base_idx = BudgetGridEngine.period_window(arrays, item.period_ids)
+                masks[item.id] = (rows, periods, base_idx)
+            return masks[item.id]
+
+        for item in items:
+            if item.rule_type in (RuleType.formula, RuleType.currency_assign):
+                continue
+            if item.rule_type == RuleType.parameter_multiplier and not item.parameter_id:
+                continue
+            rows, periods, base_idx = _masks(item)
+            BudgetGridEngine.apply_value_item(
+                arrays, item, rows, periods, base_idx, param_values.get(item.parameter_id)
+            )
+
+        BudgetGridEngine.run_formula_measures(arrays, formulas)
+
+        formula_items = [item for item in items if item.rule_type == RuleType.formula]
+        for item in formula_items:
+            rows, periods, base_idx = _masks(item)
+            BudgetGridEngine.apply_formula_item(arrays, item, rows, periods, base_idx)
+
+        if formula_items:
+            BudgetGridEngine.run_formula_measures(arrays, formulas)
+
+    # ============ Sensitivity Sweep ============
+
+    @staticmethod
+    def sweep_values(
+        values: Optional[List[float]],
+        range_start: Optional[float],
+        range_end: Optional[float],
+        step: Optional[float],
+    ) -> List[float]:
+        """Istekteki deger listesini veya aralik/adim tanimini deger listesine cevirir."""
+        if values:
+            result = [float(v) for v in values]
+        elif range_start is not None and range_end is not None and step:
+            if step <= 0 or range_end < range_start:
+                raise ValueError("Gecersiz aralik: bitis >= baslangic ve adim > 0 olmali")
+            count = int(np.floor((range_end - range_start) / step + 1e-9)) + 1
+            if count > MAX_SWEEP_POINTS:
+                raise ValueError(f"En fazla {MAX_SWEEP_POINTS} deger hesaplanabilir")
+            result = [round(range_start + i * step, 10) for i in range(count)]
+        else:
+            raise ValueError("Deger listesi veya aralik (baslangic, bitis, adim) verilmeli")
+
+        if len(result) > MAX_SWEEP_POINTS:
+            raise ValueError(f"En fazla {MAX_SWEEP_POINTS} deger hesaplanabilir")
+        return result
+
+    @staticmethod
+    def run_sensitivity(
+        db: Session,
+        definition: BudgetDefinition,
+        periods: list,
+        parameter_id: int,
+        sweep: List[float],
+        rule_set_ids: Sequence[int],
+    ) -> dict:
+        """
+        Parametrenin her degeri icin grid toplamlarini tek geciste hesaplar.
+        Senaryo 0 versiyondaki mevcut parametre degeridir (delta referansi);
+        sonraki senaryolar sweep degerleridir. Veritabanina yazilmaz.
+        """
+        parameter = db.query(BudgetParameter).filter(BudgetParameter.id == parameter_id).first()
+        if not parameter:
+            raise ValueError("Parametre bulunamadi")
+
+        measures = [m for m in definition.budget_type.measures if m.is_active]
+        measure_codes = [m.code for m in measures]
+        formulas = {
+            m.code: m.formula for m in measures
+            if m.measure_type == BudgetMeasureType.calculated and m.formula
+        }
+
+        plan = RuleSetCompiler.get_plan(db, rule_set_ids, definition.version_id)
+        items = plan.items
+        used_params = {item.parameter_id for item in items if item.parameter_id}
+        if parameter_id not in used_params:
+            raise ValueError(f"'{parameter.code}' parametresi secilen kural setlerinde kullanilmiyor")
+
+        bound = plan.parameter_values
+        base_value = bound.get(parameter_id)
+
+        scenario_count = len(sweep) + 1
+        arrays = BudgetGridEngine.load_arrays(
+            db, definition.id, [p.id for p in periods], measure_codes, scenario_count
+        )
+
+        param_values = {
+            pid: np.full(scenario_count, bound.get(pid, np.nan), dtype=np.float64)
+            for pid in used_params
+        }
+        param_values[parameter_id] = np.array(
+            [base_value if base_value is not None else np.nan] + sweep, dtype=np.float64
+        )
+
+        BudgetGridEngine.run_rules(db, arrays, items, formulas, param_values)
+
+        totals = arrays.values.sum(axis=(1, 2))  # [S, M]
+        base_totals = totals[0]
+        points = []
+        for s, value in enumerate(sweep, start=1):
+            deltas = totals[s] - base_totals
+            points.append({
+                "parameter_value": value,
+                "totals": {code: float(totals[s, i]) for i, code in enumerate(measure_codes)},
+                "deltas": {code: float(deltas[i]) for i, code in enumerate(measure_codes)},
+                "delta_percents": {
+                    code: (float(deltas[i] / base_totals[i] * 100) if base_totals[i] else None)
+                    for i, code in enumerate(measure_codes)
+                },
+            })
+
+        logger.info(
+            f"Hassasiyet analizi: def={definition.id}, param={parameter.code}, "
+            f"{len(sweep)} deger, {len(arrays.row_ids)} satir"
+        )
+
+        return {
+            "definition_id": definition.id,
+            "parameter_id": parameter.id,
+            "parameter_code": parameter.code,
+            "base_value": base_value,
+            "measures": measure_codes,
+            "base_totals": {code: float(base_totals[i]) for i, code in enumerate(measure_codes)},
+            "points": points,
+            "row_count": len(arrays.row_ids),
+            "period_count": len(arrays.period_ids),
+        }
+
+    # ============ Aggregation ============
+
+    @staticmethod
+    def aggregate(
+        db: Session,
+        definition: BudgetDefinition,
+        period_ids: List[int],
+        measure_codes: List[str],
+        group_by_entity_id: Optional[int] = None,
+        currency_code: Optional[str] = None,
+        snapshot: Optional[CalculationSnapshot] = None,
+    ) -> dict:
+        """
+        Grid toplamlarini [G, P, M] olarak hesaplar.
+        Toplama veritabaninda (para birimi, grup, donem, olcu) bazinda yapilir;
+        currency_code verilirse parasal olculer bu gruplanmis toplamlar
+        uzerinde tek seferde donusturulur ve tekrar toplanir.
+        snapshot verilirse hucreler snapshot aninda haliyle okunur.
+        """
+        group_key = (
+            BudgetEntryRow.dimension_values[str(group_by_entity_id)].astext
+            if group_by_entity_id is not None else literal(None)
+        )
+        cells = BudgetSnapshotService.cell_source(definition.id, snapshot)
+        records = db.query(
+            BudgetEntryRow.currency_code,
+            group_key.label("group_key"),
+            cells.c.period_id,
+            cells.c.measure_code,
+            func.sum(cells.c.value),
+        ).join(BudgetEntryRow, BudgetEntryRow.id == cells.c.row_id).filter(
+            BudgetEntryRow.budget_definition_id == definition.id,
+            BudgetEntryRow.is_active == True,
+            cells.c.period_id.in_(period_ids),
+            cells.c.measure_code.in_(measure_codes),
+        ).group_by(
+            BudgetEntryRow.currency_code, "group_key", cells.c.period_id, cells.c.measure_code,
+        ).all()
+
+        monetary_codes = set()
+        if currency_code:
+            monetary_codes = CurrencyConverter.monetary_measure_codes(
+                m for m in definition.budget_type.measures if m.code in measure_codes
+            )
+        return BudgetGridEngine.aggregate_records(
+            db, records, period_ids, measure_codes, monetary_codes, definition.version_id, currency_code
+        )
+
+    @staticmethod
+    def aggregate_records(
+        db: Session,
+        records: List[tuple],
+        period_ids: List[int],
+        measure_codes: List[str],
+        monetary_codes: set,
+        version_id: int,
+        currency_code: Optional[str] = None,
+    ) -> dict:
+        """
+        (para birimi, grup, donem, olcu, toplam) kayitlarini [G, P, M] dizisine
+        yerlestirir; currency_code verilirse parasal olculeri donusturur.
+        """
+        group_keys = sorted({r[1] for r in records}, key=lambda k: (k is None, str(k)))
+        values = np.zeros((len(group_keys), len(period_ids), len(measure_codes)), dtype=np.float64)
+        missing = set()
+        if not records:
+            return {"group_keys": group_keys, "values": values, "missing_rates": missing}
+
+        group_pos = {k: i for i, k in enumerate(group_keys)}
+        period_pos = {pid: i for i, pid in enumerate(period_ids)}
+        measure_pos = {code: i for i, code in enumerate(measure_codes)}
+
+        row_codes = [r[0] for r in records]
+        record_periods = [r[2] for r in records]
+        gi = np.array([group_pos[r[1]] for r in records])
+        pi = np.array([period_pos[r[2]] for r in records])
+        mi = np.array([measure_pos[r[3]] for r in records])
+        sums = np.array([float(r[4]) if r[4] is not None else 0.0 for r in records], dtype=np.float64)
+
+        if currency_code:
+            monetary = np.array([r[3] in monetary_codes for r in records], dtype=bool)
+            table = CurrencyConverter.get_rate_table(db, version_id)
+            factors = CurrencyConverter.factors(table, row_codes, record_periods, currency_code)
+            sums = CurrencyConverter.convert(sums, factors, monetary)
+            missing_mask = monetary & np.isnan(factors)
+            if missing_mask.any():
+                idx = np.flatnonzero(missing_mask)
+                missing = CurrencyConverter.missing_rates(
+                    table, factors[idx], [row_codes[i] for i in idx], [record_periods[i] for i in idx], currency_code
+                )
+                sums = np.where(missing_mask, 0.0, sums)
+
+        np.add.at(values, (gi, pi, mi), sums)
+        return {"group_keys": group_keys, "values": values, "missing_rates": missing}
@@ -0,0 +1,506 @@
+"""
+Budget Import Service - Dosyadan butce grid'ine toplu aktarim
+
+CSV / XLSX / Parquet dosyasini parcalar (chunk) halinde okur, boyut
+kodlarini bellekteki kod -> id haritasiyla cozer, eksik satirlari toplu
+olusturur ve hucreleri toplu upsert ile yazar. Hatali satirlar hata
+nedeniyle birlikte indirilebilir bir red (rejects) dosyasina yazilir;
+REJECTS_MAX_AGE'den eski red dosyalari yeni bir aktarim basladiginda silinir.
+
+Dosya duzenleri:
+- long: boyut kolonlari + PERIOD (+ CURRENCY) + olcu kolonlari
+  (grid export ciktisi ile ayni)
+- wide: boyut kolonlari (+ CURRENCY, MEASURE) + donem kolonlari (yyyy-MM)
+"""
+
+import csv
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid as uuid_lib
+from datetime import date, datetime
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.models.budget_entry import (
+    BudgetDefinition, BudgetDefinitionDimension, BudgetEntryRow, BudgetMeasureType
+)
+from app.models.dynamic.master_data import MasterData
+from app.models.dynamic.meta_entity import MetaEntity
+from app.services.budget_cell_store import BudgetCellStore
+from app.services.cell_history_service import CellHistoryBuffer
+
+logger = logging.getLogger(__name__)
+
+IMPORT_LAYOUTS = ("auto", "long", "wide")
+
+# Dosyadan bir seferde islenen kaynak satir sayisi
+IMPORT_CHUNK_ROWS = 50000
+
+# Yanitta donen en fazla hata mesaji
+MAX_ERROR_DETAILS = 50
+
+REJECTS_DIR = os.path.join(tempfile.gettempdir(), "pbs_import_rejects")
+
+# Red dosyalari bu kadar sn sonra silinir (indirme icin yeterli sure)
+REJECTS_MAX_AGE = 24 * 3600
+
+_PERIOD_CODE = re.compile(r"^\d{4}-\d{2}$")
+_REJECT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _normalize_header(value) -> str:
+    if isinstance(value, (datetime, date)):
+        return f"{value.year:04d}-{value.month:02d}"
+    return str(value).strip().upper() if value is not None else ""
+
+
+def _as_code(series: pd.Series) -> pd.Series:
+    """Kod kolonunu metne cevirir (Excel'in 100 -> 100.0 donusumu dahil)."""
+    def _one(v):
+        if v is None or (isinstance(v, float) and np.isnan(v)):
+            return ""
+        if isinstance(v, float) and v.is_integer():
+            return str(int(v))
+        if isinstance(v, (datetime, date)):
+            return f"{v.year:04d}-{v.month:02d}"
+        return str(v).strip()
+    return series.map(_one)
+
+
+def _parse_values(raw: pd.Series) -> Tuple[pd.Series, pd.Series, pd.Series]:
+    """(deger, bos maskesi, gecersiz maskesi). Ondalik ayirici olarak virgul kabul edilir."""
+    if pd.api.types.is_numeric_dtype(raw):
+        values = raw.astype(np.float64)
+        blank = values.isna()
+        return values, blank, pd.Series(False, index=raw.index)
+
+    text = raw.where(raw.notna(), "").astype(str).str.strip()
+    blank = text.eq("")
+    comma_decimal = text.str.contains(",", regex=False) & ~text.str.contains(".", regex=False)
+    text = text.where(~comma_decimal, text.str.replace(",", ".", regex=False))
+    values = pd.to_numeric(text, errors="coerce")
+    invalid = values.isna() & ~blank
+    return values, blank, invalid
+
+
+class BudgetImportService:
+    """Butce tanimina dosyadan toplu veri aktaran servis."""
+
+    # ============ Readers ============
+
+    @staticmethod
+    def iter_chunks(stream: BinaryIO, file_name: str, chunk_rows: int = IMPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        """Dosyayi tipine gore parca parca DataFrame olarak okur (tum dosya bellege alinmaz)."""
+        ext = os.path.splitext(file_name or "")[1].lower()
+
+        if ext in (".parquet", ".pq"):
+            import pyarrow.parquet as pq
+            parquet_file = pq.ParquetFile(stream)
+            for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+                yield batch.to_pandas()
+            return
+
+        if ext in (".xlsx", ".xlsm"):
+            from openpyxl import load_workbook
+            workbook = load_workbook(stream, read_only=True, data_only=True)
+            try:
+                sheet = workbook.worksheets[0]
+                rows = sheet.iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    return
+                columns = [_normalize_header(h) for h in header]
+                buffer = []
+                for values in rows:
+                    if values is None or all(v is None for v in values):
+                        continue
+                    buffer.append(values[:len(columns)])
+                    if len(buffer) >= chunk_rows:
+                        yield pd.DataFrame(buffer, columns=columns, dtype=object)
+                        buffer = []
+                if buffer:
+                    yield pd.DataFrame(buffer, columns=columns, dtype=object)
+            finally:
+                workbook.close()
+            return
+
+        if ext in (".csv", ".txt", ""):
+            head = stream.read(64 * 1024)
+            stream.seek(0)
+            first_line = head.decode("utf-8-sig", errors="ignore").splitlines()[0] if head else ""
+            delimiter = max([";", ",", "\t", "|"], key=first_line.count)
+            for chunk in pd.read_csv(
+                stream, sep=delimiter, dtype=str, keep_default_na=False,
+                encoding="utf-8-sig", chunksize=chunk_rows,
+            ):
+                yield chunk
+            return
+
+        raise ValueError(f"Desteklenmeyen dosya tipi: {ext} (csv, xlsx, parquet)")
+
+    # ============ Import ============
+
+    @staticmethod
+    def import_file(
+        db: Session,
+        definition: BudgetDefinition,
+        periods: list,
+        stream: BinaryIO,
+        file_name: str,
+        layout: str = "auto",
+        measure_code: Optional[str] = None,
+        history: Optional[CellHistoryBuffer] = None,
+    ) -> Dict:
+        """
+        Dosyayi tanima aktarir (commit cagirana aittir).
+        Bir kaynak satirindaki herhangi bir hata o satirin tamamini reddeder.
+        history verilirse degisen hucreler gecmise yazilir. rows_changed: satir
+        eklendi, para birimi degisti ya da pasif satir aktiflesti (hucre gecmisine
+        dusmez; konsolidasyonlari cagiran gecersiz kilar).
+        """
+        if layout not in IMPORT_LAYOUTS:
+            raise ValueError(f"Gecersiz duzen: {layout} (auto, long, wide)")
+
+        # Boyutlar: entity kodu -> entity_id (tanimdaki sirayla)
+        dimensions = [
+            (entity.id, entity.code.upper())
+            for _, entity in db.query(BudgetDefinitionDimension, MetaEntity).join(
+                MetaEntity, MetaEntity.id == BudgetDefinitionDimension.entity_id
+            ).filter(
+                BudgetDefinitionDimension.budget_definition_id == definition.id
+            ).order_by(BudgetDefinitionDimension.sort_order).all()
+        ]
+        if not dimensions:
+            raise ValueError("Tanimda boyut bulunamadi")
+
+        # Bellek ici kod -> id haritalari (entity basina tek sorgu)
+        code_maps = {}
+        for entity_id, _ in dimensions:
+            code_maps[entity_id] = {
+                code: md_id for md_id, code in db.query(MasterData.id, MasterData.code).filter(
+                    MasterData.entity_id == entity_id
+                ).all()
+            }
+
+        period_map = {p.code: p.id for p in periods}
+        measures = {m.code.upper(): m for m in definition.budget_type.measures if m.is_active}
+        input_measures = {code for code, m in measures.items() if m.measure_type == BudgetMeasureType.input}
+        if measure_code and measure_code.upper() not in input_measures:
+            raise ValueError(f"'{measure_code}' input olcu degil veya bulunamadi")
+
+        # Mevcut satirlar: boyut anahtari -> row_id
+        row_map: Dict[tuple, int] = {}
+        row_currency: Dict[int, Optional[str]] = {}
+        inactive_rows = set()
+        for row_id, dimension_values, currency_code, is_active in db.query(
+            BudgetEntryRow.id, BudgetEntryRow.dimension_values,
+            BudgetEntryRow.currency_code, BudgetEntryRow.is_active,
+        ).filter(BudgetEntryRow.budget_definition_id == definition.id).all():
+            key = BudgetImportService._row_key(dimension_values or {}, dimensions)
+            if key is not None:
+                row_map[key] = row_id
+                row_currency[row_id] = currency_code
+                if not is_active:
+                    inactive_rows.add(row_id)
+
+        stats = {
+            "layout": layout,
+            "processed_rows": 0,
+            "created_rows": 0,
+            "upserted_cells": 0,
+            "rejected_rows": 0,
+            "reject_file_id": None,
+            "ignored_columns": [],
+            "errors": [],
+            "rows_changed": False,
+        }
+        reactivated = set()
+        BudgetImportService.cleanup_rejects()
+        rejects = _RejectWriter(definition.id)
+
+        try:
+            line_offset = 0
+            for chunk in BudgetImportService.iter_chunks(stream, file_name):
+                chunk.columns = [_normalize_header(c) for c in chunk.columns]
+                chunk.index = pd.RangeIndex(line_offset + 2, line_offset + 2 + len(chunk))  # 1 = baslik
+                line_offset += len(chunk)
+
+                if stats["processed_rows"] == 0:
+                    stats["layout"] = BudgetImportService._resolve_layout(
+                        chunk, layout, dimensions, period_map, measures, stats
+                    )
+                stats["processed_rows"] += len(chunk)
+
+                cells, keys, errors = BudgetImportService._chunk_cells(
+                    chunk, stats["layout"], dimensions, code_maps, period_map,
+                    input_measures, measure_code,
+                )
+
+                # Hatasiz kaynak satirlari: boyut anahtari ve para birimi
+                ok_keys = keys.drop(errors.index) if len(errors) else keys
+                currencies = None
+                if "CURRENCY" in chunk.columns:
+                    currencies = _as_code(chunk.loc[ok_keys.index, "CURRENCY"]).str.upper()
+
+                # Eksik satirlari toplu olustur
+                missing = ok_keys[ok_keys.map(row_map.get).isna()]
+                if len(missing):
+                    new_keys = dict(zip(
+                        missing, currencies.loc[missing.index] if currencies is not None else [None] * len(missing)
+                    ))
+                    created = BudgetImportService._create_rows(db, definition.id, dimensions, new_keys)
+                    row_map.update(created)
+                    row_currency.update({row_id: new_keys[key] or "TL" for key, row_id in created.items()})
+                    stats["created_rows"] += len(created)
+                    stats["rows_changed"] = stats["rows_changed"] or bool(created)
+
+                line_row_ids = ok_keys.map(row_map.get)
+                reactivated |= inactive_rows & set(line_row_ids)
+
+                if currencies is not None:
+                    changes = {
+                        row_id: code for row_id, code in zip(line_row_ids, currencies)
+                        if code and row_currency.get(row_id) != code
+                    }
+                    if changes:
+                        db.execute(
+                            update(BudgetEntryRow),
+                            [{"id": row_id, "currency_code": code} for row_id, code in changes.items()],
+                        )
+                        row_currency.update(changes)
+                        stats["rows_changed"] = True
+
+                valid = cells[cells["line"].isin(line_row_ids.index)] if len(errors) else cells
+                row_ids = valid["line"].map(line_row_ids)
+
+                # Ayni hucre dosyada birden fazla ise son deger gecerli
+                upsert = pd.DataFrame({
+                    "row_id": row_ids.astype(np.int64),
+                    "period_id": valid["period_id"].astype(np.int64),
+                    "measure_code": valid["measure_code"],
+                    "value": valid["value"].round(4),
+                }).drop_duplicates(subset=["row_id", "period_id", "measure_code"], keep="last")
+                stats["upserted_cells"] += BudgetCellStore.bulk_upsert(
+                    db, upsert.to_dict("records"), history=history
+                )
+
+                if len(errors):
+                    stats["rejected_rows"] += len(errors)
+                    rejects.write(chunk.loc[errors.index], errors)
+                    remaining = MAX_ERROR_DETAILS - len(stats["errors"])
+                    if remaining > 0:
+                        stats["errors"] += [f"Satir {line}: {msg}" for line, msg in errors.head(remaining).items()]
+
+            if reactivated:
+                db.execute(
+                    update(BudgetEntryRow).where(BudgetEntryRow.id.in_(reactivated)).values(is_active=True)
+                )
+                stats["rows_changed"] = True
+        finally:
+            stats["reject_file_id"] = rejects.close()
+
+        logger.info(
+            f"Grid import: def={definition.id}, {stats['processed_rows']} satir, "
+            f"{stats['upserted_cells']} hucre, {stats['rejected_rows']} red"
+        )
+        return stats
+
+    # ============ Rejects ============
+
+    @staticmethod
+    def reject_file_path(definition_id: int, reject_id: str) -> Optional[str]:
+        """Red dosyasinin yolu (yoksa veya gecersiz id ise None)."""
+        if not _REJECT_ID.match(reject_id or ""):
+            return None
+        path = os.path.join(REJECTS_DIR, f"{definition_id}_{reject_id}.csv")
+        return path if os.path.exists(path) else None
+
+    @staticmethod
+    def cleanup_rejects(max_age: float = REJECTS_MAX_AGE) -> int:
+        """max_age sn'den eski red dosyalarini siler; silinen dosya sayisini dondurur."""
+        cutoff = time.time() - max_age
+        removed = 0
+        try:
+            entries = list(os.scandir(REJECTS_DIR))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                # Ayni anda baska bir aktarim sildi
+                continue
+        if removed:
+            logger.info(f"{removed} eski red dosyasi silindi")
+        return removed
+
+    # ============ Internal ============
+
+    @staticmethod
+    def _row_key(dimension_values: dict, dimensions: List[Tuple[int, str]]) -> Optional[tuple]:
+        key = []
+        for entity_id, _ in dimensions:
+            md_id = dimension_values.get(str(entity_id))
+            if md_id is None:
+                return None
+            try:
+                key.append(int(md_id))
+            except (TypeError, ValueError):
+                return None
+        return tuple(key)
+
+    @staticmethod
+    def _resolve_layout(chunk, layout, dimensions, period_map, measures, stats) -> str:
+        columns = list(chunk.columns)
+        missing = [code for _, code in dimensions if code not in columns]
+        if missing:
+            raise ValueError(f"Boyut kolonlari eksik: {', '.join(missing)}")
+
+        if layout == "auto":
+            layout = "long" if "PERIOD" in columns else "wide"
+
+        known = {code for _, code in dimensions} | {"CURRENCY"}
+        if layout == "long":
+            if "PERIOD" not in columns:
+                raise ValueError("Long duzen icin PERIOD kolonu gerekli")
+            known |= {"PERIOD"} | set(measures)
+        else:
+            period_columns = [c for c in columns if _PERIOD_CODE.match(c)]
+            if not period_columns:
+                raise ValueError("Wide duzen icin donem kolonlari (yyyy-MM) gerekli")
+            unknown_periods = [c for c in period_columns if c not in period_map]
+            if unknown_periods:
+                raise ValueError(f"Versiyonda olmayan donem kolonlari: {', '.join(unknown_periods[:10])}")
+            known |= set(period_columns) | {"MEASURE"}
+
+        stats["ignored_columns"] = [c for c in columns if c not in known]
+        return layout
+
+    @staticmethod
+    def _chunk_cells(
+        chunk: pd.DataFrame,
+        layout: str,
+        dimensions: List[Tuple[int, str]],
+        code_maps: Dict[int, Dict[str, int]],
+        period_map: Dict[str, int],
+        input_measures: set,
+        measure_code: Optional[str],
+    ) -> Tuple[pd.DataFrame, pd.Series, pd.Series]:
+        """
+        Bir parcayi hucre listesine (line, period_id, measure_code, value) cevirir.
+        Diger degerler: kaynak satir no -> boyut anahtari ve kaynak satir no -> hata mesaji.
+        """
+        errors = pd.Series("", index=chunk.index, dtype=object)
+
+        def _fail(mask: pd.Series, message):
+            mask = mask & errors.eq("")
+            if mask.any():
+                errors[mask] = message if isinstance(message, str) else message[mask]
+
+        # Boyut kodlari -> id
+        id_columns = []
+        for entity_id, column in dimensions:
+            codes = _as_code(chunk[column])
+            ids = codes.map(code_maps[entity_id])
+            _fail(ids.isna(), "Anaveri bulunamadi: " + column + "='" + codes + "'")
+            id_columns.append(ids)
+        keys = pd.Series(list(zip(*[ids.fillna(-1).astype(np.int64).tolist() for ids in id_columns])), index=chunk.index)
+
+        if layout == "long":
+            periods = _as_code(chunk["PERIOD"])
+            period_ids = periods.map(period_map)
+            _fail(period_ids.isna(), "Donem bulunamadi: '" + periods + "'")
+            measure_columns = [c for c in chunk.columns if c in input_measures]
+            parts = []
+            for column in measure_columns:
+                values, blank, invalid = _parse_values(chunk[column])
+                _fail(invalid, f"Gecersiz sayi: {column}")
+                parts.append(pd.DataFrame({
+                    "line": chunk.index, "period_id": period_ids,
+                    "measure_code": column, "value": values, "blank": blank,
+                }))
+        else:
+            if "MEASURE" in chunk.columns:
+                measure_codes = _as_code(chunk["MEASURE"]).str.upper()
+                _fail(~measure_codes.isin(input_measures), "Input olcu degil veya bulunamadi: '" + measure_codes + "'")
+            elif measure_code:
+                measure_codes = pd.Series(measure_code.upper(), index=chunk.index)
+            else:
+                raise ValueError("Wide duzen icin MEASURE kolonu veya measure_code gerekli")
+            parts = []
+            for column in [c for c in chunk.columns if c in period_map]:
+                values, blank, invalid = _parse_values(chunk[column])
+                _fail(invalid, f"Gecersiz sayi: {column}")
+                parts.append(pd.DataFrame({
+                    "line": chunk.index, "period_id": period_map[column],
+                    "measure_code": measure_codes, "value": values, "blank": blank,
+                }))
+
+        if parts:
+            cells = pd.concat(parts, ignore_index=True)
+            cells = cells[~cells["blank"]].drop(columns=["blank"])
+        else:
+            cells = pd.DataFrame(columns=["line", "period_id", "measure_code", "value"])
+
+        return cells, keys, errors[errors.ne("")]
+
+    @staticmethod
+    def _create_rows(
+        db: Session,
+        definition_id: int,
+        dimensions: List[Tuple[int, str]],
+        new_keys: Dict[tuple, Optional[str]],
+    ) -> Dict[tuple, int]:
+        """Yeni satirlari toplu INSERT ... RETURNING ile olusturur (id'ler kayit sirasiyla doner)."""
+        keys = list(new_keys)
+        records = [
+            {
+                "uuid": uuid_lib.uuid4(),
+                "budget_definition_id": definition_id,
+                "dimension_values": {str(entity_id): int(md_id) for (entity_id, _), md_id in zip(dimensions, key)},
+                "currency_code": new_keys[key] or "TL",
+                "is_active": True,
+                "sort_order": 0,
+            }
+            for key in keys
+        ]
+        result = db.execute(
+            insert(BudgetEntryRow.__table__).returning(BudgetEntryRow.id, sort_by_parameter_order=True),
+            records,
+        )
+        return {key: row_id for key, (row_id,) in zip(keys, result.all())}
+
+
+class _RejectWriter:
+    """Reddedilen kaynak satirlarini hata nedeniyle birlikte CSV'ye yazar (ilk hatada acilir)."""
+
+    def __init__(self, definition_id: int):
+        self.definition_id = definition_id
+        self.reject_id = None
+        self._file = None
+        self._writer = None
+
+    def write(self, rows: pd.DataFrame, errors: pd.Series) -> None:
+        if self._file is None:
+            os.makedirs(REJECTS_DIR, exist_ok=True)
+            self.reject_id = uuid_lib.uuid4().hex
+            path = os.path.join(REJECTS_DIR, f"{self.definition_id}_{self.reject_id}.csv")
+            self._file = open(path, "w", newline="", encoding="utf-8-sig")
+            self._writer = csv.writer(self._file, delimiter=";")
+            self._writer.writerow(["LINE"] + list(rows.columns) + ["ERROR"])
+        for line, values in zip(rows.index, rows.itertuples(index=False)):
+            self._writer.writerow([line] + ["" if pd.isna(v) else v for v in values] + [errors[line]])
+
+    def close(self) -> Optional[str]:
+        if self._file is not None:
+            self._file.close()
+        return self.reject_id
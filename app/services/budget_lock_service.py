@@ -0,0 +1,131 @@
+"""
+Budget Lock Service - Tanim bazinda eszamanlilik kontrolu
+
+Hesaplama, geri alma, ice aktarma ve dagitim tanim uzerinde PostgreSQL
+transaction seviyesinde exclusive advisory lock alir; kaydetme ayni
+kilidin shared halini alir, boylece kaydetmeler birbirini beklemez.
+Kilitler pg_try_* ile denenir: alinamazsa istek beklemeden reddedilir
+(409), uzun bir hesaplama transaction'inin arkasinda baglanti birikmez.
+Kilitler commit / rollback ile kendiliginden birakilir.
+
+Her butce satirinin bir revizyonu vardir; satirin hucrelerini degistiren
+her islem revizyonu artirir. Kaydetmede istemci grid'den okudugu
+revizyonu gonderir, satir o arada degismisse hucre catisma olarak
+dondurulur.
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_xact_lock(int4, int4) anahtarinin ilk yarisi: 'PBSD'
+LOCK_NAMESPACE = 0x50425344
+
+# Kaydetmede eski revizyonlu hucreler icin davranis
+SAVE_CONFLICT_MODES = ("reject", "overwrite")
+
+_LOCK_STATUS_SQL = text("""
+    SELECT l.pid, l.mode, l.granted, a.xact_start, a.application_name
+    FROM pg_locks l
+    LEFT JOIN pg_stat_activity a ON a.pid = l.pid
+    WHERE l.locktype = 'advisory'
+      AND l.classid::bigint = :namespace
+      AND l.objid::bigint = :definition_id
+      AND l.objsubid = 2
+    ORDER BY l.granted DESC, a.xact_start
+""")
+
+_LOCK_ROWS_SQL = text("""
+    SELECT id, revision
+    FROM budget_entry_rows
+    WHERE budget_definition_id = :definition_id AND id = ANY(:row_ids)
+    ORDER BY id
+    FOR UPDATE
+""")
+
+
+class BudgetLockService:
+    """Tanim kilitleri ve satir revizyonlari."""
+
+    # ============ Advisory Locks ============
+
+    @staticmethod
+    def try_lock(db: Session, definition_id: int, shared: bool = False) -> bool:
+        """Tanim kilidini transaction sonuna kadar almayi dener (beklemez)."""
+        func = "pg_try_advisory_xact_lock_shared" if shared else "pg_try_advisory_xact_lock"
+        acquired = db.execute(
+            text(f"SELECT {func}(:namespace, :definition_id)"),
+            {"namespace": LOCK_NAMESPACE, "definition_id": int(definition_id)},
+        ).scalar()
+        if not acquired:
+            logger.info(f"Tanim {definition_id} kilidi alinamadi (shared={shared})")
+        return bool(acquired)
+
+    @staticmethod
+    def lock(db: Session, definition_id: int) -> None:
+        """Exclusive tanim kilidini bekleyerek alir (arka plan isleri icin)."""
+        db.execute(
+            text("SELECT pg_advisory_xact_lock(:namespace, :definition_id)"),
+            {"namespace": LOCK_NAMESPACE, "definition_id": int(definition_id)},
+        )
+
+    @staticmethod
+    def lock_status(db: Session, definition_id: int) -> Dict:
+        """Tanim kilidini tutan / bekleyen oturumlar."""
+        holders = []
+        for pid, mode, granted, xact_start, application_name in db.execute(
+            _LOCK_STATUS_SQL, {"namespace": LOCK_NAMESPACE, "definition_id": int(definition_id)}
+        ).all():
+            holders.append({
+                "pid": pid,
+                "mode": "exclusive" if mode == "ExclusiveLock" else "shared",
+                "granted": granted,
+                "transaction_start": xact_start,
+                "application_name": application_name or None,
+            })
+        granted = [h for h in holders if h["granted"]]
+        return {
+            "definition_id": definition_id,
+            "locked": bool(granted),
+            "exclusive": any(h["mode"] == "exclusive" for h in granted),
+            "holders": holders,
+        }
+
+    # ============ Row Revisions ============
+
+    @staticmethod
+    def lock_rows(db: Session, definition_id: int, row_ids: Iterable[int]) -> Dict[int, int]:
+        """Satirlari (id sirasiyla) kilitler ve guncel revizyonlarini dondurur."""
+        row_ids = sorted(set(row_ids))
+        if not row_ids:
+            return {}
+        result = db.execute(_LOCK_ROWS_SQL, {"definition_id": definition_id, "row_ids": row_ids})
+        return {row_id: revision for row_id, revision in result.all()}
+
+    @staticmethod
+    def bump_revisions(
+        db: Session,
+        definition_id: int,
+        row_ids: Optional[List[int]] = None,
+        returning: bool = False,
+    ) -> Dict[int, int]:
+        """
+        Satir revizyonlarini bir artirir; row_ids None ise tanimin tum
+        satirlari. returning ile yeni revizyonlar dondurulur.
+        """
+        if row_ids is not None and not row_ids:
+            return {}
+        sql = "UPDATE budget_entry_rows SET revision = revision + 1 WHERE budget_definition_id = :definition_id"
+        params = {"definition_id": definition_id}
+        if row_ids is not None:
+            sql += " AND id = ANY(:row_ids)"
+            params["row_ids"] = sorted(set(row_ids))
+        if returning:
+            sql += " RETURNING id, revision"
+            return {row_id: revision for row_id, revision in db.execute(text(sql), params).all()}
+        db.execute(text(sql), params)
+        return {}
@@ -0,0 +1,164 @@
+"""
+Budget Snapshot Service - Hesaplama snapshot'larinin yazimi ve okunmasi
+
+Hesaplama oncesi hucreler calculation_snapshot_cells tablosuna COPY ile
+yazilir (snapshot, satir, donem, olcu birincil anahtari). Geri alma ve
+"snapshot aninda" okuma ayni tablodan yalnizca gereken satirlari indeks
+uzerinden okur; her istekte buyuk bir JSONB dokumani cozumlenmez.
+
+Snapshot aninda gorunum, geri almanin uretecegi durumdur ve hicbir sey
+yazmaz: snapshot'in kapsadigi dilimdeki (scope yoksa tum grid) guncel
+hucreler yerine snapshot hucreleri, dilim disinda guncel hucreler okunur.
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, not_, select, union_all
+from sqlalchemy.orm import Session
+
+from app.models.budget_entry import (
+    BudgetCellType, BudgetEntryCell, CalculationSnapshot, CalculationSnapshotCell,
+)
+
+logger = logging.getLogger(__name__)
+
+_SNAPSHOT_COLUMNS = (
+    "snapshot_id, row_id, period_id, measure_code, value, cell_type, "
+    "is_manual_override, source_rule_id, source_param_id"
+)
+
+
+class BudgetSnapshotService:
+    """Hesaplama snapshot'lari: yazma, geri alma icin okuma ve snapshot aninda gorunum."""
+
+    # ============ Capture ============
+
+    @staticmethod
+    def capture(
+        db: Session,
+        definition_id: int,
+        cells: Iterable,
+        rule_set_ids: Optional[List[int]] = None,
+        scope: Optional[Dict] = None,
+    ) -> CalculationSnapshot:
+        """Hucrelerin mevcut halini yeni bir snapshot olarak yazar (commit cagirana aittir)."""
+        snapshot = CalculationSnapshot(
+            budget_definition_id=definition_id,
+            rule_set_ids=rule_set_ids or [],
+            scope=scope,
+        )
+        db.add(snapshot)
+        db.flush()
+
+        count = 0
+        cursor = db.connection().connection.driver_connection.cursor()
+        try:
+            with cursor.copy(f"COPY calculation_snapshot_cells ({_SNAPSHOT_COLUMNS}) FROM STDIN") as copy:
+                for cell in cells:
+                    copy.write_row((
+                        snapshot.id,
+                        cell.row_id,
+                        cell.period_id,
+                        cell.measure_code,
+                        cell.value,
+                        cell.cell_type.value if cell.cell_type else BudgetCellType.input.value,
+                        bool(cell.is_manual_override),
+                        cell.source_rule_id,
+                        cell.source_param_id,
+                    ))
+                    count += 1
+        finally:
+            cursor.close()
+
+        snapshot.cell_count = count
+        db.flush()
+        return snapshot
+
+    # ============ Read ============
+
+    @staticmethod
+    def get(db: Session, definition_id: int, snapshot_id: int) -> Optional[CalculationSnapshot]:
+        return db.query(CalculationSnapshot).filter(
+            CalculationSnapshot.id == snapshot_id,
+            CalculationSnapshot.budget_definition_id == definition_id,
+        ).first()
+
+    @staticmethod
+    def scope_slice(snapshot: CalculationSnapshot) -> Optional[tuple]:
+        """Snapshot'in kapsadigi (row_ids, period_ids); None = tum grid."""
+        if not snapshot.scope:
+            return None
+        return (
+            [int(r) for r in snapshot.scope.get("row_ids") or []],
+            [int(p) for p in snapshot.scope.get("period_ids") or []],
+        )
+
+    @staticmethod
+    def load_cells(
+        db: Session, snapshot: CalculationSnapshot, row_ids: Optional[List[int]] = None
+    ) -> List[BudgetEntryCell]:
+        """Snapshot hucrelerini (kaydedilmemis) BudgetEntryCell nesneleri olarak dondurur."""
+        query = db.query(CalculationSnapshotCell).filter(CalculationSnapshotCell.snapshot_id == snapshot.id)
+        if row_ids is not None:
+            if not row_ids:
+                return []
+            query = query.filter(CalculationSnapshotCell.row_id.in_(row_ids))
+        return [
+            BudgetEntryCell(
+                budget_definition_id=snapshot.budget_definition_id,
+                row_id=c.row_id,
+                period_id=c.period_id,
+                measure_code=c.measure_code,
+                value=c.value,
+                cell_type=c.cell_type,
+                is_manual_override=c.is_manual_override,
+                source_rule_id=c.source_rule_id,
+                source_param_id=c.source_param_id,
+            )
+            for c in query.all()
+        ]
+
+    # ============ As Of Snapshot ============
+
+    @staticmethod
+    def overlay(db: Session, snapshot: CalculationSnapshot, cells: List, row_ids: List[int]) -> List:
+        """
+        Guncel hucreleri snapshot aninda gorunume cevirir: snapshot dilimindeki
+        guncel hucreler atilir, yerine snapshot hucreleri konur.
+        """
+        scope = BudgetSnapshotService.scope_slice(snapshot)
+        if scope is None:
+            kept = []
+        else:
+            scope_rows, scope_periods = set(scope[0]), set(scope[1])
+            kept = [c for c in cells if not (c.row_id in scope_rows and c.period_id in scope_periods)]
+        return kept + BudgetSnapshotService.load_cells(db, snapshot, row_ids)
+
+    @staticmethod
+    def cell_source(definition_id: int, snapshot: Optional[CalculationSnapshot] = None):
+        """
+        Toplama sorgulari icin (row_id, period_id, measure_code, value)
+        kaynagi: snapshot yoksa tanimin hucreleri, varsa snapshot aninda
+        hucreler (UNION ALL alt sorgusu).
+        """
+        cells = BudgetEntryCell.__table__
+        current = select(
+            cells.c.row_id, cells.c.period_id, cells.c.measure_code, cells.c.value,
+        ).where(cells.c.budget_definition_id == definition_id)
+        if snapshot is None:
+            return current.subquery("cells")
+
+        snap = CalculationSnapshotCell.__table__
+        snapshot_cells = select(
+            snap.c.row_id, snap.c.period_id, snap.c.measure_code, snap.c.value,
+        ).where(snap.c.snapshot_id == snapshot.id)
+
+        scope = BudgetSnapshotService.scope_slice(snapshot)
+        if scope is None:
+            return snapshot_cells.subquery("cells")
+        if scope[0] and scope[1]:
+            current = current.where(not_(and_(
+                cells.c.row_id.in_(scope[0]), cells.c.period_id.in_(scope[1]),
+            )))
+        return union_all(current, snapshot_cells).subquery("cells")
@@ -0,0 +1,217 @@
+"""
+Cell History Service - Hucre degisiklik gecmisi
+
+Hucre degistiren islemler (kaydetme, hesaplama, geri alma, ice aktarma,
+dagitim, eslestirme) degisiklikleri bir CellHistoryBuffer'a ekler. Buffer
+kayitlari bellekte biriktirir ve islemin sonunda (veya HISTORY_FLUSH_SIZE
+kayitta bir) COPY ile budget_cell_history tablosuna yazar; gecmis, veriyle
+ayni transaction'da commit edilir. Toplu upsert yolunda (ice aktarma,
+dagitim) eski degerler gecici tablo ile mevcut hucreler birlestirilerek
+tek INSERT ... SELECT ile yazilir.
+
+budget_cell_history changed_at ile aylik RANGE partition'lidir; ayin
+partition'i ilk yazimda olusturulur. Sorgular satir / hucre bazinda
+id'ye gore geriye dogru keyset sayfalama ile yapilir.
+"""
+
+import logging
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.budget_entry import BudgetCellHistory, CellChangeSource
+
+logger = logging.getLogger(__name__)
+
+# Buffer bu kadar kayda ulasinca COPY ile yazilir
+HISTORY_FLUSH_SIZE = 50000
+
+# Gecmis sorgularinda sayfa basina en fazla kayit
+HISTORY_PAGE_LIMIT = 1000
+
+# Partition olusturma kilidi: pg_advisory_xact_lock(int4, int4) = ('PBSH', 0);
+# tanim kilitlerinin ('PBSD', tanim_id) alanindan ayridir
+_PARTITION_LOCK_KEY = (0x50425348, 0)
+
+_HISTORY_COLUMNS = (
+    "changed_at, budget_definition_id, row_id, period_id, measure_code, "
+    "old_value, new_value, source, reference_id, changed_by"
+)
+
+_STAGED_HISTORY_SQL = f"""
+    INSERT INTO budget_cell_history ({_HISTORY_COLUMNS})
+    SELECT :changed_at, r.budget_definition_id, s.row_id, s.period_id, s.measure_code,
+           c.value, s.value, :source, :reference_id, :changed_by
+    FROM {{staging}} s
+    JOIN budget_entry_rows r ON r.id = s.row_id
+    LEFT JOIN budget_entry_cells c
+           ON c.budget_definition_id = r.budget_definition_id
+          AND c.row_id = s.row_id AND c.period_id = s.period_id AND c.measure_code = s.measure_code
+    WHERE c.value IS DISTINCT FROM s.value
+"""
+
+_QUANT = Decimal("0.0001")
+
+
+def _to_decimal(value) -> Optional[Decimal]:
+    """Degeri hucre hassasiyetine (Numeric(20, 4)) yuvarlar; karsilastirma icin."""
+    if value is None:
+        return None
+    try:
+        return Decimal(str(value)).quantize(_QUANT, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        return None
+
+
+class CellHistoryBuffer:
+    """
+    Bir islemin hucre degisikliklerini biriktirir ve toplu yazar.
+    Tum kayitlar ayni changed_at, kaynak ve kullaniciyi tasir.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        definition_id: int,
+        source: CellChangeSource,
+        changed_by: Optional[str] = None,
+        reference_id: Optional[int] = None,
+        flush_size: int = HISTORY_FLUSH_SIZE,
+    ):
+        self.db = db
+        self.definition_id = definition_id
+        self.source = source
+        self.changed_by = changed_by
+        self.reference_id = reference_id
+        self.flush_size = flush_size
+        self.changed_at = datetime.utcnow()
+        self.written = 0
+        self._pending: List[tuple] = []
+
+    def record(self, row_id: int, period_id: int, measure_code: str, old_value, new_value) -> None:
+        """Tek hucre degisikligi; deger ayniysa yazilmaz."""
+        old_value, new_value = _to_decimal(old_value), _to_decimal(new_value)
+        if old_value == new_value:
+            return
+        self._pending.append((row_id, period_id, measure_code, old_value, new_value))
+        if len(self._pending) >= self.flush_size:
+            self.flush()
+
+    def record_diff(self, before: Dict[tuple, object], after: Dict[tuple, object]) -> None:
+        """
+        {(row_id, period_id, measure_code): value} oncesi / sonrasi
+        eslemelerinden degisen, eklenen ve silinen hucreleri yazar.
+        """
+        for key, new_value in after.items():
+            row_id, period_id, measure_code = key
+            self.record(row_id, period_id, measure_code, before.get(key), new_value)
+        for key, old_value in before.items():
+            if key not in after:
+                row_id, period_id, measure_code = key
+                self.record(row_id, period_id, measure_code, old_value, None)
+
+    def record_staged(self, staging_table: str) -> None:
+        """
+        Toplu upsert oncesi: gecici tablodaki (row_id, period_id,
+        measure_code, value) kayitlarini mevcut hucrelerle karsilastirip
+        degisenleri tek ifadeyle yazar.
+        """
+        CellHistoryService.ensure_partition(self.db, self.changed_at)
+        result = self.db.execute(text(_STAGED_HISTORY_SQL.format(staging=staging_table)), {
+            "changed_at": self.changed_at,
+            "source": self.source.value,
+            "reference_id": self.reference_id,
+            "changed_by": self.changed_by,
+        })
+        self.written += result.rowcount or 0
+
+    def flush(self) -> int:
+        """Biriken kayitlari COPY ile yazar (commit cagirana aittir)."""
+        if not self._pending:
+            return 0
+        CellHistoryService.ensure_partition(self.db, self.changed_at)
+        pending, self._pending = self._pending, []
+
+        cursor = self.db.connection().connection.driver_connection.cursor()
+        try:
+            with cursor.copy(f"COPY budget_cell_history ({_HISTORY_COLUMNS}) FROM STDIN") as copy:
+                for row_id, period_id, measure_code, old_value, new_value in pending:
+                    copy.write_row((
+                        self.changed_at, self.definition_id, row_id, period_id, measure_code,
+                        old_value, new_value, self.source.value, self.reference_id, self.changed_by,
+                    ))
+        finally:
+            cursor.close()
+
+        self.written += len(pending)
+        return len(pending)
+
+
+class CellHistoryService:
+    """Gecmis partition'lari ve sorgulari."""
+
+    # ============ Partitions ============
+
+    @staticmethod
+    def partition_name(when: datetime) -> str:
+        return f"budget_cell_history_y{when.year:04d}m{when.month:02d}"
+
+    @staticmethod
+    def ensure_partition(db: Session, when: datetime) -> None:
+        """Tarihin ayina ait partition'i olusturur (varsa dokunmaz)."""
+        name = CellHistoryService.partition_name(when)
+        if db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+            return
+
+        # Ayni anda ilk yazimi yapan oturumlar sirayla olusturur
+        db.execute(text("SELECT pg_advisory_xact_lock(:a, :b)"),
+                   {"a": _PARTITION_LOCK_KEY[0], "b": _PARTITION_LOCK_KEY[1]})
+        start = datetime(when.year, when.month, 1)
+        end = datetime(when.year + (when.month == 12), when.month % 12 + 1, 1)
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF budget_cell_history "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        logger.info(f"Hucre gecmisi partition'i olusturuldu: {name}")
+
+    # ============ Query ============
+
+    @staticmethod
+    def query(
+        db: Session,
+        definition_id: int,
+        row_id: int,
+        period_id: Optional[int] = None,
+        measure_code: Optional[str] = None,
+        source: Optional[CellChangeSource] = None,
+        before_id: Optional[int] = None,
+        limit: int = 100,
+    ) -> Dict:
+        """
+        Satirin (period_id + measure_code ile tek hucrenin) degisiklikleri,
+        yeniden eskiye. Sonraki sayfa icin next_before_id dondurulur.
+        """
+        limit = max(1, min(limit, HISTORY_PAGE_LIMIT))
+        query = db.query(BudgetCellHistory).filter(
+            BudgetCellHistory.row_id == row_id,
+            BudgetCellHistory.budget_definition_id == definition_id,
+        )
+        if period_id is not None:
+            query = query.filter(BudgetCellHistory.period_id == period_id)
+        if measure_code:
+            query = query.filter(BudgetCellHistory.measure_code == measure_code)
+        if source is not None:
+            query = query.filter(BudgetCellHistory.source == source)
+        if before_id is not None:
+            query = query.filter(BudgetCellHistory.id < before_id)
+
+        records = query.order_by(BudgetCellHistory.id.desc()).limit(limit + 1).all()
+        has_more = len(records) > limit
+        records = records[:limit]
+        return {
+            "items": records,
+            "next_before_id": records[-1].id if has_more else None,
+        }
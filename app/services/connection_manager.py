@@ -3,14 +3,79 @@ Connection Manager - Dis kaynak baglanti yoneticisi
 
 SAP OData, HANA DB ve dosya kaynaklar icin baglanti testi,
 ornek veri cekme ve tam veri cekme islemlerini yonetir.
+
+Tam veri cekme kayitlari parcalar halinde ureten bir iterator dondurur:
+OData sayfa sayfa, HANA fetchmany ile, dosyalar FETCH_BATCH_SIZE'lik
+parcalarla okunur; tuketici yazdikca yeni parca cekilir.
+
+HANA baglantilari DataConnection basina havuzdan alinir (HanaPool); degerler
+surucunun dondurdugu tiplerle (int, Decimal, date, datetime) uretilir,
+metne / kolon tipine cevirme COPY asamasindaki donusturuculere kalir.
+
+OData tam cekmede sorgunun anahtar kolonlari varsa once $count alinir,
+anahtarlara gore siralanmis $skip/$top pencereleri tek bir keep-alive
+oturum uzerinden es zamanli istenir; anahtar kolon yoksa sayfalar sunucu
+linkleriyle sirayla okunur. Basarisiz istekler artan beklemeyle
+tekrarlanir, sayfalar yine kaynak sirasinda uretilir.
+
+CSV dosyalarinin encoding / ayirici / baslik bilgisi dosya basindan
+tespit edilir ve sorguda saklanir; dosya her zaman tek gecisle okunur.
 """
 
-import logging
+import codecs
+import csv
 import io
-from typing import Tuple, List, Dict, Any, Optional
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from typing import Tuple, List, Dict, Any, Iterator, Optional
+
+from app.services.hana_pool import HanaPool
+from app.services.upload_cache import UploadCache
 
 logger = logging.getLogger(__name__)
 
+# Tam veri cekmede HANA ve dosya kayitlari bu buyuklukte parcalarla uretilir;
+# HANA'da DataConnection.extra_config["hana_fetch_size"] ile degistirilir
+FETCH_BATCH_SIZE = 10_000
+
+# OData tam cekme varsayilanlari; DataConnection.extra_config icindeki
+# odata_page_size / odata_parallelism / odata_max_retries ile degistirilir
+ODATA_PAGE_SIZE = 5000
+ODATA_PARALLELISM = 4
+ODATA_MAX_RETRIES = 3
+ODATA_RETRY_BACKOFF = 1.0  # sn, her denemede iki katina cikar
+ODATA_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# CSV lehce tespiti dosyanin bu kadar baslangic baytina ve ilk
+# CSV_SNIFF_ROWS satirina bakar; sonuc file_parse_config["detected"]
+# olarak saklanir ve sonraki sync'lerde yalnizca dogrulanir
+CSV_SNIFF_BYTES = 1 << 20
+CSV_SNIFF_ROWS = 200
+CSV_DELIMITERS = [";", ",", "\t", "|"]
+_NUMERIC_CELL = re.compile(r"^[-+]?[\d.,:/\s-]*\d[\d.,:/\s-]*%?$")
+
+# Tespit edilen encoding ile cozulemeyen baytlar (dosya basi UTF-8, ilerisi
+# CP1254) okumayi durdurmaz: CP1254 ile cozulur ve okuyan thread'e isaretlenir
+CSV_FALLBACK_ERRORS = "pbs_cp1254_fallback"
+_csv_fallback = threading.local()
+
+
+def _cp1254_fallback(error: UnicodeError):
+    if not isinstance(error, UnicodeDecodeError):
+        raise error
+    _csv_fallback.used = True
+    return error.object[error.start:error.end].decode("cp1254", errors="replace"), error.end
+
+
+codecs.register_error(CSV_FALLBACK_ERRORS, _cp1254_fallback)
+
 
 class ConnectionManager:
     """Dis kaynak baglanti islemlerini yoneten sinif."""
@@ -82,7 +147,7 @@ class ConnectionManager:
     def _test_hana_db(config: dict) -> dict:
         """HANA DB baglanti testi."""
         try:
-            from hdbcli import dbapi
+            from hdbcli import dbapi  # noqa: F401
         except ImportError:
             return {
                 "success": False,
@@ -92,28 +157,19 @@ class ConnectionManager:
 
         host = config.get("host", "")
         port = config.get("port", 443)
-        database_name = config.get("database_name", "")
         username = config.get("username", "")
-        password = config.get("password", "")
 
         if not host or not username:
             return {"success": False, "message": "HANA host ve kullanici adi gerekli.", "details": None}
 
         try:
-            conn = dbapi.connect(
-                address=host,
-                port=port,
-                user=username,
-                password=password,
-                databaseName=database_name if database_name else None,
-                encrypt=True,
-                sslValidateCertificate=False
-            )
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1 FROM DUMMY")
-            result = cursor.fetchone()
-            cursor.close()
-            conn.close()
+            with HanaPool.connection(config) as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("SELECT 1 FROM DUMMY")
+                    result = cursor.fetchone()
+                finally:
+                    cursor.close()
 
             if result and result[0] == 1:
                 return {
@@ -203,93 +259,86 @@ class ConnectionManager:
     @staticmethod
     def _fetch_hana_sample(config: dict, query_config: dict, limit: int) -> Tuple[List[Dict], List[str]]:
         """HANA DB'den ornek veri ceker."""
-        from hdbcli import dbapi
-
         query_text = query_config.get("query_text", "")
         if not query_text:
             raise ValueError("HANA sorgu metni gerekli.")
 
-        conn = dbapi.connect(
-            address=config.get("host", ""),
-            port=config.get("port", 443),
-            user=config.get("username", ""),
-            password=config.get("password", ""),
-            databaseName=config.get("database_name") or None,
-            encrypt=True,
-            sslValidateCertificate=False
-        )
+        # LIMIT ekle (eger yoksa)
+        sql = query_text.rstrip().rstrip(";")
+        if "LIMIT" not in sql.upper():
+            sql = f"SELECT * FROM ({sql}) AS sub LIMIT {limit}"
 
-        try:
-            cursor = conn.cursor()
-            # LIMIT ekle (eger yoksa)
-            sql = query_text.rstrip().rstrip(";")
-            if "LIMIT" not in sql.upper():
-                sql = f"SELECT * FROM ({sql}) AS sub LIMIT {limit}"
-            cursor.execute(sql)
-
-            column_names = [desc[0] for desc in cursor.description]
-            raw_rows = cursor.fetchall()
-            rows = []
-            for raw_row in raw_rows:
-                row = {}
-                for i, col_name in enumerate(column_names):
-                    val = raw_row[i]
-                    row[col_name] = str(val) if val is not None else None
-                rows.append(row)
-
-            cursor.close()
-            return rows, column_names
-        finally:
-            conn.close()
+        column_names: List[str] = []
+        with HanaPool.connection(config) as conn:
+            batches = ConnectionManager._iter_cursor_batches(conn, sql, (), limit, column_names)
+            try:
+                rows = next(batches, [])[:limit]
+            finally:
+                batches.close()
+        return rows, column_names
 
     @staticmethod
     def _fetch_file_sample(query_config: dict, limit: int) -> Tuple[List[Dict], List[str]]:
-        """Dosya iceriginden ornek veri ceker. file_bytes query_config icinde olmali."""
-        import pandas as pd
-
-        file_bytes = query_config.get("file_bytes")
-        file_name = query_config.get("file_name", "")
-        parse_config = query_config.get("file_parse_config") or {}
-
-        if file_bytes is None:
-            raise ValueError("Dosya icerigi gerekli.")
-
-        df = ConnectionManager._read_file_to_dataframe(file_bytes, file_name, parse_config)
-        df = df.head(limit)
-
-        # NaN degerleri None yap
-        df = df.where(df.notna(), None)
-
-        rows = df.to_dict(orient="records")
-        column_names = list(df.columns)
-
-        # Tum degerleri string'e cevir
-        for row in rows:
-            for k, v in row.items():
-                row[k] = str(v) if v is not None else None
-
+        """Dosyanin ilk parcasindan ornek veri ceker. file_path query_config icinde olmali."""
+        column_names: List[str] = []
+        chunks = ConnectionManager._iter_file_chunks(
+            query_config, batch_size=limit, columns=column_names, cache_parsed=False
+        )
+        try:
+            rows = next(chunks, [])[:limit]
+        finally:
+            chunks.close()
         return rows, column_names
 
     # ============ Fetch All Data ============
 
     @staticmethod
-    def fetch_all_data(conn_type: str, config: dict, query_config: dict) -> List[Dict[str, Any]]:
-        """Tum veriyi ceker (sync icin)."""
+    def fetch_batches(
+        conn_type: str,
+        config: dict,
+        query_config: dict,
+        columns: Optional[List[str]] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Tum veriyi kayit parcalari halinde ceker (sync ve kolon tespiti icin).
+        Parcalar tuketildikce uretilir; bellekte ayni anda yalnizca cekilen
+        parca tutulur. Iterator erken kapatilirsa kaynak baglantisi da kapanir.
+        HANA ve dosyalarda kolon adlari (veri satiri olmasa da) columns'a
+        eklenir.
+        """
         if conn_type == "sap_odata":
-            return ConnectionManager._fetch_sap_all(config, query_config)
+            return ConnectionManager._iter_sap_pages(config, query_config)
         elif conn_type == "hana_db":
-            return ConnectionManager._fetch_hana_all(config, query_config)
+            return ConnectionManager._iter_hana_batches(config, query_config, columns=columns)
         elif conn_type == "file_upload":
-            rows, _ = ConnectionManager._fetch_file_sample(query_config, limit=1_000_000)
-            return rows
+            return ConnectionManager._iter_file_chunks(query_config, columns=columns)
         else:
             raise ValueError(f"Bilinmeyen baglanti tipi: {conn_type}")
 
     @staticmethod
-    def _fetch_sap_all(config: dict, query_config: dict) -> List[Dict]:
-        """SAP OData'dan tum veriyi ceker (pagination ile)."""
-        import requests
-        from requests.auth import HTTPBasicAuth
+    def fetch_all_data(conn_type: str, config: dict, query_config: dict) -> List[Dict[str, Any]]:
+        """Tum veriyi tek listede dondurur (kucuk kaynaklar icin)."""
+        return [
+            row
+            for batch in ConnectionManager.fetch_batches(conn_type, config, query_config)
+            for row in batch
+        ]
+
+    @staticmethod
+    def _iter_sap_pages(config: dict, query_config: dict) -> Iterator[List[Dict]]:
+        """
+        SAP OData'dan veriyi sayfa sayfa ceker. Anahtar kolonlar varsa once
+        $count alinir, sonra $orderby ile sirasi sabitlenmis $skip/$top
+        pencereleri en fazla odata_parallelism istekle es zamanli cekilir;
+        sayfalar pencere sirasinda uretilir. Anahtar kolon yoksa ya da
+        $count desteklenmiyorsa __next / @odata.nextLink ile sirali okunur.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        extra = config.get("extra_config") or {}
+        page_size = max(1, int(extra.get("odata_page_size") or ODATA_PAGE_SIZE))
+        parallelism = max(1, int(extra.get("odata_parallelism") or ODATA_PARALLELISM))
+        retries = max(0, int(extra.get("odata_max_retries", ODATA_MAX_RETRIES)))
 
         host = config.get("host", "").rstrip("/")
         sap_service_path = config.get("sap_service_path", "")
@@ -297,6 +346,15 @@ class ConnectionManager:
         select = query_config.get("odata_select", "")
         filter_str = query_config.get("odata_filter", "")
         top = query_config.get("odata_top")
+        key_columns = query_config.get("key_columns") or []
+
+        watermark = query_config.get("watermark")
+        if watermark:
+            literal = ConnectionManager._odata_literal(
+                watermark["value"], watermark["data_type"], int(extra.get("odata_version") or 2)
+            )
+            predicate = f"{watermark['column']} ge {literal}"
+            filter_str = f"({filter_str}) and {predicate}" if filter_str else predicate
 
         url = f"{host}{sap_service_path}/{entity}"
         params = {"$format": "json"}
@@ -304,153 +362,654 @@ class ConnectionManager:
             params["$select"] = select
         if filter_str:
             params["$filter"] = filter_str
-        if top:
-            params["$top"] = str(top)
 
-        headers = {"Accept": "application/json"}
+        with ConnectionManager._odata_session(config, parallelism) as session:
+            # $orderby olmadan sunucu her pencereyi farkli sirayla donebilir
+            # (kayit atlanir / tekrarlanir); anahtar kolon yoksa sirali okunur
+            total = ConnectionManager._odata_count(session, url, filter_str, retries) if key_columns else None
+            if total is None:
+                if top:
+                    params["$top"] = str(top)
+                yield from ConnectionManager._iter_odata_next_links(session, url, params, top, retries)
+                return
+
+            params["$orderby"] = ",".join(key_columns)
+            if top:
+                total = min(total, int(top))
+
+            def fetch_window(skip: int, size: int) -> List[Dict]:
+                return ConnectionManager._fetch_odata_window(session, url, params, skip, size, retries)
+
+            pool = ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="odata")
+            pending = deque()
+            try:
+                # Bellekte en fazla 2 x parallelism pencere bekler
+                for skip in range(0, total, page_size):
+                    size = min(page_size, total - skip)
+                    pending.append((size, pool.submit(fetch_window, skip, size)))
+                    if len(pending) >= parallelism * 2:
+                        yield pending.popleft()[1].result()
+                last_size, last_page = page_size, []
+                while pending:
+                    last_size, future = pending.popleft()
+                    last_page = future.result()
+                    yield last_page
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+            # $count'tan sonra eklenen kayitlar: son sayfa doluysa sirayla devam
+            skip = total
+            while not top and total and len(last_page) >= last_size:
+                last_page = fetch_window(skip, page_size)
+                if last_page:
+                    yield last_page
+                skip += page_size
+                last_size = page_size
+
+    @staticmethod
+    def _odata_literal(value, data_type: str, version: int = 2) -> str:
+        """Watermark degeri icin OData $filter literal'i (V2 veya V4 sozdizimi)."""
+        if data_type in ("date", "datetime"):
+            if not isinstance(value, datetime):
+                value = datetime(value.year, value.month, value.day)
+            if version >= 4:
+                return value.date().isoformat() if data_type == "date" else f"{value.isoformat()}Z"
+            return f"datetime'{value.isoformat()}'"
+        if data_type == "integer":
+            return str(int(value))
+        if data_type == "decimal":
+            return f"{value}M" if version < 4 else str(value)
+        return "'" + str(value).replace("'", "''") + "'"
+
+    @staticmethod
+    def _odata_session(config: dict, pool_size: int):
+        """Tum sayfa istekleri icin ortak keep-alive oturum (en fazla pool_size baglanti)."""
+        import requests
+        from requests.adapters import HTTPAdapter
+        from requests.auth import HTTPBasicAuth
+
+        session = requests.Session()
+        session.headers["Accept"] = "application/json"
         sap_client = config.get("sap_client", "")
         if sap_client:
-            headers["sap-client"] = sap_client
+            session.headers["sap-client"] = sap_client
 
         username = config.get("username", "")
-        password = config.get("password", "")
-        auth = HTTPBasicAuth(username, password) if username else None
+        if username:
+            session.auth = HTTPBasicAuth(username, config.get("password", ""))
+        session.verify = False
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @staticmethod
+    def _odata_get(session, url: str, params: Optional[dict], retries: int):
+        """
+        GET istegi; baglanti hatasi, zaman asimi, 429 ve 5xx yanitlari
+        ODATA_RETRY_BACKOFF'tan baslayip ikiye katlanan beklemeyle tekrarlanir.
+        """
+        import requests
 
-        all_rows = []
+        for attempt in range(retries + 1):
+            try:
+                resp = session.get(url, params=params, timeout=60)
+                if resp.status_code not in ODATA_RETRY_STATUSES:
+                    resp.raise_for_status()
+                    return resp
+                error = requests.HTTPError(f"{resp.status_code} {resp.reason} ({url})", response=resp)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if attempt >= retries:
+                raise error
+            delay = ODATA_RETRY_BACKOFF * 2 ** attempt
+            logger.warning(f"OData istegi basarisiz: {error}. {delay:.1f} sn sonra tekrar ({attempt + 1}/{retries})")
+            time.sleep(delay)
+
+    @staticmethod
+    def _odata_count(session, url: str, filter_str: str, retries: int) -> Optional[int]:
+        """Entity set kayit sayisi ($count); desteklenmiyorsa None."""
+        import requests
+
+        params = {"$filter": filter_str} if filter_str else None
+        try:
+            resp = ConnectionManager._odata_get(session, f"{url}/$count", params, retries)
+            return int(resp.text.strip())
+        except (requests.HTTPError, ValueError) as e:
+            logger.info(f"OData $count alinamadi, sirali sayfalama kullanilacak: {e}")
+            return None
+
+    @staticmethod
+    def _odata_results(data: dict) -> Tuple[List[Dict], Optional[str]]:
+        """Yanittan (kayitlar, sonraki sayfa linki); V2 d.results / V4 value."""
+        results = data.get("d", {}).get("results", [])
+        if not results:
+            results = data.get("value", [])
+
+        rows = [
+            {k: str(v) if v is not None else None for k, v in r.items() if not k.startswith("__")}
+            for r in results
+        ]
+        # Pagination: __next veya @odata.nextLink
+        next_link = data.get("d", {}).get("__next") or data.get("@odata.nextLink")
+        return rows, next_link
+
+    @staticmethod
+    def _fetch_odata_window(session, url: str, params: dict, skip: int, size: int, retries: int) -> List[Dict]:
+        """
+        $skip/$top penceresini ceker. Sunucu sayfa boyutunu kisarsa
+        pencere dolana kadar sonraki sayfa linki izlenir.
+        """
+        rows, next_link = ConnectionManager._odata_results(
+            ConnectionManager._odata_get(session, url, {**params, "$skip": str(skip), "$top": str(size)}, retries).json()
+        )
+        while next_link and len(rows) < size:
+            page, next_link = ConnectionManager._odata_results(
+                ConnectionManager._odata_get(session, next_link, None, retries).json()
+            )
+            if not page:
+                break
+            rows.extend(page)
+        return rows[:size]
+
+    @staticmethod
+    def _iter_odata_next_links(session, url: str, params: dict, top, retries: int) -> Iterator[List[Dict]]:
+        """Sirali sayfalama: __next / @odata.nextLink takip edilir."""
         current_url = url
         current_params = params
 
         while current_url:
-            resp = requests.get(current_url, params=current_params, headers=headers, auth=auth, timeout=60, verify=False)
-            resp.raise_for_status()
-            data = resp.json()
-
-            results = data.get("d", {}).get("results", [])
-            if not results:
-                results = data.get("value", [])
-
-            for r in results:
-                row = {k: str(v) if v is not None else None for k, v in r.items() if not k.startswith("__")}
-                all_rows.append(row)
+            page, next_link = ConnectionManager._odata_results(
+                ConnectionManager._odata_get(session, current_url, current_params, retries).json()
+            )
+            if page:
+                yield page
 
-            # Pagination: __next veya @odata.nextLink
-            next_link = data.get("d", {}).get("__next") or data.get("@odata.nextLink")
             if next_link and not top:
                 current_url = next_link
-                current_params = {}  # next_link zaten parametreleri icerir
+                current_params = None  # next_link zaten parametreleri icerir
             else:
                 current_url = None
 
-        return all_rows
-
     @staticmethod
-    def _fetch_hana_all(config: dict, query_config: dict) -> List[Dict]:
-        """HANA DB'den tum veriyi ceker."""
-        from hdbcli import dbapi
-
+    def _iter_hana_batches(
+        config: dict,
+        query_config: dict,
+        columns: Optional[List[str]] = None,
+    ) -> Iterator[List[Dict]]:
+        """
+        HANA DB'den veriyi havuzdaki bir baglanti uzerinden fetchmany ile
+        ceker; parca boyu extra_config["hana_fetch_size"] (varsayilan
+        FETCH_BATCH_SIZE).
+        """
         query_text = query_config.get("query_text", "")
         if not query_text:
             raise ValueError("HANA sorgu metni gerekli.")
 
-        conn = dbapi.connect(
-            address=config.get("host", ""),
-            port=config.get("port", 443),
-            user=config.get("username", ""),
-            password=config.get("password", ""),
-            databaseName=config.get("database_name") or None,
-            encrypt=True,
-            sslValidateCertificate=False
-        )
+        extra = config.get("extra_config") or {}
+        fetch_size = max(1, int(extra.get("hana_fetch_size") or FETCH_BATCH_SIZE))
 
+        sql = query_text.rstrip().rstrip(";")
+        params: tuple = ()
+        watermark = query_config.get("watermark")
+        if watermark:
+            column = watermark["column"].replace('"', '""')
+            sql = f'SELECT * FROM ({sql}) AS sub WHERE "{column}" >= ?'
+            params = (watermark["value"],)
+
+        with HanaPool.connection(config) as conn:
+            yield from ConnectionManager._iter_cursor_batches(conn, sql, params, fetch_size, columns)
+
+    @staticmethod
+    def _iter_cursor_batches(
+        conn,
+        sql: str,
+        params: tuple,
+        fetch_size: int,
+        columns: Optional[List[str]] = None,
+    ) -> Iterator[List[Dict]]:
+        """
+        DB-API baglantisinda sorguyu calistirip sonucu fetch_size'lik
+        parcalarla uretir. Degerler surucunun tipleriyle kalir; yalnizca
+        imlece bagli LOB nesneleri okundugu anda metne cevrilir. Kolon adlari
+        (sonuc bos olsa da) columns'a eklenir.
+        """
+        cursor = conn.cursor()
         try:
-            cursor = conn.cursor()
-            sql = query_text.rstrip().rstrip(";")
-            cursor.execute(sql)
+            cursor.arraysize = fetch_size
+            if hasattr(cursor, "setfetchsize"):
+                # hdbcli: sunucudan tek round-trip'te gelen satir sayisi
+                cursor.setfetchsize(fetch_size)
+            if params:
+                cursor.execute(sql, params)
+            else:
+                cursor.execute(sql)
 
             column_names = [desc[0] for desc in cursor.description]
-            raw_rows = cursor.fetchall()
-            rows = []
-            for raw_row in raw_rows:
-                row = {}
-                for i, col_name in enumerate(column_names):
-                    val = raw_row[i]
-                    row[col_name] = str(val) if val is not None else None
-                rows.append(row)
-
+            if columns is not None:
+                columns[:] = column_names
+            unresolved = list(range(len(column_names)))
+            lob_columns: List[str] = []
+            while True:
+                raw_rows = cursor.fetchmany(fetch_size)
+                if not raw_rows:
+                    break
+                # LOB kolonlari ilk dolu degerlerinden anlasilir
+                for index in list(unresolved):
+                    value = next((raw_row[index] for raw_row in raw_rows if raw_row[index] is not None), None)
+                    if value is not None:
+                        unresolved.remove(index)
+                        if hasattr(value, "read"):
+                            lob_columns.append(column_names[index])
+
+                rows = [dict(zip(column_names, raw_row)) for raw_row in raw_rows]
+                for name in lob_columns:
+                    for row in rows:
+                        if row[name] is not None:
+                            row[name] = str(row[name])
+                yield rows
+        finally:
             cursor.close()
-            return rows
+
+    @staticmethod
+    def _iter_file_chunks(
+        query_config: dict,
+        batch_size: int = FETCH_BATCH_SIZE,
+        columns: Optional[List[str]] = None,
+        cache_parsed: bool = True,
+    ) -> Iterator[List[Dict]]:
+        """
+        Diske yazilmis yuklemeyi (file_path) batch_size'lik kayit parcalari
+        halinde okur; dosya hicbir zaman tamamen bellege alinmaz. CSV/TXT
+        pandas chunksize, xlsx openpyxl read-only, Parquet kayit batch'leri
+        ile okunur. Kolon adlari dosya acilinca columns listesine eklenir.
+        CSV lehcesi (encoding, ayirici, baslik) okumadan once cozulur.
+
+        Yukleme deposundaki dosyalar (file_cache_dir) ayni okuma secenekleriyle
+        daha once tam okunduysa parse edilmez, string kolonlu Parquet hali
+        okunur; ilk tam okumada bu hal okunan parcalardan yazilir.
+        """
+        file_path = query_config.get("file_path")
+        if not file_path:
+            raise ValueError("Dosya icerigi gerekli.")
+
+        parse_config = query_config.get("file_parse_config") or {}
+        file_ext = ConnectionManager._file_ext(query_config)
+        parse_key = ConnectionManager.file_parse_key(query_config)
+        columns = columns if columns is not None else []
+
+        cache_dir = query_config.get("file_cache_dir")
+        parsed_path = None
+        if cache_dir and file_ext != "parquet":
+            parsed_path = UploadCache.parsed_path(cache_dir, parse_key)
+            if os.path.exists(parsed_path):
+                logger.info(f"Dosya depodaki parse edilmis halinden okunuyor: {parsed_path}")
+                return ConnectionManager._iter_cached_chunks(parsed_path, batch_size, columns)
+
+        if file_ext in ("xlsx", "xlsm"):
+            batches = ConnectionManager._iter_excel_chunks(file_path, parse_config, batch_size, columns)
+        elif file_ext == "xls":
+            batches = ConnectionManager._iter_xls_chunks(file_path, parse_config, batch_size, columns)
+        elif file_ext == "parquet":
+            return ConnectionManager._iter_parquet_chunks(file_path, batch_size, columns)
+        else:
+            # csv, txt ve bilinmeyen uzantilar; cozulen lehce (file_parse_key)
+            # query_config'e yazilir, cagiran file_parse_config["detected"] olarak saklar
+            dialect = query_config["file_dialect"]
+            strict_encoding = not ConnectionManager._is_auto(parse_config.get("encoding"))
+            batches = ConnectionManager._iter_csv_chunks(file_path, dialect, strict_encoding, batch_size, columns)
+
+        if parsed_path and cache_parsed:
+            return ConnectionManager._tee_parquet(batches, columns, parsed_path)
+        return batches
+
+    @staticmethod
+    def _file_ext(query_config: dict) -> str:
+        file_name = query_config.get("file_name") or query_config.get("file_path") or ""
+        return file_name.rsplit(".", 1)[-1].lower() if "." in file_name else ""
+
+    @staticmethod
+    def file_parse_key(query_config: dict) -> str:
+        """
+        Dosyanin okunus seklini belirleyen secenekler (bicim, CSV lehcesi,
+        sayfa, baslik) JSON olarak; yukleme deposunda parse edilmis hal ve
+        kolon tespiti bu anahtarla saklanir. CSV lehcesi burada cozulup
+        query_config["file_dialect"]'e yazilir.
+        """
+        if "file_parse_key" in query_config:
+            return query_config["file_parse_key"]
+
+        parse_config = query_config.get("file_parse_config") or {}
+        file_ext = ConnectionManager._file_ext(query_config)
+        if file_ext in ("xlsx", "xlsm", "xls"):
+            options = {
+                "format": file_ext,
+                "sheet_name": parse_config.get("sheet_name", 0),
+                "has_header": parse_config.get("has_header", True),
+            }
+        elif file_ext == "parquet":
+            options = {"format": "parquet"}
+        else:
+            dialect = ConnectionManager._resolve_csv_dialect(query_config["file_path"], parse_config)
+            query_config["file_dialect"] = dialect
+            options = {"format": "csv", **dialect}
+
+        query_config["file_parse_key"] = json.dumps(options, sort_keys=True)
+        return query_config["file_parse_key"]
+
+    @staticmethod
+    def _iter_cached_chunks(parsed_path: str, batch_size: int, columns: List[str]) -> Iterator[List[Dict]]:
+        """Depodaki string kolonlu Parquet: degerler zaten str / None."""
+        import pyarrow.parquet as pq
+
+        with pq.ParquetFile(parsed_path) as parquet_file:
+            columns.extend(parquet_file.schema_arrow.names)
+            for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+                yield record_batch.to_pylist()
+
+    @staticmethod
+    def _tee_parquet(batches: Iterator[List[Dict]], columns: List[str], parsed_path: str) -> Iterator[List[Dict]]:
+        """
+        Parcalari aynen uretirken string kolonlu Parquet'e yazar. Dosya
+        yalnizca okuma sonuna kadar tamamlanirsa yerine konur; yarida
+        kalan (hata, erken kapatma) okumalar depoya yazilmaz.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        tmp_path = f"{parsed_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        writer = None
+        completed = False
+        try:
+            for batch in batches:
+                if writer is None:
+                    schema = pa.schema([(name, pa.string()) for name in columns])
+                    writer = pq.ParquetWriter(tmp_path, schema)
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                yield batch
+            completed = True
         finally:
-            conn.close()
+            if writer is not None:
+                writer.close()
+                try:
+                    if completed:
+                        os.replace(tmp_path, parsed_path)
+                    else:
+                        os.unlink(tmp_path)
+                except OSError as e:
+                    # Kayit bu arada depodan silinmis olabilir
+                    logger.warning(f"Parse edilmis dosya depoya yazilamadi: {e}")
 
     # ============ Helper: File Reading ============
 
-    # Turk dili ve Bati Avrupa karakter setleri icin encoding fallback sirasi
-    ENCODING_FALLBACK_ORDER = ["utf-8", "utf-8-sig", "iso-8859-9", "cp1254", "latin1"]
-
     @staticmethod
-    def _read_csv_with_encoding_fallback(
-        file_bytes: bytes, delimiter: str, header, encoding_hint: str | None = None
-    ):
+    def _iter_csv_chunks(
+        file_path: str,
+        dialect: Dict[str, Any],
+        strict_encoding: bool,
+        batch_size: int,
+        columns: List[str],
+    ) -> Iterator[List[Dict]]:
         """
-        CSV/TXT dosyasini okur. encoding_hint verilmemisse veya 'auto' ise
-        birden fazla encoding dener (UTF-8 > UTF-8 BOM > ISO-8859-9 > CP1254 > Latin1).
-        Turkce karakterler (ş, ğ, ı, ö, ü, ç) icin otomatik tespit saglar.
+        CSV/TXT: cozulmus lehceyle tek pandas read_csv(chunksize) gecisi,
+        string kolonlar. Encoding tespit edildiyse (kullanici vermediyse)
+        dosyanin ilerisindeki gecersiz baytlar CP1254 olarak cozulur ve
+        UTF-8 tespiti dialect icinde CP1254'e duzeltilir.
         """
         import pandas as pd
 
-        # Kullanici acikca encoding belirttiyse sadece onu dene
-        if encoding_hint and encoding_hint.lower() not in ("auto", ""):
-            buffer = io.BytesIO(file_bytes)
-            return pd.read_csv(buffer, delimiter=delimiter, encoding=encoding_hint, header=header, dtype=str)
+        has_header = dialect["has_header"]
+        _csv_fallback.used = False
+        reader = pd.read_csv(
+            file_path, sep=dialect["delimiter"], encoding=dialect["encoding"],
+            encoding_errors="strict" if strict_encoding else CSV_FALLBACK_ERRORS,
+            header=0 if has_header else None, dtype=str, chunksize=batch_size,
+        )
+        with reader:
+            for df in reader:
+                # Header yoksa kolon isimlerini olustur
+                if not has_header:
+                    df.columns = [f"column_{i+1}" for i in range(len(df.columns))]
+                if not columns:
+                    columns.extend(str(c) for c in df.columns)
+                yield ConnectionManager._dataframe_records(df)
+
+        if _csv_fallback.used and dialect["encoding"].startswith("utf-8"):
+            logger.warning(
+                f"CSV dosyasinin ilerisinde UTF-8 olmayan baytlar var, CP1254 ile cozuldu: {file_path}"
+            )
+            dialect["encoding"] = "cp1254"
+
+    # ============ Helper: CSV Dialect ============
 
-        # Otomatik encoding tespiti: sirayla dene
-        last_error = None
-        for enc in ConnectionManager.ENCODING_FALLBACK_ORDER:
+    @staticmethod
+    def _resolve_csv_dialect(file_path: str, parse_config: dict) -> Dict[str, Any]:
+        """
+        CSV lehcesi: {"encoding", "delimiter", "has_header"}.
+        Kullanicinin acikca verdigi degerler ('auto' / bos olmayan) aynen
+        kullanilir. Kalanlar icin once onceki sync'lerde kaydedilen tespit
+        (file_parse_config["detected"]) dosya basina karsi dogrulanir;
+        tutmazsa dosyanin ilk CSV_SNIFF_BYTES bayti incelenir. Dosya yine
+        tek gecisle okunur.
+        """
+        with open(file_path, "rb") as f:
+            prefix = f.read(CSV_SNIFF_BYTES)
+
+        explicit = {
+            key: parse_config[key] for key in ("encoding", "delimiter", "has_header")
+            if not ConnectionManager._is_auto(parse_config.get(key))
+        }
+        recorded = {**(parse_config.get("detected") or {}), **explicit}
+        if len(recorded) == 3 and ConnectionManager._dialect_matches(prefix, recorded):
+            return recorded
+
+        dialect = ConnectionManager._sniff_csv_dialect(prefix, explicit)
+        logger.info(
+            f"CSV lehcesi tespit edildi: encoding={dialect['encoding']}, "
+            f"ayirici={dialect['delimiter']!r}, baslik={dialect['has_header']}"
+        )
+        return dialect
+
+    @staticmethod
+    def _is_auto(value) -> bool:
+        return value is None or (isinstance(value, str) and value.strip().lower() in ("", "auto"))
+
+    @staticmethod
+    def _sniff_csv_dialect(prefix: bytes, explicit: Dict[str, Any]) -> Dict[str, Any]:
+        """Dosya basindan encoding, ayirici ve baslik satiri; explicit degerler korunur."""
+        encoding = explicit.get("encoding") or ConnectionManager._sniff_encoding(prefix)
+        try:
+            sample = ConnectionManager._decode_prefix(prefix, encoding)
+        except (UnicodeDecodeError, LookupError) as e:
+            raise ValueError(f"Dosya '{encoding}' encoding ile okunamadi: {e}")
+        if len(prefix) == CSV_SNIFF_BYTES and "\n" in sample:
+            # Son satir yarim kalmis olabilir
+            sample = sample[:sample.rindex("\n") + 1]
+
+        delimiter = explicit.get("delimiter") or ConnectionManager._sniff_delimiter(sample)
+        has_header = explicit.get("has_header")
+        if has_header is None:
+            has_header = ConnectionManager._sniff_header(ConnectionManager._sample_rows(sample, delimiter))
+        return {"encoding": encoding, "delimiter": delimiter, "has_header": bool(has_header)}
+
+    @staticmethod
+    def _sniff_encoding(prefix: bytes) -> str:
+        """
+        BOM > gecerli UTF-8 > CP1254 > ISO-8859-9. Turkce harfler CP1254 ve
+        ISO-8859-9'da ayni baytlardadir; CP1254 0x80-0x9F araligini da
+        (€, tirnaklar) karakter olarak kullanir, orada tanimsiz bayt varsa
+        ISO-8859-9 secilir.
+        """
+        if prefix.startswith(codecs.BOM_UTF8):
+            return "utf-8-sig"
+        if prefix.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return "utf-16"
+        for encoding in ("utf-8", "cp1254"):
             try:
-                buffer = io.BytesIO(file_bytes)
-                df = pd.read_csv(buffer, delimiter=delimiter, encoding=enc, header=header, dtype=str)
-                logger.info(f"CSV dosyasi '{enc}' encoding ile basariyla okundu")
-                return df
-            except (UnicodeDecodeError, UnicodeError) as e:
-                last_error = e
-                logger.debug(f"Encoding '{enc}' basarisiz: {e}")
+                ConnectionManager._decode_prefix(prefix, encoding)
+                return encoding
+            except UnicodeDecodeError:
                 continue
+        return "iso-8859-9"
+
+    @staticmethod
+    def _decode_prefix(prefix: bytes, encoding: str) -> str:
+        """Dosya basini cozer; sonda yarim kalan cok baytli karakter hata sayilmaz."""
+        return codecs.getincrementaldecoder(encoding)().decode(prefix, final=False)
 
-        # Hicbiri calismadiysa son hatayi ver
-        raise last_error or ValueError("Dosya encoding'i tespit edilemedi")
+    @staticmethod
+    def _sample_rows(sample: str, delimiter: str) -> List[List[str]]:
+        reader = csv.reader(io.StringIO(sample), delimiter=delimiter)
+        return [row for row in islice(reader, CSV_SNIFF_ROWS) if row]
 
     @staticmethod
-    def _read_file_to_dataframe(file_bytes: bytes, file_name: str, parse_config: dict):
-        """Dosya icerigini pandas DataFrame'e donusturur."""
-        import pandas as pd
+    def _sniff_delimiter(sample: str) -> str:
+        """
+        Adaylar icinde satirlari en tutarli (ayni alan sayisina) bolen;
+        esitlikte daha cok kolon, sonra aday sirasi. Hicbiri bolmuyorsa ';'.
+        """
+        best, best_score = CSV_DELIMITERS[0], (0.0, 0)
+        for delimiter in CSV_DELIMITERS:
+            widths = [len(row) for row in ConnectionManager._sample_rows(sample, delimiter)]
+            if not widths:
+                continue
+            width = max(set(widths), key=widths.count)
+            if width < 2:
+                continue
+            score = (round(widths.count(width) / len(widths), 2), width)
+            if score > best_score:
+                best, best_score = delimiter, score
+        return best
+
+    @staticmethod
+    def _sniff_header(rows: List[List[str]]) -> bool:
+        """
+        Ilk satir bos / tekrarli / sayisal hucre iceriyorsa baslik degildir;
+        sayisal bir veri kolonunun ilk satiri sayisal degilse basliktir.
+        Kanit yoksa (tum kolonlar metin) eski varsayilan: baslik var.
+        """
+        if len(rows) < 2:
+            return True
+        header, data = rows[0], rows[1:]
+        cells = [cell.strip() for cell in header]
+        if not all(cells) or len(set(cells)) != len(cells):
+            return False
+        if any(_NUMERIC_CELL.match(cell) for cell in cells):
+            return False
+        for i, cell in enumerate(cells):
+            values = [row[i].strip() for row in data if i < len(row) and row[i].strip()]
+            if values and cell in values:
+                return False
+        return True
+
+    @staticmethod
+    def _dialect_matches(prefix: bytes, dialect: Dict[str, Any]) -> bool:
+        """
+        Kayitli lehcenin bu dosyaya uyup uymadigini ucuzca dener: dosya basi
+        encoding ile cozulmeli, tek baytli kod sayfasi kayitliyken dosya
+        ASCII disi gecerli UTF-8 olmamali, ayirici ilk satiri bolmeli.
+        """
+        encoding = dialect["encoding"]
+        try:
+            sample = ConnectionManager._decode_prefix(prefix, encoding)
+        except (UnicodeDecodeError, LookupError):
+            return False
+        if not codecs.lookup(encoding).name.startswith("utf") and not prefix.isascii():
+            try:
+                ConnectionManager._decode_prefix(prefix, "utf-8")
+                return False
+            except UnicodeDecodeError:
+                pass
+        rows = ConnectionManager._sample_rows(sample[:CSV_SNIFF_BYTES // 16], dialect["delimiter"])
+        return bool(rows) and len(rows[0]) > 1
+
+    @staticmethod
+    def _iter_excel_chunks(file_path: str, parse_config: dict, batch_size: int, columns: List[str]) -> Iterator[List[Dict]]:
+        """xlsx: openpyxl read-only modunda satir satir; bos satirlar atlanir."""
+        from openpyxl import load_workbook
 
-        file_ext = file_name.rsplit(".", 1)[-1].lower() if "." in file_name else ""
-        delimiter = parse_config.get("delimiter", ";")
-        encoding = parse_config.get("encoding", None)
         has_header = parse_config.get("has_header", True)
         sheet_name = parse_config.get("sheet_name", 0)
 
-        header = 0 if has_header else None
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+            rows = sheet.iter_rows(values_only=True)
+
+            names: Optional[List[str]] = None
+            if has_header:
+                names = ConnectionManager._header_names(next(rows, None) or ())
+                columns.extend(names)
+
+            batch = []
+            for values in rows:
+                if all(v is None for v in values):
+                    continue
+                if names is None:
+                    names = [f"column_{i+1}" for i in range(len(values))]
+                    columns.extend(names)
+                batch.append({name: str(v) if v is not None else None for name, v in zip(names, values)})
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            workbook.close()
 
-        if file_ext in ("csv", "txt"):
-            df = ConnectionManager._read_csv_with_encoding_fallback(
-                file_bytes, delimiter, header, encoding_hint=encoding
-            )
-        elif file_ext in ("xlsx", "xls"):
-            buffer = io.BytesIO(file_bytes)
-            df = pd.read_excel(buffer, sheet_name=sheet_name, header=header, dtype=str)
-        elif file_ext == "parquet":
-            buffer = io.BytesIO(file_bytes)
-            df = pd.read_parquet(buffer)
-            # Parquet veri tiplerini korur, string'e cevirmeye gerek yok
-        else:
-            # Varsayilan: CSV olarak dene (encoding fallback ile)
-            df = ConnectionManager._read_csv_with_encoding_fallback(
-                file_bytes, delimiter, header, encoding_hint=encoding
-            )
+    @staticmethod
+    def _iter_xls_chunks(file_path: str, parse_config: dict, batch_size: int, columns: List[str]) -> Iterator[List[Dict]]:
+        """Eski xls: openpyxl okuyamaz, pandas ile tek seferde okunup parcalanir."""
+        import pandas as pd
 
-        # Header yoksa kolon isimlerini olustur
+        has_header = parse_config.get("has_header", True)
+        df = pd.read_excel(
+            file_path, sheet_name=parse_config.get("sheet_name", 0),
+            header=0 if has_header else None, dtype=str,
+        )
         if not has_header:
             df.columns = [f"column_{i+1}" for i in range(len(df.columns))]
+        columns.extend(str(c) for c in df.columns)
 
-        return df
+        for start in range(0, len(df), batch_size):
+            yield ConnectionManager._dataframe_records(df.iloc[start:start + batch_size])
+
+    @staticmethod
+    def _iter_parquet_chunks(file_path: str, batch_size: int, columns: List[str]) -> Iterator[List[Dict]]:
+        """Parquet: row group'lar batch_size'lik kayit batch'leri halinde okunur."""
+        import pyarrow.parquet as pq
+
+        with pq.ParquetFile(file_path) as parquet_file:
+            columns.extend(parquet_file.schema_arrow.names)
+            for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+                yield ConnectionManager._dataframe_records(record_batch.to_pandas())
+
+    @staticmethod
+    def _header_names(header) -> List[str]:
+        """Excel baslik satiri; bos basliklar 'Unnamed: i', tekrarlar 'ad.1' (pandas ile ayni)."""
+        names: List[str] = []
+        seen: Dict[str, int] = {}
+        for i, value in enumerate(header):
+            name = str(value) if value is not None else f"Unnamed: {i}"
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            names.append(name)
+        return names
+
+    @staticmethod
+    def _dataframe_records(df) -> List[Dict[str, Any]]:
+        """DataFrame'i string degerli kayit listesine cevirir (NaN -> None)."""
+        # object'e cevirmeden where(None), pandas string kolonlarinda NaN birakir
+        df = df.astype(object)
+        df = df.where(df.notna(), None)
+        rows = df.to_dict(orient="records")
+        for row in rows:
+            for k, v in row.items():
+                if v is not None and not isinstance(v, str):
+                    row[k] = str(v)
+        return rows
@@ -0,0 +1,236 @@
+"""
+Currency Conversion Service - Vektorel para birimi donusumu
+
+Doviz kurlarini (para birimi x donem, versiyon bazli) bir kez okuyup
+[para birimi, donem] matrisi olarak process icinde tutar. Grid, toplam
+ve export endpoint'leri deger dizilerini tek seferde bu matrisle carpar.
+
+Kurlar baz para birimine gore tutulur (1 birim = rate baz para birimi);
+A'dan B'ye donusum carpani rate(A) / rate(B) olur. Versiyona ozel kur,
+genel (version_id bos) kura gore onceliklidir. Kur eklendiginde veya
+silindiginde cache invalidate edilir; ayrica her istekte kur tablosunun
+revizyonu (max updated_date, kayit sayisi) kontrol edilir.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.budget_entry import MeasureDataType
+from app.models.system_data import BudgetCurrencyRate
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateTable:
+    """
+    Bir versiyon icin kur matrisi.
+    - rates: float64 [C, P], eksik kur = NaN; baz para birimi satiri 1
+    """
+    version_id: Optional[int]
+    revision: Tuple[Optional[datetime], int]
+    currency_index: Mapping[str, int]
+    period_index: Mapping[int, int]
+    rates: np.ndarray
+
+
+_rate_cache: Dict[Optional[int], RateTable] = {}
+_cache_lock = threading.Lock()
+
+
+def _normalize_code(code: Optional[str]) -> str:
+    return (code or settings.BASE_CURRENCY_CODE).upper().strip()
+
+
+class CurrencyConverter:
+    """Kur tablolarini cache'leyen ve deger dizilerini donusturen sinif."""
+
+    # ============ Rate Table ============
+
+    @staticmethod
+    def get_rate_table(db: Session, version_id: Optional[int]) -> RateTable:
+        """Versiyonun kur matrisini dondurur (gecerli cache kaydi varsa onu)."""
+        revision = CurrencyConverter._revision(db, version_id)
+        with _cache_lock:
+            table = _rate_cache.get(version_id)
+        if table is not None and table.revision == revision:
+            return table
+
+        table = CurrencyConverter._load(db, version_id, revision)
+        with _cache_lock:
+            _rate_cache[version_id] = table
+        logger.info(
+            f"Kur tablosu yuklendi: versiyon={version_id}, "
+            f"{len(table.currency_index)} para birimi x {len(table.period_index)} donem"
+        )
+        return table
+
+    @staticmethod
+    def invalidate(version_id: Optional[int] = None) -> None:
+        """
+        Kur cache'ini temizler. Genel kurlar (version_id bos) tum versiyonlari
+        etkiledigi icin None verildiginde tum cache silinir.
+        """
+        with _cache_lock:
+            if version_id is None:
+                _rate_cache.clear()
+            else:
+                _rate_cache.pop(version_id, None)
+
+    # ============ Conversion ============
+
+    @staticmethod
+    def factors(
+        table: RateTable,
+        source_codes: Sequence[Optional[str]],
+        period_ids: Sequence[int],
+        target_code: str,
+    ) -> np.ndarray:
+        """
+        Eleman bazli donusum carpanlari: source_codes[i] -> target_code, period_ids[i].
+        Kuru olmayan elemanlar NaN doner.
+        """
+        codes = np.asarray([_normalize_code(c) for c in source_codes], dtype=object)
+        periods = np.asarray(period_ids)
+        if codes.size == 0:
+            return np.zeros(0, dtype=np.float64)
+
+        unique_codes, code_inverse = np.unique(codes, return_inverse=True)
+        unique_periods, period_inverse = np.unique(periods, return_inverse=True)
+
+        source = CurrencyConverter._rate_matrix(table, list(unique_codes), list(unique_periods))  # [Cu, Pu]
+        target = CurrencyConverter._rate_matrix(table, [_normalize_code(target_code)], list(unique_periods))[0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix = source / target[None, :]
+        matrix = np.where(np.isfinite(matrix), matrix, np.nan)
+        return matrix[code_inverse, period_inverse]
+
+    @staticmethod
+    def factor_matrix(
+        table: RateTable,
+        row_codes: Sequence[Optional[str]],
+        period_ids: Sequence[int],
+        target_code: str,
+    ) -> np.ndarray:
+        """Satir x donem carpan matrisi [R, P] (satirin para biriminden hedefe)."""
+        row_count, period_count = len(row_codes), len(period_ids)
+        codes = np.repeat(np.asarray(list(row_codes), dtype=object), period_count)
+        periods = np.tile(np.asarray(list(period_ids)), row_count)
+        return CurrencyConverter.factors(table, codes, periods, target_code).reshape(row_count, period_count)
+
+    @staticmethod
+    def convert(values: np.ndarray, factors: np.ndarray, monetary: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Degerleri carpanlarla tek seferde donusturur. monetary (bool maske)
+        verilirse sadece isaretli elemanlar donusturulur; kuru olmayanlar NaN olur.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if monetary is None:
+            return values * factors
+        return np.where(monetary, values * factors, values)
+
+    @staticmethod
+    def missing_rates(
+        table: RateTable,
+        factors: np.ndarray,
+        source_codes: Sequence[Optional[str]],
+        period_ids: Sequence[int],
+        target_code: str,
+    ) -> Set[Tuple[str, int]]:
+        """NaN carpanlara neden olan eksik (para birimi, donem) kurlari (kaynak veya hedef)."""
+        target = _normalize_code(target_code)
+        pairs = {
+            (_normalize_code(source_codes[i]), int(period_ids[i]))
+            for i in np.flatnonzero(np.isnan(np.ravel(factors)))
+        }
+        if not pairs:
+            return set()
+        pair_periods = sorted({period_id for _, period_id in pairs})
+        target_rates = CurrencyConverter._rate_matrix(table, [target], pair_periods)[0]
+        target_missing = {pid for pid, rate in zip(pair_periods, target_rates) if np.isnan(rate)}
+        return {
+            (target, period_id) if period_id in target_missing else (code, period_id)
+            for code, period_id in pairs
+        }
+
+    @staticmethod
+    def monetary_measure_codes(measures: Iterable) -> Set[str]:
+        """Donusturulecek (para birimi tipindeki) olcu kodlari."""
+        return {m.code for m in measures if m.data_type == MeasureDataType.currency}
+
+    # ============ Internal ============
+
+    @staticmethod
+    def _revision(db: Session, version_id: Optional[int]) -> Tuple[Optional[datetime], int]:
+        query = db.query(func.max(BudgetCurrencyRate.updated_date), func.count(BudgetCurrencyRate.id))
+        if version_id is not None:
+            query = query.filter(or_(
+                BudgetCurrencyRate.version_id == version_id,
+                BudgetCurrencyRate.version_id.is_(None),
+            ))
+        else:
+            query = query.filter(BudgetCurrencyRate.version_id.is_(None))
+        max_updated, count = query.one()
+        return (max_updated, count)
+
+    @staticmethod
+    def _load(db: Session, version_id: Optional[int], revision: Tuple[Optional[datetime], int]) -> RateTable:
+        query = db.query(
+            BudgetCurrencyRate.currency_code, BudgetCurrencyRate.period_id,
+            BudgetCurrencyRate.version_id, BudgetCurrencyRate.rate,
+        )
+        if version_id is not None:
+            query = query.filter(or_(
+                BudgetCurrencyRate.version_id == version_id,
+                BudgetCurrencyRate.version_id.is_(None),
+            ))
+        else:
+            query = query.filter(BudgetCurrencyRate.version_id.is_(None))
+        records = query.all()
+
+        base_code = _normalize_code(settings.BASE_CURRENCY_CODE)
+        currency_codes = [base_code] + sorted({_normalize_code(r[0]) for r in records} - {base_code})
+        period_ids = sorted({r[1] for r in records})
+        currency_index = {code: i for i, code in enumerate(currency_codes)}
+        period_index = {pid: i for i, pid in enumerate(period_ids)}
+
+        rates = np.full((len(currency_codes), len(period_ids)), np.nan, dtype=np.float64)
+        # Once genel, sonra versiyona ozel kurlar (oncelikli) yazilir
+        for code, period_id, rate_version_id, rate in sorted(records, key=lambda r: r[2] is not None):
+            if rate is None:
+                continue
+            rates[currency_index[_normalize_code(code)], period_index[period_id]] = float(rate)
+        rates[0, :] = 1.0
+
+        return RateTable(
+            version_id=version_id,
+            revision=revision,
+            currency_index=currency_index,
+            period_index=period_index,
+            rates=rates,
+        )
+
+    @staticmethod
+    def _rate_matrix(table: RateTable, codes: List[str], period_ids: List[int]) -> np.ndarray:
+        """Istenen para birimleri ve donemler icin kur matrisi; bilinmeyen = NaN (baz = 1)."""
+        result = np.full((len(codes), len(period_ids)), np.nan, dtype=np.float64)
+        base_code = _normalize_code(settings.BASE_CURRENCY_CODE)
+        p_src = [table.period_index.get(pid) for pid in period_ids]
+        p_cols = [j for j, p in enumerate(p_src) if p is not None]
+        p_idx = [p for p in p_src if p is not None]
+        for i, code in enumerate(codes):
+            if code == base_code:
+                result[i, :] = 1.0
+                continue
+            c = table.currency_index.get(code)
+            if c is not None and p_idx:
+                result[i, p_cols] = table.rates[c, p_idx]
+        return result
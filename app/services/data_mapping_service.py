@@ -25,9 +25,13 @@ from app.models.system_data import (
 )
 from app.models.budget_entry import (
     BudgetDefinition, BudgetDefinitionDimension, BudgetEntryRow, BudgetEntryCell,
-    BudgetCellType
+    BudgetCellType, BudgetStorageMode, CellChangeSource
 )
 from app.schemas.data_connection import MappingExecutionResult, MappingPreviewResponse
+from app.services.budget_consolidation_service import BudgetConsolidationService
+from app.services.budget_lock_service import BudgetLockService
+from app.services.cell_history_service import CellHistoryBuffer
+from app.services.rule_set_compiler import RuleSetCompiler
 
 logger = logging.getLogger(__name__)
 
@@ -54,7 +58,9 @@ class DataMappingService:
             "system_version": DataMappingService._execute_system_version_mapping,
             "system_period": DataMappingService._execute_system_period_mapping,
             "system_parameter": DataMappingService._execute_system_parameter_mapping,
-            "budget_entry": DataMappingService._execute_budget_entry_mapping,
+            "budget_entry": lambda db, mapping: DataMappingService._execute_budget_entry_mapping(
+                db, mapping, triggered_by
+            ),
         }
 
         handler = handler_map.get(target_type)
@@ -531,6 +537,7 @@ class DataMappingService:
                                 version_id=version.id,
                                 value=str(param_value)
                             ))
+                        param.updated_date = func.now()
                     else:
                         error_details.append(
                             f"Satir {processed}: Versiyon bulunamadi: '{version_code}'"
@@ -543,6 +550,7 @@ class DataMappingService:
                     break
 
         db.commit()
+        RuleSetCompiler.invalidate_parameters()
         return MappingExecutionResult(
             success=errors == 0,
             message=f"Parametre aktarimi: {inserted} yeni, {updated} guncellenen, {errors} hata.",
@@ -555,7 +563,8 @@ class DataMappingService:
     @staticmethod
     def _execute_budget_entry_mapping(
         db: Session,
-        mapping: DataConnectionMapping
+        mapping: DataConnectionMapping,
+        triggered_by: Optional[str] = None
     ) -> MappingExecutionResult:
         """
         Staging -> BudgetEntryRow + BudgetEntryCell upsert (en karmasik).
@@ -584,6 +593,18 @@ class DataMappingService:
                 success=False, message=f"BudgetDefinition bulunamadi: {definition_id}",
                 processed=0, inserted=0, updated=0, errors=0
             )
+        if definition.storage_mode == BudgetStorageMode.dense:
+            return MappingExecutionResult(
+                success=False, message="Hedef tanim dense depolama modunda, once cell moduna donusturun.",
+                processed=0, inserted=0, updated=0, errors=0
+            )
+
+        # Kaydetme / hesaplama / ice aktarma ile ayni anda yazilmaz
+        if not BudgetLockService.try_lock(db, definition_id):
+            return MappingExecutionResult(
+                success=False, message="Tanim uzerinde devam eden bir hesaplama/islem var, daha sonra tekrar deneyin.",
+                processed=0, inserted=0, updated=0, errors=0
+            )
 
         field_mappings = mapping.field_mappings
 
@@ -616,6 +637,11 @@ class DataMappingService:
         updated = 0
         errors = 0
         error_details = []
+        touched_row_ids = set()
+        rows_changed = False
+        history = CellHistoryBuffer(
+            db, definition_id, CellChangeSource.mapping, changed_by=triggered_by, reference_id=mapping.id
+        )
 
         for row in rows_data:
             processed += 1
@@ -692,8 +718,9 @@ class DataMappingService:
 
                 if existing_row:
                     entry_row = existing_row
-                    if currency_code:
+                    if currency_code and entry_row.currency_code != currency_code:
                         entry_row.currency_code = currency_code
+                        rows_changed = True
                 else:
                     entry_row = BudgetEntryRow(
                         uuid=uuid_lib.uuid4(),
@@ -704,20 +731,25 @@ class DataMappingService:
                     )
                     db.add(entry_row)
                     db.flush()
+                    rows_changed = True
 
                 # 3. BudgetEntryCell upsert: (row_id, period_id, measure_code)
                 for measure_code, value in measure_values.items():
                     existing_cell = db.query(BudgetEntryCell).filter(
+                        BudgetEntryCell.budget_definition_id == definition_id,
                         BudgetEntryCell.row_id == entry_row.id,
                         BudgetEntryCell.period_id == period_id,
                         BudgetEntryCell.measure_code == measure_code
                     ).first()
 
                     if existing_cell:
+                        history.record(entry_row.id, period_id, measure_code, existing_cell.value, value)
                         existing_cell.value = value
                         updated += 1
                     else:
+                        history.record(entry_row.id, period_id, measure_code, None, value)
                         db.add(BudgetEntryCell(
+                            budget_definition_id=definition_id,
                             row_id=entry_row.id,
                             period_id=period_id,
                             measure_code=measure_code,
@@ -725,6 +757,7 @@ class DataMappingService:
                             cell_type=BudgetCellType.input,
                         ))
                         inserted += 1
+                touched_row_ids.add(entry_row.id)
 
             except Exception as e:
                 errors += 1
@@ -733,6 +766,12 @@ class DataMappingService:
                     error_details.append("100'den fazla hata, islem durduruluyor.")
                     break
 
+        # Acik gridler bu satirlari eski revizyonla kaydedemesin
+        BudgetLockService.bump_revisions(db, definition_id, sorted(touched_row_ids))
+        # Yeni satir / para birimi hucre gecmisine dusmez: konsolidasyonlar tam yenilenir
+        if rows_changed:
+            BudgetConsolidationService.invalidate_definition(db, definition_id)
+        history.flush()
         db.commit()
         return MappingExecutionResult(
             success=errors == 0,
@@ -3,27 +3,544 @@ Data Sync Service - Veri senkronizasyon servisi
 
 Kolon tespiti, staging tablo olusturma, veri senkronizasyonu
 ve staging veri onizleme islemlerini yonetir.
+
+Kolon tespiti kaynaktan sinirli bir taramanin reservoir ornegi uzerinde
+tipleri vektorel cikarir; bir tip yalnizca ornekteki tum degerler sync'in
+donusturuculerinden gecebiliyorsa onerilir. Kolon istatistikleri (bos
+orani, farkli deger tahmini, min / max, uzunluk) de dondurulur.
+
+Staging yukleme tek bir COPY ile yapilir: kaynaktan gelen kayit parcalari
+kolon tiplerine donusturulup dogrudan COPY akisina yazilir, satir basina
+INSERT round-trip'i olmaz. Parcalar arka plan thread'inde cekilir ve
+sinirli bir kuyrukla aktarilir; cekme ile yukleme ust uste biner, bellek
+kuyruk derinligi kadar parca ile sinirli kalir.
+
+Tam yukleme index'siz bir golge tabloya (<staging>__next) yapilir; index
+ve ANALYZE sonrasi ayni transaction'da rename ile staging'in yerine gecer.
+Okuyucular (eslestirme, DWH aktarimi, onizleme) hep tam bir kopya gorur.
+
+Delta modundaki sorgularda kaynak, son basarili sync'in watermark'indan
+(>=) itibaren filtrelenir; kayitlar gecici tabloya yuklenip anahtar
+kolonlarla staging'e upsert edilir. Yeni watermark sync log'a yazilir.
 """
 
+import contextlib
+import functools
 import logging
+import queue
 import re
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple
 
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
+from app.db.session import get_session_local
 from app.models.data_connection import (
     DataConnection, DataConnectionQuery, DataConnectionColumn,
-    DataSyncLog, SyncStatus, ColumnDataType
+    DataSyncLog, SyncStatus, SyncMode, ColumnDataType, ConnectionType
 )
 from app.schemas.data_connection import (
     DetectedColumn, ColumnDetectionResponse, DataPreviewResponse
 )
 from app.services.connection_manager import ConnectionManager
+from app.services.upload_cache import UploadCache
 
 logger = logging.getLogger(__name__)
 
+# Staging yuklemede her bu kadar satirda ilerleme (satir / sn) sync log'a yazilir
+SYNC_PROGRESS_INTERVAL = 100_000
+
+# Cekilip henuz yazilmamis en fazla bu kadar kayit parcasi bellekte bekler
+SYNC_PREFETCH_BATCHES = 4
+
+# Golge tablo degistirmede okuyucu kilitleri icin deneme basina bekleme / deneme sayisi
+SYNC_SWAP_LOCK_TIMEOUT = "5s"
+SYNC_SWAP_ATTEMPTS = 3
+
+# Kolon tespiti: kaynaktan en fazla DETECT_SCAN_ROWS satir / DETECT_TIME_BUDGET
+# sn okunur, tip cikarimi DETECT_SAMPLE_ROWS satirlik reservoir ornegi uzerinde
+# yapilir (DataConnection.extra_config["detect_sample_rows"] ile degisir)
+DETECT_SAMPLE_ROWS = 100_000
+DETECT_SCAN_ROWS = 1_000_000
+DETECT_TIME_BUDGET = 1.0
+
+
+# ============ Value Coercion ============
+# COPY'ye giden degerler staging kolonunun tipine donusturulur. Kaynaklar
+# (OData JSON, HANA, dosya) degerleri cogunlukla metin olarak verir.
+
+_TRUE_VALUES = {"true", "1", "yes", "evet", "x", "t", "y", "e"}
+_FALSE_VALUES = {"false", "0", "no", "hayir", "hayır", "f", "n", "h"}
+
+# SAP OData V2 tarih formati: /Date(1700000000000)/ veya /Date(1700000000000+0180)/
+_SAP_DATE_RE = re.compile(r'^/Date\((-?\d+)([+-]\d{4})?\)/$')
+
+_PLAIN_NUMBER_RE = re.compile(r'^-?\d+(\.\d+)?$')
+
+# DD.MM.YYYY veya DD/MM/YYYY, istege bagli HH:MM[:SS] (strptime satir basina cok yavas)
+_LOCAL_DATETIME_RE = re.compile(r'^(\d{1,2})[./](\d{1,2})[./](\d{4})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2}))?)?$')
+
+
+def _type_value(data_type) -> str:
+    return data_type.value if hasattr(data_type, 'value') else str(data_type)
+
+
+def _coerce_string(value):
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        value = str(value)
+    # PostgreSQL metin tiplerinde NUL karakteri kabul edilmez
+    return value.replace("\x00", "") if "\x00" in value else value
+
+
+def _coerce_integer(value):
+    if value is None or isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(value)
+        return int(value)
+    if isinstance(value, Decimal):
+        if not value.is_finite() or value != value.to_integral_value():
+            raise ValueError(value)
+        return int(value)
+    text_value = str(value).strip()
+    if not text_value:
+        return None
+    try:
+        return int(text_value)
+    except ValueError:
+        number = _parse_decimal_text(text_value)
+        if number != number.to_integral_value():
+            raise ValueError(value)
+        return int(number)
+
+
+def _coerce_decimal(value):
+    if value is None or isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return value
+    text_value = str(value).strip()
+    if not text_value:
+        return None
+    if _PLAIN_NUMBER_RE.match(text_value):
+        return text_value  # metin COPY'de PostgreSQL kendisi cozer
+    return _parse_decimal_text(text_value)
+
+
+def _parse_decimal_text(text_value: str) -> Decimal:
+    # SAP ters isaret: 123.45-
+    if text_value.endswith("-"):
+        text_value = "-" + text_value[:-1]
+    if "," in text_value:
+        if "." in text_value and text_value.rfind(",") < text_value.rfind("."):
+            text_value = text_value.replace(",", "")  # 1,234.56
+        else:
+            text_value = text_value.replace(".", "").replace(",", ".")  # 1.234,56
+    try:
+        number = Decimal(text_value)
+    except InvalidOperation:
+        raise ValueError(text_value)
+    if not number.is_finite():
+        raise ValueError(text_value)
+    return number
+
+
+def _coerce_boolean(value):
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float, Decimal)):
+        return bool(value)
+    text_value = str(value).strip().lower()
+    if not text_value:
+        return None
+    if text_value in _TRUE_VALUES:
+        return True
+    if text_value in _FALSE_VALUES:
+        return False
+    raise ValueError(value)
+
+
+def _parse_sap_date(text_value: str) -> Optional[datetime]:
+    match = _SAP_DATE_RE.match(text_value)
+    if not match:
+        return None
+    return datetime(1970, 1, 1) + timedelta(milliseconds=int(match.group(1)))
+
+
+def _coerce_datetime(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        # timestamp (timezone'suz) kolon: UTC'ye cevir
+        return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return _parse_datetime_text(str(value).strip())
+
+
+@functools.lru_cache(maxsize=65536)
+def _parse_datetime_text(text_value: str) -> Optional[datetime]:
+    """Metin tarih cozumu; kaynaklarda ayni tarihler cok tekrarlandigi icin onbelleklenir."""
+    if not text_value or text_value.strip("0") == "":
+        return None  # SAP bos tarih: 00000000
+    if text_value.startswith("/Date("):
+        parsed = _parse_sap_date(text_value)
+        if parsed is not None:
+            return parsed
+    match = _LOCAL_DATETIME_RE.match(text_value)
+    if match:
+        day, month, year, hour, minute, second = match.groups()
+        return datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0))
+    # ISO 8601 (SAP DATS YYYYMMDD dahil)
+    return _coerce_datetime(datetime.fromisoformat(text_value))
+
+
+def _coerce_date(value):
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    parsed = _coerce_datetime(value)
+    return parsed.date() if parsed is not None else None
+
+
+_COERCERS = {
+    "string": _coerce_string,
+    "integer": _coerce_integer,
+    "decimal": _coerce_decimal,
+    "boolean": _coerce_boolean,
+    "date": _coerce_date,
+    "datetime": _coerce_datetime,
+}
+
+
+def _format_watermark(value) -> str:
+    """Watermark'in log'da saklanan metin hali."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _parse_watermark(text_value: str, data_type: str):
+    """Saklanan watermark metnini kolon tipindeki degere cevirir (kaynak filtresi icin)."""
+    if data_type == "datetime":
+        return datetime.fromisoformat(text_value)
+    if data_type == "date":
+        return date.fromisoformat(text_value[:10])
+    if data_type == "integer":
+        return int(text_value)
+    if data_type == "decimal":
+        return Decimal(text_value)
+    return text_value
+
+
+def _shadow_name(table_name: str) -> str:
+    """Golge tablo adi; 63 karakter sinirinda da staging adindan farkli kalir."""
+    return f"{table_name[:57]}__next"
+
+
+def _index_name(table_name: str, suffix: str) -> str:
+    return f"{table_name}{suffix}"[:63]
+
+
+# ============ Prefetch ============
+
+_PREFETCH_END = object()
+
+
+def _prefetch(batches: Iterator[List[Dict[str, Any]]], depth: int) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Kayit parcalarini arka plan thread'inde ceker ve en fazla depth parcalik
+    kuyrukla aktarir; kuyruk doluyken uretici bekler (back-pressure).
+    Ureticideki hata tuketicide yeniden firlatilir. Tuketici erken
+    birakirsa (hata / close) uretici durur ve kaynak iterator'u kapatilir.
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        end = _PREFETCH_END
+        try:
+            for batch in batches:
+                if not put(batch):
+                    return
+        except Exception as e:
+            end = e
+        finally:
+            close = getattr(batches, "close", None)
+            if close:
+                close()
+        put(end)
+
+    worker = threading.Thread(target=produce, name="sync-prefetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _PREFETCH_END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        worker.join()
+
+
+# ============ Type Inference ============
+# Kolon tespiti ornekteki degerleri vektorel (pandas str / to_numeric /
+# to_datetime) olarak yukaridaki donusturucularin kabul ettigi bicimlere
+# gore siniflandirir. Bir tip ancak ornekteki tum dolu degerler o tipe
+# donusturulebiliyorsa onerilir; tespit edilen tip sync'te hata vermez.
+
+# Sayi bicimleri _parse_decimal_text ile ayni: isaret basta ya da SAP gibi sonda
+_NUMBER_SIGN = r"[+-]?(?:{body})|(?:{body})-"
+_INTEGER_SHAPE = _NUMBER_SIGN.format(body=r"\d{1,18}")
+_DECIMAL_SHAPE = "|".join(_NUMBER_SIGN.format(body=body) for body in (
+    r"\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+",  # 1234.56, 1e5
+    r"\d{1,3}(?:\.\d{3})*,\d+|\d+,\d+",       # 1.234,56 / 1234,56
+    r"\d{1,3}(?:,\d{3})+\.\d+",               # 1,234.56
+))
+# Bastaki sifir (malzeme / musteri kodu) sayiya cevrilince kaybolur
+_LEADING_ZERO_SHAPE = r"[+-]?0\d"
+# NUMERIC(20,4) tam kismi
+_DECIMAL_LIMIT = 1e16
+
+# _parse_datetime_text'in kabul ettigi bicimler: ISO tarih (SAP DATS YYYYMMDD
+# dahil), ISO tarih-saat, DD.MM.YYYY [HH:MM[:SS]], /Date(ms)/
+_ISO_DATE_SHAPE = r"\d{4}-\d{2}-\d{2}|\d{8}"
+_ISO_DATETIME_SHAPE = r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?(?:Z|[+-]\d{2}:?\d{2})?"
+_TEMPORAL_SHAPE = "|".join((
+    _ISO_DATE_SHAPE, _ISO_DATETIME_SHAPE,
+    _LOCAL_DATETIME_RE.pattern.strip("^$"), _SAP_DATE_RE.pattern.strip("^$"),
+))
+# DATS tamsayi gibi de gorunur; yalnizca makul yillarda tarih sayilir
+_DATS_YEARS = (1900, 2100)
+
+# Surucunun kendi tipleriyle gelen degerler (HANA) Python tipine gore
+# siniflandirilir; ilk uyan kume secilir (bool int'in, datetime date'in
+# alt sinifi oldugu icin tam tip karsilastirilir)
+_NATIVE_TYPES = (
+    ({bool}, "boolean"),
+    ({int}, "integer"),
+    ({int, float, Decimal}, "decimal"),
+    ({date}, "date"),
+    ({date, datetime}, "datetime"),
+)
+_BIGINT_LIMIT = 2 ** 63
+
+
+def _numeric_values(values):
+    """_DECIMAL_SHAPE'e uyan metinlerin sayisal degeri (_parse_decimal_text'in vektorel hali)."""
+    import pandas as pd
+
+    negative = values.str.endswith("-")
+    if negative.any():
+        values = values.where(~negative, "-" + values.str[:-1])
+    has_comma = values.str.contains(",", regex=False)
+    if not has_comma.any():
+        return pd.to_numeric(values, errors="coerce")
+    thousands = has_comma & values.str.contains(".", regex=False) & (values.str.rfind(",") < values.str.rfind("."))
+    values = values.where(~thousands, values.str.replace(",", "", regex=False))
+    values = values.where(~(has_comma & ~thousands), values.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    return pd.to_numeric(values, errors="coerce")
+
+
+def _temporal_values(values):
+    """
+    (tarih-saat degerleri, yalnizca-tarih maskesi); degerlerden biri bile
+    tarih bicimine uymuyorsa None. Gecersiz tarihler (31.02.2024) NaT olur,
+    zaman dilimli degerler UTC'ye cevrilir.
+    """
+    import pandas as pd
+
+    if not values.str.fullmatch(_TEMPORAL_SHAPE).all():
+        return None
+
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[us]")
+    date_only = values.str.fullmatch(_ISO_DATE_SHAPE)
+
+    iso = date_only | values.str.fullmatch(_ISO_DATETIME_SHAPE)
+    if iso.any():
+        parsed[iso] = pd.to_datetime(values[iso], format="ISO8601", errors="coerce", utc=True).dt.tz_localize(None)
+
+    sap = values.str.startswith("/Date(")
+    if sap.any():
+        millis = values[sap].str.extract(_SAP_DATE_RE.pattern)[0]
+        parsed[sap] = pd.to_datetime(pd.to_numeric(millis), unit="ms")
+
+    # DD.MM.YYYY [HH:MM[:SS]]; ayiricilar tek bicime getirilip formatla cozulur
+    local = ~iso & ~sap
+    if local.any():
+        local_values = values[local].str.replace("/", ".", regex=False).str.replace("T", " ", regex=False)
+        colons = local_values.str.count(":")
+        for count, fmt in ((0, "%d.%m.%Y"), (1, "%d.%m.%Y %H:%M"), (2, "%d.%m.%Y %H:%M:%S")):
+            part = colons == count
+            if part.any():
+                parsed[part[part].index] = pd.to_datetime(local_values[part], format=fmt, errors="coerce")
+        date_only[local] = colons == 0
+
+    return parsed, date_only
+
+
+def _native_profile(values) -> Optional[Tuple[str, str, str]]:
+    """
+    Kolon surucu tipleriyle (int, Decimal, date, datetime...) geldiyse
+    (data_type, min, max); metin degerli kolonlarda (dosya, OData) None.
+    """
+    if values.empty or isinstance(values.iat[0], str):
+        return None
+    items = values.tolist()
+    kinds = set(map(type, items))
+    data_type = next((data_type for allowed, data_type in _NATIVE_TYPES if kinds <= allowed), None)
+    if data_type is None:
+        return None
+    if data_type == "datetime" and date in kinds:
+        items = [v if isinstance(v, datetime) else datetime(v.year, v.month, v.day) for v in items]
+
+    low, high = min(items), max(items)
+    if data_type in ("date", "datetime"):
+        return data_type, low.isoformat(), high.isoformat()
+    limit = _BIGINT_LIMIT if data_type == "integer" else _DECIMAL_LIMIT
+    if data_type != "boolean" and max(-low, high) >= limit:
+        return None
+    return data_type, str(low), str(high)
+
+
+def _infer_column(raw, scanned: int) -> Dict[str, Any]:
+    """
+    Ornek kolonunun (str, surucu tipi ya da None degerli object Series) tipi
+    ve istatistikleri: data_type, null_ratio, distinct_count, min_value,
+    max_value, max_length. scanned: ornegin secildigi toplam satir sayisi.
+    Tip kontrolleri farkli degerler uzerinde yapilir.
+    """
+    present = raw.dropna()
+    native = _native_profile(present)
+    if native is not None:
+        data_type, low, high = native
+        return {
+            "data_type": data_type,
+            "null_ratio": round(1 - len(present) / len(raw), 4),
+            "distinct_count": _estimate_distinct(present, scanned),
+            "min_value": low,
+            "max_value": high,
+            "max_length": int(present.drop_duplicates().astype(str).str.len().max()),
+        }
+
+    values = present.astype(str)
+    max_length = int(values.str.len().max()) if len(values) else 0
+    values = values.str.strip()
+    values = values[values != ""]
+
+    profile = {
+        "data_type": "string",
+        "null_ratio": round(1 - len(values) / len(raw), 4) if len(raw) else 1.0,
+        "distinct_count": _estimate_distinct(values, scanned),
+        "min_value": None,
+        "max_value": None,
+        "max_length": max_length or None,
+    }
+    values = values.drop_duplicates()
+    if values.empty:
+        return profile
+
+    # Tarih / saat (SAP bos tarihi 00000000 bos sayilir)
+    dated = values[values.str.strip("0") != ""]
+    temporal = _temporal_values(dated) if not dated.empty else None
+    if temporal is not None:
+        timestamps, date_only = temporal
+        dats = dated.str.fullmatch(r"\d{8}")
+        if timestamps.notna().all() and timestamps[dats].dt.year.between(*_DATS_YEARS).all():
+            low, high = timestamps.min(), timestamps.max()
+            if date_only.all():
+                profile.update(data_type="date", min_value=low.date().isoformat(), max_value=high.date().isoformat())
+            else:
+                profile.update(data_type="datetime", min_value=low.isoformat(), max_value=high.isoformat())
+            return profile
+
+    # Sayi; min / max kaynaktaki yazilisiyla (1.234,56) doner
+    if not values.str.match(_LEADING_ZERO_SHAPE).any():
+        data_type = None
+        if values.str.fullmatch(_INTEGER_SHAPE).all():
+            data_type = "integer"
+        elif values.str.fullmatch(_DECIMAL_SHAPE).all():
+            data_type = "decimal"
+        if data_type:
+            numbers = _numeric_values(values)
+            if numbers.notna().all() and (data_type == "integer" or numbers.abs().lt(_DECIMAL_LIMIT).all()):
+                profile.update(
+                    data_type=data_type,
+                    min_value=values[numbers.idxmin()],
+                    max_value=values[numbers.idxmax()],
+                )
+                return profile
+
+    if values.str.lower().isin(_TRUE_VALUES | _FALSE_VALUES).all():
+        profile["data_type"] = "boolean"
+        return profile
+
+    profile.update(min_value=values.min(), max_value=values.max())
+    return profile
+
+
+def _estimate_distinct(values, scanned: int) -> int:
+    """
+    Farkli deger sayisi. Ornek taranan satirlarin tamamiysa kesin, degilse
+    GEE tahmini: sqrt(N/n) * (bir kez gorulen) + (birden cok gorulen).
+    """
+    counts = values.value_counts()
+    sample = int(counts.sum())
+    if not sample or scanned <= sample:
+        return len(counts)
+    once = int((counts == 1).sum())
+    estimate = (scanned / sample) ** 0.5 * once + (len(counts) - once)
+    return int(min(max(estimate, len(counts)), scanned))
+
+
+def _reservoir_sample(
+    batches: Iterator[List[Dict[str, Any]]],
+    size: int,
+    max_rows: int,
+    time_budget: float,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Kayit akisindan en fazla size satirlik esit olasilikli ornek (reservoir,
+    Algorithm R; parca basina vektorel). Akis bitince, max_rows satir ya da
+    time_budget saniye dolunca okuma biter. (ornek, taranan satir) dondurur.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(0)  # ayni dosyanin tespiti tekrarlanabilir olsun
+    sample: List[Dict[str, Any]] = []
+    scanned = 0
+    deadline = time.monotonic() + time_budget
+    for batch in batches:
+        batch = batch[:max_rows - scanned]
+        fill = min(len(batch), size - len(sample))
+        sample.extend(batch[:fill])
+        if fill < len(batch):
+            positions = np.arange(scanned + fill + 1, scanned + len(batch) + 1)
+            slots = rng.integers(0, positions)
+            for i in np.flatnonzero(slots < size):
+                sample[slots[i]] = batch[fill + i]
+        scanned += len(batch)
+        if scanned >= max_rows or time.monotonic() >= deadline:
+            break
+    return sample, scanned
+
 
 class DataSyncService:
     """Veri senkronizasyon islemlerini yoneten sinif."""
@@ -34,140 +551,83 @@ class DataSyncService:
     def detect_columns(
         connection: DataConnection,
         query: DataConnectionQuery,
-        file_bytes: Optional[bytes] = None,
-        file_name: Optional[str] = None
+        file_path: Optional[str] = None,
+        file_name: Optional[str] = None,
+        cache_dir: Optional[str] = None
     ) -> ColumnDetectionResponse:
         """
-        Kolon tiplerini otomatik tespit eder.
-        SAP/HANA icin ornek veri ceker, dosya icin dosya icerigini okur.
+        Kolon tiplerini ve istatistiklerini otomatik tespit eder.
+        Kaynak (SAP/HANA ya da diske yazilmis yukleme) parca parca okunur;
+        sinirli bir taramadan reservoir ornegi alinip tipler vektorel
+        cikarilir. Yukleme deposundaki dosyalar (cache_dir) icin ayni okuma
+        secenekleriyle yapilmis tespit yeniden kullanilir.
         """
+        import pandas as pd
+
         config = DataSyncService._build_connection_config(connection)
         query_config = DataSyncService._build_query_config(query)
+        source_info = {
+            "connection_type": connection.connection_type.value if hasattr(connection.connection_type, 'value') else str(connection.connection_type),
+            "connection_code": connection.code
+        }
 
-        if file_bytes:
-            query_config["file_bytes"] = file_bytes
+        parse_key = None
+        if file_path:
+            query_config["file_path"] = file_path
             query_config["file_name"] = file_name or "upload.csv"
-
-        rows, column_names = ConnectionManager.fetch_sample_data(
-            conn_type=connection.connection_type.value if hasattr(connection.connection_type, 'value') else str(connection.connection_type),
-            config=config,
-            query_config=query_config,
-            limit=100
+            query_config["file_cache_dir"] = cache_dir
+            if cache_dir:
+                parse_key = ConnectionManager.file_parse_key(query_config)
+                cached = UploadCache.load_schema(cache_dir, parse_key)
+                if cached:
+                    DataSyncService._record_file_dialect(query, query_config)
+                    return ColumnDetectionResponse(**cached, source_info=source_info)
+
+        extra = config.get("extra_config") or {}
+        sample_size = max(1, int(extra.get("detect_sample_rows") or DETECT_SAMPLE_ROWS))
+        column_names: List[str] = []
+        batches = ConnectionManager.fetch_batches(
+            source_info["connection_type"], config, query_config, columns=column_names
         )
-
+        with contextlib.closing(batches):
+            rows, scanned = _reservoir_sample(
+                batches, sample_size, max(sample_size, DETECT_SCAN_ROWS), DETECT_TIME_BUDGET
+            )
+        DataSyncService._record_file_dialect(query, query_config)
+        if not column_names and rows:
+            column_names = list(rows[0].keys())
+
+        # object: HANA'nin int / Decimal / datetime degerleri pandas tiplerine cevrilmez
+        sample = pd.DataFrame(rows, columns=column_names, dtype=object)
         detected_columns = []
-        for i, col_name in enumerate(column_names):
-            # Kolon degerlerini topla
-            sample_values = []
-            non_null_values = []
-            for row in rows:
-                val = row.get(col_name)
-                if val is not None:
-                    sample_values.append(str(val))
-                    non_null_values.append(str(val))
-                else:
-                    sample_values.append("")
-
-            # Tip tespiti
-            detected_type = DataSyncService._detect_column_type(non_null_values)
-
-            # Max uzunluk
-            max_len = max((len(str(v)) for v in non_null_values), default=0)
-
-            # Nullable kontrolu
-            has_nulls = len(non_null_values) < len(rows) if rows else True
-
-            # Target name: kucuk harf, bosluk yerine alt cizgi, ozel karakter temizle
-            target_name = DataSyncService._sanitize_column_name(col_name)
-
+        for col_name in column_names:
+            profile = _infer_column(sample[col_name], scanned)
             detected_columns.append(DetectedColumn(
                 source_name=col_name,
-                suggested_target_name=target_name,
-                detected_data_type=detected_type,
-                sample_values=sample_values[:5],
-                is_nullable=has_nulls,
-                max_length=max_len if max_len > 0 else None
+                # Target name: kucuk harf, bosluk yerine alt cizgi, ozel karakter temizle
+                suggested_target_name=DataSyncService._sanitize_column_name(col_name),
+                detected_data_type=profile["data_type"],
+                sample_values=["" if pd.isna(v) else str(v) for v in sample[col_name].iloc[:5]],
+                is_nullable=profile["null_ratio"] > 0 or not rows,
+                max_length=profile["max_length"],
+                null_ratio=profile["null_ratio"],
+                distinct_count=profile["distinct_count"],
+                min_value=profile["min_value"],
+                max_value=profile["max_value"],
             ))
 
-        return ColumnDetectionResponse(
+        result = ColumnDetectionResponse(
             columns=detected_columns,
             sample_row_count=len(rows),
-            source_info={
-                "connection_type": connection.connection_type.value if hasattr(connection.connection_type, 'value') else str(connection.connection_type),
-                "connection_code": connection.code
-            }
+            scanned_row_count=scanned,
+            source_info=source_info
         )
-
-    @staticmethod
-    def _detect_column_type(values: List[str]) -> str:
-        """Ornek degerlerden kolon tipini tespit eder."""
-        if not values:
-            return "string"
-
-        # Integer kontrolu
-        int_count = 0
-        for v in values:
-            try:
-                int(v.strip())
-                int_count += 1
-            except (ValueError, AttributeError):
-                pass
-
-        if int_count >= len(values) * 0.9:
-            return "integer"
-
-        # Decimal kontrolu
-        decimal_count = 0
-        for v in values:
-            try:
-                float(v.strip().replace(",", "."))
-                decimal_count += 1
-            except (ValueError, AttributeError):
-                pass
-
-        if decimal_count >= len(values) * 0.9:
-            return "decimal"
-
-        # Boolean kontrolu
-        bool_values = {"true", "false", "1", "0", "yes", "no", "evet", "hayir"}
-        bool_count = sum(1 for v in values if v.strip().lower() in bool_values)
-        if bool_count >= len(values) * 0.9:
-            return "boolean"
-
-        # Date kontrolu (YYYY-MM-DD, DD.MM.YYYY, DD/MM/YYYY)
-        date_patterns = [
-            r'^\d{4}-\d{2}-\d{2}$',
-            r'^\d{2}\.\d{2}\.\d{4}$',
-            r'^\d{2}/\d{2}/\d{4}$',
-        ]
-        date_count = 0
-        for v in values:
-            v_stripped = v.strip()
-            for pattern in date_patterns:
-                if re.match(pattern, v_stripped):
-                    date_count += 1
-                    break
-
-        if date_count >= len(values) * 0.8:
-            return "date"
-
-        # Datetime kontrolu
-        datetime_patterns = [
-            r'^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}',
-            r'^\d{2}\.\d{2}\.\d{4} \d{2}:\d{2}',
-        ]
-        dt_count = 0
-        for v in values:
-            v_stripped = v.strip()
-            for pattern in datetime_patterns:
-                if re.match(pattern, v_stripped):
-                    dt_count += 1
-                    break
-
-        if dt_count >= len(values) * 0.8:
-            return "datetime"
-
-        return "string"
+        if parse_key:
+            UploadCache.save_schema(
+                cache_dir, parse_key,
+                result.model_dump(include={"columns", "sample_row_count", "scanned_row_count"})
+            )
+        return result
 
     @staticmethod
     def _sanitize_column_name(name: str) -> str:
@@ -200,15 +660,7 @@ class DataSyncService:
         if not table_name:
             raise ValueError("Staging tablo adi bos.")
 
-        # Kolon DDL olustur
-        col_defs = ["_staging_id SERIAL PRIMARY KEY", "_synced_at TIMESTAMP DEFAULT NOW()"]
-
-        for col in query.columns:
-            if not col.is_included:
-                continue
-            pg_type = DataSyncService._column_type_to_pg(col.data_type, col.max_length)
-            nullable = "" if col.is_nullable else " NOT NULL"
-            col_defs.append(f'"{col.target_name}" {pg_type}{nullable}')
+        col_defs = DataSyncService._staging_column_defs(query)
 
         # Tabloyu olustur (varsa sil)
         drop_sql = f'DROP TABLE IF EXISTS "{table_name}" CASCADE'
@@ -224,6 +676,21 @@ class DataSyncService:
 
         logger.info(f"Staging tablosu olusturuldu: {table_name}")
 
+    @staticmethod
+    def _staging_column_defs(query: DataConnectionQuery, primary_key: bool = True) -> List[str]:
+        """Staging tablosu kolon DDL'leri (sistem kolonlari + dahil edilen kolonlar)."""
+        col_defs = [
+            "_staging_id SERIAL PRIMARY KEY" if primary_key else "_staging_id SERIAL",
+            "_synced_at TIMESTAMP DEFAULT NOW()",
+        ]
+        for col in query.columns:
+            if not col.is_included:
+                continue
+            pg_type = DataSyncService._column_type_to_pg(col.data_type, col.max_length)
+            nullable = "" if col.is_nullable else " NOT NULL"
+            col_defs.append(f'"{col.target_name}" {pg_type}{nullable}')
+        return col_defs
+
     @staticmethod
     def _column_type_to_pg(data_type, max_length: Optional[int] = None) -> str:
         """ColumnDataType -> PostgreSQL type mapping."""
@@ -246,17 +713,23 @@ class DataSyncService:
         connection: DataConnection,
         query: DataConnectionQuery,
         triggered_by: str,
-        file_bytes: Optional[bytes] = None,
-        file_name: Optional[str] = None
+        file_path: Optional[str] = None,
+        file_name: Optional[str] = None,
+        cache_dir: Optional[str] = None
     ) -> DataSyncLog:
         """
         Veri senkronizasyonunu calistirir.
         1. Log olustur
-        2. Staging tablosu yoksa olustur
-        3. TRUNCATE (full refresh)
-        4. Veri cek
-        5. Batch INSERT
-        6. Log guncelle
+        2. Kolon kontrolu
+        3. Mod secimi: delta icin onceki basarili watermark gerekir,
+           yoksa (ilk sync, yeniden olusturulacak staging) tam yukleme yapilir
+        4. full: golge tablo (<staging>__next) / delta: gecici tablo
+           (kaynak watermark ile filtrelenir)
+        5. COPY ile yukleme (kolon tiplerine donusturerek, cekmeyle es zamanli)
+        6. full: index + ANALYZE / delta: anahtar kolonlarla staging'e upsert
+        7. full: golge tabloyu staging ile degistir (rename)
+        8. Log guncelle (yeni watermark dahil)
+        Tum adimlar tek transaction'dadir; hata olursa staging oldugu gibi kalir.
         """
         import uuid
 
@@ -274,101 +747,344 @@ class DataSyncService:
         db.refresh(sync_log)
 
         try:
-            # 2. Staging tablo kontrolu
-            if not query.staging_table_created:
-                DataSyncService.create_staging_table(db, query)
-
+            # 2. Kolon kontrolu
             table_name = query.staging_table_name
+            if not table_name:
+                raise ValueError("Staging tablo adi bos.")
 
-            # 3. TRUNCATE
-            db.execute(text(f'TRUNCATE TABLE "{table_name}"'))
-            db.commit()
+            included_columns = [col for col in query.columns if col.is_included]
+            if not included_columns:
+                raise ValueError("Dahil edilen kolon yok.")
 
-            # 4. Veri cek
             config = DataSyncService._build_connection_config(connection)
             query_config = DataSyncService._build_query_config(query)
 
-            if file_bytes:
-                query_config["file_bytes"] = file_bytes
+            if file_path:
+                query_config["file_path"] = file_path
                 query_config["file_name"] = file_name or "upload.csv"
+                query_config["file_cache_dir"] = cache_dir
 
             conn_type = connection.connection_type.value if hasattr(connection.connection_type, 'value') else str(connection.connection_type)
-            rows = ConnectionManager.fetch_all_data(conn_type, config, query_config)
-
-            logger.info(f"Fetch sonucu: {len(rows) if rows else 0} satir")
-            if rows:
-                logger.info(f"Ilk satir keys: {list(rows[0].keys())}")
-                logger.info(f"Ilk satir values (ilk 5): {dict(list(rows[0].items())[:5])}")
-
-            if not rows:
-                sync_log.status = SyncStatus.success
-                sync_log.completed_at = datetime.utcnow()
-                sync_log.total_rows = 0
-                sync_log.inserted_rows = 0
-                db.commit()
-                logger.warning("Fetch sonucu bos — 0 satir dondu.")
-                return sync_log
-
-            # 5. Batch INSERT
-            included_columns = [col for col in query.columns if col.is_included]
-            if not included_columns:
-                raise ValueError("Dahil edilen kolon yok.")
-
-            target_names = [col.target_name for col in included_columns]
-            source_names = [col.source_name for col in included_columns]
-            logger.info(f"Source names (DB'den): {source_names}")
-            logger.info(f"Target names (staging kolon): {target_names}")
-
-            # Kolon ismi uyumsuzlugu kontrolu
-            row_keys = set(rows[0].keys()) if rows else set()
-            missing_sources = [s for s in source_names if s not in row_keys]
-            if missing_sources:
-                logger.warning(
-                    f"KOLON UYUMSUZLUGU! Dosyadaki kolonlar: {sorted(row_keys)}, "
-                    f"Bulunamayan source_name'ler: {missing_sources}"
-                )
-
-            col_list = ", ".join(f'"{tn}"' for tn in target_names)
-            param_list = ", ".join(f":p{i}" for i in range(len(target_names)))
-            insert_sql = f'INSERT INTO "{table_name}" ({col_list}) VALUES ({param_list})'
-
-            inserted = 0
-            batch_size = 500
-            for batch_start in range(0, len(rows), batch_size):
-                batch = rows[batch_start:batch_start + batch_size]
-                params_list = []
-                for row in batch:
-                    params = {}
-                    for i, (src, tgt) in enumerate(zip(source_names, target_names)):
-                        val = row.get(src)
-                        params[f"p{i}"] = val
-                    params_list.append(params)
-
-                for params in params_list:
-                    db.execute(text(insert_sql), params)
-
-                inserted += len(batch)
 
+            # 3. Mod secimi
+            watermark_col = DataSyncService._watermark_column(query, included_columns)
+            previous_watermark = None
+            key_columns: List[DataConnectionColumn] = []
+            if _type_value(query.sync_mode) == SyncMode.delta.value:
+                key_columns = DataSyncService._delta_key_columns(included_columns, conn_type)
+                if query.staging_table_created:
+                    previous_watermark = DataSyncService._last_watermark(
+                        db, query.id, sync_log.id, watermark_col.source_name
+                    )
+            delta = previous_watermark is not None
+
+            sync_log.sync_mode = SyncMode.delta if delta else SyncMode.full
             db.commit()
 
-            # 6. Basarili log
+            # 4. Hedef tablo
+            if delta:
+                data_type = _type_value(watermark_col.data_type)
+                query_config["watermark"] = {
+                    "column": watermark_col.source_name,
+                    "data_type": data_type,
+                    "value": _parse_watermark(previous_watermark, data_type),
+                }
+                target_table = DataSyncService._create_delta_table(db, table_name, key_columns)
+            else:
+                target_table = DataSyncService._create_shadow_table(db, query, table_name)
+
+            # 5. COPY ile yukleme (cekme arka planda devam eder)
+            started = time.monotonic()
+            batches = ConnectionManager.fetch_batches(conn_type, config, query_config)
+            with contextlib.closing(_prefetch(batches, SYNC_PREFETCH_BATCHES)) as prefetched:
+                fetched = DataSyncService._copy_rows(db, sync_log.id, target_table, included_columns, prefetched)
+
+            # 6. Upsert / index
+            written = fetched
+            if delta:
+                written = DataSyncService._upsert_delta(db, table_name, target_table, included_columns, key_columns)
+            else:
+                DataSyncService._index_shadow_table(db, table_name, target_table, key_columns)
+
+            if watermark_col is not None:
+                current = db.execute(text(
+                    f'SELECT max("{watermark_col.target_name}") FROM "{target_table}"'
+                )).scalar()
+                sync_log.watermark_value = _format_watermark(current) if current is not None else previous_watermark
+                sync_log.watermark_column = watermark_col.source_name
+
+            # 7. Degistirme
+            if not delta:
+                DataSyncService._swap_shadow_table(db, table_name, target_table)
+                query.staging_table_created = True
+            elapsed = time.monotonic() - started
+
+            # 8. Basarili log (tespit edilen dosya lehcesi sorguya yazilir)
+            DataSyncService._record_file_dialect(query, query_config)
             sync_log.status = SyncStatus.success
             sync_log.completed_at = datetime.utcnow()
-            sync_log.total_rows = len(rows)
-            sync_log.inserted_rows = inserted
+            sync_log.total_rows = fetched
+            sync_log.inserted_rows = written
+            sync_log.rows_per_second = round(fetched / elapsed, 1) if elapsed > 0 else None
             db.commit()
 
-            logger.info(f"Sync basarili: {table_name}, {inserted} satir eklendi.")
+            if not fetched:
+                logger.warning("Fetch sonucu bos — 0 satir dondu.")
+            logger.info(
+                f"Sync basarili ({sync_log.sync_mode.value}): {table_name}, {fetched} satir cekildi, "
+                f"{written} satir yazildi ({elapsed:.1f} sn, {sync_log.rows_per_second or 0:.0f} satir/sn), "
+                f"watermark: {sync_log.watermark_value}."
+            )
             return sync_log
 
         except Exception as e:
             logger.error(f"Sync hatasi: {e}")
+            db.rollback()
             sync_log.status = SyncStatus.failed
             sync_log.completed_at = datetime.utcnow()
             sync_log.error_message = str(e)[:2000]
             db.commit()
             return sync_log
 
+    # ============ Delta Sync ============
+
+    @staticmethod
+    def _watermark_column(
+        query: DataConnectionQuery, included_columns: List[DataConnectionColumn]
+    ) -> Optional[DataConnectionColumn]:
+        """Sorgunun watermark kolonu (dahil edilen kolonlardan, source_name ile)."""
+        if not query.watermark_column:
+            if _type_value(query.sync_mode) == SyncMode.delta.value:
+                raise ValueError("Delta sync icin watermark kolonu secilmeli.")
+            return None
+
+        column = next((col for col in included_columns if col.source_name == query.watermark_column), None)
+        if column is None:
+            raise ValueError(f"Watermark kolonu '{query.watermark_column}' dahil edilen kolonlar arasinda yok.")
+        if _type_value(column.data_type) == ColumnDataType.boolean.value:
+            raise ValueError(f"Watermark kolonu '{column.source_name}' boolean olamaz.")
+        return column
+
+    @staticmethod
+    def _delta_key_columns(
+        included_columns: List[DataConnectionColumn], conn_type: str
+    ) -> List[DataConnectionColumn]:
+        """Delta upsert anahtari: dahil edilen is_primary_key kolonlari."""
+        if conn_type == ConnectionType.file_upload.value:
+            raise ValueError("Dosya kaynaklarinda delta sync desteklenmez.")
+        key_columns = [col for col in included_columns if col.is_primary_key]
+        if not key_columns:
+            raise ValueError("Delta sync icin en az bir anahtar (is_primary_key) kolon gerekli.")
+        return key_columns
+
+    @staticmethod
+    def _last_watermark(db: Session, query_id: int, current_log_id: int, column: str) -> Optional[str]:
+        """
+        Son basarili sync'in watermark'i (basarisiz sync'ler staging'i degistirmez).
+        Watermark kolonu o sync'ten sonra degistiyse deger yeni kolona ait degildir:
+        None doner ve tam sync yapilir.
+        """
+        last = db.query(DataSyncLog).filter(
+            DataSyncLog.query_id == query_id,
+            DataSyncLog.id != current_log_id,
+            DataSyncLog.status == SyncStatus.success,
+        ).order_by(DataSyncLog.id.desc()).first()
+        if last is None or last.watermark_column != column:
+            return None
+        return last.watermark_value
+
+    @staticmethod
+    def _create_delta_table(db: Session, table_name: str, key_columns: List[DataConnectionColumn]) -> str:
+        """
+        Upsert icin staging'de anahtar kolonlara unique index (yoksa) ve
+        delta kayitlari icin transaction sonunda silinen gecici tablo.
+        """
+        keys = ", ".join(f'"{col.target_name}"' for col in key_columns)
+        index_name = _index_name(table_name, "_delta_key")
+        try:
+            with db.begin_nested():
+                db.execute(text(f'CREATE UNIQUE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ({keys})'))
+        except IntegrityError:
+            raise ValueError(
+                f"Staging tablosunda anahtar kolonlarda ({keys}) tekrar eden kayitlar var; "
+                f"delta sync icin anahtar kolonlari duzeltip tam sync yapin."
+            )
+
+        delta_table = f"{table_name}__delta"[:63]
+        db.execute(text(f'CREATE TEMP TABLE "{delta_table}" (LIKE "{table_name}" INCLUDING DEFAULTS) ON COMMIT DROP'))
+        return delta_table
+
+    @staticmethod
+    def _upsert_delta(
+        db: Session,
+        table_name: str,
+        delta_table: str,
+        columns: List[DataConnectionColumn],
+        key_columns: List[DataConnectionColumn],
+    ) -> int:
+        """Delta kayitlarini staging'e upsert eder; ayni anahtarda son gelen kazanir."""
+        col_list = ", ".join(f'"{col.target_name}"' for col in columns)
+        keys = ", ".join(f'"{col.target_name}"' for col in key_columns)
+        key_names = {col.target_name for col in key_columns}
+        updates = [f'"{col.target_name}" = EXCLUDED."{col.target_name}"' for col in columns if col.target_name not in key_names]
+        updates.append("_synced_at = NOW()")
+
+        result = db.execute(text(f"""
+            INSERT INTO "{table_name}" ({col_list})
+            SELECT DISTINCT ON ({keys}) {col_list}
+            FROM "{delta_table}"
+            ORDER BY {keys}, _staging_id DESC
+            ON CONFLICT ({keys}) DO UPDATE SET {", ".join(updates)}
+        """))
+        return result.rowcount or 0
+
+    # ============ Shadow Table ============
+
+    @staticmethod
+    def _create_shadow_table(db: Session, query: DataConnectionQuery, table_name: str) -> str:
+        """
+        Tam yukleme icin index'siz golge tablo (<staging>__next). Ayni
+        transaction'da yuklenip staging ile degistirilir; okuyucular
+        yukleme boyunca eski veriyi gorur.
+        """
+        shadow = _shadow_name(table_name)
+        col_defs = DataSyncService._staging_column_defs(query, primary_key=False)
+        db.execute(text(f'DROP TABLE IF EXISTS "{shadow}"'))
+        db.execute(text(f'CREATE TABLE "{shadow}" ({", ".join(col_defs)})'))
+        return shadow
+
+    @staticmethod
+    def _index_shadow_table(
+        db: Session, table_name: str, shadow: str, key_columns: List[DataConnectionColumn]
+    ) -> None:
+        """Yukleme sonrasi golge tabloya primary key / delta anahtar index'i ve ANALYZE."""
+        db.execute(text(
+            f'ALTER TABLE "{shadow}" ADD CONSTRAINT "{_index_name(shadow, "_pkey")}" PRIMARY KEY (_staging_id)'
+        ))
+        if key_columns:
+            keys = ", ".join(f'"{col.target_name}"' for col in key_columns)
+            try:
+                with db.begin_nested():
+                    db.execute(text(
+                        f'CREATE UNIQUE INDEX "{_index_name(shadow, "_delta_key")}" ON "{shadow}" ({keys})'
+                    ))
+            except IntegrityError:
+                logger.warning(f"{table_name}: anahtar kolonlarda ({keys}) tekrar eden kayitlar var, delta index'i olusturulmadi.")
+        db.execute(text(f'ANALYZE "{shadow}"'))
+
+    @staticmethod
+    def _swap_shadow_table(db: Session, table_name: str, shadow: str) -> None:
+        """
+        Eski staging'i silip golge tabloyu yerine adlandirir. Okuyucularin
+        kilitleri icin en fazla SYNC_SWAP_ATTEMPTS kez SYNC_SWAP_LOCK_TIMEOUT
+        beklenir; yukleme kaybolmasin diye her deneme savepoint icindedir.
+        """
+        db.execute(text(f"SET LOCAL lock_timeout = '{SYNC_SWAP_LOCK_TIMEOUT}'"))
+        for attempt in range(1, SYNC_SWAP_ATTEMPTS + 1):
+            try:
+                with db.begin_nested():
+                    db.execute(text(f'DROP TABLE IF EXISTS "{table_name}" CASCADE'))
+                    db.execute(text(f'ALTER TABLE "{shadow}" RENAME TO "{table_name}"'))
+                break
+            except OperationalError as e:
+                if attempt == SYNC_SWAP_ATTEMPTS:
+                    raise ValueError(f"Staging tablosu kilitli, degistirilemedi: {table_name}") from e
+                logger.warning(f"Staging degistirme kilidi alinamadi ({attempt}/{SYNC_SWAP_ATTEMPTS}): {table_name}")
+                time.sleep(1)
+
+        # Index / sequence adlarini staging adina cevir
+        for suffix in ("_pkey", "_delta_key"):
+            db.execute(text(
+                f'ALTER INDEX IF EXISTS "{_index_name(shadow, suffix)}" RENAME TO "{_index_name(table_name, suffix)}"'
+            ))
+        sequence = db.execute(text("SELECT pg_get_serial_sequence(:t, '_staging_id')"), {"t": f'"{table_name}"'}).scalar()
+        if sequence:
+            db.execute(text(f'ALTER SEQUENCE {sequence} RENAME TO "{_index_name(table_name, "__staging_id_seq")}"'))
+
+    @staticmethod
+    def _copy_rows(
+        db: Session,
+        sync_log_id: int,
+        table_name: str,
+        columns: List[DataConnectionColumn],
+        batches: Iterable[List[Dict[str, Any]]],
+    ) -> int:
+        """
+        Kayit parcalarini tek COPY ile staging tablosuna yazar; degerler
+        parca parca kolonun data_type'ina donusturulur.
+        SYNC_PROGRESS_INTERVAL satirda bir ilerleme (satir / sn) sync
+        log'a yazilir. Commit cagirana aittir.
+        """
+        fields = [(col.source_name, _COERCERS.get(_type_value(col.data_type), _coerce_string)) for col in columns]
+        col_list = ", ".join(f'"{col.target_name}"' for col in columns)
+
+        inserted = 0
+        reported = 0
+        started = time.monotonic()
+        cursor = db.connection().connection.driver_connection.cursor()
+        try:
+            with cursor.copy(f'COPY "{table_name}" ({col_list}) FROM STDIN') as copy:
+                for batch in batches:
+                    if not batch:
+                        continue
+
+                    # Kolon ismi uyumsuzlugu kontrolu
+                    if not inserted:
+                        missing_sources = [src for src, _ in fields if src not in batch[0]]
+                        if missing_sources:
+                            logger.warning(
+                                f"KOLON UYUMSUZLUGU! Kaynaktaki kolonlar: {sorted(batch[0].keys())}, "
+                                f"Bulunamayan source_name'ler: {missing_sources}"
+                            )
+
+                    # Donusum kolon kolon yapilir (satir basina liste kurmaktan hizli)
+                    try:
+                        values = [list(map(coerce, [row.get(src) for row in batch])) for src, coerce in fields]
+                    except (ValueError, ArithmeticError, TypeError, OverflowError):
+                        raise ValueError(DataSyncService._coercion_error(batch, fields, inserted))
+                    for record in zip(*values):
+                        copy.write_row(record)
+                    inserted += len(batch)
+                    del batch, values
+
+                    if inserted - reported >= SYNC_PROGRESS_INTERVAL:
+                        reported = inserted
+                        rate = inserted / max(time.monotonic() - started, 1e-6)
+                        logger.info(f"Staging yukleme: {table_name}, {inserted} satir ({rate:.0f} satir/sn)")
+                        DataSyncService._report_progress(sync_log_id, inserted, rate)
+        finally:
+            cursor.close()
+
+        return inserted
+
+    @staticmethod
+    def _coercion_error(batch: List[Dict[str, Any]], fields: list, offset: int) -> str:
+        """Donusturulemeyen ilk degeri satir / kolon bilgisiyle aciklar."""
+        for i, row in enumerate(batch):
+            for src, coerce in fields:
+                value = row.get(src)
+                try:
+                    coerce(value)
+                except (ValueError, ArithmeticError, TypeError, OverflowError):
+                    return f"Satir {offset + i + 1}, kolon '{src}': gecersiz deger '{str(value)[:100]}'"
+        return f"Satir {offset + 1}: deger donusturulemedi"
+
+    @staticmethod
+    def _report_progress(sync_log_id: int, inserted: int, rate: float) -> None:
+        """Ilerlemeyi ayri bir oturumda commit eder; COPY transaction'i acik kalir."""
+        progress_db = get_session_local()()
+        try:
+            progress_db.query(DataSyncLog).filter(DataSyncLog.id == sync_log_id).update(
+                {DataSyncLog.inserted_rows: inserted, DataSyncLog.rows_per_second: round(rate, 1)},
+                synchronize_session=False,
+            )
+            progress_db.commit()
+        except Exception as e:
+            logger.warning(f"Sync ilerlemesi yazilamadi: {e}")
+            progress_db.rollback()
+        finally:
+            progress_db.close()
+
     # ============ Preview Staging Data ============
 
     @staticmethod
@@ -411,6 +1127,7 @@ class DataSyncService:
     def _build_connection_config(connection: DataConnection) -> dict:
         """DataConnection modelinden config dict olusturur."""
         return {
+            "connection_id": connection.id,
             "host": connection.host,
             "port": connection.port,
             "database_name": connection.database_name,
@@ -418,6 +1135,7 @@ class DataSyncService:
             "password": connection.password,
             "sap_client": connection.sap_client,
             "sap_service_path": connection.sap_service_path,
+            "extra_config": connection.extra_config,
         }
 
     @staticmethod
@@ -430,8 +1148,22 @@ class DataSyncService:
             "odata_filter": query.odata_filter,
             "odata_top": query.odata_top,
             "file_parse_config": query.file_parse_config,
+            "key_columns": [col.source_name for col in query.columns if col.is_primary_key],
         }
 
+    @staticmethod
+    def _record_file_dialect(query: DataConnectionQuery, query_config: dict) -> None:
+        """
+        Dosya okunurken cozulen CSV lehcesini file_parse_config["detected"]
+        olarak saklar; ayni dosya ailesinin sonraki sync'leri tespiti atlar.
+        Commit cagirana aittir.
+        """
+        dialect = query_config.get("file_dialect")
+        parse_config = query.file_parse_config or {}
+        if dialect and parse_config.get("detected") != dialect:
+            # JSONB degisikligi yeni dict atanarak algilanir
+            query.file_parse_config = {**parse_config, "detected": dict(dialect)}
+
     @staticmethod
     def generate_staging_table_name(conn_code: str, query_code: str) -> str:
         """Staging tablo adi olusturur."""
@@ -10,7 +10,7 @@ from datetime import datetime
 from typing import Optional, List, Dict, Any
 
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import text
+from sqlalchemy import text, func
 
 from app.models.dwh import DwhMapping, DwhFieldMapping, DwhTable
 from app.models.dynamic.master_data import MasterData
@@ -21,9 +21,13 @@ from app.models.system_data import (
 )
 from app.models.budget_entry import (
     BudgetDefinition, BudgetDefinitionDimension, BudgetEntryRow, BudgetEntryCell,
-    BudgetCellType
+    BudgetCellType, BudgetStorageMode, CellChangeSource
 )
 from app.schemas.dwh import DwhMappingExecutionResult, DwhMappingPreview
+from app.services.budget_consolidation_service import BudgetConsolidationService
+from app.services.budget_lock_service import BudgetLockService
+from app.services.cell_history_service import CellHistoryBuffer
+from app.services.rule_set_compiler import RuleSetCompiler
 
 logger = logging.getLogger(__name__)
 
@@ -50,7 +54,9 @@ class DwhMappingService:
             "system_version": DwhMappingService._execute_system_version_mapping,
             "system_period": DwhMappingService._execute_system_period_mapping,
             "system_parameter": DwhMappingService._execute_system_parameter_mapping,
-            "budget_entry": DwhMappingService._execute_budget_entry_mapping,
+            "budget_entry": lambda db, mapping: DwhMappingService._execute_budget_entry_mapping(
+                db, mapping, triggered_by
+            ),
         }
 
         handler = handler_map.get(target_type)
@@ -473,6 +479,7 @@ class DwhMappingService:
                                 version_id=version.id,
                                 value=str(param_value)
                             ))
+                        param.updated_date = func.now()
                     else:
                         error_details.append(
                             f"Satir {processed}: Versiyon bulunamadi: '{version_code}'"
@@ -485,6 +492,7 @@ class DwhMappingService:
                     break
 
         db.commit()
+        RuleSetCompiler.invalidate_parameters()
         return DwhMappingExecutionResult(
             success=errors == 0,
             message=f"Parametre aktarimi: {inserted} yeni, {updated} guncellenen, {errors} hata.",
@@ -495,7 +503,8 @@ class DwhMappingService:
     @staticmethod
     def _execute_budget_entry_mapping(
         db: Session,
-        mapping: DwhMapping
+        mapping: DwhMapping,
+        triggered_by: Optional[str] = None
     ) -> DwhMappingExecutionResult:
         """
         DWH -> BudgetEntryRow + BudgetEntryCell upsert (en karmasik).
@@ -524,11 +533,21 @@ class DwhMappingService:
             return DwhMappingExecutionResult(
                 success=False, message=f"BudgetDefinition bulunamadi: {definition_id}"
             )
+        if definition.storage_mode == BudgetStorageMode.dense:
+            return DwhMappingExecutionResult(
+                success=False, message="Hedef tanim dense depolama modunda, once cell moduna donusturun."
+            )
 
         field_mappings = mapping.field_mappings
         if not field_mappings:
             return DwhMappingExecutionResult(success=False, message="Alan eslestirmeleri bos.")
 
+        # Kaydetme / hesaplama / ice aktarma ile ayni anda yazilmaz
+        if not BudgetLockService.try_lock(db, definition_id):
+            return DwhMappingExecutionResult(
+                success=False, message="Tanim uzerinde devam eden bir hesaplama/islem var, daha sonra tekrar deneyin."
+            )
+
         # Cache'ler
         # Period cache: code -> id
         periods = db.query(BudgetPeriod).all()
@@ -558,6 +577,11 @@ class DwhMappingService:
         updated = 0
         errors = 0
         error_details = []
+        touched_row_ids = set()
+        rows_changed = False
+        history = CellHistoryBuffer(
+            db, definition_id, CellChangeSource.mapping, changed_by=triggered_by, reference_id=mapping.id
+        )
 
         for row in rows_data:
             processed += 1
@@ -635,8 +659,9 @@ class DwhMappingService:
 
                 if existing_row:
                     entry_row = existing_row
-                    if currency_code:
+                    if currency_code and entry_row.currency_code != currency_code:
                         entry_row.currency_code = currency_code
+                        rows_changed = True
                 else:
                     import uuid as uuid_lib
                     entry_row = BudgetEntryRow(
@@ -648,20 +673,25 @@ class DwhMappingService:
                     )
                     db.add(entry_row)
                     db.flush()
+                    rows_changed = True
 
                 # 3. BudgetEntryCell upsert: (row_id, period_id, measure_code)
                 for measure_code, value in measure_values.items():
                     existing_cell = db.query(BudgetEntryCell).filter(
+                        BudgetEntryCell.budget_definition_id == definition_id,
                         BudgetEntryCell.row_id == entry_row.id,
                         BudgetEntryCell.period_id == period_id,
                         BudgetEntryCell.measure_code == measure_code
                     ).first()
 
                     if existing_cell:
+                        history.record(entry_row.id, period_id, measure_code, existing_cell.value, value)
                         existing_cell.value = value
                         updated += 1
                     else:
+                        history.record(entry_row.id, period_id, measure_code, None, value)
                         db.add(BudgetEntryCell(
+                            budget_definition_id=definition_id,
                             row_id=entry_row.id,
                             period_id=period_id,
                             measure_code=measure_code,
@@ -669,6 +699,7 @@ class DwhMappingService:
                             cell_type=BudgetCellType.input,
                         ))
                         inserted += 1
+                touched_row_ids.add(entry_row.id)
 
             except Exception as e:
                 errors += 1
@@ -677,6 +708,12 @@ class DwhMappingService:
                     error_details.append("100'den fazla hata, islem durduruluyor.")
                     break
 
+        # Acik gridler bu satirlari eski revizyonla kaydedemesin
+        BudgetLockService.bump_revisions(db, definition_id, sorted(touched_row_ids))
+        # Yeni satir / para birimi hucre gecmisine dusmez: konsolidasyonlar tam yenilenir
+        if rows_changed:
+            BudgetConsolidationService.invalidate_definition(db, definition_id)
+        history.flush()
         db.commit()
         return DwhMappingExecutionResult(
             success=errors == 0,
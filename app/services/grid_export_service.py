@@ -0,0 +1,372 @@
+"""
+Grid Export Service - Butce grid'inin akis (streaming) ile disa aktarimi
+
+Satirlar ve hucreler server-side cursor ile satir sirasinda okunur, her
+butce satiri icin donem x olcu dizisi doldurulup CSV/XLSX satirlarina
+yazilir. Boyut kod/adlari tek bir toplu anaveri sorgusuyla cozulur.
+Bellek kullanimi grid boyutundan bagimsizdir.
+
+Konsolidasyonlar ayni yazicilarla aktarilir: satirlar onbellekteki
+(ortak boyut degerleri, para birimi) gruplaridir.
+"""
+
+import csv
+import io
+import logging
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, select, text
+from sqlalchemy.orm import Session
+
+from app.db.session import get_session_local
+from app.models.budget_entry import (
+    BudgetConsolidation, BudgetConsolidationCell, BudgetDefinition, BudgetDefinitionDimension,
+    BudgetEntryRow, BudgetEntryCell
+)
+from app.models.dynamic.meta_entity import MetaEntity
+from app.models.system_data import BudgetPeriod
+from app.services.currency_conversion_service import CurrencyConverter
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("csv", "xlsx")
+
+# Cursor'dan bir seferde alinan kayit sayisi
+EXPORT_FETCH_SIZE = 5000
+
+# CSV tamponu bu boyutu asinca istemciye gonderilir
+CSV_CHUNK_BYTES = 64 * 1024
+
+XLSX_READ_CHUNK_BYTES = 256 * 1024
+
+_MASTER_DATA_LOOKUP_SQL = text("""
+    SELECT md.id, md.code, md.name
+    FROM master_data md
+    WHERE md.id IN (
+        SELECT DISTINCT (d.value)::int
+        FROM budget_entry_rows r
+        CROSS JOIN LATERAL jsonb_each_text(r.dimension_values) d
+        WHERE r.budget_definition_id = :definition_id
+          AND r.is_active = true
+          AND d.value ~ '^[0-9]+$'
+    )
+""")
+
+_CONSOLIDATION_MASTER_DATA_LOOKUP_SQL = text("""
+    SELECT md.id, md.code, md.name
+    FROM master_data md
+    WHERE md.id IN (
+        SELECT DISTINCT (d.value)::int
+        FROM budget_consolidation_cells c
+        CROSS JOIN LATERAL jsonb_each_text(c.dimension_values) d
+        WHERE c.consolidation_id = :consolidation_id
+          AND d.value ~ '^[0-9]+$'
+    )
+""")
+
+# Konsolidasyon satiri = (ortak boyut degerleri, para birimi); kaynak katkilari toplanir
+_CONSOLIDATION_ROWS_SQL = text("""
+    SELECT c.dimension_values::text || '|' || c.currency_code AS row_key,
+           c.currency_code, c.dimension_values, c.period_id, c.measure_code, sum(c.value) AS value
+    FROM budget_consolidation_cells c
+    WHERE c.consolidation_id = :consolidation_id
+    GROUP BY c.dimension_values, c.currency_code, c.period_id, c.measure_code
+    ORDER BY c.dimension_values::text, c.currency_code
+""")
+
+
+@dataclass
+class GridExportContext:
+    """Export icin bir kez hazirlanan meta bilgiler."""
+    definition_id: int
+    definition_code: str
+    period_ids: List[int]
+    period_codes: List[str]
+    measure_codes: List[str]
+    dimensions: List[Tuple[str, str]]  # (entity_id, entity_code)
+    master_data: Dict[int, Tuple[str, str]]  # md_id -> (code, name)
+    currency_code: Optional[str] = None
+    monetary: Optional[np.ndarray] = None  # bool [M]
+    factors: Dict[str, np.ndarray] = field(default_factory=dict)  # row currency -> [P]
+    consolidation_id: Optional[int] = None  # doluysa konsolidasyon onbellegi aktarilir
+
+    @property
+    def header(self) -> List[str]:
+        columns = []
+        for _, entity_code in self.dimensions:
+            columns += [entity_code, f"{entity_code}_NAME"]
+        columns += ["CURRENCY", "PERIOD"] + self.measure_codes
+        return columns
+
+
+class GridExportService:
+    """Grid'i CSV veya XLSX olarak parca parca ureten servis."""
+
+    @staticmethod
+    def prepare(
+        db: Session,
+        definition: BudgetDefinition,
+        periods: List[BudgetPeriod],
+        currency_code: Optional[str] = None,
+    ) -> GridExportContext:
+        """Donem, olcu, boyut ve anaveri bilgilerini (tek sorguda) hazirlar."""
+        measures = sorted(
+            [m for m in definition.budget_type.measures if m.is_active],
+            key=lambda m: (m.sort_order or 0, m.code),
+        )
+        measure_codes = [m.code for m in measures]
+
+        dimensions = []
+        for dim, entity in db.query(BudgetDefinitionDimension, MetaEntity).join(
+            MetaEntity, MetaEntity.id == BudgetDefinitionDimension.entity_id
+        ).filter(
+            BudgetDefinitionDimension.budget_definition_id == definition.id
+        ).order_by(BudgetDefinitionDimension.sort_order).all():
+            dimensions.append((str(entity.id), entity.code))
+
+        master_data = {
+            md_id: (code, name)
+            for md_id, code, name in db.execute(_MASTER_DATA_LOOKUP_SQL, {"definition_id": definition.id}).all()
+        }
+
+        context = GridExportContext(
+            definition_id=definition.id,
+            definition_code=definition.code,
+            period_ids=[p.id for p in periods],
+            period_codes=[p.code for p in periods],
+            measure_codes=measure_codes,
+            dimensions=dimensions,
+            master_data=master_data,
+        )
+
+        if currency_code:
+            monetary_codes = CurrencyConverter.monetary_measure_codes(measures)
+            row_codes = [
+                code for (code,) in db.query(BudgetEntryRow.currency_code).filter(
+                    BudgetEntryRow.budget_definition_id == definition.id,
+                    BudgetEntryRow.is_active == True
+                ).distinct().all()
+            ]
+            table = CurrencyConverter.get_rate_table(db, definition.version_id)
+            matrix = CurrencyConverter.factor_matrix(table, row_codes, [p.id for p in periods], currency_code)
+            context.currency_code = currency_code
+            context.monetary = np.array([code in monetary_codes for code in measure_codes], dtype=bool)
+            context.factors = {code: matrix[i] for i, code in enumerate(row_codes)}
+
+        return context
+
+    @staticmethod
+    def prepare_consolidation(
+        db: Session,
+        consolidation: BudgetConsolidation,
+        periods: List[BudgetPeriod],
+        currency_code: Optional[str] = None,
+    ) -> GridExportContext:
+        """Konsolidasyon onbellegi icin export bilgilerini hazirlar (boyutlar = ortak boyutlar)."""
+        measures = list(consolidation.measures)
+        measure_codes = [m.code for m in measures]
+
+        entities = {
+            e.id: e for e in db.query(MetaEntity).filter(
+                MetaEntity.id.in_(consolidation.dimension_entity_ids or [])
+            ).all()
+        }
+        dimensions = [
+            (str(entity_id), entities[entity_id].code)
+            for entity_id in consolidation.dimension_entity_ids or [] if entity_id in entities
+        ]
+
+        master_data = {
+            md_id: (code, name)
+            for md_id, code, name in db.execute(
+                _CONSOLIDATION_MASTER_DATA_LOOKUP_SQL, {"consolidation_id": consolidation.id}
+            ).all()
+        }
+
+        context = GridExportContext(
+            definition_id=consolidation.id,
+            definition_code=consolidation.code,
+            period_ids=[p.id for p in periods],
+            period_codes=[p.code for p in periods],
+            measure_codes=measure_codes,
+            dimensions=dimensions,
+            master_data=master_data,
+            consolidation_id=consolidation.id,
+        )
+
+        if currency_code:
+            monetary_codes = CurrencyConverter.monetary_measure_codes(measures)
+            row_codes = [
+                code for (code,) in db.query(BudgetConsolidationCell.currency_code).filter(
+                    BudgetConsolidationCell.consolidation_id == consolidation.id
+                ).distinct().all()
+            ]
+            table = CurrencyConverter.get_rate_table(db, consolidation.version_id)
+            matrix = CurrencyConverter.factor_matrix(table, row_codes, [p.id for p in periods], currency_code)
+            context.currency_code = currency_code
+            context.monetary = np.array([code in monetary_codes for code in measure_codes], dtype=bool)
+            context.factors = {code: matrix[i] for i, code in enumerate(row_codes)}
+
+        return context
+
+    # ============ Row Iteration ============
+
+    @staticmethod
+    def iter_rows(db: Session, context: GridExportContext) -> Iterator[list]:
+        """
+        Server-side cursor ile satir + hucreleri okur; her butce satiri icin
+        donem basina bir cikti satiri uretir (olcu degerleri yan yana).
+        """
+        if context.consolidation_id is not None:
+            stmt = _CONSOLIDATION_ROWS_SQL.bindparams(consolidation_id=context.consolidation_id).execution_options(
+                stream_results=True, yield_per=EXPORT_FETCH_SIZE
+            )
+            yield from GridExportService._iter_grouped(db, context, stmt)
+            return
+
+        stmt = select(
+            BudgetEntryRow.id,
+            BudgetEntryRow.currency_code,
+            BudgetEntryRow.dimension_values,
+            BudgetEntryCell.period_id,
+            BudgetEntryCell.measure_code,
+            BudgetEntryCell.value,
+        ).outerjoin(
+            BudgetEntryCell, and_(
+                BudgetEntryCell.budget_definition_id == context.definition_id,
+                BudgetEntryCell.row_id == BudgetEntryRow.id,
+            )
+        ).where(
+            BudgetEntryRow.budget_definition_id == context.definition_id,
+            BudgetEntryRow.is_active == True,
+        ).order_by(
+            BudgetEntryRow.sort_order, BudgetEntryRow.id
+        ).execution_options(stream_results=True, yield_per=EXPORT_FETCH_SIZE)
+        yield from GridExportService._iter_grouped(db, context, stmt)
+
+    @staticmethod
+    def _iter_grouped(db: Session, context: GridExportContext, stmt) -> Iterator[list]:
+        """(satir anahtari, para birimi, boyutlar, donem, olcu, deger) akisini satir satir toplar."""
+        period_pos = {pid: i for i, pid in enumerate(context.period_ids)}
+        measure_pos = {code: i for i, code in enumerate(context.measure_codes)}
+        shape = (len(context.period_ids), len(context.measure_codes))
+
+        current_id = None
+        current = None
+        values = np.zeros(shape, dtype=np.float64)
+        present = np.zeros(shape, dtype=bool)
+
+        for row_id, currency_code, dimension_values, period_id, measure_code, value in db.execute(stmt):
+            if row_id != current_id:
+                if current is not None:
+                    yield from GridExportService._emit(context, current, values, present)
+                current_id = row_id
+                current = (currency_code, dimension_values or {})
+                values.fill(0.0)
+                present.fill(False)
+            p = period_pos.get(period_id)
+            m = measure_pos.get(measure_code)
+            if p is None or m is None or value is None:
+                continue
+            values[p, m] = float(value)
+            present[p, m] = True
+
+        if current is not None:
+            yield from GridExportService._emit(context, current, values, present)
+
+    @staticmethod
+    def _emit(context: GridExportContext, current: tuple, values: np.ndarray, present: np.ndarray) -> Iterator[list]:
+        currency_code, dimension_values = current
+
+        prefix = []
+        for entity_id, _ in context.dimensions:
+            md_id = dimension_values.get(entity_id)
+            md = context.master_data.get(int(md_id)) if md_id is not None and str(md_id).isdigit() else None
+            code, name = md if md else ("", "")
+            prefix += [code, name]
+
+        out_values = values
+        out_present = present
+        if context.currency_code:
+            factors = context.factors.get(currency_code)
+            if factors is not None:
+                out_values = CurrencyConverter.convert(
+                    values, factors[:, None], context.monetary[None, :]
+                )
+                out_present = present & ~np.isnan(out_values)
+            currency_code = context.currency_code
+
+        for p, period_code in enumerate(context.period_codes):
+            yield prefix + [currency_code or "", period_code] + [
+                float(out_values[p, m]) if out_present[p, m] else None
+                for m in range(len(context.measure_codes))
+            ]
+
+    # ============ Writers ============
+
+    @staticmethod
+    def stream(context: GridExportContext, export_format: str) -> Iterator[bytes]:
+        """
+        StreamingResponse icin byte parcalari uretir. Istek oturumundan bagimsiz
+        kendi veritabani oturumunu acar (cursor akis suresince acik kalir).
+        """
+        db = get_session_local()()
+        try:
+            if export_format == "xlsx":
+                yield from GridExportService._write_xlsx(db, context)
+            else:
+                yield from GridExportService._write_csv(db, context)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _write_csv(db: Session, context: GridExportContext) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=';')
+
+        # UTF-8 BOM (Excel'de Turkce karakter sorunu icin)
+        buffer.write('\ufeff')
+        writer.writerow(context.header)
+
+        count = 0
+        for line in GridExportService.iter_rows(db, context):
+            writer.writerow(["" if v is None else v for v in line])
+            count += 1
+            if buffer.tell() >= CSV_CHUNK_BYTES:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate(0)
+
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+        logger.info(f"Grid CSV export: def={context.definition_id}, {count} satir")
+
+    @staticmethod
+    def _write_xlsx(db: Session, context: GridExportContext) -> Iterator[bytes]:
+        """
+        Write-only workbook satirlari gecici dosyalara yazar; XLSX bir zip
+        arsivi oldugu icin dosya tamamlaninca parca parca gonderilir.
+        """
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=(context.definition_code or "Grid")[:31])
+        sheet.append(context.header)
+
+        count = 0
+        for line in GridExportService.iter_rows(db, context):
+            sheet.append(line)
+            count += 1
+
+        with tempfile.TemporaryFile() as tmp:
+            workbook.save(tmp)
+            tmp.seek(0)
+            while True:
+                chunk = tmp.read(XLSX_READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+        logger.info(f"Grid XLSX export: def={context.definition_id}, {count} satir")
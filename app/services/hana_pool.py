@@ -0,0 +1,264 @@
+"""
+HANA Pool - HANA DB baglanti havuzu
+
+TLS'li dbapi.connect her test / tespit / sync isteginde yeniden kurulmaz;
+baglantilar DataConnection basina (id + baglanti bilgileri) bir havuzda
+tutulur:
+- Havuz basina en fazla HANA_POOL_MAX_SIZE baglanti acilir; havuz doluysa
+  istek HANA_POOL_ACQUIRE_TIMEOUT sn bos baglanti bekler.
+- HANA_POOL_IDLE_TIMEOUT sn kullanilmayan baglantilar kapatilir.
+- HANA_POOL_HEALTH_INTERVAL sn'dir dogrulanmamis ya da hatayla iade edilmis
+  baglanti verilmeden once saglik sorgusuyla denenir; cevap vermeyen
+  kapatilip yerine yenisi acilir.
+Baglanti bilgileri degisirse anahtar da degisir; eski baglantilar bosta
+kalip kapanir. Kaydedilmemis baglantilar (connection_id yok) havuza alinmaz.
+
+ConnectionPool yalnizca DB-API 2.0 bekler; connect fonksiyonu ve saglik
+sorgusu disaridan verilir (yerelde sqlite3 ile denenebilir).
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PooledConnection:
+    conn: Any
+    used_at: float
+    checked_at: float
+
+
+class ConnectionPool:
+    """Anahtar basina sinirli, thread-safe DB-API baglanti havuzu."""
+
+    def __init__(
+        self,
+        max_size: int,
+        idle_timeout: float,
+        health_interval: float,
+        acquire_timeout: float,
+        health_sql: str = "SELECT 1",
+    ):
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self.acquire_timeout = acquire_timeout
+        self.health_sql = health_sql
+        self._cond = threading.Condition()
+        self._idle: Dict[Hashable, List[_PooledConnection]] = {}
+        self._in_use: Dict[Hashable, int] = {}
+        self._reaper: Optional[threading.Timer] = None
+
+    @contextmanager
+    def connection(self, key: Optional[Hashable], connect: Callable[[], Any]) -> Iterator[Any]:
+        """
+        Anahtarin havuzundan bir baglanti verir, blok bitince iade eder.
+        key None ise baglanti havuzsuz acilip kapatilir.
+        """
+        if key is None:
+            conn = connect()
+            try:
+                yield conn
+            finally:
+                self._close(conn)
+            return
+
+        pooled = self._acquire(key, connect)
+        try:
+            yield pooled.conn
+        except BaseException:
+            # Hata baglantiyi bozmus olabilir: sonraki kullanimdan once dogrulanir
+            pooled.checked_at = 0.0
+            raise
+        finally:
+            self._release(key, pooled)
+
+    def close_all(self) -> None:
+        """Bostaki tum baglantilari kapatir (kullanimdakiler iadede havuza doner)."""
+        with self._cond:
+            stale = [pooled for idle in self._idle.values() for pooled in idle]
+            self._idle.clear()
+            if self._reaper is not None:
+                self._reaper.cancel()
+                self._reaper = None
+        for pooled in stale:
+            self._close(pooled.conn)
+
+    def stats(self) -> Dict[Hashable, Dict[str, int]]:
+        with self._cond:
+            keys = set(self._idle) | set(self._in_use)
+            return {
+                key: {"idle": len(self._idle.get(key, ())), "in_use": self._in_use.get(key, 0)}
+                for key in keys
+            }
+
+    # ============ Acquire / Release ============
+
+    def _acquire(self, key: Hashable, connect: Callable[[], Any]) -> _PooledConnection:
+        deadline = time.monotonic() + self.acquire_timeout
+        stale: List[_PooledConnection] = []
+        pooled = None
+        with self._cond:
+            while True:
+                stale += self._take_expired(time.monotonic())
+                idle = self._idle.get(key)
+                if idle:
+                    # En son kullanilan: saglik kontrolu gerektirme olasiligi en dusuk
+                    pooled = idle.pop()
+                    break
+                if self._in_use.get(key, 0) < self.max_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"Baglanti havuzu dolu ({self.max_size}); {self.acquire_timeout:g} sn icinde bos baglanti olmadi."
+                    )
+                self._cond.wait(remaining)
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+
+        for expired in stale:
+            self._close(expired.conn)
+
+        try:
+            now = time.monotonic()
+            if pooled is not None and now - pooled.checked_at > self.health_interval:
+                if self._healthy(pooled.conn):
+                    pooled.checked_at = now
+                else:
+                    logger.info("Havuzdaki baglanti cevap vermedi; yenisi aciliyor.")
+                    self._close(pooled.conn)
+                    pooled = None
+            if pooled is None:
+                pooled = _PooledConnection(connect(), now, now)
+        except BaseException:
+            with self._cond:
+                self._return_slot(key)
+            raise
+        return pooled
+
+    def _release(self, key: Hashable, pooled: _PooledConnection) -> None:
+        pooled.used_at = time.monotonic()
+        with self._cond:
+            self._idle.setdefault(key, []).append(pooled)
+            self._return_slot(key)
+            self._schedule_reap()
+
+    def _return_slot(self, key: Hashable) -> None:
+        self._in_use[key] -= 1
+        if not self._in_use[key]:
+            del self._in_use[key]
+        self._cond.notify()
+
+    # ============ Idle Timeout / Health ============
+
+    def _take_expired(self, now: float) -> List[_PooledConnection]:
+        """Bosta kalma suresi dolan baglantilari havuzdan cikarir (kilit altinda)."""
+        expired = []
+        for key, idle in list(self._idle.items()):
+            keep = [pooled for pooled in idle if now - pooled.used_at < self.idle_timeout]
+            expired += [pooled for pooled in idle if now - pooled.used_at >= self.idle_timeout]
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+        return expired
+
+    def _schedule_reap(self) -> None:
+        if self._reaper is None:
+            self._reaper = threading.Timer(self.idle_timeout, self._reap)
+            self._reaper.daemon = True
+            self._reaper.start()
+
+    def _reap(self) -> None:
+        with self._cond:
+            self._reaper = None
+            stale = self._take_expired(time.monotonic())
+            if self._idle:
+                self._schedule_reap()
+        for pooled in stale:
+            self._close(pooled.conn)
+        if stale:
+            logger.info(f"Bosta kalan {len(stale)} baglanti kapatildi.")
+
+    def _healthy(self, conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self.health_sql)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception as e:
+            logger.debug(f"Baglanti saglik kontrolu basarisiz: {e}")
+            return False
+
+    @staticmethod
+    def _close(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_hana_pool = ConnectionPool(
+    max_size=settings.HANA_POOL_MAX_SIZE,
+    idle_timeout=settings.HANA_POOL_IDLE_TIMEOUT,
+    health_interval=settings.HANA_POOL_HEALTH_INTERVAL,
+    acquire_timeout=settings.HANA_POOL_ACQUIRE_TIMEOUT,
+    health_sql="SELECT 1 FROM DUMMY",
+)
+
+
+class HanaPool:
+    """DataConnection basina HANA baglanti havuzu."""
+
+    @staticmethod
+    def connection(config: dict):
+        """
+        config (_build_connection_config) icin havuzdan baglanti:
+            with HanaPool.connection(config) as conn: ...
+        """
+        return _hana_pool.connection(HanaPool._key(config), lambda: HanaPool._connect(config))
+
+    @staticmethod
+    def close_all() -> None:
+        _hana_pool.close_all()
+
+    @staticmethod
+    def _key(config: dict) -> Optional[tuple]:
+        connection_id = config.get("connection_id")
+        if connection_id is None:
+            return None
+        password = hashlib.sha256((config.get("password") or "").encode("utf-8")).hexdigest()
+        return (
+            connection_id,
+            config.get("host") or "",
+            config.get("port") or 443,
+            config.get("username") or "",
+            config.get("database_name") or None,
+            password,
+        )
+
+    @staticmethod
+    def _connect(config: dict):
+        from hdbcli import dbapi
+
+        return dbapi.connect(
+            address=config.get("host", ""),
+            port=config.get("port", 443),
+            user=config.get("username", ""),
+            password=config.get("password", ""),
+            databaseName=config.get("database_name") or None,
+            encrypt=True,
+            sslValidateCertificate=False
+        )
@@ -0,0 +1,449 @@
+"""
+Rule Set Compiler - Kural seti derleyici ve plan cache'i
+
+Kural setlerini degismez bir calistirma planina derler: kalemler sirali,
+kosullar attribute referanslarina cozulmus, formuller derlenmis ve
+parametre degerleri versiyon bazinda baglanmis olur.
+
+Planlar process icinde (rule_set_id, version_id) bazinda tutulur.
+Kural setinin updated_date'i veya kullandigi parametrelerin revizyonu
+(BudgetParameter.updated_date) degistiginde plan yeniden derlenir. Cache
+en fazla PLAN_CACHE_SIZE plan tutar (LRU); silinen kural setlerinin ve
+versiyonlarin planlari hemen atilir.
+"""
+
+import json
+import keyword
+import logging
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+from types import MappingProxyType, CodeType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session, joinedload
+
+from app.models.budget_entry import RuleSet, RuleSetItem, RuleType
+from app.models.system_data import BudgetParameter, ParameterVersion
+from app.models.dynamic.master_data import MasterData
+from app.models.dynamic.master_data_value import MasterDataValue
+from app.models.dynamic.meta_attribute import MetaAttribute
+
+logger = logging.getLogger(__name__)
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_FORMULA_ALLOWED_CHARS = set("0123456789.+-*/() ")
+_BUILTIN_FIELDS = ("CODE", "NAME")
+
+
+# ============ Compiled Plan ============
+
+@dataclass(frozen=True)
+class AttributeRef:
+    """Bir entity attribute'una cozulmus referans (CODE/NAME icin field dolu)."""
+    entity_id: int
+    attribute_code: str
+    field: Optional[str] = None
+    attribute_id: Optional[int] = None
+
+    @property
+    def resolvable(self) -> bool:
+        return self.field is not None or self.attribute_id is not None
+
+
+@dataclass(frozen=True)
+class CompiledCondition:
+    """Boyut kosulu: attribute degeri operator ile karsilastirilir (eq, ne, in)."""
+    attribute: AttributeRef
+    operator: str
+    value: str
+    allowed: Optional[Tuple[Any, ...]] = None
+
+    def matches(self, actual_value: str) -> bool:
+        if self.operator == "eq":
+            return actual_value == self.value
+        elif self.operator == "ne":
+            return actual_value != self.value
+        elif self.operator == "in":
+            return self.allowed is not None and actual_value in self.allowed
+        return False
+
+
+@dataclass(frozen=True)
+class CompiledFormula:
+    """Derlenmis formul. Olcu kodlari degisken olarak cozulur (skaler veya numpy dizisi)."""
+    source: str
+    code: CodeType
+    names: frozenset
+
+    def evaluate(self, measure_values: Mapping[str, Any]):
+        """Formulu hesaplar; hatali formul veya eksik olcu icin None doner."""
+        try:
+            return eval(self.code, {"__builtins__": {}}, dict(measure_values))
+        except Exception:
+            return None
+
+
+@dataclass(frozen=True)
+class CompiledRuleItem:
+    """Tek bir kural seti kaleminin derlenmis hali."""
+    id: int
+    rule_set_id: int
+    rule_type: RuleType
+    target_measure_code: str
+    condition: Optional[CompiledCondition]
+    period_ids: Optional[frozenset]
+    fixed_value: Optional[Decimal]
+    parameter_id: Optional[int]
+    parameter_operation: str
+    formula: Optional[CompiledFormula]
+    currency_code: Optional[str]
+    currency_source: Optional[AttributeRef]
+    priority: int
+    sort_order: int
+
+    def applies_to_period(self, period_id: int) -> bool:
+        return self.period_ids is None or period_id in self.period_ids
+
+
+@dataclass(frozen=True)
+class RuleSetPlan:
+    """Bir kural setinin bir versiyon icin derlenmis plani."""
+    rule_set_id: int
+    version_id: int
+    updated_date: Optional[datetime]
+    parameter_revision: Tuple[Tuple[int, Optional[datetime]], ...]
+    items: Tuple[CompiledRuleItem, ...]
+    parameter_values: Mapping[int, float]
+
+    @property
+    def parameter_ids(self) -> frozenset:
+        return frozenset(item.parameter_id for item in self.items if item.parameter_id)
+
+
+@dataclass(frozen=True)
+class ExecutionPlan:
+    """Secilen kural setlerinin birlesik plani (kalemler oncelik sirasinda)."""
+    rule_set_ids: Tuple[int, ...]
+    items: Tuple[CompiledRuleItem, ...]
+    parameter_values: Mapping[int, float]
+
+    @property
+    def attribute_refs(self) -> frozenset:
+        refs = set()
+        for item in self.items:
+            if item.condition is not None:
+                refs.add(item.condition.attribute)
+            if item.currency_source is not None:
+                refs.add(item.currency_source)
+        return frozenset(refs)
+
+
+# ============ Compilation Helpers ============
+
+@lru_cache(maxsize=1024)
+def compile_formula(formula: Optional[str]) -> Optional[CompiledFormula]:
+    """
+    'FIYAT * MIKTAR' gibi bir formulu derler.
+    Sadece isimler (olcu kodlari), sayilar ve + - * / ( ) kabul edilir.
+    """
+    if not formula:
+        return None
+    names = _IDENTIFIER.findall(formula)
+    if any(keyword.iskeyword(name) for name in names):
+        return None
+    if not all(c in _FORMULA_ALLOWED_CHARS for c in _IDENTIFIER.sub(" ", formula)):
+        return None
+    try:
+        code = compile(formula, "<formula>", "eval")
+    except SyntaxError:
+        return None
+    return CompiledFormula(source=formula, code=code, names=frozenset(names))
+
+
+def _parse_in_values(condition_value: str) -> Optional[Tuple[Any, ...]]:
+    try:
+        if condition_value.startswith("["):
+            return tuple(json.loads(condition_value))
+        return tuple(v.strip() for v in condition_value.split(","))
+    except (json.JSONDecodeError, TypeError):
+        return None
+
+
+# ============ Cache ============
+
+# Cache'te tutulan en fazla plan sayisi; asilinca en uzun suredir
+# kullanilmayan plan atilir
+PLAN_CACHE_SIZE = 512
+
+_plan_cache: "OrderedDict[Tuple[int, int], RuleSetPlan]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class RuleSetCompiler:
+    """Kural seti planlarini derleyen ve process icinde cache'leyen sinif."""
+
+    @staticmethod
+    def get_plan(db: Session, rule_set_ids: Sequence[int], version_id: int) -> ExecutionPlan:
+        """
+        Secilen aktif kural setleri icin birlesik plan dondurur.
+        Gecerli cache kayitlari kullanilir, digerleri yeniden derlenir.
+        """
+        rule_set_ids = list(rule_set_ids or [])
+        if not rule_set_ids:
+            return ExecutionPlan(rule_set_ids=(), items=(), parameter_values=MappingProxyType({}))
+
+        heads = {
+            rs_id: updated_date
+            for rs_id, updated_date in db.query(RuleSet.id, RuleSet.updated_date).filter(
+                RuleSet.id.in_(rule_set_ids), RuleSet.is_active == True
+            ).all()
+        }
+
+        with _cache_lock:
+            cached = {}
+            for rs_id in heads:
+                plan = _plan_cache.get((rs_id, version_id))
+                if plan is not None:
+                    _plan_cache.move_to_end((rs_id, version_id))
+                cached[rs_id] = plan
+        cached = {
+            rs_id: plan for rs_id, plan in cached.items()
+            if plan is not None and plan.updated_date == heads[rs_id]
+        }
+
+        # Parametre revizyonu kontrolu (tek sorgu)
+        cached_param_ids = set()
+        for plan in cached.values():
+            cached_param_ids |= plan.parameter_ids
+        revisions = RuleSetCompiler._parameter_revisions(db, cached_param_ids)
+        plans = {
+            rs_id: plan for rs_id, plan in cached.items()
+            if plan.parameter_revision == tuple((pid, revisions.get(pid)) for pid in sorted(plan.parameter_ids))
+        }
+
+        missing = [rs_id for rs_id in heads if rs_id not in plans]
+        if missing:
+            compiled = RuleSetCompiler._compile_rule_sets(db, missing, version_id)
+            with _cache_lock:
+                for plan in compiled:
+                    _plan_cache[(plan.rule_set_id, version_id)] = plan
+                    _plan_cache.move_to_end((plan.rule_set_id, version_id))
+                while len(_plan_cache) > PLAN_CACHE_SIZE:
+                    _plan_cache.popitem(last=False)
+            plans.update({plan.rule_set_id: plan for plan in compiled})
+            logger.info(f"Kural seti planlari derlendi: {missing} (versiyon={version_id})")
+
+        items: List[CompiledRuleItem] = []
+        parameter_values: Dict[int, float] = {}
+        for rs_id in rule_set_ids:
+            plan = plans.get(rs_id)
+            if plan:
+                items.extend(plan.items)
+                parameter_values.update(plan.parameter_values)
+        items.sort(key=lambda x: (x.priority, x.sort_order))
+
+        return ExecutionPlan(
+            rule_set_ids=tuple(rule_set_ids),
+            items=tuple(items),
+            parameter_values=MappingProxyType(parameter_values),
+        )
+
+    @staticmethod
+    def invalidate_rule_set(rule_set_id: int) -> None:
+        """Kural setinin tum versiyonlardaki planlarini siler."""
+        with _cache_lock:
+            for key in [k for k in _plan_cache if k[0] == rule_set_id]:
+                del _plan_cache[key]
+
+    @staticmethod
+    def invalidate_version(version_id: int) -> None:
+        """Versiyonun tum kural seti planlarini siler."""
+        with _cache_lock:
+            for key in [k for k in _plan_cache if k[1] == version_id]:
+                del _plan_cache[key]
+
+    @staticmethod
+    def invalidate_parameters(parameter_ids: Optional[Iterable[int]] = None) -> None:
+        """Verilen parametreleri (None ise tum parametreleri) kullanan planlari siler."""
+        ids = set(parameter_ids) if parameter_ids is not None else None
+        with _cache_lock:
+            for key, plan in list(_plan_cache.items()):
+                if ids is None or plan.parameter_ids & ids:
+                    del _plan_cache[key]
+
+    @staticmethod
+    def clear() -> None:
+        with _cache_lock:
+            _plan_cache.clear()
+
+    # ============ Attribute Resolution ============
+
+    @staticmethod
+    def resolve_attribute(db: Session, ref: AttributeRef, md_ids: Iterable[Optional[int]]) -> Dict[int, str]:
+        """Verilen master data kayitlari icin attribute degerlerini tek sorguda okur."""
+        md_ids = [md_id for md_id in set(md_ids) if md_id is not None]
+        if not md_ids or not ref.resolvable:
+            return {}
+
+        if ref.field is not None:
+            column = MasterData.code if ref.field == "CODE" else MasterData.name
+            return {
+                md_id: value
+                for md_id, value in db.query(MasterData.id, column).filter(MasterData.id.in_(md_ids)).all()
+            }
+
+        return {
+            md_id: value or ""
+            for md_id, value in db.query(MasterDataValue.master_data_id, MasterDataValue.value).filter(
+                MasterDataValue.attribute_id == ref.attribute_id,
+                MasterDataValue.master_data_id.in_(md_ids)
+            ).all()
+        }
+
+    @staticmethod
+    def compile_condition(
+        db: Session, entity_id: int, attribute_code: str, operator: str = "eq", value: Optional[str] = None
+    ) -> CompiledCondition:
+        """Kural kalemi disinda kullanilan (or. hesaplama kapsami) tek bir boyut kosulunu derler."""
+        upper = attribute_code.upper()
+        if upper in _BUILTIN_FIELDS:
+            ref = AttributeRef(entity_id=entity_id, attribute_code=attribute_code, field=upper)
+        else:
+            attribute_id = db.query(MetaAttribute.id).filter(
+                MetaAttribute.entity_id == entity_id,
+                MetaAttribute.code == attribute_code
+            ).scalar()
+            ref = AttributeRef(entity_id=entity_id, attribute_code=attribute_code, attribute_id=attribute_id)
+        value = value or ""
+        return CompiledCondition(
+            attribute=ref,
+            operator=operator,
+            value=value,
+            allowed=_parse_in_values(value) if operator == "in" else None,
+        )
+
+    # ============ Internal ============
+
+    @staticmethod
+    def _parameter_revisions(db: Session, parameter_ids: Iterable[int]) -> Dict[int, Optional[datetime]]:
+        parameter_ids = list(parameter_ids)
+        if not parameter_ids:
+            return {}
+        return {
+            pid: updated_date
+            for pid, updated_date in db.query(BudgetParameter.id, BudgetParameter.updated_date).filter(
+                BudgetParameter.id.in_(parameter_ids)
+            ).all()
+        }
+
+    @staticmethod
+    def _compile_rule_sets(db: Session, rule_set_ids: List[int], version_id: int) -> List[RuleSetPlan]:
+        rule_sets = db.query(RuleSet).options(joinedload(RuleSet.items)).filter(
+            RuleSet.id.in_(rule_set_ids)
+        ).all()
+
+        # Attribute kodlarini toplu coz: (entity_id, code) -> attribute_id
+        attr_keys = set()
+        for rs in rule_sets:
+            for item in rs.items:
+                if item.condition_entity_id and item.condition_attribute_code:
+                    attr_keys.add((item.condition_entity_id, item.condition_attribute_code))
+                if item.currency_source_entity_id and item.currency_source_attribute_code:
+                    attr_keys.add((item.currency_source_entity_id, item.currency_source_attribute_code))
+        attr_keys = {k for k in attr_keys if k[1].upper() not in _BUILTIN_FIELDS}
+        attribute_ids = {}
+        if attr_keys:
+            entity_ids = {k[0] for k in attr_keys}
+            for attr_id, entity_id, code in db.query(MetaAttribute.id, MetaAttribute.entity_id, MetaAttribute.code).filter(
+                MetaAttribute.entity_id.in_(entity_ids)
+            ).all():
+                if (entity_id, code) in attr_keys:
+                    attribute_ids[(entity_id, code)] = attr_id
+
+        def _ref(entity_id: int, attribute_code: str) -> AttributeRef:
+            upper = attribute_code.upper()
+            if upper in _BUILTIN_FIELDS:
+                return AttributeRef(entity_id=entity_id, attribute_code=attribute_code, field=upper)
+            return AttributeRef(
+                entity_id=entity_id, attribute_code=attribute_code,
+                attribute_id=attribute_ids.get((entity_id, attribute_code))
+            )
+
+        # Parametre degerlerini versiyon icin bagla
+        param_ids = {
+            item.parameter_id for rs in rule_sets for item in rs.items if item.parameter_id
+        }
+        parameter_values = {}
+        if param_ids:
+            for pid, value in db.query(ParameterVersion.parameter_id, ParameterVersion.value).filter(
+                ParameterVersion.version_id == version_id,
+                ParameterVersion.parameter_id.in_(param_ids)
+            ).all():
+                if not value:
+                    continue
+                try:
+                    parameter_values[pid] = float(value)
+                except (ValueError, TypeError):
+                    continue
+        revisions = RuleSetCompiler._parameter_revisions(db, param_ids)
+
+        plans = []
+        for rs in rule_sets:
+            items = []
+            for item in rs.items:
+                if not item.is_active:
+                    continue
+                items.append(RuleSetCompiler._compile_item(item, _ref))
+            items.sort(key=lambda x: (x.priority, x.sort_order))
+
+            rs_param_ids = sorted({item.parameter_id for item in items if item.parameter_id})
+            plans.append(RuleSetPlan(
+                rule_set_id=rs.id,
+                version_id=version_id,
+                updated_date=rs.updated_date,
+                parameter_revision=tuple((pid, revisions.get(pid)) for pid in rs_param_ids),
+                items=tuple(items),
+                parameter_values=MappingProxyType({
+                    pid: parameter_values[pid] for pid in rs_param_ids if pid in parameter_values
+                }),
+            ))
+        return plans
+
+    @staticmethod
+    def _compile_item(item: RuleSetItem, make_ref) -> CompiledRuleItem:
+        condition = None
+        if item.condition_entity_id and item.condition_attribute_code:
+            operator = item.condition_operator or "eq"
+            value = item.condition_value or ""
+            condition = CompiledCondition(
+                attribute=make_ref(item.condition_entity_id, item.condition_attribute_code),
+                operator=operator,
+                value=value,
+                allowed=_parse_in_values(value) if operator == "in" else None,
+            )
+
+        currency_source = None
+        if item.currency_source_entity_id and item.currency_source_attribute_code:
+            currency_source = make_ref(item.currency_source_entity_id, item.currency_source_attribute_code)
+
+        return CompiledRuleItem(
+            id=item.id,
+            rule_set_id=item.rule_set_id,
+            rule_type=item.rule_type,
+            target_measure_code=item.target_measure_code,
+            condition=condition,
+            period_ids=frozenset(item.apply_to_period_ids) if item.apply_to_period_ids else None,
+            fixed_value=item.fixed_value,
+            parameter_id=item.parameter_id,
+            parameter_operation=item.parameter_operation or "multiply",
+            formula=compile_formula(item.formula) if item.rule_type == RuleType.formula else None,
+            currency_code=item.currency_code,
+            currency_source=currency_source,
+            priority=item.priority or 0,
+            sort_order=item.sort_order or 0,
+        )
@@ -0,0 +1,212 @@
+"""
+Upload Cache - Yuklenen dosyalarin icerik adresli deposu
+
+Dosya yuklemeleri icerigin SHA-256 ozetiyle (upload_id) UPLOAD_CACHE_DIR
+altinda saklanir:
+    <upload_id>/meta.json                 dosya adi, boyut, yukleme zamani
+    <upload_id>/source.<uzanti>           ham dosya
+    <upload_id>/parsed_<anahtar>.parquet  ilk tam okumada yazilan string kolonlu hali
+    <upload_id>/schema_<anahtar>.json     kolon tespiti sonucu
+Anahtar okuma seceneklerinden (CSV lehcesi, sayfa, baslik) uretilir. Ayni
+dosya tekrar yuklendiginde ya da upload_id ile referans verildiginde kolon
+tespiti ve sync dosyayi yeniden parse etmez.
+
+Her erisim meta.json zamanini gunceller; deponun toplam boyutu
+UPLOAD_CACHE_MAX_BYTES'i asinca en uzun suredir kullanilmayan kayitlar
+silinir. Son UPLOAD_CACHE_EVICT_GRACE sn icinde kullanilan (okunuyor ya da
+parse ediliyor olabilecek) kayitlar silinmez; bu sure boyunca yazilmamis
+yarim yuklemeler (istemci kopmus) her temizlikte silinir.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{64}$")
+
+# Yarim kalan yuklemeler bu onekle depo kokunde tutulur
+_SPOOL_PREFIX = ".spool_"
+
+
+class UploadCache:
+    """Yuklenen dosyalarin SHA-256 adresli deposu."""
+
+    # ============ Store ============
+
+    @staticmethod
+    def root() -> str:
+        os.makedirs(settings.UPLOAD_CACHE_DIR, exist_ok=True)
+        return settings.UPLOAD_CACHE_DIR
+
+    @staticmethod
+    def spool_file(suffix: str):
+        """Yuklemenin yazilacagi gecici dosya; put() ile depoya tasinir (ayni dosya sistemi)."""
+        return tempfile.NamedTemporaryFile(
+            dir=UploadCache.root(), prefix=_SPOOL_PREFIX, suffix=suffix, delete=False
+        )
+
+    @staticmethod
+    def put(spool_path: str, digest: str, file_name: str) -> Dict[str, Any]:
+        """
+        Diske yazilmis yuklemeyi ozetiyle depoya alir. Ayni icerik zaten
+        varsa gecici dosya silinir ve mevcut kayit dondurulur.
+        """
+        entry = UploadCache.get(digest)
+        if entry is not None:
+            os.unlink(spool_path)
+            logger.info(f"Yukleme depoda mevcut: {file_name} ({digest[:12]})")
+            return entry
+
+        entry_dir = os.path.join(UploadCache.root(), digest)
+        os.makedirs(entry_dir, exist_ok=True)
+        ext = file_name.rsplit(".", 1)[-1].lower() if "." in file_name else ""
+        source = os.path.join(entry_dir, f"source.{ext}" if ext else "source")
+        os.replace(spool_path, source)
+        meta = {
+            "file_name": file_name,
+            "source": os.path.basename(source),
+            "size": os.path.getsize(source),
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        UploadCache._write_json(os.path.join(entry_dir, "meta.json"), meta)
+
+        UploadCache.evict(keep=digest)
+        return UploadCache._entry(digest, entry_dir, meta)
+
+    @staticmethod
+    def get(upload_id: str) -> Optional[Dict[str, Any]]:
+        """upload_id kaydi ({upload_id, file_name, file_path, cache_dir}); yoksa None."""
+        if not upload_id or not _UPLOAD_ID.match(upload_id):
+            return None
+        entry_dir = os.path.join(UploadCache.root(), upload_id)
+        meta_path = os.path.join(entry_dir, "meta.json")
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(os.path.join(entry_dir, meta["source"])):
+            return None
+
+        # LRU: son erisim zamani
+        os.utime(meta_path)
+        return UploadCache._entry(upload_id, entry_dir, meta)
+
+    @staticmethod
+    def _entry(upload_id: str, entry_dir: str, meta: dict) -> Dict[str, Any]:
+        return {
+            "upload_id": upload_id,
+            "file_name": meta["file_name"],
+            "file_path": os.path.join(entry_dir, meta["source"]),
+            "cache_dir": entry_dir,
+        }
+
+    # ============ Parsed Form / Schema ============
+
+    @staticmethod
+    def parsed_path(cache_dir: str, parse_key: str) -> str:
+        return os.path.join(cache_dir, f"parsed_{UploadCache._key_hash(parse_key)}.parquet")
+
+    @staticmethod
+    def load_schema(cache_dir: str, parse_key: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(cache_dir, f"schema_{UploadCache._key_hash(parse_key)}.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def save_schema(cache_dir: str, parse_key: str, schema: dict) -> None:
+        try:
+            UploadCache._write_json(
+                os.path.join(cache_dir, f"schema_{UploadCache._key_hash(parse_key)}.json"), schema
+            )
+        except OSError as e:
+            # Kayit bu arada silinmis olabilir; tespit sonucu yine dondurulur
+            logger.warning(f"Kolon tespiti depoya yazilamadi: {e}")
+
+    @staticmethod
+    def _key_hash(parse_key: str) -> str:
+        return hashlib.sha1(parse_key.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def _write_json(path: str, data: dict) -> None:
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=os.path.dirname(path), suffix=".tmp", delete=False
+        ) as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(f.name, path)
+
+    # ============ Eviction ============
+
+    @staticmethod
+    def evict(keep: Optional[str] = None) -> int:
+        """
+        Depo UPLOAD_CACHE_MAX_BYTES'i asiyorsa en uzun suredir erisilmeyen
+        kayitlari siler (keep ve son UPLOAD_CACHE_EVICT_GRACE sn icinde
+        kullanilanlar haric). Yarim kalmis yuklemeler her zaman silinir.
+        Silinen kayit sayisini dondurur.
+        """
+        root = UploadCache.root()
+        now = time.time()
+        grace = settings.UPLOAD_CACHE_EVICT_GRACE
+        entries = []
+        total = 0
+        spools = 0
+        with os.scandir(root) as it:
+            for item in it:
+                if item.name.startswith(_SPOOL_PREFIX):
+                    try:
+                        stat = item.stat()
+                        if now - stat.st_mtime > grace:
+                            os.unlink(item.path)
+                            spools += 1
+                        else:
+                            total += stat.st_size
+                    except FileNotFoundError:
+                        # put() ayni anda tasidi
+                        pass
+                    continue
+                if not item.is_dir() or not _UPLOAD_ID.match(item.name):
+                    continue
+                size = 0
+                accessed = 0.0
+                try:
+                    with os.scandir(item.path) as files:
+                        for file in files:
+                            stat = file.stat()
+                            size += stat.st_size
+                            # meta.json erisimde, parse / sema dosyalari kullanimda yazilir
+                            accessed = max(accessed, stat.st_mtime)
+                except FileNotFoundError:
+                    # Baska bir istek ayni anda sildi
+                    continue
+                entries.append((accessed, item.name, size))
+                total += size
+
+        removed = 0
+        for accessed, upload_id, size in sorted(entries):
+            if total <= settings.UPLOAD_CACHE_MAX_BYTES:
+                break
+            if upload_id == keep or now - accessed < grace:
+                continue
+            shutil.rmtree(os.path.join(root, upload_id), ignore_errors=True)
+            total -= size
+            removed += 1
+
+        if spools:
+            logger.info(f"Yukleme deposundan {spools} yarim kalmis yukleme silindi")
+        if removed:
+            logger.info(f"Yukleme deposundan {removed} kayit silindi ({total / 1e6:.0f} MB kaldi)")
+        return removed
@@ -0,0 +1,221 @@
+"""
+Version Copy Service - Butce versiyonlarinin veritabani icinde derin kopyasi
+
+Kaynak versiyonun butce tanimlari, boyutlari, satirlari ve hucreleri
+INSERT ... SELECT ifadeleriyle kopyalanir. Yeni id'ler sequence'tan
+onceden alinip gecici eslestirme tablolarinda (kaynak id -> hedef id)
+tutulur; boylece satir ve hucreler uygulamaya hic tasinmadan, tablo
+basina tek ifadeyle kopyalanir. Donemler istenirse ay kaydirilarak
+(or. +12) eslestirilir; dense modundaki tanimlarin serilerinde yalnizca
+baslangic ayi kaydirilir.
+"""
+
+import logging
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.system_data import BudgetPeriod, BudgetVersion
+from app.services.budget_cell_store import BudgetCellStore
+
+logger = logging.getLogger(__name__)
+
+# Tanim kodlari tekil oldugu icin yeni tanim kodu: <kaynak kod>_<yeni versiyon kodu>
+DEFINITION_CODE_MAX_LENGTH = 50
+
+_PERIOD_MAP_SQL = text("""
+    CREATE TEMP TABLE tmp_copy_period_map ON COMMIT DROP AS
+    SELECT s.id AS source_id, t.id AS target_id
+    FROM budget_periods s
+    JOIN budget_periods t
+      ON t.year * 12 + t.month = s.year * 12 + s.month + :offset
+""")
+
+_DEFINITION_MAP_SQL = text("""
+    CREATE TEMP TABLE tmp_copy_definition_map ON COMMIT DROP AS
+    SELECT d.id AS source_id,
+           nextval(pg_get_serial_sequence('budget_definitions', 'id'))::int AS target_id
+    FROM budget_definitions d
+    WHERE d.version_id = :source_version_id
+      AND d.deleted_at IS NULL
+""")
+
+_COPY_DEFINITIONS_SQL = text("""
+    INSERT INTO budget_definitions (
+        id, uuid, version_id, budget_type_id, code, name, description, status,
+        storage_mode, is_active, created_by, sort_order, created_date, updated_date
+    )
+    SELECT m.target_id, gen_random_uuid(), :target_version_id, d.budget_type_id,
+           left(d.code, :code_prefix_length) || :code_suffix, d.name, d.description,
+           'draft', d.storage_mode, d.is_active, :created_by, d.sort_order, now(), now()
+    FROM budget_definitions d
+    JOIN tmp_copy_definition_map m ON m.source_id = d.id
+""")
+
+_COPY_DIMENSIONS_SQL = text("""
+    INSERT INTO budget_definition_dimensions (
+        budget_definition_id, entity_id, sort_order, is_required, created_date, updated_date
+    )
+    SELECT m.target_id, dd.entity_id, dd.sort_order, dd.is_required, now(), now()
+    FROM budget_definition_dimensions dd
+    JOIN tmp_copy_definition_map m ON m.source_id = dd.budget_definition_id
+""")
+
+_ROW_MAP_SQL = text("""
+    CREATE TEMP TABLE tmp_copy_row_map ON COMMIT DROP AS
+    SELECT r.id AS source_id,
+           nextval(pg_get_serial_sequence('budget_entry_rows', 'id'))::int AS target_id,
+           m.target_id AS definition_id
+    FROM budget_entry_rows r
+    JOIN tmp_copy_definition_map m ON m.source_id = r.budget_definition_id
+""")
+
+_COPY_ROWS_SQL = text("""
+    INSERT INTO budget_entry_rows (
+        id, uuid, budget_definition_id, dimension_values, currency_code,
+        is_active, sort_order, created_date, updated_date
+    )
+    SELECT rm.target_id, gen_random_uuid(), rm.definition_id, r.dimension_values, r.currency_code,
+           r.is_active, r.sort_order, now(), now()
+    FROM budget_entry_rows r
+    JOIN tmp_copy_row_map rm ON rm.source_id = r.id
+""")
+
+# Hucreler hedef tanimin henuz baglanmamis partition tablosuna yazilir
+_COPY_CELLS_SQL = """
+    INSERT INTO {partition} (
+        budget_definition_id, row_id, period_id, measure_code, value, cell_type,
+        source_rule_id, source_param_id, is_manual_override, created_date, updated_date
+    )
+    SELECT rm.definition_id, rm.target_id, pm.target_id, c.measure_code, c.value, c.cell_type,
+           c.source_rule_id, c.source_param_id, c.is_manual_override, now(), now()
+    FROM budget_entry_cells c
+    JOIN tmp_copy_row_map rm ON rm.source_id = c.row_id
+    JOIN tmp_copy_period_map pm ON pm.source_id = c.period_id
+    WHERE c.budget_definition_id = :source_definition_id
+"""
+
+# dense tanimlarin serileri: ay kaydirma yalnizca baslangic ayini degistirir
+_COPY_SERIES_SQL = text("""
+    INSERT INTO budget_entry_series (
+        budget_definition_id, row_id, measure_code, start_month, values, flags, updated_date
+    )
+    SELECT rm.definition_id, rm.target_id, s.measure_code, s.start_month + :offset, s.values, s.flags, now()
+    FROM budget_entry_series s
+    JOIN tmp_copy_row_map rm ON rm.source_id = s.row_id
+""")
+
+_SOURCE_CELL_COUNT_SQL = text("""
+    SELECT count(*)
+    FROM budget_entry_cells c
+    JOIN tmp_copy_row_map rm ON rm.source_id = c.row_id
+""")
+
+_COPY_PARAMETERS_SQL = text("""
+    INSERT INTO parameter_versions (parameter_id, version_id, value)
+    SELECT pv.parameter_id, :target_version_id, pv.value
+    FROM parameter_versions pv
+    WHERE pv.version_id = :source_version_id
+""")
+
+
+class VersionCopyService:
+    """Versiyon verilerini set bazli kopyalayan servis."""
+
+    @staticmethod
+    def shift_period(db: Session, period_id: Optional[int], offset: int) -> Optional[int]:
+        """Donemi offset ay kaydirir; hedef donem tanimli degilse ValueError."""
+        if period_id is None or offset == 0:
+            return period_id
+        period = db.query(BudgetPeriod).filter(BudgetPeriod.id == period_id).first()
+        if not period:
+            return None
+        index = period.year * 12 + period.month - 1 + offset
+        year, month = divmod(index, 12)
+        target = db.query(BudgetPeriod).filter(
+            BudgetPeriod.year == year, BudgetPeriod.month == month + 1
+        ).first()
+        if not target:
+            raise ValueError(f"Hedef dönem bulunamadı: {year:04d}-{month + 1:02d}")
+        return target.id
+
+    @staticmethod
+    def copy_parameters(db: Session, source_version_id: int, target_version_id: int) -> int:
+        """Parametre versiyon degerlerini tek ifadeyle kopyalar."""
+        result = db.execute(_COPY_PARAMETERS_SQL, {
+            "source_version_id": source_version_id,
+            "target_version_id": target_version_id,
+        })
+        return result.rowcount
+
+    @staticmethod
+    def copy_budget_data(
+        db: Session,
+        source: BudgetVersion,
+        target: BudgetVersion,
+        period_offset: int = 0,
+        created_by: Optional[str] = None,
+    ) -> Dict[str, int]:
+        """
+        Tanim, boyut, satir ve hucreleri kaynak versiyondan hedefe kopyalar
+        (commit cagirana aittir). Kopyalanan tanimlar taslak durumunda olusur.
+        Hedefte karsiligi olmayan donemlerin hucreleri atlanir.
+        """
+        code_suffix = f"_{target.code}"
+        code_prefix_length = DEFINITION_CODE_MAX_LENGTH - len(code_suffix)
+        if code_prefix_length < 1:
+            raise ValueError("Versiyon kodu tanım kodları için çok uzun")
+
+        db.execute(_PERIOD_MAP_SQL, {"offset": period_offset})
+        db.execute(_DEFINITION_MAP_SQL, {"source_version_id": source.id})
+
+        definitions = db.execute(_COPY_DEFINITIONS_SQL, {
+            "target_version_id": target.id,
+            "code_prefix_length": code_prefix_length,
+            "code_suffix": code_suffix,
+            "created_by": created_by,
+        }).rowcount
+        dimensions = db.execute(_COPY_DIMENSIONS_SQL).rowcount
+
+        db.execute(_ROW_MAP_SQL)
+        db.execute(text("CREATE INDEX ON tmp_copy_row_map (source_id)"))
+        db.execute(text("ANALYZE tmp_copy_row_map"))
+        db.execute(text("ANALYZE tmp_copy_period_map"))
+        rows = db.execute(_COPY_ROWS_SQL).rowcount
+
+        # Hucreler her yeni tanim icin indekssiz, FK'siz bagimsiz tabloya yuklenir;
+        # indeksler yuklemeden sonra kurulur, FK'lar ATTACH'ta tek sorguyla dogrulanir
+        # (satir basina FK tetikleyicisi ve indeks bakimi yok).
+        definition_map = db.execute(text(
+            "SELECT source_id, target_id FROM tmp_copy_definition_map ORDER BY target_id"
+        )).all()
+        cells = 0
+        for source_id, target_id in definition_map:
+            partition = BudgetCellStore.create_partition_table(db, target_id)
+            cells += db.execute(
+                text(_COPY_CELLS_SQL.format(partition=partition)), {"source_definition_id": source_id}
+            ).rowcount
+            BudgetCellStore.index_partition_table(db, target_id)
+        series = db.execute(_COPY_SERIES_SQL, {"offset": period_offset}).rowcount
+        skipped = db.execute(_SOURCE_CELL_COUNT_SQL).scalar() - cells if period_offset else 0
+
+        # ATTACH kilitleri commit'e kadar tutulur: en sona birakilir
+        for _, target_id in definition_map:
+            BudgetCellStore.attach_partition(db, target_id)
+
+        for table in ("tmp_copy_row_map", "tmp_copy_definition_map", "tmp_copy_period_map"):
+            db.execute(text(f"DROP TABLE {table}"))
+
+        logger.info(
+            f"Versiyon {source.code} -> {target.code} derin kopya: {definitions} tanim, "
+            f"{rows} satir, {cells} hucre, {series} seri (offset={period_offset}, atlanan={skipped})"
+        )
+        return {
+            "definitions": definitions,
+            "dimensions": dimensions,
+            "rows": rows,
+            "cells": cells,
+            "series": series,
+            "skipped_cells": skipped,
+        }
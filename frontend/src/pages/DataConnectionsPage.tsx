@@ -108,6 +108,10 @@ interface DetectedColumn {
   sample_values: string[];
   is_nullable: boolean;
   max_length?: number;
+  null_ratio?: number;
+  distinct_count?: number;
+  min_value?: string;
+  max_value?: string;
 }
 
 interface MetaEntity {
@@ -576,8 +580,8 @@ export function DataConnectionsPage() {
           query={columnQuery}
           onClose={() => setShowColumnModal(false)}
           onSaved={() => { setShowColumnModal(false); loadQueries(selectedConn.id); loadSyncLogs(selectedConn.id); }}
-          onSyncFile={async (file) => {
-            const res = await dataConnectionApi.triggerSyncFromFile(selectedConn.id, columnQuery.id, file);
+          onSyncFile={async (file, uploadId) => {
+            const res = await dataConnectionApi.triggerSyncFromFile(selectedConn.id, columnQuery.id, file, uploadId);
             if (res.data.status === 'failed') {
               alert('Sync başarısız: ' + res.data.message);
             } else {
@@ -1039,7 +1043,7 @@ function QueryFormModal({
     odata_select: query?.odata_select || '',
     odata_filter: query?.odata_filter || '',
     odata_top: query?.odata_top?.toString() || '',
-    file_parse_config: query?.file_parse_config || { delimiter: ';', encoding: 'utf-8', has_header: true },
+    file_parse_config: query?.file_parse_config || { delimiter: 'auto', encoding: 'auto' },
   });
   const [saving, setSaving] = useState(false);
 
@@ -1135,9 +1139,10 @@ function QueryFormModal({
             <div className="grid grid-cols-2 gap-4">
               <div>
                 <label className="block text-sm font-medium text-gray-700 mb-1">Ayırıcı</label>
-                <select value={(form.file_parse_config as any)?.delimiter || ';'}
+                <select value={(form.file_parse_config as any)?.delimiter || 'auto'}
                   onChange={(e) => setForm({...form, file_parse_config: {...(form.file_parse_config || {}), delimiter: e.target.value}})}
                   className="w-full px-3 py-2 border border-gray-300 rounded-lg bg-white text-gray-900 text-sm">
+                  <option value="auto">Otomatik</option>
                   <option value=";">Noktalı Virgül (;)</option>
                   <option value=",">Virgül (,)</option>
                   <option value="\t">Tab</option>
@@ -1146,9 +1151,10 @@ function QueryFormModal({
               </div>
               <div>
                 <label className="block text-sm font-medium text-gray-700 mb-1">Encoding</label>
-                <select value={(form.file_parse_config as any)?.encoding || 'utf-8'}
+                <select value={(form.file_parse_config as any)?.encoding || 'auto'}
                   onChange={(e) => setForm({...form, file_parse_config: {...(form.file_parse_config || {}), encoding: e.target.value}})}
                   className="w-full px-3 py-2 border border-gray-300 rounded-lg bg-white text-gray-900 text-sm">
+                  <option value="auto">Otomatik</option>
                   <option value="utf-8">UTF-8</option>
                   <option value="latin-1">Latin-1 (ISO-8859-1)</option>
                   <option value="windows-1254">Windows-1254 (Turkce)</option>
@@ -1178,7 +1184,7 @@ function ColumnEditorModal({
   connection: DataConnection;
   query: DataConnectionQuery;
   onClose: () => void;
-  onSyncFile?: (file: File) => Promise<void>;
+  onSyncFile?: (file: File, uploadId?: string) => Promise<void>;
   onSaved: () => void;
 }) {
   const [columns, setColumns] = useState<DetectedColumn[]>([]);
@@ -1186,6 +1192,7 @@ function ColumnEditorModal({
   const [saving, setSaving] = useState(false);
   const [syncing, setSyncing] = useState(false);
   const [lastFile, setLastFile] = useState<File | null>(null);
+  const [lastUploadId, setLastUploadId] = useState<string | undefined>(undefined);
   const [editableColumns, setEditableColumns] = useState<{
     source_name: string; target_name: string; data_type: string;
     is_nullable: boolean; is_primary_key: boolean; is_included: boolean;
@@ -1207,6 +1214,19 @@ function ColumnEditorModal({
     }
   }, [query.columns]);
 
+  // Tespit istatistikleri kaynak kolon hucresinin ipucunda gosterilir
+  const detectedStats = (sourceName: string) => {
+    const c = columns.find(d => d.source_name === sourceName);
+    if (!c || c.null_ratio == null) return undefined;
+    return [
+      `Boş: %${(c.null_ratio * 100).toFixed(1)}`,
+      c.distinct_count != null ? `Farklı: ~${c.distinct_count}` : null,
+      c.min_value != null ? `Min: ${c.min_value}` : null,
+      c.max_value != null ? `Max: ${c.max_value}` : null,
+      c.max_length ? `Maks. uzunluk: ${c.max_length}` : null,
+    ].filter(Boolean).join('\n');
+  };
+
   const handleDetect = async () => {
     setDetecting(true);
     try {
@@ -1234,6 +1254,7 @@ function ColumnEditorModal({
     setLastFile(file);
     try {
       const res = await dataConnectionApi.detectColumnsFromFile(connection.id, query.id, file);
+      setLastUploadId(res.data.upload_id);
       setColumns(res.data.columns);
       setEditableColumns(res.data.columns.map((c, i) => ({
         source_name: c.source_name,
@@ -1248,6 +1269,7 @@ function ColumnEditorModal({
     } catch (err: any) {
       alert('Dosya kolon tespiti hatası: ' + (err.response?.data?.detail || err.message));
       setLastFile(null);
+      setLastUploadId(undefined);
     } finally {
       setDetecting(false);
     }
@@ -1329,7 +1351,7 @@ function ColumnEditorModal({
                       <input type="checkbox" checked={col.is_included}
                         onChange={(e) => updateCol(idx, 'is_included', e.target.checked)} className="rounded" />
                     </td>
-                    <td className="px-3 py-2 font-mono text-xs text-gray-600">{col.source_name}</td>
+                    <td className="px-3 py-2 font-mono text-xs text-gray-600" title={detectedStats(col.source_name)}>{col.source_name}</td>
                     <td className="px-3 py-2">
                       <input value={col.target_name} onChange={(e) => updateCol(idx, 'target_name', e.target.value)}
                         className="w-full px-2 py-1 border border-gray-200 rounded text-sm bg-white text-gray-900" />
@@ -1377,7 +1399,7 @@ function ColumnEditorModal({
                 try {
                   // Once kolonlari kaydet, sonra sync yap
                   await dataConnectionApi.saveColumns(connection.id, query.id, editableColumns);
-                  await onSyncFile(lastFile);
+                  await onSyncFile(lastFile, lastUploadId);
                   onSaved();
                 } catch (err: any) {
                   alert('Kaydet & Sync hatası: ' + (err.response?.data?.detail || err.message));
@@ -102,18 +102,25 @@ export interface DetectedColumn {
   sample_values: string[];
   is_nullable: boolean;
   max_length?: number;
+  null_ratio?: number;
+  distinct_count?: number;
+  min_value?: string;
+  max_value?: string;
 }
 
 export interface ColumnDetectionResult {
   columns: DetectedColumn[];
   sample_row_count: number;
+  scanned_row_count?: number;
   source_info?: Record<string, any>;
+  upload_id?: string;
 }
 
 export interface SyncTriggerResult {
   sync_log_id: number;
   status: string;
   message: string;
+  upload_id?: string;
 }
 
 export interface DataPreview {
@@ -270,14 +277,22 @@ export const dataConnectionApi = {
   triggerSync: (connId: number, queryId: number) =>
     api.post<SyncTriggerResult>(`/data-connections/${connId}/queries/${queryId}/sync`),
 
-  triggerSyncFromFile: (connId: number, queryId: number, file: File) => {
+  // uploadId verilirse dosya tekrar gonderilmez; sunucu deposundan silinmisse (404) dosya yuklenir
+  triggerSyncFromFile: async (connId: number, queryId: number, file: File, uploadId?: string) => {
+    const url = `/data-connections/${connId}/queries/${queryId}/sync/file`;
+    const headers = { 'Content-Type': 'multipart/form-data' };
+    if (uploadId) {
+      const idData = new FormData();
+      idData.append('upload_id', uploadId);
+      try {
+        return await api.post<SyncTriggerResult>(url, idData, { headers });
+      } catch (err: any) {
+        if (err.response?.status !== 404) throw err;
+      }
+    }
     const formData = new FormData();
     formData.append('file', file);
-    return api.post<SyncTriggerResult>(
-      `/data-connections/${connId}/queries/${queryId}/sync/file`,
-      formData,
-      { headers: { 'Content-Type': 'multipart/form-data' } }
-    );
+    return api.post<SyncTriggerResult>(url, formData, { headers });
   },
 
   // Sync Logs
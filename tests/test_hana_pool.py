@@ -0,0 +1,236 @@
+"""
+HANA baglanti havuzu ve imlec parcalama testleri
+
+ConnectionPool ve ConnectionManager._iter_cursor_batches yalnizca DB-API
+2.0 bekler; HANA yerine sqlite3 baglantilari kullanilir.
+"""
+
+import sqlite3
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+
+from app.services.connection_manager import ConnectionManager
+from app.services.hana_pool import ConnectionPool
+
+KEY = ("conn", "host", 443, "user", None, "hash")
+
+
+class FakeLob:
+    """hdbcli LOB nesnesi gibi: read() ile okunur, str() ile metne doner."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def read(self):
+        return self.data.decode("utf-8")
+
+    def __str__(self):
+        return self.read()
+
+
+sqlite3.register_converter("TEST_DECIMAL", lambda raw: Decimal(raw.decode()))
+sqlite3.register_converter("TEST_NCLOB", FakeLob)
+
+
+class Connector:
+    """Acilan baglantilari sayan connect fonksiyonu."""
+
+    def __init__(self):
+        self.opened = []
+
+    def __call__(self):
+        conn = sqlite3.connect(":memory:", check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        self.opened.append(conn)
+        return conn
+
+
+def is_closed(conn) -> bool:
+    try:
+        conn.execute("SELECT 1")
+        return False
+    except sqlite3.ProgrammingError:
+        return True
+
+
+def make_pool(**kwargs) -> ConnectionPool:
+    options = dict(max_size=2, idle_timeout=60, health_interval=60, acquire_timeout=1)
+    options.update(kwargs)
+    return ConnectionPool(**options)
+
+
+# ============ ConnectionPool ============
+
+def test_connection_is_reused():
+    pool, connect = make_pool(), Connector()
+    with pool.connection(KEY, connect) as first:
+        pass
+    with pool.connection(KEY, connect) as second:
+        assert second is first
+    assert len(connect.opened) == 1
+    assert pool.stats() == {KEY: {"idle": 1, "in_use": 0}}
+    pool.close_all()
+
+
+def test_keys_have_separate_connections():
+    pool, connect = make_pool(), Connector()
+    with pool.connection(KEY, connect) as first, pool.connection(("other",), connect) as second:
+        assert first is not second
+    assert len(connect.opened) == 2
+    pool.close_all()
+    assert all(is_closed(conn) for conn in connect.opened)
+
+
+def test_unpooled_connection_is_closed():
+    pool, connect = make_pool(), Connector()
+    with pool.connection(None, connect) as conn:
+        assert not is_closed(conn)
+    assert is_closed(conn)
+    assert pool.stats() == {}
+
+
+def test_max_size_and_acquire_timeout():
+    pool, connect = make_pool(max_size=2, acquire_timeout=0.1), Connector()
+    with pool.connection(KEY, connect), pool.connection(KEY, connect):
+        assert pool.stats()[KEY]["in_use"] == 2
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            with pool.connection(KEY, connect):
+                pass
+        assert 0.1 <= time.monotonic() - started < 1
+    assert len(connect.opened) == 2
+    assert pool.stats()[KEY] == {"idle": 2, "in_use": 0}
+    pool.close_all()
+
+
+def test_waiter_gets_released_connection():
+    pool, connect = make_pool(max_size=1, acquire_timeout=2), Connector()
+    held = pool.connection(KEY, connect)
+    first = held.__enter__()
+    threading.Timer(0.1, held.__exit__, (None, None, None)).start()
+
+    with pool.connection(KEY, connect) as second:
+        assert second is first
+    assert len(connect.opened) == 1
+    pool.close_all()
+
+
+def test_broken_connection_is_replaced():
+    pool, connect = make_pool(health_interval=0), Connector()
+    with pool.connection(KEY, connect) as first:
+        pass
+    first.close()
+
+    with pool.connection(KEY, connect) as second:
+        assert second is not first
+        assert second.execute("SELECT 1").fetchone() == (1,)
+    assert len(connect.opened) == 2
+    assert pool.stats()[KEY] == {"idle": 1, "in_use": 0}
+    pool.close_all()
+
+
+def test_connection_is_checked_after_error():
+    pool, connect = make_pool(health_interval=3600), Connector()
+    with pytest.raises(RuntimeError):
+        with pool.connection(KEY, connect) as first:
+            first.close()
+            raise RuntimeError("query failed")
+
+    # Saglik araligi dolmamis olsa da hatadan sonra dogrulanir
+    with pool.connection(KEY, connect) as second:
+        assert second is not first
+    assert len(connect.opened) == 2
+    pool.close_all()
+
+
+def test_failed_connect_returns_slot():
+    pool = make_pool(max_size=1, acquire_timeout=0.1)
+
+    def refuse():
+        raise ConnectionError("refused")
+
+    with pytest.raises(ConnectionError):
+        with pool.connection(KEY, refuse):
+            pass
+    connect = Connector()
+    with pool.connection(KEY, connect):
+        pass
+    assert len(connect.opened) == 1
+    pool.close_all()
+
+
+def test_idle_connections_are_reaped():
+    pool, connect = make_pool(idle_timeout=0.1), Connector()
+    with pool.connection(KEY, connect) as conn:
+        pass
+    assert pool.stats()[KEY]["idle"] == 1
+
+    deadline = time.monotonic() + 2
+    while pool.stats() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert pool.stats() == {}
+    assert is_closed(conn)
+
+
+def test_expired_connection_is_not_handed_out():
+    pool, connect = make_pool(idle_timeout=0.05), Connector()
+    with pool.connection(KEY, connect) as first:
+        pass
+    time.sleep(0.1)
+    with pool.connection(KEY, connect) as second:
+        assert second is not first
+    assert is_closed(first)
+    pool.close_all()
+
+
+# ============ _iter_cursor_batches ============
+
+@pytest.fixture
+def db():
+    conn = Connector()()
+    conn.execute("CREATE TABLE items (id INTEGER, amount TEST_DECIMAL, name TEXT, note TEST_NCLOB)")
+    conn.executemany(
+        "INSERT INTO items VALUES (?, ?, ?, ?)",
+        [(i, f"{i}.50", f"item {i}", f"note {i}" if i % 2 else None) for i in range(5)],
+    )
+    yield conn
+    conn.close()
+
+
+def test_batches_keep_native_types(db):
+    columns = []
+    batches = list(ConnectionManager._iter_cursor_batches(
+        db, "SELECT id, amount, name FROM items ORDER BY id", (), 2, columns
+    ))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert columns == ["id", "amount", "name"]
+    assert batches[0][1] == {"id": 1, "amount": Decimal("1.50"), "name": "item 1"}
+
+
+def test_batches_bind_params(db):
+    rows = [row for batch in ConnectionManager._iter_cursor_batches(
+        db, "SELECT id FROM items WHERE id >= ? ORDER BY id", (3,), 10
+    ) for row in batch]
+    assert rows == [{"id": 3}, {"id": 4}]
+
+
+def test_empty_result_reports_columns(db):
+    columns = []
+    batches = list(ConnectionManager._iter_cursor_batches(
+        db, "SELECT id, name FROM items WHERE id < 0", (), 10, columns
+    ))
+    assert batches == []
+    assert columns == ["id", "name"]
+
+
+def test_lob_values_are_stringified(db):
+    rows = [row for batch in ConnectionManager._iter_cursor_batches(
+        db, "SELECT id, note FROM items ORDER BY id", (), 1
+    ) for row in batch]
+    # Ilk parcada LOB kolonu NULL; tespit sonraki parcalarda yapilir
+    assert rows[0] == {"id": 0, "note": None}
+    assert rows[1] == {"id": 1, "note": "note 1"}
+    assert rows[3] == {"id": 3, "note": "note 3"}
+    assert all(isinstance(row["note"], (str, type(None))) for row in rows)
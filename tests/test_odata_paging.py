@@ -0,0 +1,211 @@
+"""
+ConnectionManager OData tam cekme testleri - yerel sahte OData sunucusu
+
+Sunucu $skip/$top pencerelerini $orderby verilmezse her istekte farkli
+sirayla dondurur (gercek servislerde sira garanti degildir); sunucu
+sayfalamasi (__next) ise kendi sabit sirasini kullanir.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import pytest
+import requests
+
+from app.services import connection_manager
+from app.services.connection_manager import ConnectionManager
+
+SERVICE_PATH = "/sap/opu/odata/sap/ZTEST_SRV"
+ENTITY = "Items"
+
+
+class StubOData:
+    """Thread'li sahte OData V2 servisi; istekleri ve hata enjeksiyonunu tutar."""
+
+    def __init__(self, total: int, page_cap: int = None):
+        self.rows = [{"ID": i, "NAME": f"item {i}", "__metadata": {"uri": f"Items({i})"}} for i in range(total)]
+        self.page_cap = page_cap
+        self.requests = []
+        self.failures = {}  # $skip -> sirayla donulecek hata kodlari
+        self.delay = 0.0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def handle(self, request):
+        parsed = urlparse(request.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        with self.lock:
+            self.requests.append((parsed.path, query))
+            pending = self.failures.get(query.get("$skip"))
+            status = pending.pop(0) if pending else None
+        if self.delay:
+            time.sleep(self.delay)
+        if status:
+            self._send(request, status, "text/plain", b"busy")
+            return
+
+        if parsed.path.endswith("/$count"):
+            self._send(request, 200, "text/plain", str(len(self.rows)).encode())
+            return
+
+        if "$skiptoken" in query or "$skip" not in query:
+            # Sunucu sayfalamasi: sabit sira
+            rows = self.rows
+            skip = int(query.get("$skiptoken", 0))
+        else:
+            rows = list(self.rows)
+            if "$orderby" in query:
+                rows.sort(key=lambda r: r[query["$orderby"]])
+            else:
+                random.shuffle(rows)
+            skip = int(query["$skip"])
+        end = len(rows) if "$top" not in query else min(len(rows), skip + int(query["$top"]))
+        if self.page_cap:
+            end = min(end, skip + self.page_cap)
+        body = {"d": {"results": rows[skip:end]}}
+        if end < len(rows) and ("$top" not in query or end < skip + int(query["$top"])):
+            next_query = {k: v for k, v in query.items() if k != "$skip"}
+            if "$skip" in query:
+                next_query["$skip"] = str(end)
+                if "$top" in query:
+                    next_query["$top"] = str(skip + int(query["$top"]) - end)
+            else:
+                next_query["$skiptoken"] = str(end)
+            body["d"]["__next"] = f"{self.base}{parsed.path}?{urlencode(next_query)}"
+        self._send(request, 200, "application/json", json.dumps(body).encode())
+
+    @staticmethod
+    def _send(request, status, content_type, payload):
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def data_requests(self):
+        with self.lock:
+            return [q for path, q in self.requests if path.endswith(ENTITY)]
+
+
+@pytest.fixture
+def odata():
+    servers = []
+
+    def start(total: int, page_cap: int = None) -> StubOData:
+        stub = StubOData(total, page_cap)
+        stub.thread.start()
+        servers.append(stub)
+        return stub
+
+    yield start
+    for stub in servers:
+        stub.server.shutdown()
+        stub.server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(connection_manager, "ODATA_RETRY_BACKOFF", 0.0)
+
+
+def fetch(stub, key_columns=("ID",), page_size=100, parallelism=4, retries=2, **query):
+    config = {
+        "host": stub.base,
+        "sap_service_path": SERVICE_PATH,
+        "extra_config": {
+            "odata_page_size": page_size,
+            "odata_parallelism": parallelism,
+            "odata_max_retries": retries,
+        },
+    }
+    query_config = {"odata_entity": ENTITY, "key_columns": list(key_columns), **query}
+    return ConnectionManager.fetch_batches("sap_odata", config, query_config)
+
+
+def ids(batches):
+    return [int(row["ID"]) for batch in batches for row in batch]
+
+
+def test_parallel_windows_are_ordered_by_key_columns(odata):
+    stub = odata(1050)
+    assert ids(fetch(stub)) == list(range(1050))
+
+    windows = [q for q in stub.data_requests() if "$skip" in q]
+    # 11 pencere + $count'tan sonra eklenen kayitlar icin bir yoklama
+    assert sorted(int(q["$skip"]) for q in windows) == sorted([*range(0, 1100, 100), 1050])
+    assert all(q["$orderby"] == "ID" for q in windows)
+
+
+def test_rows_are_returned_as_strings_without_metadata(odata):
+    stub = odata(3)
+    rows = [row for batch in fetch(stub) for row in batch]
+    assert rows[0] == {"ID": "0", "NAME": "item 0"}
+
+
+def test_without_key_columns_pages_sequentially(odata):
+    stub = odata(1050, page_cap=200)
+    assert ids(fetch(stub, key_columns=())) == list(range(1050))
+
+    requests_made = stub.data_requests()
+    assert not any("$skip" in q for q in requests_made)
+    assert len(requests_made) == 6
+    assert not any(path.endswith("/$count") for path, _ in stub.requests)
+
+
+def test_odata_top_limits_parallel_fetch(odata):
+    stub = odata(1050)
+    assert ids(fetch(stub, odata_top=250)) == list(range(250))
+
+
+@pytest.mark.parametrize("status", [503, 429])
+def test_failed_windows_are_retried(odata, status):
+    stub = odata(500)
+    stub.failures = {"0": [status], "200": [status, status]}
+    assert ids(fetch(stub)) == list(range(500))
+
+    skips = [q["$skip"] for q in stub.data_requests() if "$skip" in q]
+    assert skips.count("0") == 2
+    assert skips.count("200") == 3
+
+
+def test_retries_are_bounded(odata):
+    stub = odata(500)
+    stub.failures = {"100": [503] * 3}
+    with pytest.raises(requests.HTTPError):
+        ids(fetch(stub, retries=2))
+
+
+def test_server_page_cap_fills_each_window(odata):
+    stub = odata(1050, page_cap=30)
+    assert ids(fetch(stub)) == list(range(1050))
+
+    windows = [q for q in stub.data_requests() if "$skip" in q]
+    assert all(q["$orderby"] == "ID" for q in windows)
+
+
+def test_early_close_stops_requests(odata):
+    stub = odata(5000)
+    stub.delay = 0.02
+    batches = fetch(stub, page_size=100, parallelism=2)
+    assert len(next(batches)) == 100
+    batches.close()
+
+    sent = len(stub.data_requests())
+    time.sleep(0.2)
+    assert len(stub.data_requests()) == sent
+    assert sent < 10